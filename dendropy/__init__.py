@@ -33,6 +33,7 @@ from dendropy.utility import vcsinfo
 from dendropy.dataobject.base import *
 from dendropy.dataobject.taxon import *
 from dendropy.dataobject.tree import *
+from dendropy.dataobject.flattree import *
 from dendropy.dataobject.char import *
 from dendropy.dataobject.dataset import *
 
@@ -22,6 +22,7 @@ Implementation of FASTA-format data reader and writer.
 
 from cStringIO import StringIO
 import re
+import string
 import textwrap
 
 from dendropy import dataobject
@@ -45,12 +46,17 @@ class FastaReader(iosys.DataReader):
 
         The supported kwargs are:
 
-            - `row_type` can be RICH or STR,
+            - `row_type` can be RICH, STR or COMPACT (sequences are
+              translated and validated a line at a time, and stored as
+              `CompactCharacterDataVector` objects, the cells of which are
+              only created if and when they are accessed),
             - `char_matrix_type` should be one of the `CharacterMatrix` types.
             - `data_type` (should be in FastaReader.supported_data_types)
         """
         iosys.DataReader.__init__(self, **kwargs)
-        self.simple_rows = kwargs.get('row_type', 'rich').upper() == 'STR'
+        row_type = kwargs.get('row_type', 'rich').upper()
+        self.simple_rows = row_type == 'STR'
+        self.compact_rows = row_type == 'COMPACT'
 
         self.char_matrix_type = kwargs.get("char_matrix_type")
         data_type = kwargs.get("data_type", '').lower()
@@ -92,6 +98,9 @@ class FastaReader(iosys.DataReader):
         else:
             self.symbol_state_map = self.char_matrix.state_alphabets[0]
 
+        if self.compact_rows:
+            return self._read_compact_rows(stream, taxon_set)
+
         curr_vec = None
         curr_taxon = None
 
@@ -141,6 +150,58 @@ class FastaReader(iosys.DataReader):
             self.char_matrix[curr_taxon] = "".join(curr_vec)
         return self.dataset
 
+    def _read_compact_rows(self, stream, taxon_set):
+        """
+        Parses sequences into `CompactCharacterDataVector` objects: the lines
+        of each sequence are collected, and then validated and translated
+        into state indices as a whole, using `str.translate()`.
+        """
+        state_alphabet = self.char_matrix.default_state_alphabet
+        if state_alphabet is None:
+            state_alphabet = self.char_matrix.state_alphabets[0]
+        table, legal_symbols = state_alphabet.symbol_index_translation_table()
+        legal_chars = legal_symbols + string.whitespace
+        curr_taxon = None
+        curr_lines = None
+        curr_row = None
+        for line_index, line in enumerate(stream):
+            s = line.strip()
+            if s.startswith('>'):
+                if curr_lines is not None:
+                    curr_vec = self._compact_vector(curr_taxon, curr_lines, curr_row, state_alphabet, table, legal_chars, stream)
+                    if len(curr_vec) == 0:
+                        raise DataParseError(message="Fasta error: Expected sequence, but found another sequence name (%s)" % s[1:].strip(), row=line_index + 1, stream=stream)
+                name = s[1:].strip()
+                curr_taxon = taxon_set.require_taxon(label=name)
+                if curr_taxon in self.char_matrix:
+                    raise DataParseError(message="Fasta error: Repeated sequence name (%s) found" % name, row=line_index + 1, stream=stream)
+                self.char_matrix[curr_taxon] = dataobject.CompactCharacterDataVector(state_alphabet=state_alphabet, taxon=curr_taxon)
+                curr_lines = []
+                curr_row = line_index + 1
+            elif curr_lines is not None:
+                curr_lines.append(s)
+            elif s:
+                raise DataParseError(message="Fasta error: Expecting a lines starting with > before sequences", row=line_index + 1, stream=stream)
+        if curr_lines is not None:
+            self._compact_vector(curr_taxon, curr_lines, curr_row, state_alphabet, table, legal_chars, stream)
+        return self.dataset
+
+    def _compact_vector(self, taxon, lines, row, state_alphabet, table, legal_chars, stream):
+        """
+        Validates and translates the (stripped) sequence lines, `lines`,
+        following the name of `taxon` on line `row`, and stores them as the
+        state indices of the sequence of `taxon`.
+        """
+        seq = "".join(lines)
+        if seq.translate(None, legal_chars):
+            for line_offset, s in enumerate(lines):
+                for col_ind, c in enumerate(s):
+                    if c not in legal_chars:
+                        raise DataParseError(message='Unrecognized sequence symbol "%s"' % c, row=row + line_offset + 1, column=col_ind + 1, stream=stream)
+        vec = self.char_matrix[taxon]
+        vec.state_indices.fromstring(seq.translate(table, string.whitespace))
+        return vec
+
 class DNAFastaReader(FastaReader):
     def __init__(self, **kwargs):
         FastaReader.__init__(self, char_matrix_type=dataobject.DnaCharacterMatrix, **kwargs)
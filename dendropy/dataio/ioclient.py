@@ -21,6 +21,8 @@ Provides high-level brokerage between formats and associated parsers/writers.
 """
 
 from dendropy.dataio.dataschema import DataSchemaRegistry
+from dendropy.utility import fileutils
+from dendropy.utility.error import DataParseError
 
 _GLOBAL_DATA_SCHEMA_REGISTRY = DataSchemaRegistry()
 
@@ -50,6 +52,12 @@ def get_reader(schema, **kwargs):
         - `exclude_chars`: Characters in the source will be skipped.
         - `encode_splits`: Specifies whether or not splits will be
                 automatically-encoded upon a tree being read.
+        - `split_encoding`: "rooted", "unrooted" or "none", overriding
+                `encode_splits` and the default of encoding splits upon
+                trees being read with a pre-populated taxon set (see
+                `dendropy.treesplit.SplitEncodingPolicy`).
+        - `node_factory`: The class of the nodes of the trees read (e.g.,
+                `dendropy.CompactNode`).
 
     Other keywords may be implemented by specific readers (e.g. NexusReader,
     NewickReader). Refer to their documentation for details.
@@ -76,6 +84,94 @@ def get_writer(schema, **kwargs):
     """
     return _GLOBAL_DATA_SCHEMA_REGISTRY.get_writer(schema, **kwargs)
 
+class TreeSelector(object):
+    """
+    Decides which trees of a source are to be returned, given a tree offset,
+    a thinning interval and/or a sample size. Called with the 0-based index
+    of a tree (before it is parsed), returns True if the tree is to be
+    skipped: readers that support the `skip_tree_func` keyword argument use
+    this to skip over the tree statement without building the tree.
+
+    If `sample_size` is given, a uniform random sample (without
+    replacement) of that many trees is drawn from the eligible trees by
+    reservoir sampling, so that only the trees that enter the reservoir
+    need to be parsed. A single selector may be used across multiple
+    sources (using `start_source()` before each) to sample from their
+    combined trees.
+    """
+
+    def __init__(self, tree_offset=0, thin=1, sample_size=None, rng=None):
+        self.tree_offset = tree_offset
+        self.thin = thin
+        if self.thin is None or self.thin < 1:
+            self.thin = 1
+        self.sample_size = sample_size
+        if rng is None:
+            from dendropy.utility import GLOBAL_RNG
+            rng = GLOBAL_RNG
+        self.rng = rng
+        self.source_idx = 0
+        self.num_eligible = 0
+        self.reservoir = []
+        self._decisions = {}
+
+    def start_source(self, source_idx):
+        self.source_idx = source_idx
+        self._decisions = {}
+
+    def __call__(self, tree_idx):
+        return self.select(tree_idx) is None
+
+    def select(self, tree_idx):
+        """
+        Returns None if the tree at `tree_idx` is to be skipped, or, if it
+        is to be kept, its slot in the reservoir (or True if not sampling).
+        The decision for each tree is made only once.
+        """
+        if tree_idx in self._decisions:
+            return self._decisions[tree_idx]
+        if tree_idx < self.tree_offset or (tree_idx - self.tree_offset) % self.thin != 0:
+            slot = None
+        elif self.sample_size is None:
+            slot = True
+        else:
+            if self.num_eligible < self.sample_size:
+                slot = self.num_eligible
+            else:
+                slot = self.rng.randint(0, self.num_eligible)
+                if slot >= self.sample_size:
+                    slot = None
+            self.num_eligible += 1
+        self._decisions[tree_idx] = slot
+        return slot
+
+    def pop(self, tree_idx):
+        """
+        Returns (and forgets) the decision for the tree at `tree_idx`.
+        """
+        slot = self.select(tree_idx)
+        del(self._decisions[tree_idx])
+        return slot
+
+    def store(self, slot, tree_idx, tree):
+        while slot >= len(self.reservoir):
+            self.reservoir.append(None)
+        self.reservoir[slot] = ((self.source_idx, tree_idx), tree)
+
+    def sampled_trees(self):
+        """
+        Returns the trees in the reservoir, in the order in which they were
+        found in the source(s).
+        """
+        return [t for key, t in sorted([r for r in self.reservoir if r is not None])]
+
+def _pop_tree_selection_kwargs(kwargs):
+    tree_offset = kwargs.pop("tree_offset", 0)
+    thin = kwargs.pop("thin", 1)
+    sample_size = kwargs.pop("sample_size", None)
+    rng = kwargs.pop("rng", None)
+    return tree_offset, thin, sample_size, rng
+
 def tree_source_iter(stream, schema, **kwargs):
     """
     Returns an iterator over trees in `schema`-formatted data
@@ -87,6 +183,37 @@ def tree_source_iter(stream, schema, **kwargs):
 
         - `tree_offset` 0-based index specifying first tree to actually return
            (raises KeyError if >= #trees)
+        - `thin` only every `thin`-th tree (counting from `tree_offset`) will
+           be returned
+        - `sample_size` a random sample (without replacement) of this many
+           trees (after `tree_offset` and `thin` have been applied) will be
+           returned, in the order in which they occur in the source; all the
+           trees are returned if there are fewer than this
+        - `rng` random number generator to be used for sampling (defaults
+           to `dendropy.utility.GLOBAL_RNG`)
+        - `tree_slice` an integer or `slice` object selecting the trees to
+           return by their 0-based index. Trees are then read by seeking
+           directly to them using a `dendropy.dataio.treeindex.TreeIndex`
+           of the source (NEXUS and NEWICK sources only), which, for files
+           on disk, is saved to and re-used from a sidecar file unless
+           `use_index_file` is False. `tree_offset`, `thin` and
+           `sample_size` are applied to the trees selected by `tree_slice`.
+        - `follow` if True, `stream` is taken to be a file that is still
+           being written (e.g., by a running MCMC analysis): instead of
+           ending when the end of the data is reached, iteration waits for
+           more trees to be appended (see
+           `dendropy.utility.fileutils.FollowingStream`), and ends only when
+           the event given by `follow_stop_event` is set, or no data has
+           been appended for `follow_timeout` seconds, or the function given
+           by `follow_idle_func` returns False (this is called each time all
+           the trees written so far have been returned). A statement left
+           incomplete when iteration ends is ignored. Not supported with
+           `tree_slice` or `sample_size`.
+
+    Trees that are not selected are skipped over without being built by
+    readers that support it (NEXUS and NEWICK). If the source is a file
+    that has a valid tree index sidecar file, then the selected trees are
+    read by seeking directly to them.
 
     Keyword arguments that should be handled by implementing Readers:
 
@@ -96,16 +223,25 @@ def tree_source_iter(stream, schema, **kwargs):
            `Tree` objects.
         - `encode_splits` specifies whether or not split bitmasks will be
            calculated and attached to the edges.
+        - `split_encoding` is one of "rooted", "unrooted" or "none" (see
+           `dendropy.treesplit.SplitEncodingPolicy`).
+        - `node_factory` is the class of the nodes of the trees (e.g.,
+           `dendropy.CompactNode`).
         - `finish_node_func` is a function that will be applied to each node
            after it has been constructed.
         - `edge_len_type` specifies the type of the edge lengths (int or float)
+        - `as_split_records` specifies that `treesplit.SplitRecord` objects,
+           summarizing the splits on each tree, are to be returned instead
+           of `Tree` objects.
+        - `as_flat_trees` specifies that array-based `FlatTree` objects are
+           to be returned instead of `Tree` objects.
+        - `skip_tree_func` is a function that will be called with the
+           0-based index of each tree before it is parsed, and which
+           returns True if the tree is to be skipped (in which case None
+           is yielded in its place).
 
     """
-    if "tree_offset" in kwargs:
-        tree_offset = kwargs["tree_offset"]
-        del(kwargs["tree_offset"])
-    else:
-        tree_offset = 0
+    tree_offset, thin, sample_size, rng = _pop_tree_selection_kwargs(kwargs)
     if "write_progress" in kwargs:
         write_progress = kwargs["write_progress"]
         del(kwargs["write_progress"])
@@ -118,19 +254,117 @@ def tree_source_iter(stream, schema, **kwargs):
         log_frequency = 1
     if log_frequency <= 0:
         write_progress = None
+    tree_slice = kwargs.pop("tree_slice", None)
+    use_index_file = kwargs.pop("use_index_file", True)
+    follow = kwargs.pop("follow", False)
+    follow_timeout = kwargs.pop("follow_timeout", None)
+    follow_idle_func = kwargs.pop("follow_idle_func", None)
+    follow_stop_event = kwargs.pop("follow_stop_event", None)
+    if follow:
+        if tree_slice is not None or sample_size is not None:
+            raise TypeError("'tree_slice' and 'sample_size' cannot be used with 'follow'")
+        # any index of the source would be outdated as soon as it grows
+        use_index_file = False
+        stream = fileutils.FollowingStream(stream,
+                stop_event=follow_stop_event,
+                timeout=follow_timeout,
+                idle_func=follow_idle_func)
+    index = None
+    if tree_slice is not None:
+        from dendropy.dataio import treeindex
+        index, src = treeindex.indexed_source(stream,
+                schema=schema,
+                preserve_underscores=kwargs.get('preserve_underscores', False),
+                use_index_file=use_index_file)
+    elif (thin > 1 or sample_size is not None) and use_index_file:
+        from dendropy.dataio import treeindex
+        index = treeindex.find_tree_index(stream,
+                schema=schema,
+                preserve_underscores=kwargs.get('preserve_underscores', False))
+        if index is not None:
+            tree_slice = slice(None)
+            src = open(stream.name, "rb")
+    if index is not None:
+        try:
+            tree_indices = index.resolve_indices(tree_slice)
+            if tree_offset > 0 and tree_offset >= len(tree_indices):
+                raise KeyError("0-based index out of bounds: %d (trees=%d, tree_offset=[0, %d])" \
+                        % (tree_offset, len(tree_indices), len(tree_indices)-1))
+            if sample_size is None:
+                tree_indices = tree_indices[tree_offset::thin]
+            else:
+                # same selection (and use of `rng`) as when reading the
+                # source without an index
+                selector = TreeSelector(tree_offset=tree_offset,
+                        thin=thin,
+                        sample_size=sample_size,
+                        rng=rng)
+                for pos, tree_idx in enumerate(tree_indices):
+                    slot = selector.select(pos)
+                    if slot is not None:
+                        selector.store(slot, pos, tree_idx)
+                tree_indices = selector.sampled_trees()
+            for t in index.indexed_tree_iter(src, tree_indices, **kwargs):
+                yield t
+        finally:
+            treeindex.close_indexed_source(src, stream)
+        return
+    selector = TreeSelector(tree_offset=tree_offset,
+            thin=thin,
+            sample_size=sample_size,
+            rng=rng)
+    tree_iter = _selected_tree_iter(stream, schema, selector, write_progress, log_frequency, kwargs)
+    if selector.sample_size is None:
+        for t in tree_iter:
+            yield t
+        return
+    for t in tree_iter:
+        pass
+    for t in selector.sampled_trees():
+        yield t
+
+def _selected_tree_iter(stream, schema, selector, write_progress, log_frequency, kwargs):
+    """
+    Iterates over the trees of `stream` selected by `selector`. If
+    `selector` is sampling, then trees are stored in its reservoir instead
+    of being returned (and None is yielded for each tree found).
+    """
+    if selector.tree_offset > 0 or selector.thin > 1 or selector.sample_size is not None:
+        kwargs["skip_tree_func"] = selector
     tree_iter = _GLOBAL_DATA_SCHEMA_REGISTRY.tree_source_iter(stream, schema, **kwargs)
-    count = 0
+    if isinstance(stream, fileutils.FollowingStream):
+        tree_iter = _followed_tree_iter(tree_iter, stream)
+    count = -1
     for count, t in enumerate(tree_iter):
-        if count >= tree_offset and t is not None:
+        slot = selector.pop(count)
+        if slot is not None and t is not None:
             if write_progress is not None and (count % log_frequency == 0):
                 write_progress("Processing tree at index %d" % count)
-            count += 1
-            yield t
+            if selector.sample_size is None:
+                yield t
+            else:
+                selector.store(slot, count, t)
+                yield None
         else:
             if write_progress is not None and (count % log_frequency == 0):
                 write_progress("Skipping tree at index %d" % count)
-    if count < tree_offset:
-        raise KeyError("0-based index out of bounds: %d (trees=%d, tree_offset=[0, %d])" % (tree_offset, count, count-1))
+    if count < selector.tree_offset and selector.tree_offset > 0:
+        raise KeyError("0-based index out of bounds: %d (trees=%d, tree_offset=[0, %d])" % (selector.tree_offset, count+1, count))
+
+def _followed_tree_iter(tree_iter, stream):
+    """
+    Iterates over the trees of `tree_iter`, parsed from the `FollowingStream`
+    `stream`, ending quietly if parsing fails because the stream ended
+    part-way through a statement that was still being written (which the
+    tokenizers report as a `DataParseError`). Any other error, or a parse
+    error raised before the stream ended, is passed on.
+    """
+    try:
+        for t in tree_iter:
+            yield t
+    except DataParseError:
+        if not stream.ended:
+            raise
 
 def multi_tree_source_iter(sources, schema, **kwargs):
     """
@@ -138,6 +372,9 @@ def multi_tree_source_iter(sources, schema, **kwargs):
     objects or filepaths (strings). Note that unless a TaxonSet object is
     explicitly passed using the 'taxon_set' keyword argument, the trees in each
     file will be associated with their own distinct, independent taxon set.
+    `tree_offset` and `thin` (see `tree_source_iter()`) are applied to each
+    source separately, while `sample_size` gives the size of the sample to
+    be drawn from the trees of all the sources combined.
     """
 #    if "taxon_set" not in kwargs:
 #        kwargs["taxon_set"] = TaxonSet()
@@ -146,6 +383,13 @@ def multi_tree_source_iter(sources, schema, **kwargs):
         del(kwargs["write_progress"])
     else:
         write_progress = None
+    sample_size = kwargs.get("sample_size", None)
+    if sample_size is not None:
+        tree_offset, thin, sample_size, rng = _pop_tree_selection_kwargs(kwargs)
+        selector = TreeSelector(tree_offset=tree_offset,
+                thin=thin,
+                sample_size=sample_size,
+                rng=rng)
     num_sources = len(sources)
     for i, s in enumerate(sources):
         if isinstance(s, str):
@@ -157,5 +401,13 @@ def multi_tree_source_iter(sources, schema, **kwargs):
                     % (i+1, num_sources, str(x)))
         else:
             write_subprogress = None
-        for t in tree_source_iter(src, schema, write_progress=write_subprogress, **kwargs):
+        if sample_size is None:
+            for t in tree_source_iter(src, schema, write_progress=write_subprogress, **kwargs):
+                yield t
+        else:
+            selector.start_source(i)
+            for t in _selected_tree_iter(src, schema, selector, write_subprogress, 1, dict(kwargs)):
+                pass
+    if sample_size is not None:
+        for t in selector.sampled_trees():
             yield t
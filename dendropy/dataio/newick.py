@@ -78,7 +78,18 @@ def tree_source_iter(stream, **kwargs):
 
         `encode_splits`
             Specifies whether or not split bitmasks will be calculated and
-            attached to the edges.
+            attached to the edges. By default, they are if `taxon_set` is
+            given and is not empty.
+
+        `split_encoding`
+            One of "rooted" (splits are encoded and trees are treated as
+            rooted), "unrooted" (splits are encoded and trees are treated as
+            unrooted) or "none" (splits are not encoded), overriding
+            `encode_splits` (see `dendropy.treesplit.SplitEncodingPolicy`).
+
+        `node_factory`
+            The class of the nodes of the trees (`dendropy.Node` by default;
+            `dendropy.CompactNode` uses substantially less memory).
 
         `finish_node_func`
             Is a function that will be applied to each node after it has
@@ -111,6 +122,32 @@ def tree_source_iter(stream, **kwargs):
             characters. Defaults to False, hyphens not treated as special
             punctuation characters.
 
+        `buffered_tokenizer`
+            If False, the source will be read character-by-character using
+            `NexusTokenizer` instead of in blocks using
+            `BufferedNexusTokenizer`. Defaults to True.
+
+        `as_split_records`
+            If True, lightweight `treesplit.SplitRecord` objects summarizing
+            the splits of each tree (as would be given by `encode_splits()`)
+            will be returned instead of `Tree` objects. These can be passed
+            to `SplitDistribution.count_splits_on_tree()` and
+            `TopologyCounter.count()`. Defaults to False.
+
+        `calc_node_ages`
+            If True (and `as_split_records` is True), node ages will be
+            calculated and stored in the split records. Defaults to False.
+
+        `as_flat_trees`
+            If True, array-based `FlatTree` representations of the trees
+            will be returned instead of `Tree` objects. Defaults to False.
+
+        `skip_tree_func`
+            A function that will be called with the 0-based index of each
+            tree before it is parsed: if it returns True, the tree statement
+            is skipped over without building the tree, and None is yielded
+            in its place.
+
     """
     if "taxon_set" in kwargs:
         taxon_set = kwargs["taxon_set"]
@@ -124,14 +161,28 @@ def tree_source_iter(stream, **kwargs):
     preserve_underscores = kwargs.get('preserve_underscores', False)
     hyphens_as_tokens = kwargs.get('hyphens_as_tokens', nexustokenizer.DEFAULT_HYPHENS_AS_TOKENS)
     extract_comment_metadata = kwargs.get("extract_comment_metadata", False)
-    newick_stream = nexustokenizer.NexusTokenizer(stream,
+    newick_stream = nexustokenizer.get_tokenizer(stream,
                                                   preserve_underscores=preserve_underscores,
                                                   hyphens_as_tokens=hyphens_as_tokens,
                                                   extract_comment_metadata=extract_comment_metadata,
-                                                  case_sensitive_taxon_labels=kwargs.get('case_sensitive_taxon_labels', False))
+                                                  case_sensitive_taxon_labels=kwargs.get('case_sensitive_taxon_labels', False),
+                                                  buffered_tokenizer=kwargs.get('buffered_tokenizer', True))
+    skip_tree_func = kwargs.pop("skip_tree_func", None)
+    tree_idx = 0
     while not newick_stream.eof:
+        if skip_tree_func is not None:
+            # only skip if it is certain that there is another tree statement,
+            # so that `skip_tree_func` is called once for each tree
+            if hasattr(newick_stream, "peek_statement") \
+                    and newick_stream.peek_statement() is not None \
+                    and skip_tree_func(tree_idx):
+                newick_stream.skip_to_semicolon()
+                tree_idx += 1
+                yield None
+                continue
         t = nexustokenizer.tree_from_token_stream(newick_stream, taxon_set=taxon_set, **kwargs)
         if t is not None:
+            tree_idx += 1
             yield t
         else:
             raise StopIteration()
@@ -191,7 +242,18 @@ class NewickReader(iosys.DataReader):
 
             `encode_splits`
                 Specifies whether or not split bitmasks will be calculated and
-                attached to the edges.
+                attached to the edges. By default, they are if `taxon_set` is
+                given and is not empty.
+
+            `split_encoding`
+                One of "rooted" (splits are encoded and trees are treated as
+                rooted), "unrooted" (splits are encoded and trees are treated as
+                unrooted) or "none" (splits are not encoded), overriding
+                `encode_splits` (see `dendropy.treesplit.SplitEncodingPolicy`).
+
+            `node_factory`
+                The class of the nodes of the trees (`dendropy.Node` by default;
+                `dendropy.CompactNode` uses substantially less memory).
 
             `finish_node_func`
                 Is a function that will be applied to each node after it has
@@ -223,6 +285,11 @@ class NewickReader(iosys.DataReader):
                 If True, hyphens will be treated as special punctuation
                 characters. Defaults to False, hyphens not treated as special
                 punctuation characters.
+
+            `buffered_tokenizer`
+                If False, the source will be read character-by-character
+                using `NexusTokenizer` instead of in blocks using
+                `BufferedNexusTokenizer`. Defaults to True.
         """
         iosys.DataReader.__init__(self, **kwargs)
         self.finish_node_func = kwargs.get("finish_node_func", None)
@@ -235,6 +302,7 @@ class NewickReader(iosys.DataReader):
         self.suppress_internal_node_taxa = kwargs.get("suppress_internal_node_taxa", False)
         self.case_sensitive_taxon_labels = kwargs.get('case_sensitive_taxon_labels', False)
         self.edge_len_type = kwargs.get('edge_len_type', float)
+        self.buffered_tokenizer = kwargs.get('buffered_tokenizer', True)
 
     def read(self, stream):
         """
@@ -255,10 +323,13 @@ class NewickReader(iosys.DataReader):
                 extract_comment_metadata=self.extract_comment_metadata,
                 store_tree_weights=self.store_tree_weights,
                 encode_splits=self.encode_splits,
+                split_encoding=self.split_encoding,
+                node_factory=self.node_factory,
                 preserve_underscores=self.preserve_underscores,
                 suppress_internal_node_taxa=self.suppress_internal_node_taxa,
                 edge_len_type=self.edge_len_type,
-                case_sensitive_taxon_labels=self.case_sensitive_taxon_labels):
+                case_sensitive_taxon_labels=self.case_sensitive_taxon_labels,
+                buffered_tokenizer=self.buffered_tokenizer):
             tree_list.append(t, reindex_taxa=False)
         return self.dataset
 
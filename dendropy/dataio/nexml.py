@@ -268,7 +268,9 @@ class NexmlReader(iosys.DataReader):
         representations of a set of NEXML treeblocks (`nex:trees`) and
         returns a TreeLists object corresponding to the NEXML.
         """
-        nx_tree_parser = _NexmlTreesParser()
+        nx_tree_parser = _NexmlTreesParser(split_encoding=self.split_encoding,
+                encode_splits=self.encode_splits,
+                node_factory=self.node_factory)
         for trees_idx, trees_element in enumerate(xml_doc.getiterator('trees')):
             for tree in nx_tree_parser.parse_trees(trees_element, dataset, trees_idx, add_to_tree_list=True):
                 pass
@@ -362,8 +364,13 @@ class _NexmlElementParser(object):
 class _NexmlTreesParser(_NexmlElementParser):
     "Parses an XmlElement representation of NEXML schema tree blocks."
 
-    def __init__(self):
+    def __init__(self, split_encoding=None, encode_splits=False, node_factory=None):
         super(_NexmlTreesParser, self).__init__()
+        self.split_encoding = dendropy.treesplit.SplitEncodingPolicy.get(split_encoding,
+                encode_splits=encode_splits)
+        if node_factory is None:
+            node_factory = dendropy.Node
+        self.node_factory = node_factory
 
     def parse_trees(self, nxtrees, dataset, trees_idx=None, add_to_tree_list=True):
         """
@@ -389,11 +396,12 @@ class _NexmlTreesParser(_NexmlElementParser):
             tree_counter = tree_counter + 1
             oid = tree_element.get('id', tree_counter)
             label = tree_element.get('label', '')
-            treeobj = dendropy.Tree (oid=oid, label=label)
+            treeobj = dendropy.Tree (oid=oid, label=label, node_factory=self.node_factory)
             treeobj.taxon_set = taxon_set
             tree_type_attr = tree_element.get('{http://www.w3.org/2001/XMLSchema-instance}type')
             treeobj.length_type = _from_nexml_tree_length_type(tree_type_attr)
             self.parse_annotations(annotated=treeobj, nxelement=tree_element)
+            encode_splits = self.split_encoding.encodes_splits(taxon_set)
             nodes = self.parse_nodes(tree_element, taxon_set=treeobj.taxon_set)
             edges = self.parse_edges(tree_element, length_type=treeobj.length_type)
             for edge in edges.values():
@@ -455,6 +463,15 @@ class _NexmlTreesParser(_NexmlElementParser):
             else:
                 treeobj.seed_node.edge = None
 
+            if encode_splits:
+                # the tree is only marked as not needing restructuring by
+                # `encode_splits()` if it is already in the required form
+                treeobj.is_rooted = self.split_encoding.resolve_rooting(treeobj.is_rooted)
+                dendropy.treesplit.encode_splits(treeobj, delete_outdegree_one=False)
+                if not self.split_encoding.is_required \
+                        and not dendropy.treesplit.splits_encoded(treeobj):
+                    del treeobj.split_edges
+
             if add_to_tree_list:
                tree_list.append(treeobj)
 
@@ -469,7 +486,7 @@ class _NexmlTreesParser(_NexmlElementParser):
         nodes = {}
         for nxnode in tree_element.getiterator('node'):
             node_id = nxnode.get('id', None)
-            nodes[node_id] = dendropy.Node()
+            nodes[node_id] = self.node_factory()
             nodes[node_id].oid = node_id
             nodes[node_id].label = nxnode.get('label', None)
             taxon_id = nxnode.get('otu', None)
@@ -486,7 +503,7 @@ class _NexmlTreesParser(_NexmlElementParser):
         "Returns the edge subtending the root node, or None if not defined."
         rootedge = tree_element.find('rootedge')
         if rootedge is not None:
-            edge = dendropy.Edge()
+            edge = self.node_factory.edge_factory()
             edge.head_node_id = rootedge.get('target', None)
             edge.oid = rootedge.get('id', 'e' + str(id(edge)))
             edge_length_str = length_type(rootedge.get('length', '0.0'))
@@ -515,7 +532,7 @@ class _NexmlTreesParser(_NexmlElementParser):
         edges = {}
         edge_counter = 0
         for nxedge in tree_element.getiterator('edge'):
-            edge = dendropy.Edge()
+            edge = self.node_factory.edge_factory()
             edge_counter = edge_counter + 1
             edge.tail_node_id = nxedge.get('source', None)
             edge.head_node_id = nxedge.get('target', None)
@@ -211,6 +211,8 @@ else:
             if not use_ncl:
                 pure_python_reader = nexusreader_py.NexusReader(
                     encode_splits = self.encode_splits,
+                    split_encoding = self.split_encoding,
+                    node_factory = self.node_factory,
                     rooting_interpreter = self.rooting_interpreter,
                     finish_node_func = self.finish_node_func,
                     allow_duplicate_taxon_labels = self.allow_duplicate_taxon_labels,
@@ -294,6 +296,8 @@ else:
             if not use_ncl:
                 pure_python_reader = nexusreader_py.NexusReader(
                     encode_splits = self.encode_splits,
+                    split_encoding = self.split_encoding,
+                    node_factory = self.node_factory,
                     rooting_interpreter = self.rooting_interpreter,
                     finish_node_func = self.finish_node_func,
                     allow_duplicate_taxon_labels = self.allow_duplicate_taxon_labels,
@@ -427,6 +431,8 @@ else:
                                             taxon_set=taxa_block,
                                             translate_dict=self.tree_translate_dicts[ncl_tb],
                                             encode_splits=self.encode_splits,
+                                            split_encoding=self.split_encoding,
+                                            node_factory=self.node_factory,
                                             rooting_interpreter=self.rooting_interpreter,
                                             finish_node_func=self.finish_node_func)
 
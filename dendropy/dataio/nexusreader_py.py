@@ -71,7 +71,20 @@ class NexusReader(iosys.DataReader):
 
             `encode_splits`
                 Specifies whether or not split bitmasks will be calculated and
-                attached to the edges.
+                attached to the edges. By default, they are if the taxon set
+                of the trees is not empty when they are read (e.g., because
+                it was given by `taxon_set`, or defined by a TAXA block).
+
+            `split_encoding`
+                One of "rooted" (splits are encoded and trees are treated as
+                rooted), "unrooted" (splits are encoded and trees are treated
+                as unrooted) or "none" (splits are not encoded), overriding
+                `encode_splits` (see `dendropy.treesplit.SplitEncodingPolicy`).
+
+            `node_factory`
+                The class of the nodes of the trees (`dendropy.Node` by
+                default; `dendropy.CompactNode` uses substantially less
+                memory).
 
             `finish_node_func`
                 Is a function that will be applied to each node after it has
@@ -104,6 +117,32 @@ class NexusReader(iosys.DataReader):
                 characters. Defaults to False, hyphens not treated as special
                 punctuation characters.
 
+            `buffered_tokenizer`
+                If False, the source will be read character-by-character
+                using `NexusTokenizer` instead of in blocks using
+                `BufferedNexusTokenizer`. Defaults to True.
+
+            `as_split_records`
+                If True, `tree_source_iter()` will yield lightweight
+                `treesplit.SplitRecord` objects summarizing the splits of
+                each tree instead of `Tree` objects. Defaults to False.
+
+            `calc_node_ages`
+                If True (and `as_split_records` is True), node ages will be
+                calculated and stored in the split records. Defaults to
+                False.
+
+            `as_flat_trees`
+                If True, `tree_source_iter()` will yield array-based
+                `FlatTree` representations of the trees instead of `Tree`
+                objects. Defaults to False.
+
+            `skip_tree_func`
+                A function that `tree_source_iter()` will call with the
+                0-based index of each tree before parsing it: if it returns
+                True, the tree statement is skipped over without building
+                the tree, and None is yielded in its place.
+
         """
         iosys.DataReader.__init__(self, **kwargs)
         self.reset()
@@ -117,6 +156,11 @@ class NexusReader(iosys.DataReader):
         self.extract_comment_metadata = kwargs.get('extract_comment_metadata', False)
         self.case_sensitive_taxon_labels = kwargs.get('case_sensitive_taxon_labels', False)
         self.edge_len_type = kwargs.get('edge_len_type', float)
+        self.buffered_tokenizer = kwargs.get('buffered_tokenizer', True)
+        self.as_split_records = kwargs.get('as_split_records', False)
+        self.as_flat_trees = kwargs.get('as_flat_trees', False)
+        self.calc_node_ages = kwargs.get('calc_node_ages', False)
+        self.skip_tree_func = kwargs.get('skip_tree_func', None)
 
     def read(self, stream):
         """
@@ -141,17 +185,23 @@ class NexusReader(iosys.DataReader):
         new one created, or the one passed to this method via the
         `taxon_set` argument). This behavior is similar to how multiple
         tree blocks are handled by a full NEXUS data file read.
+        If `as_split_records` was specified, then `treesplit.SplitRecord`
+        objects will be returned instead of trees (or `FlatTree` objects, if
+        `as_flat_trees` was specified). If `skip_tree_func` was
+        specified, then None is returned in place of each tree skipped.
         """
         self.reset()
         if self.dataset is None:
             self.dataset = dataobject.DataSet()
-        self.stream_tokenizer = nexustokenizer.NexusTokenizer(stream,
+        self.stream_tokenizer = nexustokenizer.get_tokenizer(stream,
                 preserve_underscores=self.preserve_underscores,
                 hyphens_as_tokens=self.hyphens_as_tokens,
-                extract_comment_metadata=self.extract_comment_metadata)
+                extract_comment_metadata=self.extract_comment_metadata,
+                buffered_tokenizer=self.buffered_tokenizer)
         token = self.stream_tokenizer.read_next_token_ucase()
         if token.upper() != "#NEXUS":
             raise self.data_format_error("Expecting '#NEXUS', but found '%s'" % token)
+        tree_idx = 0
         while not self.stream_tokenizer.eof:
             token = self.stream_tokenizer.read_next_token_ucase()
             while token != None and token != 'BEGIN' and not self.stream_tokenizer.eof:
@@ -179,7 +229,14 @@ class NexusReader(iosys.DataReader):
                         if not taxon_set:
                             taxon_set = self._get_taxon_set(link_title)
                             self._prepopulate_translate_dict(taxon_set)
-                        tree = self._parse_tree_statement(taxon_set)
+                        if self.skip_tree_func is not None and self.skip_tree_func(tree_idx):
+                            self.stream_tokenizer.skip_to_semicolon()
+                            tree = None
+                        else:
+                            tree = self._parse_tree_statement(taxon_set,
+                                    as_split_records=self.as_split_records,
+                                    as_flat_trees=self.as_flat_trees)
+                        tree_idx += 1
                         yield tree
                 self.stream_tokenizer.skip_to_semicolon() # move past END command
             else:
@@ -223,10 +280,11 @@ class NexusReader(iosys.DataReader):
     ## HELPERS
 
     def _prepare_to_read_from_stream(self, file_obj):
-        self.stream_tokenizer = nexustokenizer.NexusTokenizer(stream_handle=file_obj,
+        self.stream_tokenizer = nexustokenizer.get_tokenizer(file_obj,
                 preserve_underscores=self.preserve_underscores,
                 hyphens_as_tokens=self.hyphens_as_tokens,
-                extract_comment_metadata=self.extract_comment_metadata)
+                extract_comment_metadata=self.extract_comment_metadata,
+                buffered_tokenizer=self.buffered_tokenizer)
 
     def _consume_to_end_of_block(self, token):
         if token:
@@ -750,11 +808,14 @@ class NexusReader(iosys.DataReader):
 #                ti = taxon_set.index(t)
 #                t.split_bitmask = (1 << ti)
 
-    def _parse_tree_statement(self, taxon_set=None):
+    def _parse_tree_statement(self, taxon_set=None, as_split_records=False, as_flat_trees=False):
         """
         Processes a TREE command. Assumes that the file reader is
         positioned right after the "TREE" token in a TREE command.
         Calls on the NewickStatementParser of the trees module.
+        If `as_split_records` is True, a `treesplit.SplitRecord` is
+        returned instead of a tree, and if `as_flat_trees` is True, a
+        `FlatTree`.
         """
         token = self.stream_tokenizer.read_next_token()
         if token == '*':
@@ -768,6 +829,8 @@ class NexusReader(iosys.DataReader):
                 taxon_set=taxon_set,
                 translate_dict=self.tree_translate_dict,
                 encode_splits=self.encode_splits,
+                split_encoding=self.split_encoding,
+                node_factory=self.node_factory,
                 rooting_interpreter=self.rooting_interpreter,
                 finish_node_func=self.finish_node_func,
                 extract_comment_metadata=self.extract_comment_metadata,
@@ -775,9 +838,12 @@ class NexusReader(iosys.DataReader):
                 preserve_underscores=self.preserve_underscores,
                 suppress_internal_node_taxa=self.suppress_internal_node_taxa,
                 edge_len_type=self.edge_len_type,
-                case_sensitive_taxon_labels=self.case_sensitive_taxon_labels)
+                case_sensitive_taxon_labels=self.case_sensitive_taxon_labels,
+                as_split_records=as_split_records,
+                as_flat_trees=as_flat_trees,
+                calc_node_ages=self.calc_node_ages)
         tree.label = tree_name
-        if tree_comments is not None and len(tree_comments) > 0:
+        if not (as_split_records or as_flat_trees) and tree_comments is not None and len(tree_comments) > 0:
             tree.comments.extend(tree_comments)
         if self.stream_tokenizer.current_token != ';':
             self.stream_tokenizer.skip_to_semicolon()
@@ -26,6 +26,7 @@ from cStringIO import StringIO
 from dendropy.utility import containers
 from dendropy.utility.error import DataParseError
 from dendropy import dataobject
+from dendropy import treesplit
 from dendropy.utility import messaging
 _LOG = messaging.get_logger(__name__)
 
@@ -292,9 +293,22 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
     token should be the opening parenthesis of the tree definition).
 
     str_to_taxon kwarg (if used) must supply the StrToTaxon interface).
+
+    If the `as_split_records` kwarg is True, then instead of a `Tree`, a
+    `treesplit.SplitRecord` summarizing the splits of the tree is returned
+    (`encode_splits` and `finish_node_func` are ignored). Wherever possible,
+    this is built directly from the tree statement without instantiating
+    any `Node` or `Edge` objects. If the `calc_node_ages` kwarg is also True,
+    then the ages of the nodes will be calculated and stored in the record.
+
+    If the `as_flat_trees` kwarg is True, then a `FlatTree` is returned
+    instead of a `Tree` (`encode_splits` is ignored). The tree is built out
+    of `CompactNode` objects, unless `node_factory` is given, before being
+    converted.
     """
     translate_dict = kwargs.get("translate_dict", None)
-    encode_splits = kwargs.get("encode_splits", False)
+    split_encoding = treesplit.SplitEncodingPolicy.get(kwargs.get("split_encoding", None),
+            encode_splits=kwargs.get("encode_splits", False))
     rooting_interpreter = kwargs.get("rooting_interpreter", RootingInterpreter(**kwargs))
     finish_node_func = kwargs.get("finish_node_func", None)
     edge_len_type = kwargs.get("edge_len_type", float)
@@ -303,20 +317,29 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
     store_tree_weights = kwargs.get("store_tree_weights", False)
     extract_comment_metadata = kwargs.get('extract_comment_metadata', False)
     case_sensitive_taxon_labels = kwargs.get('case_sensitive_taxon_labels', False)
+    as_split_records = kwargs.get("as_split_records", False)
+    as_flat_trees = kwargs.get("as_flat_trees", False)
+    calc_node_ages = kwargs.get("calc_node_ages", False)
     stream_tokenizer_extract_comment_metadata_setting = stream_tokenizer.extract_comment_metadata
     stream_tokenizer.extract_comment_metadata = extract_comment_metadata
     if taxon_set is None:
         taxon_set = dataobject.TaxonSet()
-    tree = dataobject.Tree(taxon_set=taxon_set)
+    encode_splits = not (as_split_records or as_flat_trees) \
+            and split_encoding.encodes_splits(taxon_set)
+    num_taxa = len(taxon_set)
+    node_factory = kwargs.get("node_factory", None)
+    if as_flat_trees and node_factory is None:
+        node_factory = dataobject.CompactNode
+    tree = dataobject.Tree(taxon_set=taxon_set, node_factory=node_factory)
 
     stream_tokenizer.tree_rooting_comment = None # clear previous comment
     stream_tokenizer.clear_comment_metadata()
     token = stream_tokenizer.read_next_token()
     if not token:
         return None
-    tree.is_rooted = rooting_interpreter.interpret_as_rooted(stream_tokenizer.tree_rooting_comment)
+    tree.is_rooted = split_encoding.resolve_rooting(rooting_interpreter.interpret_as_rooted(stream_tokenizer.tree_rooting_comment))
 #    if stream_tokenizer.tree_rooting_comment is not None:
-#        tree.is_rooted = rooting_interpreter.interpret_as_rooted(stream_tokenizer.tree_rooting_comment)
+#        tree.is_rooted = split_encoding.resolve_rooting(rooting_interpreter.interpret_as_rooted(stream_tokenizer.tree_rooting_comment))
 #    elif rooting_interpreter.interpret_as_rooted(stream_tokenizer.tree_rooting_comment):
 #        tree_is_rooted = True
 
@@ -351,7 +374,7 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
                 allow_repeated_use=False,
                 case_sensitive=case_sensitive_taxon_labels)
 
-    tree.seed_node = dataobject.Node()
+    tree.seed_node = tree.node_factory()
     curr_node = tree.seed_node
     if encode_splits:
         curr_node.edge.split_bitmask = 0L
@@ -378,6 +401,69 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
     stream_tokenizer.clear_comments()
     store_comment_metadata(tree)
 
+    if token == '(' and kwargs.get('str_to_taxon') is None \
+            and hasattr(stream_tokenizer, "peek_statement"):
+        statement = stream_tokenizer.peek_statement()
+        if as_split_records and statement is not None and "'" not in statement:
+            if "[" in statement:
+                # comments do not contribute to split records
+                newick_str = _NEWICK_COMMENT_PATTERN.sub(" ", statement)
+            else:
+                newick_str = statement
+            split_record = _split_record_from_simple_newick(statement=newick_str,
+                    stream_tokenizer=stream_tokenizer,
+                    str_to_taxon=stt,
+                    is_rooted=tree.is_rooted,
+                    edge_len_type=edge_len_type,
+                    suppress_internal_node_taxa=suppress_internal_node_taxa,
+                    calc_node_ages=calc_node_ages)
+            if split_record is not None:
+                split_record.weight = tree.weight
+                stream_tokenizer.consume_statement(statement)
+                stream_tokenizer.extract_comment_metadata = stream_tokenizer_extract_comment_metadata_setting
+                return split_record
+            # could not handle statement: start again using general parser
+            stt = StrToTaxon(taxon_set,
+                    translate_dict,
+                    allow_repeated_use=False,
+                    case_sensitive=case_sensitive_taxon_labels)
+        elif statement is not None and "[" not in statement and "'" not in statement:
+            if encode_splits:
+                fast_split_map = split_map
+            else:
+                fast_split_map = None
+            normalized = _build_tree_from_simple_newick(tree=tree,
+                    statement=statement,
+                    stream_tokenizer=stream_tokenizer,
+                    str_to_taxon=stt,
+                    split_map=fast_split_map,
+                    finish_node_func=finish_node_func,
+                    edge_len_type=edge_len_type,
+                    suppress_internal_node_taxa=suppress_internal_node_taxa,
+                    extract_comment_metadata=extract_comment_metadata)
+            if normalized is not None:
+                stream_tokenizer.consume_statement(statement)
+                stream_tokenizer.extract_comment_metadata = stream_tokenizer_extract_comment_metadata_setting
+                if encode_splits:
+                    _finish_split_encoding(tree, normalized, num_taxa, split_encoding)
+                if as_flat_trees:
+                    return dataobject.FlatTree.from_tree(tree)
+                return tree
+            # could not handle statement: start again using general parser
+            stt = StrToTaxon(taxon_set,
+                    translate_dict,
+                    allow_repeated_use=False,
+                    case_sensitive=case_sensitive_taxon_labels)
+            tree.seed_node = tree.node_factory()
+            curr_node = tree.seed_node
+            if encode_splits:
+                split_map.clear()
+                curr_node.edge.split_bitmask = 0L
+
+    # nodes are attached directly rather than through `Node.add_child()`,
+    # as the tree is not yet visible to anything that could be tracking
+    # structural changes
+    normalized = True
     while True:
         if not token or token == ';':
             if curr_node is not tree.seed_node:
@@ -389,16 +475,16 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
             if not curr_node.parent_node:
                 if curr_node.child_nodes():
                     raise stream_tokenizer.data_format_error("Unexpected '(' after the tree description.  Expecting a label for the root or a ;")
-            tmp_node = dataobject.Node()
+            tmp_node = tree.node_factory()
             if encode_splits:
                 tmp_node.edge.split_bitmask = 0L
-            curr_node.add_child(tmp_node)
+            _attach_child_node(curr_node, tmp_node)
             curr_node = tmp_node
             token = stream_tokenizer.read_next_token()
             store_node_comments(curr_node)
             store_comment_metadata(curr_node)
         elif token == ',':
-            tmp_node = dataobject.Node()
+            tmp_node = tree.node_factory()
             if curr_node.is_leaf() and not curr_node.taxon:
 #                 curr_node.taxon = taxon_set.Taxon(oid="UNAMED_" + str(id(curr_node)), label='')
 #                 taxon_set.add(curr_node.taxon)
@@ -414,7 +500,7 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
                 p.edge.split_bitmask |= u
             if finish_node_func is not None:
                 finish_node_func(curr_node, tree)
-            p.add_child(tmp_node)
+            _attach_child_node(p, tmp_node)
             curr_node = tmp_node
             token = stream_tokenizer.read_next_token()
             store_node_comments(curr_node)
@@ -431,6 +517,9 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
                     u = e.split_bitmask
                     p.edge.split_bitmask |= u
                     split_map[u] = curr_node.edge
+                    if len(p._child_nodes) == 1 \
+                            and (p is not tree.seed_node or curr_node._child_nodes):
+                        normalized = False
                 if finish_node_func is not None:
                     finish_node_func(curr_node, tree)
                 curr_node = p
@@ -457,7 +546,9 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
                     curr_node.label = token
                 else:
                     curr_node.taxon = t
-                    if encode_splits:
+                    # as with `treesplit.encode_splits()`, taxa of internal
+                    # nodes do not contribute to splits
+                    if encode_splits and is_leaf:
                         try:
                             cm = t.split_bitmask
                         except:
@@ -483,8 +574,341 @@ def tree_from_token_stream(stream_tokenizer, **kwargs):
                 store_node_comments(curr_node)
                 store_comment_metadata(curr_node)
     stream_tokenizer.extract_comment_metadata = stream_tokenizer_extract_comment_metadata_setting
+    if as_split_records:
+        return treesplit.SplitRecord.from_tree(tree, calc_node_ages=calc_node_ages)
+    if as_flat_trees:
+        return dataobject.FlatTree.from_tree(tree)
+    if encode_splits:
+        _finish_split_encoding(tree, normalized, num_taxa, split_encoding)
     return tree
 
+def _attach_child_node(parent_node, child_node):
+    child_node._parent_node = parent_node
+    child_node._edge.tail_node = parent_node
+    parent_node._child_nodes.append(child_node)
+
+def _finish_split_encoding(tree, normalized, num_taxa, split_encoding):
+    """
+    Marks `tree`, whose splits have been encoded as it was built, as not
+    needing `treesplit.encode_splits()` if possible, i.e., if `normalized`
+    is True (no node has out-degree one, other than a seed node with a
+    single leaf child) and no taxa have been added to the taxon set
+    (`num_taxa` being its original size) while building it. Otherwise, if
+    splits were not explicitly requested by `split_encoding`, the
+    `split_edges` dictionary is discarded.
+    """
+    if normalized \
+            and (tree.is_rooted or len(tree.seed_node._child_nodes) != 2) \
+            and len(tree.taxon_set) == num_taxa:
+        treesplit.mark_splits_encoded(tree)
+    elif not split_encoding.is_required:
+        del tree.split_edges
+
+_NEWICK_COMMENT_PATTERN = re.compile(r"\[[^\[\]]*\]")
+_SIMPLE_NEWICK_TOKEN_PATTERNS = {}
+
+def _get_simple_newick_token_pattern(global_ignore_punctuation):
+    """
+    Returns (and caches) a compiled regular expression that splits a tree
+    statement into (punctuation, edge length, label, invalid character)
+    tuples via `findall()`. Anything that is not a parenthesis, comma, edge
+    length or unquoted label (e.g., comments or quotes) ends up in the last
+    group.
+    """
+    key = frozenset(global_ignore_punctuation)
+    try:
+        return _SIMPLE_NEWICK_TOKEN_PATTERNS[key]
+    except KeyError:
+        ws = NexusTokenizer.whitespace
+        delimiters = set(ws) | set(NexusTokenizer.punctuation) | set('[')
+        label_delimiters = delimiters - key
+        edge_len_delimiters = label_delimiters - set('-+.')
+        esc = lambda chars: "".join([re.escape(c) for c in sorted(chars)])
+        pattern = re.compile("[%s]*(?:([(),])|:[%s]*([^%s]+)|([^%s]+)|([^%s]))" \
+                % (esc(ws), esc(ws), esc(edge_len_delimiters), esc(label_delimiters), esc(ws)))
+        _SIMPLE_NEWICK_TOKEN_PATTERNS[key] = pattern
+        return pattern
+
+def _build_tree_from_simple_newick(tree,
+        statement,
+        stream_tokenizer,
+        str_to_taxon,
+        split_map,
+        finish_node_func,
+        edge_len_type,
+        suppress_internal_node_taxa,
+        extract_comment_metadata):
+    """
+    Fast-path alternative to the main loop of `tree_from_token_stream()`
+    for tree statements consisting of nothing but parentheses, commas,
+    unquoted labels and edge lengths (i.e., no comments or quoted labels),
+    which is by far the most common case for (large) tree files. `statement`
+    is the text of the tree statement following the opening parenthesis (as
+    returned by `peek_statement()`), and is scanned in a single pass, with
+    nodes being linked to each other directly rather than through the
+    `Node` API.
+
+    If the tree was successfully built on `tree.seed_node`, returns False if
+    any node (other than the seed node with a single leaf child) has
+    out-degree one, or True otherwise. If a construct that cannot be handled
+    (or is erroneous) is found, None is returned, and the caller should
+    discard the (partially-constructed) tree and parse the statement using
+    the general algorithm, which also takes care of reporting errors.
+    """
+    tokens = _get_simple_newick_token_pattern(stream_tokenizer.global_ignore_punctuation).findall(statement)
+    preserve_underscores = stream_tokenizer.preserve_underscores
+    Node = tree.node_factory
+    encode_splits = split_map is not None
+    seed_node = tree.seed_node
+    if finish_node_func is not None:
+        finished_nodes = []
+    if extract_comment_metadata:
+        seed_node.comment_metadata = {}
+    curr_node = Node()
+    curr_node._parent_node = seed_node
+    curr_node._edge.tail_node = seed_node
+    seed_node._child_nodes.append(curr_node)
+    if encode_splits:
+        curr_node._edge.split_bitmask = 0L
+    if extract_comment_metadata:
+        curr_node.comment_metadata = {}
+    prev_token = '('
+    normalized = True
+    try:
+        for punctuation, edge_len_str, label, invalid in tokens:
+            if punctuation:
+                if punctuation == '(':
+                    if curr_node._parent_node is None and curr_node._child_nodes:
+                        return None
+                    parent_node = curr_node
+                else:
+                    if not curr_node._child_nodes and curr_node.taxon is None:
+                        return None
+                    parent_node = curr_node._parent_node
+                    if parent_node is None:
+                        return None
+                    if encode_splits:
+                        e = curr_node._edge
+                        u = e.split_bitmask
+                        split_map[u] = e
+                        parent_node._edge.split_bitmask |= u
+                    if finish_node_func is not None:
+                        finished_nodes.append(curr_node)
+                if punctuation == ')':
+                    if len(parent_node._child_nodes) == 1 \
+                            and (parent_node is not seed_node or curr_node._child_nodes):
+                        normalized = False
+                    curr_node = parent_node
+                else:
+                    curr_node = Node()
+                    curr_node._parent_node = parent_node
+                    curr_node._edge.tail_node = parent_node
+                    parent_node._child_nodes.append(curr_node)
+                    if encode_splits:
+                        curr_node._edge.split_bitmask = 0L
+                    if extract_comment_metadata:
+                        curr_node.comment_metadata = {}
+                prev_token = punctuation
+            elif edge_len_str:
+                if prev_token != ')' and prev_token != 'label':
+                    return None
+                try:
+                    curr_node._edge.length = edge_len_type(edge_len_str)
+                except:
+                    curr_node._edge.length = edge_len_str
+                prev_token = ':'
+            elif label:
+                if not preserve_underscores:
+                    label = label.replace('_', ' ')
+                if not curr_node._child_nodes:
+                    if curr_node.taxon is not None:
+                        return None
+                    t = str_to_taxon.require_taxon(label=label)
+                else:
+                    if curr_node.label:
+                        return None
+                    if suppress_internal_node_taxa:
+                        t = None
+                    else:
+                        t = str_to_taxon.get_taxon(label=label)
+                if t is None:
+                    curr_node.label = label
+                else:
+                    curr_node.taxon = t
+                    if encode_splits and not curr_node._child_nodes:
+                        try:
+                            cm = t.split_bitmask
+                        except AttributeError:
+                            cm = 1 << (str_to_taxon.index(t))
+                        e = curr_node._edge
+                        e.split_bitmask = cm
+                        split_map[cm] = e
+                prev_token = 'label'
+            else:
+                return None
+    except StrToTaxon.MultipleTaxonUseError:
+        return None
+    if curr_node is not seed_node:
+        return None
+    if encode_splits:
+        split_map[seed_node._edge.split_bitmask] = seed_node._edge
+    if finish_node_func is not None:
+        for nd in finished_nodes:
+            finish_node_func(nd, tree)
+    return normalized
+
+def _split_record_from_simple_newick(statement,
+        stream_tokenizer,
+        str_to_taxon,
+        is_rooted,
+        edge_len_type,
+        suppress_internal_node_taxa,
+        calc_node_ages):
+    """
+    Split-only counterpart of `_build_tree_from_simple_newick()`: scans
+    `statement` (the text of a simple tree statement following the opening
+    parenthesis) and returns a `treesplit.SplitRecord` with the splits,
+    edge lengths and (if `calc_node_ages` is True) node ages that
+    `treesplit.encode_splits()` followed by `Tree.calc_node_ages()` would
+    give on the corresponding tree, without instantiating any `Node` or
+    `Edge` objects. Each node is represented by a list, [split bitmask, edge
+    length, age, number of children, has label], for as long as it is open.
+
+    Returns None if the statement cannot be handled (or is erroneous, or
+    describes a tree with nodes of out-degree one, or, if `calc_node_ages`
+    is True, is not ultrametric), in which case the caller should parse
+    the statement using the general algorithm.
+    """
+    tokens = _get_simple_newick_token_pattern(stream_tokenizer.global_ignore_punctuation).findall(statement)
+    preserve_underscores = stream_tokenizer.preserve_underscores
+    taxon_set = str_to_taxon.taxon_set
+    check_prec = 0.0000001
+    split_bitmasks = []
+    edge_lengths = []
+    node_ages = []
+    root_children = []
+    seed_node = [0L, None, None, 0, False]
+    stack = [seed_node]
+    curr_node = [0L, None, 0.0, 0, False]
+    prev_token = '('
+    try:
+        for punctuation, edge_len_str, label, invalid in tokens:
+            if punctuation:
+                if punctuation == '(':
+                    if curr_node[3] or curr_node[4] or not stack:
+                        return None
+                    stack.append(curr_node)
+                else:
+                    if not stack or curr_node[3] == 1 or not (curr_node[3] or curr_node[4]):
+                        return None
+                    parent_node = stack[-1]
+                    if parent_node is seed_node:
+                        root_children.append((len(split_bitmasks), curr_node[3]))
+                    split_bitmasks.append(curr_node[0])
+                    edge_lengths.append(curr_node[1])
+                    node_ages.append(curr_node[2])
+                    parent_node[0] |= curr_node[0]
+                    parent_node[3] += 1
+                    if calc_node_ages:
+                        age = curr_node[2] + curr_node[1]
+                        if parent_node[3] == 1:
+                            parent_node[2] = age
+                        elif abs(parent_node[2] - age) > check_prec:
+                            return None
+                    if punctuation == ')':
+                        curr_node = stack.pop()
+                        prev_token = punctuation
+                        continue
+                curr_node = [0L, None, 0.0, 0, False]
+                prev_token = punctuation
+            elif edge_len_str:
+                if prev_token != ')' and prev_token != 'label':
+                    return None
+                try:
+                    curr_node[1] = edge_len_type(edge_len_str)
+                except:
+                    curr_node[1] = edge_len_str
+                prev_token = ':'
+            elif label:
+                if curr_node[4]:
+                    return None
+                if not preserve_underscores:
+                    label = label.replace('_', ' ')
+                if not curr_node[3]:
+                    t = str_to_taxon.require_taxon(label=label)
+                    curr_node[0] = taxon_set.taxon_bitmask(t)
+                elif not suppress_internal_node_taxa:
+                    str_to_taxon.get_taxon(label=label)
+                curr_node[4] = True
+                prev_token = 'label'
+            else:
+                return None
+    except StrToTaxon.MultipleTaxonUseError:
+        return None
+    except TypeError:
+        # edge lengths missing or not numeric when calculating node ages
+        return None
+    if curr_node is not seed_node or seed_node[3] == 1:
+        return None
+    split_bitmasks.append(seed_node[0])
+    edge_lengths.append(seed_node[1])
+    node_ages.append(seed_node[2])
+
+    # mirror `Tree.deroot()` as called by `encode_splits()`
+    to_del = None
+    del_idx = None
+    if not is_rooted and len(root_children) == 2:
+        if root_children[1][1] >= 2:
+            to_keep, to_del = root_children
+        elif root_children[0][1] >= 2:
+            to_del, to_keep = root_children
+    if to_del is not None:
+        keep_idx = to_keep[0]
+        del_idx = to_del[0]
+        try:
+            edge_lengths[keep_idx] += edge_lengths[del_idx]
+        except:
+            pass
+        if calc_node_ages:
+            try:
+                keep_age = node_ages[keep_idx] + edge_lengths[keep_idx]
+            except TypeError:
+                return None
+            if abs(node_ages[del_idx] - keep_age) > check_prec:
+                return None
+            if keep_idx < del_idx:
+                node_ages[-1] = keep_age
+            else:
+                node_ages[-1] = node_ages[del_idx]
+
+    # a dictionary is used to resolve duplicate keys in the same way (and to
+    # iterate over splits in the same order) as `tree.split_edges`
+    split_map = {}
+    if is_rooted:
+        for idx, split in enumerate(split_bitmasks):
+            split_map[split] = idx
+    else:
+        mask = taxon_set.all_taxa_bitmask()
+        for idx, split in enumerate(split_bitmasks):
+            if idx == del_idx:
+                continue
+            if split & 1:
+                split_map[split] = idx
+            else:
+                split_map[(~split) & mask] = idx
+    splits = tuple(split_map.keys())
+    indexes = split_map.values()
+    if calc_node_ages:
+        node_ages = tuple([node_ages[idx] for idx in indexes])
+    else:
+        node_ages = None
+    return treesplit.SplitRecord(taxon_set=taxon_set,
+            splits=splits,
+            split_bitmasks=tuple([split_bitmasks[idx] for idx in indexes]),
+            edge_lengths=tuple([edge_lengths[idx] for idx in indexes]),
+            node_ages=node_ages,
+            is_rooted=is_rooted)
+
 ###############################################################################
 ## NexusTokenizer
 
@@ -685,7 +1109,15 @@ class NexusTokenizer(object):
                 nesting += 1
             cmt_body.write(c)
             c = self.read_next_char()
-        comment = cmt_body.getvalue()
+        self._store_comment(cmt_body.getvalue())
+        self.read_next_char()
+
+    def _store_comment(self, comment):
+        """
+        Classifies a comment body (i.e., the text between the enclosing
+        square brackets), and stores it as rooting, weighting, metadata or
+        general comment as appropriate.
+        """
         self.last_comment_parsed = comment
         normalized_comment = comment.strip().upper()
         if normalized_comment == "&R":
@@ -699,7 +1131,6 @@ class NexusTokenizer(object):
         else:
             # only add comments if none of the above
             self.comments.append(comment)
-        self.read_next_char()
 
     def read_noncomment_character(self):
         """
@@ -1038,3 +1469,358 @@ class NexusTokenizer(object):
                                 max_taxa=max_taxa,
                                 label=label)
 
+
+###############################################################################
+## Tokenizer construction
+
+def get_tokenizer(stream_handle, **kwargs):
+    """
+    Returns a tokenizer for `stream_handle`: a `BufferedNexusTokenizer`
+    unless `buffered_tokenizer` is False, in which case a (character-by-
+    character) `NexusTokenizer` is returned. All other keyword arguments are
+    passed to the tokenizer constructor.
+    """
+    if kwargs.pop("buffered_tokenizer", True):
+        return BufferedNexusTokenizer(stream_handle, **kwargs)
+    else:
+        return NexusTokenizer(stream_handle, **kwargs)
+
+###############################################################################
+## BufferedNexusTokenizer
+
+class BufferedNexusTokenizer(NexusTokenizer):
+    """
+    Drop-in replacement for `NexusTokenizer` that reads the underlying stream
+    in large blocks and scans tokens, comments and quoted labels out of the
+    buffer using compiled regular expressions and `str.find`, instead of
+    calling `read(1)` and doing line/column bookkeeping for every character.
+    Line and column numbers are only calculated when an error is reported.
+
+    Because the stream is read ahead in blocks, the position of the
+    underlying stream handle does not correspond to the position of the
+    tokenizer: use `current_offset()` to get the latter.
+    """
+
+    block_size = 1 << 16
+
+    punctuation_chars = frozenset(NexusTokenizer.punctuation)
+    whitespace_chars = frozenset(NexusTokenizer.whitespace)
+    whitespace_pattern = re.compile('[ \0\t\n\r]*')
+    comment_delimiter_pattern = re.compile(r'[\[\]]')
+    statement_delimiter_pattern = re.compile(r"[;\[']")
+    _word_patterns = {}
+
+    def _get_word_pattern(ignore_punctuation):
+        """
+        Returns (and caches) the match function of a compiled regular
+        expression matching a run of characters that are part of an unquoted
+        token, given the set of punctuation characters to be treated as
+        ordinary characters, together with the set of characters that
+        delimit such a token.
+        """
+        key = frozenset(ignore_punctuation)
+        try:
+            return BufferedNexusTokenizer._word_patterns[key]
+        except KeyError:
+            delimiters = (BufferedNexusTokenizer.whitespace_chars | BufferedNexusTokenizer.punctuation_chars) - key
+            delimiters = frozenset(delimiters | set('['))
+            pattern = re.compile("[^%s]*" % "".join([re.escape(c) for c in sorted(delimiters)]))
+            BufferedNexusTokenizer._word_patterns[key] = (pattern.match, delimiters)
+            return BufferedNexusTokenizer._word_patterns[key]
+
+    _get_word_pattern = staticmethod(_get_word_pattern)
+
+    def __init__(self, stream_handle=None, **kwargs):
+        NexusTokenizer.__init__(self, stream_handle=stream_handle, **kwargs)
+        self.block_size = kwargs.get("block_size", BufferedNexusTokenizer.block_size)
+
+    def _reset(self):
+        NexusTokenizer._reset(self)
+        self._buffer = ""
+        self._buffer_pos = -1
+        self._buffer_offset = 0
+        self._discarded_newlines = 0
+        self._discarded_last_newline = -1
+
+    def _fill_buffer(self):
+        """
+        Discards the consumed portion of the buffer (i.e., everything before
+        the current character) and appends the next block from the stream.
+        Returns False (leaving the buffer untouched) if the stream is
+        exhausted.
+        """
+        block = self.stream_handle.read(self.block_size)
+        if not block:
+            return False
+        keep_from = max(self._buffer_pos, 0)
+        if keep_from:
+            self._discarded_newlines += self._buffer.count('\n', 0, keep_from)
+            idx = self._buffer.rfind('\n', 0, keep_from)
+            if idx >= 0:
+                self._discarded_last_newline = self._buffer_offset + idx
+            self._buffer_offset += keep_from
+            self._buffer_pos -= keep_from
+        self._buffer = self._buffer[keep_from:] + block
+        return True
+
+    def _set_buffer_pos(self, pos):
+        """
+        Makes the character at index `pos` of the buffer the current
+        character, refilling the buffer or flagging EOF as needed.
+        """
+        self._buffer_pos = pos
+        if pos >= len(self._buffer):
+            if not self.stream_handle or not self._fill_buffer():
+                self._buffer_pos = len(self._buffer)
+                self.eof = True
+                self._current_file_char = ''
+                if not self.allow_eof:
+                    raise self.data_format_error("Unexpected end of file")
+                return ''
+        self._current_file_char = self._buffer[self._buffer_pos]
+        return self._current_file_char
+
+    def current_offset(self):
+        """
+        Returns the offset (in characters from the beginning of the stream)
+        of the current character.
+        """
+        return self._buffer_offset + max(self._buffer_pos, 0)
+
+    def peek_statement(self):
+        """
+        Returns the text from the current character up to (but not
+        including) the next ';', without advancing the cursor, or None if
+        there is no ';' before the end of the stream. Note that no account
+        is taken of comments or quotes: the ';' found may be inside either.
+        """
+        if self._buffer_pos < 0:
+            self.read_next_char()
+        pos = self._buffer_pos
+        while True:
+            idx = self._buffer.find(';', pos)
+            if idx >= 0:
+                return self._buffer[self._buffer_pos:idx]
+            pos = len(self._buffer)
+            start_offset = self._buffer_offset
+            if not self._fill_buffer():
+                return None
+            pos -= self._buffer_offset - start_offset
+
+    def consume_statement(self, statement):
+        """
+        Advances the cursor past `statement` (as returned by
+        `peek_statement()`) and the terminating ';', as if ';' had just been
+        read as a token.
+        """
+        self.comments = []
+        self.current_token = ';'
+        self._set_buffer_pos(self._buffer_pos + len(statement) + 1)
+
+    def _update_position(self):
+        """
+        Calculates the line and column number of the current character.
+        """
+        pos = min(max(self._buffer_pos, 0), len(self._buffer))
+        self.current_line_number = 1 + self._discarded_newlines + self._buffer.count('\n', 0, pos)
+        idx = self._buffer.rfind('\n', 0, pos)
+        if idx >= 0:
+            last_newline = self._buffer_offset + idx
+        else:
+            last_newline = self._discarded_last_newline
+        self.current_col_number = self._buffer_offset + pos - last_newline
+
+    def read_next_char(self):
+        """
+        Advances the cursor to the next character and returns it.
+        """
+        if self.stream_handle:
+            return self._set_buffer_pos(self._buffer_pos + 1)
+        return None
+
+    def _raw_read_next_char(self):
+        pos = self._buffer_pos + 1
+        if pos >= len(self._buffer):
+            self._buffer_pos = pos
+            if not self._fill_buffer():
+                self._buffer_pos = len(self._buffer)
+                raise StopIteration()
+            pos = self._buffer_pos
+        self._buffer_pos = pos
+        self._current_file_char = self._buffer[pos]
+        return self._current_file_char
+
+    def skip_comment(self):
+        """
+        Reads characters until the current comment block (and any nested
+        comment block) terminates. Assumes current cursor position is on the
+        opening '[' of the comment block.
+        """
+        if self._buffer_pos < 0:
+            self.read_next_char()
+        find_delimiter = BufferedNexusTokenizer.comment_delimiter_pattern.search
+        body = []
+        nesting = 1
+        start = self._buffer_pos + 1
+        pos = start
+        while True:
+            m = find_delimiter(self._buffer, pos)
+            if m is None:
+                body.append(self._buffer[start:])
+                self._buffer_pos = len(self._buffer)
+                if not self._fill_buffer():
+                    self._store_comment("".join(body))
+                    self._set_buffer_pos(len(self._buffer))
+                    return
+                start = pos = self._buffer_pos
+                continue
+            pos = m.start()
+            if self._buffer[pos] == ']':
+                nesting -= 1
+                if nesting == 0:
+                    break
+            else:
+                nesting += 1
+            pos += 1
+        body.append(self._buffer[start:pos])
+        self._store_comment("".join(body))
+        self._set_buffer_pos(pos + 1)
+
+    def skip_to_significant_character(self):
+        "Advances to the first non-whitespace character outside a comment block."
+        if self._buffer_pos < 0:
+            self.read_next_char()
+        match_whitespace = BufferedNexusTokenizer.whitespace_pattern.match
+        while not self.eof:
+            pos = match_whitespace(self._buffer, self._buffer_pos).end()
+            c = self._set_buffer_pos(pos)
+            if c == '[':
+                self.skip_comment()
+            elif c == '' or c not in BufferedNexusTokenizer.whitespace_chars:
+                break
+        return self._current_file_char
+
+    def _read_quoted_token(self):
+        """
+        Reads a single-quoted token, assuming the current character is the
+        opening quote, leaving the cursor on the character following the
+        closing quote.
+        """
+        parts = []
+        pos = self._buffer_pos + 1
+        while True:
+            idx = self._buffer.find("'", pos)
+            if idx < 0 or idx + 1 >= len(self._buffer):
+                # closing quote not found, or cannot tell whether it is
+                # escaped ('') without reading more
+                self._buffer_pos = pos
+                if self._fill_buffer():
+                    pos = self._buffer_pos
+                    continue
+                if idx < 0:
+                    self._buffer_pos = len(self._buffer)
+                    self._current_file_char = ''
+                    self.eof = True
+                    raise self.data_format_error("Unexpected end of file inside quoted token")
+                parts.append(self._buffer[pos:idx])
+                self._set_buffer_pos(idx + 1)
+                return "".join(parts)
+            if self._buffer[idx + 1] == "'":
+                parts.append(self._buffer[pos:idx + 1])
+                pos = idx + 2
+            else:
+                parts.append(self._buffer[pos:idx])
+                self._set_buffer_pos(idx + 1)
+                return "".join(parts)
+
+    def _read_unquoted_token(self, ignore_punctuation):
+        """
+        Reads an unquoted token starting at the current character, skipping
+        over (and storing) any embedded comments.
+        """
+        match_word, delimiters = BufferedNexusTokenizer._get_word_pattern(ignore_punctuation)
+        parts = []
+        while True:
+            m = match_word(self._buffer, self._buffer_pos)
+            parts.append(m.group())
+            c = self._set_buffer_pos(m.end())
+            if c == '[':
+                self.skip_comment()
+            elif c == '' or c in delimiters:
+                break
+            # otherwise, buffer was refilled in the middle of the token
+        tokenstr = "".join(parts)
+        if not self.preserve_underscores:
+            tokenstr = tokenstr.replace('_', ' ')
+        return tokenstr
+
+    def read_next_token(self, ignore_punctuation=None):
+        """
+        Reads the next token in the file stream. A token in this context
+        is any word or punctuation character outside of a comment block.
+        """
+        self.comments = []
+        ignore_punctuation = self.compose_punctutation_to_be_ignored(ignore_punctuation)
+        self.current_token = None
+        if self.eof:
+            if not self.allow_eof:
+                raise self.data_format_error("Unexpected end of file while trying to read next token")
+            else:
+                return None
+        c = self.skip_to_significant_character()
+        if self.eof:
+            if not self.allow_eof:
+                raise self.data_format_error("Unexpected end of file while trying to read next significant character")
+            else:
+                return None
+        if c == "'":
+            tokenstr = self._read_quoted_token()
+        else:
+            if c in BufferedNexusTokenizer.punctuation_chars and c not in ignore_punctuation:
+                self.current_token = c
+                self.read_next_char()
+                return c
+            tokenstr = self._read_unquoted_token(ignore_punctuation)
+        self.current_token = tokenstr
+        return tokenstr
+
+    def skip_to_semicolon(self):
+        """
+        Advances the file stream cursor to the next semi-colon, skipping over
+        (and storing) comments and quoted tokens.
+        """
+        self.comments = []
+        self.current_token = None
+        if self._buffer_pos < 0:
+            self.read_next_char()
+        find_delimiter = BufferedNexusTokenizer.statement_delimiter_pattern.search
+        while not self.eof:
+            m = find_delimiter(self._buffer, self._buffer_pos)
+            if m is None:
+                self._set_buffer_pos(len(self._buffer))
+                continue
+            c = self._set_buffer_pos(m.start())
+            if c == ';':
+                self.current_token = c
+                self.read_next_char()
+                break
+            elif c == '[':
+                self.skip_comment()
+            else:
+                self._read_quoted_token()
+
+    def data_format_error(self, message):
+        """
+        Returns an exception object parameterized with line and
+        column number values.
+        """
+        self._update_position()
+        return NexusTokenizer.data_format_error(self, message)
+
+    def too_many_taxa_error(self, taxon_set, max_taxa, label):
+        """
+        Returns an exception object parameterized with line and
+        column number values.
+        """
+        self._update_position()
+        return NexusTokenizer.too_many_taxa_error(self, taxon_set, max_taxa, label)
@@ -79,6 +79,6 @@ def generalized_tree_source_iter(stream, **kwargs):
     if schema == "nexus":
         return tree_source_iter(stream, **kwargs)
     elif schema == "newick":
-        return ioclient.tree_source_iter(stream, 'newick', **kwargs)
+        return newick.tree_source_iter(stream, **kwargs)
     else:
         raise TypeError("Cannot diagnose file schema based on first token found: '%s' (looking for '#NEXUS' or '(')")
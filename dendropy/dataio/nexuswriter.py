@@ -355,9 +355,16 @@ class NexusWriter(iosys.DataWriter):
         else:
             for taxon in char_matrix.taxon_set:
                 seq_vec = char_matrix[taxon]
+                if isinstance(seq_vec, dataobject.CompactCharacterDataVector) and seq_vec.is_compact():
+                    # written from the state indices, without creating cells
+                    if None not in [state.symbol for state in seq_vec.state_alphabet]:
+                        nexus.append('%s    %s' % (textutils.escape_nexus_token(taxon.label, preserve_spaces=self.preserve_spaces, quote_underscores=not self.unquoted_underscores).ljust(max_label_len), seq_vec.symbols_as_string()))
+                        continue
+                    states = seq_vec.values()
+                else:
+                    states = [cell.value for cell in seq_vec]
                 seq = StringIO()
-                for cell in seq_vec:
-                    state = cell.value
+                for state in states:
                     assert state is not None, "Undefined state encountered in character sequence."
                     try:
                         seq.write(state_string_map[state])
@@ -0,0 +1,555 @@
+#! /usr/bin/env python
+
+##############################################################################
+##  DendroPy Phylogenetic Computing Library.
+##
+##  Copyright 2010 Jeet Sukumaran and Mark T. Holder.
+##  All rights reserved.
+##
+##  See "LICENSE.txt" for terms and conditions of usage.
+##
+##  If you use this work or any portion thereof in published work,
+##  please cite it as:
+##
+##     Sukumaran, J. and M. T. Holder. 2010. DendroPy: a Python library
+##     for phylogenetic computing. Bioinformatics 26: 1569-1571.
+##
+##############################################################################
+
+"""
+Indexing of the tree statements in NEXUS- and NEWICK-formatted sources, so
+that arbitrary ranges of trees can be read (e.g., by different processes)
+without parsing all the trees that precede them.
+"""
+
+import os
+import json
+
+from dendropy.dataio import nexustokenizer
+from dendropy.dataio import nexusreader_py
+from dendropy.dataio import newick
+from dendropy import dataobject
+
+INDEX_FILE_EXTENSION = ".dpidx"
+INDEX_FORMAT = "dendropy-tree-index"
+INDEX_FORMAT_VERSION = 2
+
+# encoding used to map the (byte) strings of the index to and from JSON: every
+# byte string is valid latin-1, and decodes back to the same bytes
+_INDEX_STRING_ENCODING = "latin-1"
+
+def _index_string(value):
+    "Returns the (byte) string `value` read from an index, or raises ValueError."
+    if not isinstance(value, basestring):
+        raise ValueError("Expecting string, but found %r" % (value,))
+    if isinstance(value, unicode):
+        return value.encode(_INDEX_STRING_ENCODING)
+    return value
+
+def _index_int(value):
+    "Returns the integer `value` read from an index, or raises ValueError."
+    if not isinstance(value, (int, long)) or isinstance(value, bool):
+        raise ValueError("Expecting integer, but found %r" % (value,))
+    return value
+
+def _index_list(value, item_func):
+    """
+    Returns list of `item_func` applied to each item of the list `value`
+    read from an index, or raises ValueError.
+    """
+    if not isinstance(value, list):
+        raise ValueError("Expecting list, but found %r" % (value,))
+    return [item_func(item) for item in value]
+
+def _index_optional(item_func):
+    def _f(value):
+        if value is None:
+            return None
+        return item_func(value)
+    return _f
+
+def _index_translation(value):
+    value = _index_list(value, _index_string)
+    if len(value) != 2:
+        raise ValueError("Expecting translation token and label, but found %r" % (value,))
+    return tuple(value)
+
+def _index_signature(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or len(value) != 3 \
+            or not isinstance(value[2], (int, long, float)):
+        raise ValueError("Invalid source signature: %r" % (value,))
+    return (_index_string(value[0]), _index_int(value[1]), value[2])
+
+###############################################################################
+## TreeIndex
+
+class TreeIndex(object):
+    """
+    Records the position of each tree statement in a NEXUS- or
+    NEWICK-formatted source, together with the TRANSLATE statement (if
+    any) in effect for it:
+
+        - `tree_offsets` : offset of each tree statement from the beginning
+          of the source (for NEXUS sources, this is the position immediately
+          following the `TREE` keyword)
+        - `tree_labels` : name of each tree (None for NEWICK sources)
+        - `tree_blocks` : index of the entry in `translate_tables` in effect
+          for each tree (None for NEWICK sources)
+        - `translate_tables` : list of (token, taxon label) tuples given by
+          the TRANSLATE statement of each TREES block
+        - `taxon_labels` : labels given by the TAXLABELS statements of all
+          TAXA blocks
+
+    If the source is a file opened in binary mode, then the offsets are byte
+    offsets that can be passed to `seek()`.
+
+    An index can be saved to and loaded from a (sidecar) file: see
+    `get_tree_index()`.
+    """
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self.tree_offsets = []
+        self.tree_labels = []
+        self.tree_blocks = []
+        self.translate_tables = []
+        self.taxon_labels = []
+        self.preserve_underscores = False
+        self.source_signature = None
+
+    def __len__(self):
+        return len(self.tree_offsets)
+
+    def scan(self, stream, **kwargs):
+        """
+        Populates the index with the tree statements found in `stream`, from
+        its current position onwards. If `schema` was not specified when this
+        index was created (or is 'nexus/newick'), it is diagnosed from the
+        first token of the source. Keyword arguments are passed to the
+        tokenizer (e.g., `preserve_underscores`, which affects the tree labels).
+        """
+        try:
+            base_offset = stream.tell()
+        except (AttributeError, IOError):
+            base_offset = 0
+        num_indexed = len(self.tree_offsets)
+        self.preserve_underscores = kwargs.get('preserve_underscores', False)
+        stream_tokenizer = nexustokenizer.get_tokenizer(stream,
+                preserve_underscores=kwargs.get('preserve_underscores', False),
+                hyphens_as_tokens=kwargs.get('hyphens_as_tokens', nexustokenizer.DEFAULT_HYPHENS_AS_TOKENS),
+                buffered_tokenizer=kwargs.get('buffered_tokenizer', True))
+        schema = self.schema
+        if schema is None or schema == "nexus/newick":
+            stream_tokenizer.skip_to_significant_character()
+            if stream_tokenizer.current_file_char == '#':
+                schema = "nexus"
+            elif stream_tokenizer.current_file_char == '(':
+                schema = "newick"
+            else:
+                raise stream_tokenizer.data_format_error("Cannot diagnose file schema based on first token found: '%s' (looking for '#NEXUS' or '(')" \
+                        % stream_tokenizer.read_next_token())
+            self.schema = schema
+        if schema == "nexus":
+            self._scan_nexus(stream_tokenizer)
+        elif schema == "newick":
+            self._scan_newick(stream_tokenizer)
+        else:
+            raise ValueError("Indexing of '%s' sources not supported" % schema)
+        if base_offset:
+            for idx in xrange(num_indexed, len(self.tree_offsets)):
+                self.tree_offsets[idx] += base_offset
+        return self
+
+    def _scan_newick(self, stream_tokenizer):
+        while True:
+            stream_tokenizer.skip_to_significant_character()
+            if stream_tokenizer.eof:
+                break
+            self.tree_offsets.append(stream_tokenizer.current_offset())
+            self.tree_labels.append(None)
+            self.tree_blocks.append(None)
+            stream_tokenizer.skip_to_semicolon()
+
+    def _scan_nexus(self, stream_tokenizer):
+        token = stream_tokenizer.read_next_token_ucase()
+        if token.upper() != "#NEXUS":
+            raise stream_tokenizer.data_format_error("Expecting '#NEXUS', but found '%s'" % token)
+        while not stream_tokenizer.eof:
+            token = stream_tokenizer.read_next_token_ucase()
+            while token != None and token != 'BEGIN' and not stream_tokenizer.eof:
+                if token != ';':
+                    stream_tokenizer.skip_to_semicolon()
+                token = stream_tokenizer.read_next_token_ucase()
+            token = stream_tokenizer.read_next_token_ucase()
+            if token == 'TREES':
+                stream_tokenizer.skip_to_semicolon() # move past BEGIN command
+                translate_table = []
+                block_idx = len(self.translate_tables)
+                self.translate_tables.append(translate_table)
+                token = stream_tokenizer.read_next_token_ucase()
+                while not (token == 'END' or token == 'ENDBLOCK') \
+                        and not stream_tokenizer.eof \
+                        and not token==None:
+                    if token == 'TRANSLATE':
+                        self._scan_translate_statement(stream_tokenizer, translate_table)
+                    elif token == 'TREE':
+                        self.tree_offsets.append(stream_tokenizer.current_offset())
+                        token = stream_tokenizer.read_next_token()
+                        if token == '*':
+                            token = stream_tokenizer.read_next_token()
+                        self.tree_labels.append(token)
+                        self.tree_blocks.append(block_idx)
+                        stream_tokenizer.skip_to_semicolon()
+                    elif token != ';':
+                        stream_tokenizer.skip_to_semicolon()
+                    token = stream_tokenizer.read_next_token_ucase()
+                stream_tokenizer.skip_to_semicolon() # move past END command
+            elif token == 'TAXA':
+                stream_tokenizer.skip_to_semicolon() # move past BEGIN command
+                token = stream_tokenizer.read_next_token_ucase()
+                while not (token == 'END' or token == 'ENDBLOCK') \
+                        and not stream_tokenizer.eof \
+                        and not token==None:
+                    if token == 'TAXLABELS':
+                        token = stream_tokenizer.read_next_token()
+                        while token != ';' and token is not None:
+                            self.taxon_labels.append(token)
+                            token = stream_tokenizer.read_next_token()
+                    elif token != ';':
+                        stream_tokenizer.skip_to_semicolon()
+                    token = stream_tokenizer.read_next_token_ucase()
+                stream_tokenizer.skip_to_semicolon() # move past END command
+            else:
+                # other blocks
+                while not (token == 'END' or token == 'ENDBLOCK') \
+                    and not stream_tokenizer.eof \
+                    and not token==None:
+                    stream_tokenizer.skip_to_semicolon()
+                    token = stream_tokenizer.read_next_token_ucase()
+                stream_tokenizer.skip_to_semicolon() # move past END command
+
+    def _scan_translate_statement(self, stream_tokenizer, translate_table):
+        while True:
+            translation_token = stream_tokenizer.read_next_token()
+            translation_label = stream_tokenizer.read_next_token()
+            translate_table.append((translation_token, translation_label))
+            token = stream_tokenizer.read_next_token() # ","
+            if (not token) or (token == ';'):
+                break
+            if token != ',':
+                raise stream_tokenizer.data_format_error("Expecting ',' in TRANSLATE statement after definition for %s = '%s', but found '%s' instead." % (translation_token, translation_label, token))
+
+    def save(self, dest):
+        """
+        Writes the index, as JSON, to the file-like object `dest`.
+        """
+        state = {
+            "format": INDEX_FORMAT,
+            "version": INDEX_FORMAT_VERSION,
+            "schema": self.schema,
+            "tree_offsets": self.tree_offsets,
+            "tree_labels": self.tree_labels,
+            "tree_blocks": self.tree_blocks,
+            "translate_tables": self.translate_tables,
+            "taxon_labels": self.taxon_labels,
+            "preserve_underscores": self.preserve_underscores,
+            "source_signature": self.source_signature,
+        }
+        json.dump(state, dest, encoding=_INDEX_STRING_ENCODING)
+
+    def load(cls, src):
+        """
+        Returns a `TreeIndex` read from the file-like object `src`, as
+        written by `save()`. Raises ValueError if `src` does not contain a
+        (well-formed) tree index of the current format. Only plain values
+        are read, so an index from an untrusted source can be loaded safely
+        (though it should only be used if it is valid for the data source:
+        see `get_tree_index()`).
+        """
+        try:
+            state = json.load(src)
+        except ValueError, e:
+            raise ValueError("Invalid tree index: %s" % e)
+        if not isinstance(state, dict) or state.get("format") != INDEX_FORMAT:
+            raise ValueError("Invalid tree index")
+        if state.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError("Unsupported tree index format version: %s" % state.get("version"))
+        try:
+            index = cls(schema=_index_optional(_index_string)(state["schema"]))
+            index.tree_offsets = _index_list(state["tree_offsets"], _index_int)
+            index.tree_labels = _index_list(state["tree_labels"], _index_optional(_index_string))
+            index.tree_blocks = _index_list(state["tree_blocks"], _index_optional(_index_int))
+            index.translate_tables = _index_list(state["translate_tables"],
+                    lambda table: _index_list(table, _index_translation))
+            index.taxon_labels = _index_list(state["taxon_labels"], _index_string)
+            index.preserve_underscores = bool(state["preserve_underscores"])
+            index.source_signature = _index_signature(state["source_signature"])
+        except KeyError, e:
+            raise ValueError("Invalid tree index: missing %s" % e)
+        num_trees = len(index.tree_offsets)
+        if len(index.tree_labels) != num_trees or len(index.tree_blocks) != num_trees:
+            raise ValueError("Invalid tree index: inconsistent number of trees")
+        for block_idx in index.tree_blocks:
+            if block_idx is not None and not (0 <= block_idx < len(index.translate_tables)):
+                raise ValueError("Invalid tree index: invalid TREES block index %s" % block_idx)
+        return index
+    load = classmethod(load)
+
+    def resolve_indices(self, tree_slice, collection_offset=-1):
+        """
+        Returns the list of 0-based tree indices selected by `tree_slice`,
+        which may be a `slice` object or an integer (negative values count
+        back from the last tree). If `collection_offset` is not negative,
+        then `tree_slice` is applied to the trees of the TREES block with
+        that 0-based index only. Raises IndexError if an integer index or
+        `collection_offset` is out of range.
+        """
+        if collection_offset is not None and collection_offset >= 0:
+            if collection_offset >= len(self.translate_tables):
+                raise IndexError("Tree collection offset %d specified, but data source only has %d tree collections defined" \
+                    % (collection_offset, len(self.translate_tables)))
+            candidates = [idx for idx, block_idx in enumerate(self.tree_blocks) if block_idx == collection_offset]
+        else:
+            candidates = range(len(self.tree_offsets))
+        if isinstance(tree_slice, slice):
+            return candidates[tree_slice]
+        try:
+            return [candidates[int(tree_slice)]]
+        except IndexError:
+            raise IndexError("Tree index %s specified, but data source only has %d trees defined" \
+                    % (tree_slice, len(candidates)))
+
+    def sub_index(self, start=0, stop=None):
+        """
+        Returns a new TreeIndex consisting of the trees from index `start`
+        up to (but not including) index `stop`.
+        """
+        index = TreeIndex(schema=self.schema)
+        index.tree_offsets = self.tree_offsets[start:stop]
+        index.tree_labels = self.tree_labels[start:stop]
+        index.tree_blocks = self.tree_blocks[start:stop]
+        index.translate_tables = self.translate_tables
+        index.taxon_labels = self.taxon_labels
+        return index
+
+    def shards(self, num_shards, start=0, stop=None):
+        """
+        Returns a list of up to `num_shards` (start, stop) index ranges of
+        (approximately) equal size that, together, span the trees from index
+        `start` up to (but not including) index `stop`. Ranges do not span
+        across TREES blocks.
+        """
+        if stop is None or stop > len(self.tree_offsets):
+            stop = len(self.tree_offsets)
+        if start >= stop:
+            return []
+        num_shards = max(1, min(num_shards, stop - start))
+        shard_size, remainder = divmod(stop - start, num_shards)
+        ranges = []
+        shard_start = start
+        for idx in range(num_shards):
+            shard_stop = shard_start + shard_size
+            if idx < remainder:
+                shard_stop += 1
+            block_start = shard_start
+            for tree_idx in xrange(shard_start+1, shard_stop):
+                if self.tree_blocks[tree_idx] != self.tree_blocks[tree_idx-1]:
+                    ranges.append((block_start, tree_idx))
+                    block_start = tree_idx
+            ranges.append((block_start, shard_stop))
+            shard_start = shard_stop
+        return ranges
+
+    def tree_source_iter(self, stream, start=0, stop=None, **kwargs):
+        """
+        Iterates over the trees from index `start` up to (but not including)
+        index `stop` in `stream`, which must be the (random access) source that
+        was scanned to build this index. Keyword arguments are as for
+        `dendropy.dataio.tree_source_iter()` (but `tree_offset` is not
+        supported). If `taxon_set` is not given, a new `TaxonSet` will be
+        created and used for all the trees (for NEXUS sources, taxa defined
+        in TAXA blocks will be added to it before any trees are read).
+        """
+        if stop is None or stop > len(self.tree_offsets):
+            stop = len(self.tree_offsets)
+        return self.indexed_tree_iter(stream, xrange(start, stop), **kwargs)
+
+    def indexed_tree_iter(self, stream, tree_indices, **kwargs):
+        """
+        Iterates over the trees at each of the 0-based indices given by
+        `tree_indices` (in the order given) in `stream`, which must be the
+        (random access) source that was scanned to build this index. Runs of
+        consecutive indices are read without seeking; otherwise each tree is
+        read by seeking directly to it, so the cost is proportional to the
+        number of trees selected rather than to the size of the source.
+        Keyword arguments are as for `tree_source_iter()`.
+        """
+        if "taxon_set" not in kwargs or kwargs["taxon_set"] is None:
+            kwargs["taxon_set"] = dataobject.TaxonSet()
+        if self.schema == "nexus":
+            reader = nexusreader_py.NexusReader(**kwargs)
+            taxon_set = reader.attached_taxon_set
+            for label in self.taxon_labels:
+                if not taxon_set.has_taxon(label=label):
+                    taxon_set.require_taxon(label=label)
+        else:
+            newick_tree_iter = None
+        current_block = None
+        next_idx = None
+        for tree_idx in tree_indices:
+            block_idx = self.tree_blocks[tree_idx]
+            if self.schema == "nexus":
+                if tree_idx == next_idx and block_idx == current_block:
+                    token = reader.stream_tokenizer.read_next_token_ucase()
+                    while token != 'TREE':
+                        if token is None or reader.stream_tokenizer.eof:
+                            raise reader.data_format_error("Expecting 'TREE' statement")
+                        reader.stream_tokenizer.skip_to_semicolon()
+                        token = reader.stream_tokenizer.read_next_token_ucase()
+                else:
+                    stream.seek(self.tree_offsets[tree_idx])
+                    reader.stream_tokenizer = nexustokenizer.get_tokenizer(stream,
+                            preserve_underscores=reader.preserve_underscores,
+                            hyphens_as_tokens=reader.hyphens_as_tokens,
+                            extract_comment_metadata=reader.extract_comment_metadata,
+                            buffered_tokenizer=reader.buffered_tokenizer)
+                    if block_idx != current_block:
+                        reader.tree_translate_dict = {}
+                        for translation_token, translation_label in self.translate_tables[block_idx]:
+                            reader.tree_translate_dict[translation_token] = taxon_set.require_taxon(label=translation_label)
+                        current_block = block_idx
+                yield reader._parse_tree_statement(taxon_set,
+                        as_split_records=reader.as_split_records,
+                        as_flat_trees=reader.as_flat_trees)
+            else:
+                if tree_idx != next_idx:
+                    stream.seek(self.tree_offsets[tree_idx])
+                    newick_tree_iter = newick.tree_source_iter(stream, **kwargs)
+                yield newick_tree_iter.next()
+            next_idx = tree_idx + 1
+
+###############################################################################
+## Convenience functions
+
+def build_tree_index(stream, schema=None, **kwargs):
+    """
+    Returns a `TreeIndex` of the trees in `stream`, which should be opened
+    in binary mode for the offsets to be usable with `seek()`.
+    """
+    return TreeIndex(schema=schema).scan(stream, **kwargs)
+
+def index_filepath(filepath):
+    """
+    Returns the path of the sidecar index file for the tree file `filepath`.
+    """
+    return filepath + INDEX_FILE_EXTENSION
+
+def source_signature(filepath):
+    """
+    Returns a tuple (absolute path, size, modification time) that identifies
+    the current state of the file `filepath`.
+    """
+    st = os.stat(filepath)
+    return (os.path.abspath(filepath), st.st_size, st.st_mtime)
+
+def _load_valid_index(filepath, schema, preserve_underscores, signature):
+    """
+    Returns the index saved in the sidecar index file of `filepath`, or None
+    if there is none, or if it cannot be read or is not valid for the
+    current state of the file (in which case it should be rebuilt).
+    """
+    idx_path = index_filepath(filepath)
+    if not os.path.exists(idx_path):
+        return None
+    try:
+        src = open(idx_path, "rb")
+        try:
+            index = TreeIndex.load(src)
+        finally:
+            src.close()
+    except (IOError, ValueError):
+        return None
+    if index.source_signature == signature \
+            and index.preserve_underscores == preserve_underscores \
+            and (schema is None or schema == "nexus/newick" or schema == index.schema) \
+            and not [offset for offset in index.tree_offsets if not (0 <= offset < signature[1])]:
+        return index
+    return None
+
+def find_tree_index(stream, schema=None, preserve_underscores=False):
+    """
+    Returns the `TreeIndex` saved in the sidecar index file of `stream`, if
+    `stream` is a file on disk (and positioned at its beginning) with a
+    sidecar index file that is valid for its current state, or None
+    otherwise. No index is built.
+    """
+    filepath = getattr(stream, "name", None)
+    if not isinstance(filepath, basestring) or not os.path.isfile(filepath):
+        return None
+    try:
+        if stream.tell() != 0:
+            return None
+    except (AttributeError, IOError):
+        return None
+    return _load_valid_index(filepath, schema, preserve_underscores, source_signature(filepath))
+
+def get_tree_index(filepath, schema=None, **kwargs):
+    """
+    Returns a `TreeIndex` of the trees in the file `filepath`. If a sidecar
+    index file (see `index_filepath()`) exists for the file, and was built
+    for the same path, size, modification time, schema and treatment of
+    underscores, then the index is loaded from it. Otherwise, the file is
+    scanned and (unless `use_index_file` is False) the index is saved to the
+    sidecar file for re-use; failure to write the sidecar file is silently
+    ignored. Other keyword arguments are passed to `TreeIndex.scan()`.
+    """
+    filepath = os.path.expandvars(os.path.expanduser(filepath))
+    use_index_file = kwargs.pop("use_index_file", True)
+    signature = source_signature(filepath)
+    preserve_underscores = kwargs.get('preserve_underscores', False)
+    if use_index_file:
+        index = _load_valid_index(filepath, schema, preserve_underscores, signature)
+        if index is not None:
+            return index
+    src = open(filepath, "rb")
+    try:
+        index = build_tree_index(src, schema=schema, **kwargs)
+    finally:
+        src.close()
+    index.source_signature = signature
+    if use_index_file:
+        try:
+            dest = open(index_filepath(filepath), "wb")
+            try:
+                index.save(dest)
+            finally:
+                dest.close()
+        except (IOError, OSError):
+            pass
+    return index
+
+def indexed_source(stream, schema=None, **kwargs):
+    """
+    Returns a tuple (`TreeIndex`, random access stream) for `stream`. If
+    `stream` is a file on disk, the index is obtained using
+    `get_tree_index()`, and the stream returned is the file re-opened in
+    binary mode (which should be closed by the caller when done: see
+    `close_indexed_source()`). Otherwise, `stream` itself must support
+    `seek()`, and is scanned from its current position.
+    """
+    filepath = getattr(stream, "name", None)
+    if isinstance(filepath, basestring) and os.path.isfile(filepath):
+        index = get_tree_index(filepath, schema=schema, **kwargs)
+        return index, open(filepath, "rb")
+    kwargs.pop("use_index_file", None)
+    return build_tree_index(stream, schema=schema, **kwargs), stream
+
+def close_indexed_source(src, stream):
+    """
+    Closes `src`, the random access stream returned by `indexed_source()`
+    (or opened by the caller) for `stream`, unless it is `stream` itself.
+    """
+    if src is not stream:
+        src.close()
@@ -25,5 +25,6 @@ classes and methods for instantiating objects in the
 from dendropy.dataobject.base import *
 from dendropy.dataobject.taxon import *
 from dendropy.dataobject.tree import *
+from dendropy.dataobject.flattree import *
 from dendropy.dataobject.char import *
 from dendropy.dataobject.dataset import *
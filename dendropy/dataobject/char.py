@@ -21,6 +21,9 @@ This module handles the core definition of phylogenetic character data.
 """
 
 import copy
+from array import array
+from itertools import izip
+from operator import itemgetter
 from cStringIO import StringIO
 from dendropy.utility import error
 from dendropy.utility import iosys
@@ -163,6 +166,34 @@ class StateAlphabet(IdTagged, list):
                     map[symbol.lower()] = state
         return map
 
+    def state_index_map(self):
+        "Returns dictionary with states as keys and their indices in self as values."
+        return dict([(state, idx) for idx, state in enumerate(self)])
+
+    def symbol_index_translation_table(self):
+        """
+        Returns a tuple, (`table`, `legal_symbols`), for translating strings
+        of (single-character) symbols into strings of the indices of the
+        corresponding states in self, using `str.translate()`: `table` is a
+        256-character translation table, with the character of each legal
+        symbol mapped to the (byte) character of the state index, while
+        `legal_symbols` is a string of all the legal symbols, which can be
+        passed as the `deletechars` argument of `str.translate()` to find
+        illegal symbols. Raises ValueError if not all symbols are single
+        characters or if there are more than 256 states.
+        """
+        if len(self) > 256:
+            raise ValueError("Symbols can only be translated to state indices for alphabets of at most 256 states")
+        state_indices = self.state_index_map()
+        table = [chr(0)] * 256
+        legal_symbols = []
+        for symbol, state in self.symbol_state_map().items():
+            if len(symbol) != 1:
+                raise ValueError("Symbols can only be translated to state indices for alphabets in which all symbols are single characters")
+            table[ord(symbol)] = chr(state_indices[state])
+            legal_symbols.append(symbol)
+        return "".join(table), "".join(legal_symbols)
+
     def get_legal_symbols_as_str(self):
         m = self.symbol_state_map()
         keys = m.keys()
@@ -494,6 +525,177 @@ class CharacterDataVector(list, TaxonLinked):
     def __str__(self):
         return str(self.symbols_as_string())
 
+class CompactCharacterDataVector(CharacterDataVector):
+    """
+    A memory-efficient `CharacterDataVector` of the states of a single state
+    alphabet, `state_alphabet`, storing each state as its index in the
+    alphabet in an array, `state_indices` (of bytes, or, for alphabets of
+    more than 256 states, of unsigned shorts). The `CharacterDataCell`
+    objects of the vector are only created when the vector is first accessed
+    as a list (e.g., by iterating over it, indexing it or modifying it), at
+    which point the vector is converted into a regular list of cells, and
+    `state_indices` is discarded. Its length, states and symbols, however,
+    can be obtained without creating any cells.
+
+    A vector may also be a view of a subset of the positions of another
+    (see `column_view()`), sharing the array of the other vector until its
+    `state_indices` are first accessed, when they are copied out of it.
+    The array of a vector must therefore not be modified in place while
+    views of it may exist (replacing the array, by assigning to
+    `state_indices`, or modifying the vector as a list, is safe).
+
+    Compact vectors are pickled (and copied using `copy.copy()`) as their
+    state indices, without creating their cells.
+    """
+
+    def state_index_typecode(state_alphabet):
+        "Returns the array typecode of the state indices of `state_alphabet`."
+        if state_alphabet is not None and len(state_alphabet) > 256:
+            return 'H'
+        return 'B'
+    state_index_typecode = staticmethod(state_index_typecode)
+
+    def __init__(self, state_alphabet=None, state_indices=None, **kwargs):
+        """
+        `state_indices` may be an array, which is used directly, or a string
+        or sequence of state indices, which is copied. Other keyword
+        arguments are passed to `CharacterDataVector`.
+        """
+        CharacterDataVector.__init__(self, **kwargs)
+        self.state_alphabet = state_alphabet
+        self._column_indices = None
+        if isinstance(state_indices, array):
+            self._state_indices = state_indices
+        else:
+            self._state_indices = array(self.state_index_typecode(state_alphabet), state_indices or [])
+
+    def _view_state_indices(self):
+        # returns a new array of the state indices of a view
+        source = self._state_indices
+        column_indices = self._column_indices
+        if len(column_indices) < 2:
+            return array(source.typecode, [source[i] for i in column_indices])
+        return array(source.typecode, itemgetter(*column_indices)(source))
+
+    def _get_state_indices(self):
+        if self._column_indices is not None:
+            self._state_indices = self._view_state_indices()
+            self._column_indices = None
+        return self._state_indices
+
+    def _set_state_indices(self, state_indices):
+        self._state_indices = state_indices
+        self._column_indices = None
+
+    state_indices = property(_get_state_indices, _set_state_indices)
+
+    def __deepcopy__(self, memo):
+        o = TaxonLinked.__deepcopy__(self, memo)
+        o.state_alphabet = memo.get(id(self.state_alphabet), self.state_alphabet)
+        if self._column_indices is not None:
+            o._state_indices = self._state_indices
+            o._column_indices = self._column_indices
+        elif self._state_indices is not None:
+            o._state_indices = self._state_indices[:]
+        else:
+            o._state_indices = None
+            list.extend(o, [copy.deepcopy(cell, memo) for cell in list.__iter__(self)])
+        return o
+
+    def __reduce_ex__(self, protocol):
+        state = self.__dict__.copy()
+        if self._state_indices is None:
+            return (self.__class__, (), state, list.__iter__(self))
+        if self._column_indices is not None:
+            state['_state_indices'] = self._view_state_indices()
+            state['_column_indices'] = None
+        return (self.__class__, (), state)
+
+    def _materialize(self):
+        if self._state_indices is not None:
+            states = self.state_alphabet
+            list.extend(self, [CharacterDataCell(value=states[i]) for i in self.state_indices])
+            self.state_indices = None
+
+    def is_compact(self):
+        "Returns True if the cells of the vector have not been created yet."
+        return self._state_indices is not None
+
+    def column_view(self, column_indices):
+        """
+        Returns a new (compact) vector of the states at the given (0-based)
+        positions of this one, `column_indices`, sharing the storage of this
+        one until its states are first accessed, or, if this vector is no
+        longer compact, copying its states. The array of state indices of
+        this vector must not be modified in place while the view shares it.
+        """
+        if self._state_indices is None:
+            state_alphabet = self.state_alphabet
+            state_indices = state_alphabet.state_index_map()
+            return self.__class__(state_alphabet=state_alphabet,
+                    state_indices=[state_indices[list.__getitem__(self, i).value] for i in column_indices],
+                    taxon=self.taxon)
+        o = self.__class__(state_alphabet=self.state_alphabet,
+                state_indices=self._state_indices,
+                taxon=self.taxon)
+        if self._column_indices is not None:
+            o._column_indices = [self._column_indices[i] for i in column_indices]
+        else:
+            o._column_indices = list(column_indices)
+        return o
+
+    def __len__(self):
+        if self._column_indices is not None:
+            return len(self._column_indices)
+        elif self._state_indices is not None:
+            return len(self._state_indices)
+        return list.__len__(self)
+
+    def values(self):
+        if self._state_indices is not None:
+            states = self.state_alphabet
+            return [states[i] for i in self.state_indices]
+        return CharacterDataVector.values(self)
+
+    def symbols_as_list(self):
+        if self._state_indices is not None:
+            symbols = [str(state) for state in self.state_alphabet]
+            return [symbols[i] for i in self.state_indices]
+        return CharacterDataVector.symbols_as_list(self)
+
+    def symbols_as_string(self, sep=""):
+        if self._state_indices is not None and self._state_indices.typecode == 'B' and not sep:
+            table = [chr(0)] * 256
+            for idx, state in enumerate(self.state_alphabet):
+                symbol = str(state)
+                if len(symbol) != 1:
+                    break
+                table[idx] = symbol
+            else:
+                return self.state_indices.tostring().translate("".join(table))
+        return CharacterDataVector.symbols_as_string(self, sep=sep)
+
+def _materializing_list_method(name):
+    list_method = getattr(list, name)
+    def method(self, *args):
+        self._materialize()
+        for arg in args:
+            if isinstance(arg, CompactCharacterDataVector):
+                arg._materialize()
+        return list_method(self, *args)
+    method.__name__ = name
+    method.__doc__ = list_method.__doc__
+    return method
+
+for _name in ["__getitem__", "__setitem__", "__delitem__", "__getslice__",
+        "__setslice__", "__delslice__", "__iter__", "__reversed__",
+        "__contains__", "__iadd__", "__add__", "__mul__", "__imul__",
+        "__rmul__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__",
+        "__repr__", "append", "extend", "insert", "pop", "remove", "index",
+        "count", "reverse", "sort"]:
+    setattr(CompactCharacterDataVector, _name, _materializing_list_method(_name))
+del _name
+
 class CharacterDataMap(dict, Annotated):
     """
     An annotable dictionary with Taxon objects as keys and
@@ -663,22 +865,31 @@ class CharacterMatrix(TaxonSetLinked, iosys.Readable, iosys.Writeable):
         character indices to include.
         """
         taxon_to_state_indices = {}
+        state_sets = {}
         for t in self.taxon_seq_map.keys():
             cdv = self[t]
             if char_indices is None:
                 ci = range(len(cdv))
             else:
                 ci = char_indices
-            v = []
-            for char_index in ci:
-                cell = cdv[char_index]
-                cell_value = cell.value
-                try:
-                    state_alphabet = cell.character_type.state_alphabet
-                except AttributeError:
-                    state_alphabet = self.default_state_alphabet
-                inds = [state_alphabet.index(i) for i in cell_value.fundamental_states]
-                v.append(set(inds))
+            if isinstance(cdv, CompactCharacterDataVector) and cdv.is_compact():
+                state_alphabet = cdv.state_alphabet
+                if id(state_alphabet) not in state_sets:
+                    state_sets[id(state_alphabet)] = [set([state_alphabet.index(i) for i in s.fundamental_states]) for s in state_alphabet]
+                alphabet_state_sets = state_sets[id(state_alphabet)]
+                state_indices = cdv.state_indices
+                v = [set(alphabet_state_sets[state_indices[char_index]]) for char_index in ci]
+            else:
+                v = []
+                for char_index in ci:
+                    cell = cdv[char_index]
+                    cell_value = cell.value
+                    try:
+                        state_alphabet = cell.character_type.state_alphabet
+                    except AttributeError:
+                        state_alphabet = self.default_state_alphabet
+                    inds = [state_alphabet.index(i) for i in cell_value.fundamental_states]
+                    v.append(set(inds))
             taxon_to_state_indices[t] = v
         return taxon_to_state_indices
 
@@ -1045,6 +1256,7 @@ class DiscreteCharacterMatrix(CharacterMatrix):
         self.state_alphabets = []
         self.default_state_alphabet = None
         self._default_symbol_state_map = None
+        self._default_state_index_map = None
         if len(args) > 0:
             self.clone_from(*args)
 
@@ -1055,15 +1267,102 @@ class DiscreteCharacterMatrix(CharacterMatrix):
 
     default_symbol_state_map = property(_get_default_symbol_state_map)
 
+    def _get_default_state_index_map(self):
+        if self._default_state_index_map is None and self.default_state_alphabet is not None:
+            self._default_state_index_map = self.default_state_alphabet.state_index_map()
+        return self._default_state_index_map
+
+    default_state_index_map = property(_get_default_state_index_map)
+
     def append_taxon_sequence(self, taxon, state_symbols):
         if taxon not in self:
             self[taxon] = CharacterDataVector(taxon=taxon)
+        vec = self[taxon]
+        if isinstance(vec, CompactCharacterDataVector) \
+                and vec.is_compact() \
+                and vec.state_alphabet is self.default_state_alphabet:
+            symbol_state_map = self.default_symbol_state_map
+            state_index_map = self.default_state_index_map
+            vec.state_indices.extend([state_index_map[symbol_state_map[str(value)]] for value in state_symbols])
+            return
         for value in state_symbols:
             if isinstance(value, str):
                 symbol = value
             else:
                 symbol = str(value)
-            self[taxon].append(CharacterDataCell(value=self.default_symbol_state_map[symbol]))
+            vec.append(CharacterDataCell(value=self.default_symbol_state_map[symbol]))
+
+    def is_compact(self):
+        """
+        Returns True if all the sequences of the matrix are stored compactly,
+        as `CompactCharacterDataVector` objects the cells of which have not
+        been created.
+        """
+        for vec in self.taxon_seq_map.itervalues():
+            if not isinstance(vec, CompactCharacterDataVector) or not vec.is_compact():
+                return False
+        return True
+
+    def compact_sequences(self):
+        """
+        Converts all the sequences of the matrix, in place, into
+        `CompactCharacterDataVector` objects, storing the indices of their
+        states in the default state alphabet of the matrix as arrays,
+        instead of as lists of `CharacterDataCell` objects. The sequences
+        can still be accessed as lists of cells, but this creates the cells
+        again. Raises ValueError if any cell has a character type or
+        annotations, or a state not in the default state alphabet.
+        """
+        state_alphabet = self.default_state_alphabet
+        if state_alphabet is None:
+            raise ValueError("No default state alphabet defined")
+        state_index_map = self.default_state_index_map
+        for taxon, vec in self.taxon_seq_map.items():
+            if isinstance(vec, CompactCharacterDataVector) \
+                    and vec.is_compact() \
+                    and vec.state_alphabet is state_alphabet:
+                continue
+            state_indices = []
+            for cell in vec:
+                if cell.character_type is not None or cell._annotations:
+                    raise ValueError("Cannot compact sequence of '%s': cells with character types or annotations found" % taxon.label)
+                try:
+                    state_indices.append(state_index_map[cell.value])
+                except KeyError:
+                    raise ValueError("Cannot compact sequence of '%s': state '%s' not in default state alphabet" % (taxon.label, cell.value))
+            self.taxon_seq_map[taxon] = CompactCharacterDataVector(state_alphabet=state_alphabet,
+                    state_indices=state_indices,
+                    oid=vec.oid,
+                    label=vec.label,
+                    taxon=taxon)
+
+    def export_character_indices(self, indices):
+        """
+        Returns a new CharacterMatrix (of the same type) consisting only
+        of columns given by the 0-based indices in `indices`.
+        Note that this new matrix will still reference the same taxon set.
+        If all the sequences of this matrix are compact (see `is_compact()`),
+        the sequences of the new matrix are views of them (see
+        `CompactCharacterDataVector.column_view()`), and no states are
+        copied until they are accessed.
+        """
+        if not self.is_compact():
+            return CharacterMatrix.export_character_indices(self, indices)
+        indices = sorted(set(indices))
+        taxon_seq_map = self.taxon_seq_map
+        self.taxon_seq_map = CharacterDataMap()
+        try:
+            clone = self.__class__()
+            clone.clone_from(self)
+        finally:
+            self.taxon_seq_map = taxon_seq_map
+        column_indices = {}
+        for taxon, vec in taxon_seq_map.items():
+            nchar = len(vec)
+            if nchar not in column_indices:
+                column_indices[nchar] = [idx for idx in indices if 0 <= idx < nchar]
+            clone.taxon_seq_map[taxon] = vec.column_view(column_indices[nchar])
+        return clone
 
 class StandardCharacterMatrix(DiscreteCharacterMatrix):
     "`standard` data."
@@ -1087,13 +1386,17 @@ class StandardCharacterMatrix(DiscreteCharacterMatrix):
 
         for taxon, cdv in self.taxon_seq_map.items():
             otaxon = memo[id(taxon)]
-            ocdv = CharacterDataVector(oid=cdv.oid, label=cdv.label, taxon=otaxon)
-            for cell in cdv:
-                if cell.character_type is not None:
-                    character_type = memo[id(cell.character_type)]
-                else:
-                    character_type = None
-                ocdv.append(CharacterDataCell(value=memo[id(cell.value)], character_type=character_type))
+            if isinstance(cdv, CompactCharacterDataVector) and cdv.is_compact():
+                ocdv = copy.deepcopy(cdv, memo)
+                ocdv.taxon = otaxon
+            else:
+                ocdv = CharacterDataVector(oid=cdv.oid, label=cdv.label, taxon=otaxon)
+                for cell in cdv:
+                    if cell.character_type is not None:
+                        character_type = memo[id(cell.character_type)]
+                    else:
+                        character_type = None
+                    ocdv.append(CharacterDataCell(value=memo[id(cell.value)], character_type=character_type))
             o.taxon_seq_map[otaxon] = ocdv
             memo[id(self.taxon_seq_map[taxon])] = o.taxon_seq_map[otaxon]
 
@@ -1143,16 +1446,22 @@ class FixedAlphabetCharacterMatrix(DiscreteCharacterMatrix):
         memo[id(self.default_state_alphabet)] = o.default_state_alphabet
         o._default_symbol_state_map = self._default_symbol_state_map
         memo[id(self._default_symbol_state_map)] = o._default_symbol_state_map
+        o._default_state_index_map = self._default_state_index_map
+        memo[id(self._default_state_index_map)] = o._default_state_index_map
         o.character_types = copy.deepcopy(self.character_types, memo)
         for taxon, cdv in self.taxon_seq_map.items():
             otaxon = memo[id(taxon)]
-            ocdv = CharacterDataVector(oid=cdv.oid, label=cdv.label, taxon=otaxon)
-            for cell in cdv:
-                if cell.character_type is not None:
-                    character_type = memo[id(cell.character_type)]
-                else:
-                    character_type = None
-                ocdv.append(CharacterDataCell(value=cell.value, character_type=character_type))
+            if isinstance(cdv, CompactCharacterDataVector) and cdv.is_compact():
+                ocdv = copy.deepcopy(cdv, memo)
+                ocdv.taxon = otaxon
+            else:
+                ocdv = CharacterDataVector(oid=cdv.oid, label=cdv.label, taxon=otaxon)
+                for cell in cdv:
+                    if cell.character_type is not None:
+                        character_type = memo[id(cell.character_type)]
+                    else:
+                        character_type = None
+                    ocdv.append(CharacterDataCell(value=cell.value, character_type=character_type))
             o.taxon_seq_map[otaxon] = ocdv
             memo[id(self.taxon_seq_map[taxon])] = o.taxon_seq_map[otaxon]
         for k, v in self.__dict__.iteritems():
@@ -1161,6 +1470,7 @@ class FixedAlphabetCharacterMatrix(DiscreteCharacterMatrix):
                          "state_alphabets",
                          "default_state_alphabet",
                          "_default_symbol_state_map",
+                         "_default_state_index_map",
                          "taxon_seq_map",
                          "character_types"]:
                 o.__dict__[k] = copy.deepcopy(v, memo)
@@ -1280,7 +1590,227 @@ class SitePatterns(object):
     """
     Tracks distinct site patterns in a character matrix.
     Useful for efficient computations.
+
+    Each site (column) of the matrix is reduced to its pattern: the tuple of
+    the indices (in `state_alphabet`) of the states of the taxa, `taxa`, at
+    that site. Distinct patterns are stored once each, in order of first
+    occurrence, in `patterns`, with the number of sites at which each is
+    found in `weights`. `pattern_sites` lists the (0-based) indices of the
+    sites of each pattern, while `site_pattern_indices` gives the index of
+    the pattern of each site, or -1 if the site is excluded.
+
+    Computations that treat sites independently (e.g., parsimony scores,
+    counts of pairwise differences) can thus be carried out once per
+    pattern, and weighted by `weights`. For example::
+
+        patterns = SitePatterns(char_matrix)
+        score = treecalc.fitch_down_pass(tree.postorder_node_iter(),
+                taxa_to_state_set_map=patterns.taxon_state_sets(),
+                weight_list=patterns.weights)
+
+    Patterns can be built up incrementally, by adding further sites (see
+    `add_matrix()` and `add_sites()`), or further taxa (see `add_sequence()`).
     """
 
-    def __init__(self, matrix=None):
-        pass
+    def __init__(self, matrix=None, **kwargs):
+        """
+        `matrix`, if given, is a `DiscreteCharacterMatrix` the sites of which
+        are added (see `add_matrix()`). Keyword arguments:
+
+            - `taxa`: list of `Taxon` objects, the states of which make up
+              the patterns, in order (defaults to all the taxa of `matrix`
+              that have sequences, in the order of its taxon set).
+            - `state_alphabet`: the alphabet indexing the states (defaults
+              to the default state alphabet of `matrix`).
+            - `gaps_as_missing`: if True, gaps are recoded as missing data
+              (i.e., as the `missing` state of the alphabet).
+            - `exclude_gaps`: if True, sites with a gap in any sequence are
+              excluded.
+            - `exclude_uncertain`: if True, sites with a gap or an ambiguous
+              or polymorphic state in any sequence are excluded.
+        """
+        self.taxa = kwargs.get("taxa", None)
+        self.state_alphabet = kwargs.get("state_alphabet", None)
+        self.gaps_as_missing = kwargs.get("gaps_as_missing", False)
+        self.exclude_gaps = kwargs.get("exclude_gaps", False)
+        self.exclude_uncertain = kwargs.get("exclude_uncertain", False)
+        self.patterns = []
+        self.weights = []
+        self.pattern_sites = []
+        self.site_pattern_indices = array('l')
+        self._pattern_index_map = {}
+        self._state_recoding = None
+        self._excluded_states = None
+        self._is_recoding = False
+        if matrix is not None:
+            self.add_matrix(matrix)
+
+    def __len__(self):
+        "Returns number of distinct patterns."
+        return len(self.patterns)
+
+    def _get_num_sites(self):
+        return len(self.site_pattern_indices)
+    num_sites = property(_get_num_sites, None, None, "Number of sites, including excluded ones.")
+
+    def _setup_states(self):
+        if self._state_recoding is not None:
+            return
+        if self.state_alphabet is None:
+            raise ValueError("No state alphabet defined")
+        gap = getattr(self.state_alphabet, "gap", None)
+        self._state_recoding = range(len(self.state_alphabet))
+        if self.gaps_as_missing and gap is not None:
+            if self.state_alphabet.missing is None:
+                raise ValueError("Cannot recode gaps as missing data: no missing data state defined")
+            self._state_recoding[self.state_alphabet.index(gap)] = self.state_alphabet.index(self.state_alphabet.missing)
+            self._is_recoding = True
+        excluded_states = set()
+        for idx, state in enumerate(self.state_alphabet):
+            if self._state_recoding[idx] != idx:
+                continue
+            if (self.exclude_gaps or self.exclude_uncertain) and state is gap:
+                excluded_states.add(idx)
+            elif self.exclude_uncertain and len(state.fundamental_states) != 1:
+                excluded_states.add(idx)
+        self._excluded_states = excluded_states
+
+    def _sequence_state_indices(self, vector):
+        """
+        Returns the state indices of `vector`, a `CharacterDataVector` or a
+        sequence of state indices.
+        """
+        if isinstance(vector, CompactCharacterDataVector) \
+                and vector.is_compact() \
+                and vector.state_alphabet is self.state_alphabet:
+            state_indices = vector.state_indices
+        elif isinstance(vector, CharacterDataVector):
+            state_index_map = self.state_alphabet.state_index_map()
+            try:
+                state_indices = [state_index_map[cell.value] for cell in vector]
+            except KeyError, e:
+                raise ValueError("State '%s' not in state alphabet" % e.args[0])
+        else:
+            state_indices = vector
+        return state_indices
+
+    def _add_pattern_site(self, pattern, site_index):
+        pattern_index = self._pattern_index_map.get(pattern)
+        if pattern_index is None:
+            if self._excluded_states.intersection(pattern):
+                pattern_index = -1
+            else:
+                pattern_index = len(self.patterns)
+                self.patterns.append(pattern)
+                self.weights.append(0)
+                self.pattern_sites.append([])
+            self._pattern_index_map[pattern] = pattern_index
+        if pattern_index >= 0:
+            self.weights[pattern_index] += 1
+            self.pattern_sites[pattern_index].append(site_index)
+        return pattern_index
+
+    def add_sites(self, sites):
+        """
+        Adds sites given as an iterable of sequences of state indices (one
+        for each of `taxa`, in order).
+        """
+        if self.taxa is None:
+            raise ValueError("No taxa defined")
+        self._setup_states()
+        recoding = self._state_recoding
+        site_pattern_indices = self.site_pattern_indices
+        for site in sites:
+            if self._is_recoding:
+                pattern = tuple([recoding[i] for i in site])
+            else:
+                pattern = tuple(site)
+            if len(pattern) != len(self.taxa):
+                raise ValueError("Expecting %d states per site, but found %d" % (len(self.taxa), len(pattern)))
+            site_pattern_indices.append(self._add_pattern_site(pattern, len(site_pattern_indices)))
+
+    def add_matrix(self, matrix):
+        """
+        Adds the sites of `matrix` (after any already added), taking the
+        states of `taxa` from their sequences in it.
+        """
+        if self.state_alphabet is None:
+            self.state_alphabet = matrix.default_state_alphabet
+        if self.taxa is None:
+            self.taxa = [t for t in matrix.taxon_set if t in matrix.taxon_seq_map]
+        self.add_sequences([matrix.taxon_seq_map[t] for t in self.taxa])
+
+    def add_sequences(self, sequences):
+        """
+        Adds the sites of `sequences`, a list of `CharacterDataVector`
+        objects (or of sequences of state indices), one for each of `taxa`,
+        in order.
+        """
+        self._setup_states()
+        rows = [self._sequence_state_indices(v) for v in sequences]
+        if rows:
+            nchar = len(rows[0])
+            for row in rows:
+                if len(row) != nchar:
+                    raise ValueError("Sequences of unequal length")
+        self.add_sites(izip(*rows))
+
+    def add_sequence(self, taxon, vector):
+        """
+        Adds the taxon `taxon`, with the sequence `vector` (a
+        `CharacterDataVector` or a sequence of state indices), which must
+        have a state for each site already added. As sites of the same
+        pattern may differ in the new sequence, patterns are split as
+        necessary (with the resulting patterns numbered in order of first
+        occurrence).
+        """
+        if self.taxa is None:
+            self.taxa = []
+        self._setup_states()
+        state_indices = self._sequence_state_indices(vector)
+        if self._is_recoding:
+            recoding = self._state_recoding
+            state_indices = [recoding[i] for i in state_indices]
+        if len(state_indices) != self.num_sites:
+            raise ValueError("Expecting %d states, but found %d" % (self.num_sites, len(state_indices)))
+        old_patterns = self.patterns
+        old_site_pattern_indices = self.site_pattern_indices
+        self.taxa.append(taxon)
+        self.patterns = []
+        self.weights = []
+        self.pattern_sites = []
+        self.site_pattern_indices = array('l')
+        self._pattern_index_map = {}
+        for site_index, pattern_index in enumerate(old_site_pattern_indices):
+            if pattern_index < 0:
+                self.site_pattern_indices.append(-1)
+            else:
+                pattern = old_patterns[pattern_index] + (state_indices[site_index],)
+                self.site_pattern_indices.append(self._add_pattern_site(pattern, site_index))
+
+    def taxon_state_sets(self):
+        """
+        Returns a dictionary mapping each of `taxa` to a list of the sets of
+        the indices of the fundamental states of its state in each pattern
+        (as `CharacterMatrix.create_taxon_to_state_set_map()` does for
+        sites).
+        """
+        state_sets = [set([self.state_alphabet.index(i) for i in s.fundamental_states]) for s in self.state_alphabet]
+        taxon_state_sets = {}
+        for taxon_index, taxon in enumerate(self.taxa):
+            taxon_state_sets[taxon] = [set(state_sets[pattern[taxon_index]]) for pattern in self.patterns]
+        return taxon_state_sets
+
+    def site_values(self, pattern_values, excluded_value=None):
+        """
+        Expands `pattern_values`, a list of values for each pattern, into a
+        list of values for each site, with `excluded_value` for excluded
+        sites.
+        """
+        site_values = []
+        for pattern_index in self.site_pattern_indices:
+            if pattern_index >= 0:
+                site_values.append(pattern_values[pattern_index])
+            else:
+                site_values.append(excluded_value)
+        return site_values
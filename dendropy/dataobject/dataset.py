@@ -133,6 +133,10 @@ class DataSet(DataObject, iosys.Readable, iosys.Writeable):
             - `exclude_chars` if True skips over character data
             - `encode_splits` specifies whether or not split bitmasks will be
                calculated and attached to the edges.
+            - `split_encoding` is one of "rooted", "unrooted" or "none" (see
+               `dendropy.treesplit.SplitEncodingPolicy`).
+            - `node_factory` is the class of the nodes of the trees (e.g.,
+               `CompactNode`).
             - `finish_node_func` is a function that will be applied to each node
                after it has been constructed.
 
@@ -0,0 +1,377 @@
+#! /usr/bin/env python
+
+##############################################################################
+##  DendroPy Phylogenetic Computing Library.
+##
+##  Copyright 2010 Jeet Sukumaran and Mark T. Holder.
+##  All rights reserved.
+##
+##  See "LICENSE.txt" for terms and conditions of usage.
+##
+##  If you use this work or any portion thereof in published work,
+##  please cite it as:
+##
+##     Sukumaran, J. and M. T. Holder. 2010. DendroPy: a Python library
+##     for phylogenetic computing. Bioinformatics 26: 1569-1571.
+##
+##############################################################################
+
+"""
+Array-based representation of the topology, edge lengths and taxa of a tree,
+for calculations that do not need the full `Tree`/`Node`/`Edge` object model.
+"""
+
+from array import array
+
+from dendropy.utility import containers
+from dendropy.dataobject.tree import Tree
+
+NAN = float("nan")
+
+###############################################################################
+## FlatTree
+
+class FlatTree(object):
+    """
+    A tree stored as a set of parallel arrays indexed by node, with node 0
+    being the root (seed node) and the nodes numbered in preorder when built
+    from a `Tree`:
+
+        - `parent_indices` : index of the parent of each node (-1 for the root)
+        - `child_offsets`, `child_counts` : the children of node `i` are
+          `child_indices[child_offsets[i]:child_offsets[i]+child_counts[i]]`,
+          in their original order
+        - `child_indices` : the children of all nodes, concatenated
+        - `preorder_indices`, `postorder_indices` : the node indices in
+          preorder and postorder
+        - `edge_lengths` : the length of the edge subtending each node, with
+          undefined lengths stored as NaN
+        - `taxon_indices` : the index in `taxon_set` of the taxon of each node
+          (-1 if the node has no taxon)
+        - `node_labels` : list of the labels of the nodes
+
+    The integer and float arrays are standard library `array` objects.
+    Once `encode_splits()` has been called (directly, or through
+    `dendropy.treesplit.encode_splits()`), `split_bitmasks` holds the rooted
+    split bitmask of each node and `split_edges` maps each split (normalized
+    if the tree is unrooted) to the index of the node subtending it, so
+    that functions that only look at the splits of trees (e.g.
+    `dendropy.treecalc.symmetric_difference()`) work on `FlatTree` objects
+    as well.
+    """
+
+    def from_tree(tree):
+        """
+        Returns a `FlatTree` with the topology, edge lengths, node labels
+        and taxa of `tree`. Taxa must belong to `tree.taxon_set`.
+        """
+        taxon_set = tree.taxon_set
+        nodes = tree.preorder_node_list()
+        node_index = {}
+        for idx, nd in enumerate(nodes):
+            node_index[nd] = idx
+        parent_indices = array('l', [-1]) * len(nodes)
+        edge_lengths = array('d', [NAN]) * len(nodes)
+        taxon_indices = array('l', [-1]) * len(nodes)
+        node_labels = [None] * len(nodes)
+        for idx, nd in enumerate(nodes):
+            p = nd._parent_node
+            if p is not None and idx > 0:
+                parent_indices[idx] = node_index[p]
+            e = nd.edge
+            if e is not None and e.length is not None:
+                edge_lengths[idx] = e.length
+            if nd.taxon is not None:
+                taxon_indices[idx] = taxon_set.index(nd.taxon)
+            node_labels[idx] = nd.label
+        return FlatTree(taxon_set=taxon_set,
+                parent_indices=parent_indices,
+                edge_lengths=edge_lengths,
+                taxon_indices=taxon_indices,
+                node_labels=node_labels,
+                is_rooted=tree.is_rooted,
+                weight=tree.weight,
+                label=tree.label)
+    from_tree = staticmethod(from_tree)
+
+    def __init__(self,
+            taxon_set,
+            parent_indices,
+            edge_lengths=None,
+            taxon_indices=None,
+            node_labels=None,
+            is_rooted=None,
+            weight=None,
+            label=None):
+        """
+        Builds the child and traversal arrays from `parent_indices`, a
+        sequence giving the index of the parent of each node, in which
+        exactly one node (the root) has a parent index of -1. The other
+        sequences, if given, must be of the same length.
+        """
+        num_nodes = len(parent_indices)
+        self.taxon_set = taxon_set
+        self.is_rooted = is_rooted
+        self.weight = weight
+        self.label = label
+        self.parent_indices = array('l', parent_indices)
+        if edge_lengths is None:
+            self.edge_lengths = array('d', [NAN]) * num_nodes
+        else:
+            self.edge_lengths = array('d', edge_lengths)
+        if taxon_indices is None:
+            self.taxon_indices = array('l', [-1]) * num_nodes
+        else:
+            self.taxon_indices = array('l', taxon_indices)
+        if node_labels is None:
+            self.node_labels = [None] * num_nodes
+        else:
+            self.node_labels = list(node_labels)
+        if len(self.edge_lengths) != num_nodes \
+                or len(self.taxon_indices) != num_nodes \
+                or len(self.node_labels) != num_nodes:
+            raise ValueError("Node arrays are of different lengths")
+        self._build_child_arrays()
+        self._build_traversal_arrays()
+
+    def _build_child_arrays(self):
+        num_nodes = len(self.parent_indices)
+        child_counts = array('l', [0]) * num_nodes
+        root_index = -1
+        for idx, p in enumerate(self.parent_indices):
+            if p < 0:
+                if root_index >= 0:
+                    raise ValueError("Multiple root nodes: %d and %d" % (root_index, idx))
+                root_index = idx
+            else:
+                child_counts[p] += 1
+        if root_index < 0 and num_nodes > 0:
+            raise ValueError("No root node")
+        child_offsets = array('l', [0]) * num_nodes
+        offset = 0
+        for idx in xrange(num_nodes):
+            child_offsets[idx] = offset
+            offset += child_counts[idx]
+        child_indices = array('l', [0]) * offset
+        next_slot = array('l', child_offsets)
+        for idx, p in enumerate(self.parent_indices):
+            if p >= 0:
+                child_indices[next_slot[p]] = idx
+                next_slot[p] += 1
+        self.root_index = root_index
+        self.child_offsets = child_offsets
+        self.child_counts = child_counts
+        self.child_indices = child_indices
+
+    def _build_traversal_arrays(self):
+        num_nodes = len(self.parent_indices)
+        preorder = array('l')
+        postorder = array('l')
+        if num_nodes:
+            child_offsets = self.child_offsets
+            child_counts = self.child_counts
+            child_indices = self.child_indices
+            stack = [(self.root_index, False)]
+            while stack:
+                idx, expanded = stack.pop()
+                if expanded:
+                    postorder.append(idx)
+                else:
+                    preorder.append(idx)
+                    stack.append((idx, True))
+                    start = child_offsets[idx]
+                    for cidx in xrange(start + child_counts[idx] - 1, start - 1, -1):
+                        stack.append((child_indices[cidx], False))
+            if len(preorder) != num_nodes:
+                raise ValueError("Parent indices do not describe a tree: %d of %d nodes reachable from the root" \
+                        % (len(preorder), num_nodes))
+        self.preorder_indices = preorder
+        self.postorder_indices = postorder
+
+    def __len__(self):
+        return len(self.parent_indices)
+
+    def children(self, idx):
+        "Returns the indices of the children of node `idx`."
+        start = self.child_offsets[idx]
+        return self.child_indices[start:start+self.child_counts[idx]]
+
+    def leaf_indices(self):
+        "Returns the indices of the leaves, in preorder."
+        child_counts = self.child_counts
+        return array('l', [idx for idx in self.preorder_indices if child_counts[idx] == 0])
+
+    def to_tree(self, node_factory=None):
+        """
+        Returns a new `Tree` with the topology, edge lengths, node labels and
+        taxa of this tree, built out of nodes of class `node_factory` (see
+        `Tree`).
+        """
+        tree = Tree(taxon_set=self.taxon_set, node_factory=node_factory)
+        tree.is_rooted = self.is_rooted
+        tree.weight = self.weight
+        tree.label = self.label
+        taxon_set = self.taxon_set
+        nodes = [None] * len(self)
+        for idx in self.preorder_indices:
+            p = self.parent_indices[idx]
+            if p < 0:
+                nd = tree.seed_node
+            else:
+                nd = nodes[p].new_child()
+            length = self.edge_lengths[idx]
+            if length == length:
+                nd.edge.length = length
+            tidx = self.taxon_indices[idx]
+            if tidx >= 0:
+                nd.taxon = taxon_set[tidx]
+            nd.label = self.node_labels[idx]
+            nodes[idx] = nd
+        return tree
+
+    ###########################################################################
+    ## Calculations
+
+    def calc_node_ages(self, check_prec=0.0000001):
+        """
+        Returns an array of the ages (sums of edge lengths from the node to
+        the tips) of the nodes, as `Tree.calc_node_ages()`. If the lengths of
+        different paths to a node differ by more than `check_prec`, then a
+        ValueError exception will be raised indicating deviation from
+        ultrametricity. If `check_prec` is negative or False, then this check
+        will be skipped.
+        """
+        check = not (check_prec < 0 or check_prec == False)
+        ages = array('d', [0.0]) * len(self)
+        edge_lengths = self.edge_lengths
+        child_offsets = self.child_offsets
+        child_counts = self.child_counts
+        child_indices = self.child_indices
+        for idx in self.postorder_indices:
+            count = child_counts[idx]
+            if count:
+                start = child_offsets[idx]
+                first = child_indices[start]
+                age = ages[first] + edge_lengths[first]
+                ages[idx] = age
+                if check:
+                    for cidx in xrange(start + 1, start + count):
+                        c = child_indices[cidx]
+                        if abs(age - (ages[c] + edge_lengths[c])) > check_prec:
+                            raise ValueError("Tree is not ultrametric")
+        return ages
+
+    def calc_root_distances(self):
+        """
+        Returns an array of the distances (sums of edge lengths, with undefined
+        lengths counting as 0) from the root to each node.
+        """
+        dists = array('d', [0.0]) * len(self)
+        edge_lengths = self.edge_lengths
+        parent_indices = self.parent_indices
+        for idx in self.preorder_indices:
+            p = parent_indices[idx]
+            if p >= 0:
+                length = edge_lengths[idx]
+                if length == length:
+                    dists[idx] = dists[p] + length
+                else:
+                    dists[idx] = dists[p]
+        return dists
+
+    def encode_splits(self, create_dict=True):
+        """
+        Calculates the rooted split bitmask of each node, storing them in
+        `split_bitmasks`. If `create_dict` is True, then `split_edges` is set
+        to a dictionary mapping the splits to the index of the node that
+        subtends them, with the splits being normalized if the tree is not
+        rooted (see `dendropy.treesplit.encode_splits()`). Unlike the latter,
+        this does not restructure the tree: the edges subtending a node of
+        out-degree one and its child, or the two basal edges of an unrooted
+        tree, all map to the same split, with the node closest to the tips
+        being recorded in `split_edges`.
+        """
+        taxon_set = self.taxon_set
+        taxon_indices = self.taxon_indices
+        child_offsets = self.child_offsets
+        child_counts = self.child_counts
+        child_indices = self.child_indices
+        split_bitmasks = [0L] * len(self)
+        for idx in self.postorder_indices:
+            count = child_counts[idx]
+            if count:
+                cm = 0L
+                start = child_offsets[idx]
+                for cidx in xrange(start, start + count):
+                    cm |= split_bitmasks[child_indices[cidx]]
+                split_bitmasks[idx] = cm
+            else:
+                tidx = taxon_indices[idx]
+                if tidx >= 0:
+                    split_bitmasks[idx] = taxon_set.taxon_bitmask(taxon_set[tidx])
+        self.split_bitmasks = split_bitmasks
+        if create_dict:
+            if self.is_rooted:
+                split_edges = {}
+            else:
+                split_edges = containers.NormalizedBitmaskDict(mask=taxon_set.all_taxa_bitmask())
+            for idx in self.postorder_indices:
+                split = split_bitmasks[idx]
+                if split not in split_edges:
+                    split_edges[split] = idx
+            self.split_edges = split_edges
+
+    def split_edge_lengths(self):
+        """
+        Returns a dictionary mapping the splits of the tree (normalized if the
+        tree is not rooted) to the lengths of the edges subtending them, with
+        undefined lengths counting as 0. The lengths of edges that map to the
+        same split (see `encode_splits()`) are summed, giving the same values
+        as the restructured tree produced by `dendropy.treesplit.encode_splits()`.
+        """
+        if not hasattr(self, "split_edges"):
+            self.encode_splits()
+        split_bitmasks = self.split_bitmasks
+        edge_lengths = self.edge_lengths
+        if self.is_rooted:
+            lengths = {}
+        else:
+            lengths = containers.NormalizedBitmaskDict(mask=self.split_edges.mask)
+        for idx in self.postorder_indices:
+            split = split_bitmasks[idx]
+            length = edge_lengths[idx]
+            if length != length:
+                length = 0.0
+            lengths[split] = lengths.get(split, 0.0) + length
+        return lengths
+
+    def iter_leaf_pairs(self):
+        """
+        Iterates over all pairs of leaves of the tree, yielding tuples of
+        (leaf index 1, leaf index 2, index of their MRCA, patristic distance
+        between them), with undefined edge lengths counting as 0. Pairs are
+        generated as their MRCAs are visited in postorder, with the first leaf
+        of each pair descending from an earlier child of the MRCA than the
+        second.
+        """
+        root_dists = self.calc_root_distances()
+        child_offsets = self.child_offsets
+        child_counts = self.child_counts
+        child_indices = self.child_indices
+        desc_leaves = {}
+        for idx in self.postorder_indices:
+            count = child_counts[idx]
+            if not count:
+                desc_leaves[idx] = [idx]
+                continue
+            start = child_offsets[idx]
+            node_dist = 2 * root_dists[idx]
+            leaves = desc_leaves.pop(child_indices[start])
+            for cidx in xrange(start + 1, start + count):
+                c_leaves = desc_leaves.pop(child_indices[cidx])
+                for leaf1 in leaves:
+                    d1 = root_dists[leaf1] - node_dist
+                    for leaf2 in c_leaves:
+                        yield leaf1, leaf2, idx, d1 + root_dists[leaf2]
+                leaves.extend(c_leaves)
+            desc_leaves[idx] = leaves
@@ -131,6 +131,10 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
     Primary manager for collections of `Taxon` objects.
     """
 
+    # lookup maps are (re)built on demand: the class default also covers
+    # instances being unpickled, whose items are restored before their state
+    _taxon_index_map = None
+
     def _to_taxon(s):
         if isinstance(s, Taxon):
             return Taxon(label=s.label)
@@ -148,6 +152,7 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
         in the iterable a new (distinct) Taxon object with the same
         label is constructed and added to the set.
         """
+        self._taxon_index_map = None
         containers.OrderedSet.__init__(self)
         base.IdTagged.__init__(self, oid=kwargs.get('oid'), label=kwargs.get('label'))
         if len(args) > 1:
@@ -168,6 +173,110 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
         memo[id(self._oid)] = o._oid
         return o
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_taxon_index_map"] = None
+        return state
+
+    def _invalidate_taxon_maps(self):
+        self._taxon_index_map = None
+
+    def _map_taxon(self, taxon, idx):
+        self._taxon_index_map.setdefault(taxon, idx)
+        self._oid_taxon_map.setdefault(taxon.oid, taxon)
+        label = taxon.label
+        if label is not None:
+            self._label_taxon_map.setdefault(label, taxon)
+            try:
+                self._lower_label_taxon_map.setdefault(label.lower(), taxon)
+            except AttributeError:
+                pass
+
+    def _get_taxon_index_map(self):
+        """
+        Returns dictionary mapping taxa to their (first) index, after
+        making sure that it and the oid, label and case-folded label lookup
+        dictionaries are current. These are updated as taxa are appended,
+        and rebuilt here following any other modification of the list, or
+        after any `Taxon` has been relabeled.
+        """
+        if self._taxon_index_map is None \
+                or self._maps_relabel_count != Taxon.relabel_count:
+            self._maps_relabel_count = Taxon.relabel_count
+            self._taxon_index_map = {}
+            self._oid_taxon_map = {}
+            self._label_taxon_map = {}
+            self._lower_label_taxon_map = {}
+            for idx, taxon in enumerate(self):
+                self._map_taxon(taxon, idx)
+        return self._taxon_index_map
+
+    def append(self, taxon):
+        list.append(self, taxon)
+        if self._taxon_index_map is not None:
+            self._map_taxon(taxon, len(self) - 1)
+
+    def add(self, taxon):
+        if taxon in self:
+            return None
+        self.append(taxon)
+        return taxon
+
+    def __contains__(self, taxon):
+        try:
+            return taxon in self._get_taxon_index_map()
+        except TypeError:
+            return list.__contains__(self, taxon)
+
+    def index(self, taxon, *args):
+        if args:
+            return list.index(self, taxon, *args)
+        try:
+            return self._get_taxon_index_map()[taxon]
+        except (KeyError, TypeError):
+            raise ValueError("%r is not in list" % taxon)
+
+    def insert(self, idx, taxon):
+        list.insert(self, idx, taxon)
+        self._invalidate_taxon_maps()
+
+    def remove(self, taxon):
+        list.remove(self, taxon)
+        self._invalidate_taxon_maps()
+
+    def pop(self, *args):
+        taxon = list.pop(self, *args)
+        self._invalidate_taxon_maps()
+        return taxon
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self._invalidate_taxon_maps()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self._invalidate_taxon_maps()
+
+    def __setslice__(self, i, j, taxa):
+        list.__setslice__(self, i, j, taxa)
+        self._invalidate_taxon_maps()
+
+    def __iadd__(self, taxa):
+        self._invalidate_taxon_maps()
+        return list.__iadd__(self, taxa)
+
+    def __imul__(self, n):
+        self._invalidate_taxon_maps()
+        return list.__imul__(self, n)
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._invalidate_taxon_maps()
+
+    def reverse(self):
+        list.reverse(self)
+        self._invalidate_taxon_maps()
+
     def __getitem__(self, i):
         if isinstance(i, int):
             return containers.OrderedSet.__getitem__(self, i)
@@ -200,12 +309,10 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
         req_taxon = kwargs.get("taxon", None)
         oid = kwargs.get("oid", None)
         label = kwargs.get("label", None)
-        for self_taxon in self:
-            if (req_taxon is not None and req_taxon is self_taxon) \
-                or (oid is not None and self_taxon.oid == oid) \
-                or (label is not None and self_taxon.label == label):
-                return True
-        return False
+        self._get_taxon_index_map()
+        return (req_taxon is not None and req_taxon in self._taxon_index_map) \
+            or (oid is not None and oid in self._oid_taxon_map) \
+            or (label is not None and label in self._label_taxon_map)
 
     def has_taxa(self, **kwargs):
         """
@@ -219,11 +326,10 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
         taxa = set(kwargs.get("taxa",  []))
         oids = set(kwargs.get("oids", []))
         labels = set(kwargs.get("labels", []))
-        taxon_oids = set([t.oid for t in self])
-        taxon_labels = set([t.label for t in self])
-        return taxa.issubset(self) \
-            and oids.issubset(taxon_oids) \
-            and labels.issubset(taxon_labels)
+        self._get_taxon_index_map()
+        return taxa.issubset(self._taxon_index_map) \
+            and oids.issubset(self._oid_taxon_map) \
+            and labels.issubset(self._label_taxon_map)
 
     def get_taxon(self, **kwargs):
         """
@@ -239,14 +345,18 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
         oid = kwargs.get("oid", None)
         label = kwargs.get("label", None)
         ci = kwargs.get("case_insensitive", False)
-        if ci:
-            label_lower = label.lower()
-        for taxon in self:
-            if (oid is not None and taxon.oid == oid) \
-                    or (label is not None and taxon.label == label) \
-                    or (ci and label is not None and label_lower == taxon.label.lower()):
-                return taxon
-        return None
+        taxon_index_map = self._get_taxon_index_map()
+        matches = []
+        if oid is not None and oid in self._oid_taxon_map:
+            matches.append(self._oid_taxon_map[oid])
+        if label is not None:
+            if label in self._label_taxon_map:
+                matches.append(self._label_taxon_map[label])
+            if ci and label.lower() in self._lower_label_taxon_map:
+                matches.append(self._lower_label_taxon_map[label.lower()])
+        if not matches:
+            return None
+        return min(matches, key=taxon_index_map.get)
 
     def require_taxon(self, **kwargs):
         """
@@ -314,8 +424,7 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
 
     def clear(self):
         "Removes all taxa from this list."
-        for t in self:
-            self.remove(t)
+        del self[:]
 
     def labels(self):
         "Convenience method to return all taxa labels."
@@ -369,13 +478,8 @@ class TaxonSet(containers.OrderedSet, base.IdTagged):
 
     def split_taxa_list(self, split_bitmask, index=0):
         "Returns list of taxa represented by split."
-        taxa = []
-        while split_bitmask:
-            if split_bitmask & 1:
-                taxa.append(self[index])
-            split_bitmask = split_bitmask >> 1
-            index += 1
-        return taxa
+        from dendropy import treesplit
+        return [self[index + i] for i in treesplit.iter_set_bits(split_bitmask)]
 
     def split_as_newick_string(self, split, preserve_spaces=False, quote_underscores=True):
         """
@@ -452,6 +556,8 @@ class Taxon(base.IdTagged):
         memo[id(self)] = self
         return self
 
+    relabel_count = 0
+
     def cmp(taxon1, taxon2):
         "Compares taxon1 and taxon2 based on label."
         return cmp(str(taxon1.label), str(taxon2.label))
@@ -469,6 +575,22 @@ class Taxon(base.IdTagged):
             kwargs['label'] = args[0].label
         base.IdTagged.__init__(self, **kwargs)
 
+    def _get_label(self):
+        return self._label
+
+    def _set_label(self, label):
+        if "_label" in self.__dict__ and label != self._label:
+            Taxon.relabel_count += 1
+        self._label = label
+
+    label = property(_get_label, _set_label)
+
+    def _set_oid(self, oid):
+        base.IdTagged._set_oid(self, oid)
+        Taxon.relabel_count += 1
+
+    oid = property(base.IdTagged._get_oid, _set_oid)
+
     def __str__(self):
         "String representation of self = taxon name."
         return "%s" % str(self.label)
@@ -23,8 +23,9 @@ as well as all the structural classes that make up a tree.
 
 from cStringIO import StringIO
 import copy
-import bisect
+import heapq
 import re
+from collections import deque
 
 from dendropy.utility import messaging
 _LOG = messaging.get_logger(__name__)
@@ -34,7 +35,7 @@ from dendropy.utility import iosys
 from dendropy.utility import error
 from dendropy.utility import textutils
 from dendropy.utility import termutils
-from dendropy.dataobject.base import IdTagged
+from dendropy.dataobject.base import IdTagged, Annotated, AnnotesDict
 from dendropy.dataobject.taxon import TaxonSet, TaxonSetLinked, TaxonLinked
 from dendropy import treesplit
 
@@ -167,6 +168,10 @@ class TreeList(list, TaxonSetLinked, iosys.Readable, iosys.Writeable):
 
             - `encode_splits` specifies whether or not split bitmasks will be
                calculated and attached to the edges.
+            - `split_encoding` is one of "rooted", "unrooted" or "none" (see
+               `dendropy.treesplit.SplitEncodingPolicy`).
+            - `node_factory` is the class of the nodes of the trees (e.g.,
+               `CompactNode`).
             - `translate_dict` should provide a dictionary mapping taxon numbers
                (as found in the source) to taxon labels (as defined in the source).
             - `rooted` specifies the default rooting interpretation of the tree
@@ -174,6 +179,14 @@ class TreeList(list, TaxonSetLinked, iosys.Readable, iosys.Writeable):
             - `finish_node_func` is a function that will be applied to each node
                after it has been constructed.
             - `edge_len_type` specifies the type of the edge lengths (int or float)
+            - `tree_slice` is an integer or `slice` object selecting the trees
+               to be read by their 0-based index (within the collection given
+               by ``collection_offset``, if specified; ``tree_offset`` is
+               ignored). For NEXUS and NEWICK sources, the trees are read by
+               seeking directly to them using a tree index of the source
+               (see `dendropy.dataio.treeindex`), which, for files on disk,
+               is saved to and re-used from a sidecar file unless
+               `use_index_file` is False.
 
         Other keyword arguments may be available, depending on the implementation
         of the reader specialized to handle `schema` formats.
@@ -188,6 +201,20 @@ class TreeList(list, TaxonSetLinked, iosys.Readable, iosys.Writeable):
                 self.taxon_set = kwargs["taxon_set"]
         else:
             kwargs["taxon_set"] = self.taxon_set
+        if kwargs.get("tree_slice") is not None:
+            from dendropy.dataio import treeindex
+            tree_slice = kwargs.pop("tree_slice")
+            index, src = treeindex.indexed_source(stream,
+                    schema=schema,
+                    preserve_underscores=kwargs.get('preserve_underscores', False),
+                    use_index_file=kwargs.pop("use_index_file", True))
+            try:
+                tree_indices = index.resolve_indices(tree_slice, collection_offset=collection_offset)
+                for t in index.indexed_tree_iter(src, tree_indices, **kwargs):
+                    self.append(t, reindex_taxa=False)
+            finally:
+                treeindex.close_indexed_source(src, stream)
+            return
         kwargs["exclude_chars"] = True
         kwargs["exclude_trees"] = False
         d = DataSet(stream=stream, schema=schema, **kwargs)
@@ -277,7 +304,9 @@ class TreeList(list, TaxonSetLinked, iosys.Readable, iosys.Writeable):
     def consensus(self, min_freq=0.5, trees_splits_encoded=False, **kwargs):
         """
         Returns a consensus tree of all trees in self, with minumum frequency
-        of split to be added to the consensus tree given by `min_freq`.
+        of split to be added to the consensus tree given by `min_freq`. The
+        nodes of the consensus tree are of the same class as those of the
+        (first) tree in self (e.g., `CompactNode`).
         """
         from dendropy import treesum
         self.split_distribution = treesplit.SplitDistribution(taxon_set=self.taxon_set)
@@ -285,7 +314,13 @@ class TreeList(list, TaxonSetLinked, iosys.Readable, iosys.Writeable):
         tsum.count_splits_on_trees(self,
                 split_distribution=self.split_distribution,
                 trees_splits_encoded=trees_splits_encoded)
-        tree = tsum.tree_from_splits(self.split_distribution, min_freq=min_freq)
+        if len(self) > 0:
+            node_factory = self[0].node_factory
+        else:
+            node_factory = None
+        tree = tsum.tree_from_splits(self.split_distribution,
+                min_freq=min_freq,
+                node_factory=node_factory)
         return tree
 
     def frequency_of_split(self, **kwargs):
@@ -486,6 +521,10 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
         `UnsupportedSchemaError` is raised. Other keywords will be
         passed to the underlying tree parser.
 
+        The keyword argument `node_factory` specifies the class of the nodes
+        of the tree (`Node` by default). Trees built out of `CompactNode`
+        objects take up considerably less memory.
+
         Tree objects can thus be instantiated in the following ways::
 
             # /usr/bin/env python
@@ -572,11 +611,17 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                                 oid=kwargs.get("oid", None))
         iosys.Writeable.__init__(self)
         iosys.Readable.__init__(self)
-        self.seed_node = Node(edge=Edge())
+        self.node_factory = kwargs.get("node_factory", None)
+        if self.node_factory is None:
+            self.node_factory = Node
+        self.seed_node = self.node_factory()
         self.length_type = None
         self.comments = None
         self._is_rooted = None
         self.weight = None
+        self._node_list_cache = None
+        self._lca_index = None
+        self._topology_version = None
 
         if len(args) > 1:
             raise error.TooManyArgumentsError(func_name=self.__class__.__name__, max_args=1, args=args)
@@ -617,8 +662,11 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
         # we treat the taxa as immutable and copy the reference even in a deepcopy
         o = TaxonSetLinked.__deepcopy__(self, memo)
         for k, v in self.__dict__.iteritems():
-            if k not in ['taxon_set', "_oid"]:
+            if k not in ['taxon_set', "_oid", "_node_list_cache", "_lca_index", "_topology_version"]:
                 o.__dict__[k] = copy.deepcopy(v, memo)
+        o._node_list_cache = None
+        o._lca_index = None
+        o._topology_version = None
         return o
 
     def read(self, stream, schema, **kwargs):
@@ -633,6 +681,10 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                `TaxonSet` object currently associated with the tree will be used.
             - `encode_splits` specifies whether or not split bitmasks will be
                calculated and attached to the edges.
+            - `split_encoding` is one of "rooted", "unrooted" or "none" (see
+               `dendropy.treesplit.SplitEncodingPolicy`).
+            - `node_factory` is the class of the nodes of the trees (e.g.,
+               `CompactNode`).
             - `translate_dict` should provide a dictionary mapping taxon numbers (as
                found in the source) to taxon labels (as defined in the source).
             - `rooted` specifies the default rooting interpretation of the tree (see
@@ -708,14 +760,110 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
 
     def nodes(self, cmp_fn=None, filter_fn=None):
         "Returns list of nodes on the tree, sorted using cmp_fn."
-        nodes = [node for node in self.preorder_node_iter(filter_fn)]
+        if filter_fn is None:
+            nodes = self.preorder_node_list()
+        else:
+            nodes = [node for node in self._get_node_lists()[0] if filter_fn(node)]
         if cmp_fn:
             nodes.sort(cmp_fn)
         return nodes
 
     def leaf_nodes(self):
         "Returns list of leaf_nodes on the tree."
-        return [leaf for leaf in self.leaf_iter()]
+        return [node for node in self._get_node_lists()[0] if not node._child_nodes]
+
+    def preorder_node_list(self):
+        """
+        Returns a list of the nodes of the tree in preorder. The traversal is
+        cached, and only recalculated if the structure of the tree has been
+        changed (through the `Node` API) since the last call to this method
+        or to `postorder_node_list()`, so repeated calls cost no more than
+        copying the list.
+        """
+        return list(self._get_node_lists()[0])
+
+    def postorder_node_list(self):
+        """
+        Returns a list of the nodes of the tree in postorder. As with
+        `preorder_node_list()`, the traversal is cached until the structure of
+        the tree changes.
+        """
+        return list(self._get_node_lists()[1])
+
+    def _get_node_lists(self):
+        """
+        Returns the cached (preorder, postorder) node lists of the tree,
+        rebuilding them if the seed node has been replaced or nodes of the
+        tree have been attached, detached or reordered since they were built.
+        The lists themselves must not be modified.
+        """
+        cache = getattr(self, "_node_list_cache", None)
+        version = self._get_topology_version()
+        if cache is None \
+                or cache[0] is not version \
+                or cache[1] != version.count \
+                or cache[2] is not self.seed_node:
+            preorder = []
+            postorder = []
+            stack = [(self.seed_node, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if expanded:
+                    postorder.append(node)
+                else:
+                    preorder.append(node)
+                    stack.append((node, True))
+                    children = node._child_nodes
+                    for idx in xrange(len(children)-1, -1, -1):
+                        stack.append((children[idx], False))
+            # tag the nodes so that edits to them are counted against this
+            # tree; a node shared with another tree is taken over from it,
+            # invalidating whatever that tree has cached
+            for node in preorder:
+                if node._topology_version is not version:
+                    if node._topology_version is not None:
+                        node._topology_version.count += 1
+                    node._topology_version = version
+            cache = (version, version.count, self.seed_node, preorder, postorder)
+            self._node_list_cache = cache
+        return cache[3], cache[4]
+
+    def _get_topology_version(self):
+        """
+        Returns the `_TopologyVersion` counting the changes made to the
+        topology of this tree, creating it if needed.
+        """
+        version = getattr(self, "_topology_version", None)
+        if version is None:
+            version = _TopologyVersion()
+            self._topology_version = version
+        return version
+
+    def build_lca_index(self):
+        """
+        Builds (or, if the topology of the tree has not changed since it
+        was last built, returns the existing) `LcaIndex` of the tree, which
+        answers MRCA queries for pairs of nodes in constant time, and for
+        sets of nodes or taxa in time proportional to their number. While the
+        index is current, `mrca()` queries by taxa use it. Any change to the
+        topology of the tree invalidates the index.
+        """
+        lca_index = self._get_lca_index()
+        if lca_index is None:
+            lca_index = LcaIndex(self)
+            self._lca_index = lca_index
+        return lca_index
+
+    def _get_lca_index(self):
+        """
+        Returns the LCA index of the tree if it has been built and is still
+        current, or None otherwise.
+        """
+        lca_index = getattr(self, "_lca_index", None)
+        if lca_index is not None and not lca_index.is_current():
+            self._lca_index = None
+            lca_index = None
+        return lca_index
 
     def internal_nodes(self):
         "Returns list of internal node in the tree."
@@ -811,6 +959,11 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
         returned! (compatibility tests are not fully performed).
         This function is used to find the "insertion point" for a new split via a
         root to tip search.
+
+        If the tree has a current LCA index (see `build_lca_index()`), the
+        search starts from the seed node and taxa are given by `taxa` or
+        `taxon_labels`, then the index is used to find the MRCA instead, and
+        split bitmasks are not required.
         """
         start_node = kwargs.get("start_node", self.seed_node)
         split_bitmask = None
@@ -827,6 +980,12 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                     raise TypeError("Must specify one of: 'split_bitmask', 'taxa' or 'taxon_labels'")
             if taxa is None:
                 raise ValueError("No taxa matching criteria found")
+            lca_index = self._get_lca_index()
+            if lca_index is not None and start_node is self.seed_node and taxa:
+                try:
+                    return lca_index.taxa_mrca(taxa)
+                except KeyError:
+                    return None
             split_bitmask = self.taxon_set.get_taxa_bitmask(taxa=taxa)
 
         if split_bitmask is None or split_bitmask == 0:
@@ -1256,7 +1415,7 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
             old_head_node = target_edge.head_node
             old_tail_node = target_edge.tail_node
             old_tail_node.remove_child(old_head_node)
-            new_seed_node = Node()
+            new_seed_node = self.node_factory()
             new_seed_node.add_child(old_head_node, edge_length=head_node_edge_len)
             old_tail_node.add_child(new_seed_node, edge_length=tail_node_edge_len)
             self.reseed_at(new_seed_node, update_splits=False, delete_outdegree_one=delete_outdegree_one)
@@ -1323,7 +1482,7 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                     while len(to_attach) > 0:
                         next_child = to_attach.pop()
                         next_sib = rng.sample(attachment_points, 1)[0]
-                        next_attachment = Node()
+                        next_attachment = self.node_factory()
                         p = next_sib.parent_node
                         p.add_child(next_attachment)
                         p.remove_child(next_sib)
@@ -1332,7 +1491,7 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                         attachment_points.append(next_attachment)
                 else:
                     while len(children) > 2:
-                        nn1 = Node()
+                        nn1 = self.node_factory()
                         nn1.edge.length = 0
                         c1 = children[0]
                         c2 = children[1]
@@ -1462,6 +1621,8 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
         children each child node has.
         """
         node_desc_counts = {}
+        # child nodes are reordered in place below, bypassing the `Node` API
+        Node.topology_edit_count += 1
         for nd in self.postorder_node_iter():
             if len(nd._child_nodes) == 0:
                 node_desc_counts[nd] = 0
@@ -1472,11 +1633,15 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
                 total += len(nd._child_nodes)
                 node_desc_counts[nd] = total
                 nd._child_nodes.sort(key=lambda n: node_desc_counts[n], reverse=not ascending)
+                nd._note_topology_change()
 
     def update_splits(self, **kwargs):
         """
-        Recalculates split hashes for tree.
+        Recalculates split hashes for tree (even if they are already marked
+        as being current, e.g., because the taxa of the nodes have been
+        changed).
         """
+        treesplit.clear_splits_encoded_mark(self)
         treesplit.encode_splits(self, **kwargs)
 
     ###########################################################################
@@ -1761,6 +1926,14 @@ class Tree(TaxonSetLinked, iosys.Readable, iosys.Writeable):
             output.write(s)
         return s
 
+    def to_flat(self):
+        """
+        Returns a `FlatTree` (array-based) representation of the topology,
+        edge lengths, node labels and taxa of this tree.
+        """
+        from dendropy.dataobject.flattree import FlatTree
+        return FlatTree.from_tree(self)
+
     def as_python_source(self, tree_obj_name=None, tree_args=None, oids=False):
         """
         Returns string that will rebuild this tree in Python.
@@ -2067,6 +2240,16 @@ class Node(TaxonLinked):
 
     nodeset_hash = staticmethod(nodeset_hash)
 
+    ## Incremented whenever a node is attached to or detached from a parent
+    ## through the `Node` API; used to detect structural changes to trees
+    ## since their splits were encoded (see `treesplit.mark_splits_encoded()`).
+    topology_edit_count = 0
+
+    ## The `_TopologyVersion` of the tree whose traversals were last cached
+    ## with this node in them (see `Tree.preorder_node_list()`); incremented
+    ## whenever the children of the node change.
+    _topology_version = None
+
     ## INSTANCE METHODS #######################################################
 
     def __init__(self, **kwargs):
@@ -2078,14 +2261,17 @@ class Node(TaxonLinked):
         self._edge = None
         self._child_nodes = []
         self._parent_node = None
-        self.edge = kwargs.get("edge", Edge(head_node=self))
+        edge = kwargs.get("edge", None)
+        if edge is None:
+            edge = self.edge_factory(head_node=self)
+        self.edge = edge
         self._edge.head_node = self
         self.comments = []
 
     def __deepcopy__(self, memo):
         o = TaxonLinked.__deepcopy__(self, memo)
         for k, v in self.__dict__.iteritems():
-            if not k in ['_child_nodes', '_taxon', "_oid"]:
+            if not k in ['_child_nodes', '_taxon', "_oid", "_topology_version"]:
                 o.__dict__[k] = copy.deepcopy(v, memo)
         for c in self.child_nodes():
             o.add_child(copy.deepcopy(c, memo))
@@ -2106,12 +2292,15 @@ class Node(TaxonLinked):
         """
         stack = [self]
         while stack:
-            node = stack.pop(0)
+            node = stack.pop()
             if filter_fn is None or filter_fn(node):
                 yield node
-            child_nodes = node.child_nodes()
-            child_nodes.extend(stack)
-            stack = child_nodes
+            # children are pushed in reverse so that the first child is
+            # visited next; the stack holds references to the children as
+            # they were when their parent was visited
+            children = node._child_nodes
+            for idx in xrange(len(children)-1, -1, -1):
+                stack.append(children[idx])
 
     def postorder_iter(self, filter_fn=None):
         """
@@ -2123,27 +2312,32 @@ class Node(TaxonLinked):
         """
         stack = [(self, False)]
         while stack:
-            node, state = stack.pop(0)
+            node, state = stack.pop()
             if state:
                 if filter_fn is None or filter_fn(node):
                     yield node
             else:
-                stack.insert(0, (node, True))
-                child_nodes = [(n, False) for n in node.child_nodes()]
-                child_nodes.extend(stack)
-                stack = child_nodes
+                stack.append((node, True))
+                children = node._child_nodes
+                for idx in xrange(len(children)-1, -1, -1):
+                    stack.append((children[idx], False))
 
     def leaf_iter(self, filter_fn=None):
         """
         Returns an iterator over the leaf_nodes that are descendants of self
         (with leaves returned in same order as a post-order traversal of the tree).
         """
-        if filter_fn:
-            filter_fn = lambda x: x.is_leaf() and filter_fn(x) or None
-        else:
-            filter_fn = lambda x: x.is_leaf() and x or None
-        for node in self.postorder_iter(filter_fn):
-            yield node
+        # leaves are in the same order in a preorder traversal as in a
+        # postorder one, so internal nodes need not be revisited
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            children = node._child_nodes
+            if children:
+                for idx in xrange(len(children)-1, -1, -1):
+                    stack.append(children[idx])
+            elif filter_fn is None or filter_fn(node):
+                yield node
 
     def level_order_iter(self, filter_fn=None):
         """
@@ -2153,13 +2347,12 @@ class Node(TaxonLinked):
         """
         if filter_fn is None or filter_fn(self):
             yield self
-        remaining = self.child_nodes()
-        while len(remaining) > 0:
-            node = remaining.pop(0)
+        remaining = deque(self._child_nodes)
+        while remaining:
+            node = remaining.popleft()
             if filter_fn is None or filter_fn(node):
                 yield node
-            child_nodes = node.child_nodes()
-            remaining.extend(child_nodes)
+            remaining.extend(node._child_nodes)
 
     def ancestor_iter(self, filter_fn=None, inclusive=True):
         """
@@ -2187,17 +2380,16 @@ class Node(TaxonLinked):
             queued_pairs = []
             in_queue = set()
             for leaf in leaves:
-                age_nd_tuple = (leaf.age, leaf)
-                queued_pairs.insert(bisect.bisect(queued_pairs, age_nd_tuple), age_nd_tuple)
+                queued_pairs.append((leaf.age, leaf))
                 in_queue.add(leaf)
+            heapq.heapify(queued_pairs)
             while queued_pairs:
-                next_el = queued_pairs.pop(0)
+                next_el = heapq.heappop(queued_pairs)
                 age, nd = next_el
                 in_queue.remove(nd)
                 p = nd.parent_node
                 if p and p not in in_queue:
-                    age_nd_tuple = (p.age, p)
-                    queued_pairs.insert(bisect.bisect(queued_pairs, age_nd_tuple), age_nd_tuple)
+                    heapq.heappush(queued_pairs, (p.age, p))
                     in_queue.add(p)
                 if include_leaves or nd.is_internal():
                     yield nd
@@ -2344,8 +2536,7 @@ class Node(TaxonLinked):
         Returns list of all leaf_nodes descended from this node (or just
         list with self as the only member if self is a leaf).
         """
-        return [node for node in \
-                self.postorder_iter(lambda x: bool(len(x.child_nodes())==0))]
+        return [node for node in self.leaf_iter()]
 
     def child_nodes(self):
         "Returns the a shallow-copy list of all child nodes."
@@ -2358,11 +2549,22 @@ class Node(TaxonLinked):
 
             - sets the parent of each child node to this node
             - sets the tail node of each child to self
-        """
-        self._child_nodes = list(child_nodes)
+            - detaches any previous child nodes that are not in `child_nodes`
+              (setting their parent and tail node to None)
+        """
+        child_nodes = list(child_nodes)
+        kept = set([id(nd) for nd in child_nodes])
+        for nd in self._child_nodes:
+            if id(nd) not in kept:
+                nd._parent_node = None
+                nd.edge.tail_node = None
+        self._child_nodes = child_nodes
         for nidx in range(len(self._child_nodes)):
             self._child_nodes[nidx].parent_node = self
             self._child_nodes[nidx].edge.tail_node = self
+        # the children are replaced even if no new child is attached
+        self._note_topology_change()
+        Node.topology_edit_count += 1
 
     def set_children(self, child_nodes):
         """Legacy support: delegates to `set_child_nodes()`"""
@@ -2374,8 +2576,22 @@ class Node(TaxonLinked):
 
     def _set_parent_node(self, parent):
         """Sets the parent node of this node."""
+        if self._parent_node is not None:
+            self._parent_node._note_topology_change()
         self._parent_node = parent
         self.edge.tail_node = parent
+        if parent is not None:
+            parent._note_topology_change()
+        self._note_topology_change()
+        Node.topology_edit_count += 1
+
+    def _note_topology_change(self):
+        """
+        Invalidates the traversals and LCA index cached by the tree this node
+        was last traversed in.
+        """
+        if self._topology_version is not None:
+            self._topology_version.count += 1
 
     parent_node = property(_get_parent_node, _set_parent_node)
 
@@ -2947,6 +3163,364 @@ class Edge(IdTagged):
             output.write(s)
         return s
 
+## `Node` is defined before `Edge`, so the class of the edges it creates for
+## itself is set here
+Node.edge_factory = Edge
+
+###############################################################################
+## CompactNode and CompactEdge
+
+class _CompactElement(object):
+    """
+    Lazily-instantiated versions of the serialization and identity
+    infrastructure provided by `DataObject`, `Annotated` and `IdTagged`,
+    shared by `CompactNode` and `CompactEdge`. The `attributes`,
+    `extensions`, `comments` and annotation containers are only created
+    when first accessed, and the default `oid` is only generated when first
+    requested. Deriving classes must define the corresponding slots.
+    """
+
+    __slots__ = ()
+
+    def _init_compact_element(self, label, oid):
+        IdTagged.instances += 1
+        self.label = label
+        if oid is None:
+            self._oid = None
+        else:
+            self._oid = IdTagged.normalize_id(oid)
+        self._attributes = None
+        self._extensions = None
+        self._annotations_dict = None
+        self._comments = None
+
+    def _get_attributes(self):
+        if self._attributes is None:
+            self._attributes = []
+        return self._attributes
+
+    def _set_attributes(self, attributes):
+        self._attributes = attributes
+
+    attributes = property(_get_attributes, _set_attributes)
+
+    def _get_extensions(self):
+        if self._extensions is None:
+            self._extensions = []
+        return self._extensions
+
+    def _set_extensions(self, extensions):
+        self._extensions = extensions
+
+    extensions = property(_get_extensions, _set_extensions)
+
+    def _get_annotations_dict(self):
+        if self._annotations_dict is None:
+            self._annotations_dict = {}
+        return self._annotations_dict
+
+    def _set_annotations_dict(self, annotations_dict):
+        self._annotations_dict = annotations_dict
+
+    _annotations = property(_get_annotations_dict, _set_annotations_dict)
+
+    def _get_comments(self):
+        if self._comments is None:
+            self._comments = []
+        return self._comments
+
+    def _set_comments(self, comments):
+        self._comments = comments
+
+    comments = property(_get_comments, _set_comments)
+
+    def _get_oid(self):
+        if self._oid is None:
+            self._oid = self._default_oid()
+        return self._oid
+
+    def _set_oid(self, oid):
+        if oid is not None:
+            self._oid = IdTagged.normalize_id(oid)
+        else:
+            self._oid = None
+
+    oid = property(_get_oid, _set_oid)
+
+    def annotations(self):
+        if not self._annotations_dict:
+            return AnnotesDict()
+        return Annotated.annotations(self)
+
+    def clear_annotations(self):
+        if self._annotations_dict:
+            self._annotations_dict.clear()
+
+    def has_annotations(self):
+        return bool(self._annotations_dict)
+
+    def __getstate__(self):
+        """
+        Returns the values of the slots (and of any other attributes) as a
+        dictionary, so that instances can be pickled with any protocol.
+        """
+        state = dict(getattr(self, "__dict__", {}))
+        for cls in self.__class__.__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                try:
+                    state[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
+    def _deepcopy_compact_fields(self, o, memo, fields):
+        for k in fields:
+            try:
+                v = getattr(self, k)
+            except AttributeError:
+                continue
+            setattr(o, k, copy.deepcopy(v, memo))
+        # attributes that do not have slots of their own
+        d = getattr(self, "__dict__", None)
+        if d:
+            for k, v in d.iteritems():
+                o.__dict__[k] = copy.deepcopy(v, memo)
+
+class CompactEdge(_CompactElement, Edge):
+    """
+    A memory-efficient `Edge`, storing its core attributes in slots and
+    creating its serialization infrastructure (annotations, comments,
+    `oid`) only on demand. Other attributes can still be set on it, but
+    will cost as much as they do on an `Edge`.
+    """
+
+    __slots__ = ("label",
+                 "_oid",
+                 "_attributes",
+                 "_extensions",
+                 "_annotations_dict",
+                 "_comments",
+                 "tail_node",
+                 "head_node",
+                 "rootedge",
+                 "length",
+                 "split_bitmask")
+
+    def __init__(self, **kwargs):
+        self._init_compact_element(label=kwargs.get("label", None), oid=kwargs.get("oid", None))
+        self.tail_node = kwargs.get("tail_node", None)
+        self.head_node = kwargs.get("head_node", None)
+        self.rootedge = kwargs.get("rootedge", False)
+        self.length = kwargs.get("length", None)
+
+    def __deepcopy__(self, memo):
+        o = self.__class__()
+        memo[id(self)] = o
+        o.tail_node = copy.deepcopy(self.tail_node, memo)
+        o.head_node = copy.deepcopy(self.head_node, memo)
+        self._deepcopy_compact_fields(o, memo, ["label",
+                "length",
+                "rootedge",
+                "split_bitmask",
+                "_attributes",
+                "_extensions",
+                "_annotations_dict",
+                "_comments"])
+        return o
+
+class CompactNode(_CompactElement, Node):
+    """
+    A memory-efficient `Node` (with a `CompactEdge` subtending it), storing
+    its core attributes in slots and creating its serialization
+    infrastructure (annotations, comments, `oid`) only on demand. Trees
+    are built out of these by passing `node_factory=CompactNode` to the
+    `Tree` constructor or to any of the tree reading methods.
+    """
+
+    __slots__ = ("label",
+                 "_oid",
+                 "_attributes",
+                 "_extensions",
+                 "_annotations_dict",
+                 "_comments",
+                 "taxon",
+                 "age",
+                 "_edge",
+                 "_child_nodes",
+                 "_parent_node",
+                 "_topology_version")
+
+    edge_factory = CompactEdge
+
+    def __init__(self, **kwargs):
+        self._init_compact_element(label=kwargs.get("label", None), oid=kwargs.get("oid", None))
+        self.taxon = kwargs.get("taxon", None)
+        self.age = None
+        self._child_nodes = []
+        self._parent_node = None
+        self._topology_version = None
+        edge = kwargs.get("edge", None)
+        if edge is None:
+            edge = self.edge_factory(head_node=self)
+        self._edge = edge
+        edge.head_node = self
+
+    def __deepcopy__(self, memo):
+        o = TaxonLinked.__deepcopy__(self, memo)
+        self._deepcopy_compact_fields(o, memo, ["age",
+                "_edge",
+                "_parent_node",
+                "_attributes",
+                "_extensions",
+                "_annotations_dict",
+                "_comments"])
+        for c in self._child_nodes:
+            o.add_child(copy.deepcopy(c, memo))
+        memo[id(self._child_nodes)] = o._child_nodes
+        return o
+
+###############################################################################
+## _TopologyVersion
+
+class _TopologyVersion(object):
+    """
+    Count of the changes made to the topology of a tree, shared by the tree
+    and the nodes tagged when its traversals were last cached, so that
+    editing one tree does not invalidate what other trees have cached.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+###############################################################################
+## LcaIndex
+
+class LcaIndex(object):
+    """
+    Index of the nodes of a tree supporting constant-time queries of the most
+    recent common ancestor (MRCA) of pairs of nodes, built by
+    `Tree.build_lca_index()`.
+
+    Nodes are numbered in preorder, so that the MRCA of two distinct nodes
+    `a` and `b`, with `a` visited before `b`, is the parent of the shallowest
+    node visited after `a` up to and including `b` in the traversal. The
+    shallowest node in any such range is found with two lookups in a sparse
+    table of range minima. The MRCA of any number of nodes is the MRCA of the
+    first and last of them in preorder.
+
+    The index reflects the tree at the time it was built: it is no longer
+    `is_current()` once nodes of the tree have been added, removed or
+    reordered, or the tree has been re-seeded. Reassigning taxa of nodes is not tracked.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.seed_node = tree.seed_node
+        self.nodes = tree.preorder_node_list()
+        self.topology_version = tree._get_topology_version()
+        self.topology_edit_count = self.topology_version.count
+        self._preorder_index = {}
+        self._leaf_nodes = {}
+        depths = [0] * len(self.nodes)
+        for idx, nd in enumerate(self.nodes):
+            self._preorder_index[nd] = idx
+            if nd._parent_node is not None and idx > 0:
+                depths[idx] = depths[self._preorder_index[nd._parent_node]] + 1
+            if nd.taxon is not None and not nd._child_nodes:
+                self._leaf_nodes[nd.taxon] = nd
+        self._depths = depths
+        level = range(len(self.nodes))
+        self._sparse_table = [level]
+        width = 1
+        while 2 * width <= len(self.nodes):
+            prev = level
+            level = []
+            for idx in xrange(len(self.nodes) - 2 * width + 1):
+                a = prev[idx]
+                b = prev[idx + width]
+                if depths[b] < depths[a]:
+                    level.append(b)
+                else:
+                    level.append(a)
+            self._sparse_table.append(level)
+            width *= 2
+
+    def is_current(self):
+        """
+        Returns True if the topology of the tree has not changed since the
+        index was built.
+        """
+        return self.topology_version is getattr(self.tree, "_topology_version", None) \
+                and self.topology_edit_count == self.topology_version.count \
+                and self.seed_node is self.tree.seed_node
+
+    def leaf_node(self, taxon):
+        """
+        Returns the leaf node associated with `taxon`, or None if there is
+        no such node.
+        """
+        return self._leaf_nodes.get(taxon, None)
+
+    def mrca(self, node1, node2):
+        """
+        Returns the most recent common ancestor of `node1` and `node2`.
+        """
+        if node1 is node2:
+            return node1
+        idx1 = self._preorder_index[node1]
+        idx2 = self._preorder_index[node2]
+        if idx1 > idx2:
+            idx1, idx2 = idx2, idx1
+        return self._range_mrca(idx1, idx2)
+
+    def _range_mrca(self, idx1, idx2):
+        # MRCA of nodes with preorder indices idx1 < idx2: the parent of the
+        # shallowest node in (idx1, idx2]
+        lo = idx1 + 1
+        k = (idx2 - lo + 1).bit_length() - 1
+        a = self._sparse_table[k][lo]
+        b = self._sparse_table[k][idx2 - (1 << k) + 1]
+        if self._depths[b] < self._depths[a]:
+            a = b
+        return self.nodes[a]._parent_node
+
+    def nodes_mrca(self, nodes):
+        """
+        Returns the most recent common ancestor of all nodes in `nodes`.
+        """
+        preorder_index = self._preorder_index
+        first = None
+        last = None
+        for nd in nodes:
+            idx = preorder_index[nd]
+            if first is None or idx < first:
+                first = idx
+            if last is None or idx > last:
+                last = idx
+        if first is None:
+            raise ValueError("No nodes given")
+        if first == last:
+            return self.nodes[first]
+        return self._range_mrca(first, last)
+
+    def taxa_mrca(self, taxa):
+        """
+        Returns the most recent common ancestor of the leaf nodes associated
+        with `taxa`. Raises KeyError if any of the taxa is not associated with
+        a leaf node.
+        """
+        nodes = []
+        for taxon in taxa:
+            try:
+                nodes.append(self._leaf_nodes[taxon])
+            except KeyError:
+                raise KeyError("Taxon not found on tree: %s" % taxon)
+        return self.nodes_mrca(nodes)
+
 ###############################################################################
 ## AsciiTreePlot
 
@@ -21,6 +21,7 @@ Population genetic statistics.
 """
 
 import math
+from itertools import izip
 import dendropy
 from dendropy.utility import probability
 
@@ -28,7 +29,32 @@ from dendropy.utility import probability
 ## internal functions: generally taking lower-level data, such as vectors etc.
 ###############################################################################
 
-def _count_differences(char_vectors, state_alphabet, ignore_uncertain=True):
+def _site_pattern_data(site_patterns):
+    """
+    Returns a tuple of three values: the states of each sequence in each
+    pattern of the `SitePatterns` object `site_patterns` (as a list of
+    tuples of state indices), the weights of the patterns, and a list of
+    flags indicating whether each state of its alphabet is uncertain (i.e., a
+    gap or an ambiguous or polymorphic state).
+    """
+    if site_patterns.patterns:
+        pattern_rows = zip(*site_patterns.patterns)
+    else:
+        pattern_rows = [()] * len(site_patterns.taxa)
+    gap = getattr(site_patterns.state_alphabet, "gap", None)
+    uncertain = [(state is gap or len(state.fundamental_ids) != 1) for state in site_patterns.state_alphabet]
+    return pattern_rows, site_patterns.weights, uncertain
+
+def _vector_site_patterns(char_vectors, state_alphabet):
+    """
+    Returns a `SitePatterns` object for the list of character vectors,
+    `char_vectors`.
+    """
+    site_patterns = dendropy.SitePatterns(taxa=[v.taxon for v in char_vectors], state_alphabet=state_alphabet)
+    site_patterns.add_sequences(char_vectors)
+    return site_patterns
+
+def _count_differences(pattern_rows, weights, uncertain, ignore_uncertain=True):
     """
     Returns pair of values: total number of pairwise differences observed between
     all sequences, and mean number of pairwise differences pair base.
@@ -38,38 +64,31 @@ def _count_differences(char_vectors, state_alphabet, ignore_uncertain=True):
     sq_diff = 0.0
     total_counted = 0
     comps = 0
-    for vidx, i in enumerate(char_vectors[:-1]):
-        for j in char_vectors[vidx+1:]:
-            if len(i) != len(j):
-                raise Exception("sequences of unequal length")
+    for vidx, i in enumerate(pattern_rows[:-1]):
+        for j in pattern_rows[vidx+1:]:
             diff = 0
             counted = 0
             comps += 1
-            for cidx, c in enumerate(i):
-                c1 = c
-                c2 = j[cidx]
+            for c1, c2, wt in izip(i, j, weights):
                 if (not ignore_uncertain) \
-                    or (c1.value is not state_alphabet.gap \
-                        and c2.value is not state_alphabet.gap \
-                        and len(c1.value.fundamental_ids) == 1 \
-                        and len(c2.value.fundamental_ids) == 1):
-                    counted += 1
-                    total_counted += 1
-                    if c1.value is not c2.value:
-                        diff += 1
+                    or (not uncertain[c1] and not uncertain[c2]):
+                    counted += wt
+                    total_counted += wt
+                    if c1 != c2:
+                        diff += wt
             sum_diff += float(diff)
             mean_diff += float(diff) / counted
             sq_diff += (diff ** 2)
     return sum_diff, mean_diff / comps, sq_diff
 
-def _nucleotide_diversity(char_vectors, state_alphabet, ignore_uncertain=True):
+def _nucleotide_diversity(pattern_rows, weights, uncertain, ignore_uncertain=True):
     """
     Returns $\pi$, the proportional nucleotide diversity, calculated for a
-    list of character vectors.
+    list of (pattern) sequences.
     """
-    return _count_differences(char_vectors, state_alphabet, ignore_uncertain)[1]
+    return _count_differences(pattern_rows, weights, uncertain, ignore_uncertain)[1]
 
-def _average_number_of_pairwise_differences(char_vectors, state_alphabet, ignore_uncertain=True):
+def _average_number_of_pairwise_differences(pattern_rows, weights, uncertain, ignore_uncertain=True):
     """
     Returns $k$ (Tajima 1983; Wakely 1996), calculated for a set of sequences:
 
@@ -79,24 +98,21 @@ def _average_number_of_pairwise_differences(char_vectors, state_alphabet, ignore
     $i$th and $j$th sequence, and $n$ is the number of DNA sequences
     sampled.
     """
-    sum_diff, mean_diff, sq_diff = _count_differences(char_vectors, state_alphabet, ignore_uncertain)
-    return sum_diff / probability.binomial_coefficient(len(char_vectors), 2)
+    sum_diff, mean_diff, sq_diff = _count_differences(pattern_rows, weights, uncertain, ignore_uncertain)
+    return sum_diff / probability.binomial_coefficient(len(pattern_rows), 2)
 
-def _num_segregating_sites(char_vectors, state_alphabet, ignore_uncertain=True):
+def _num_segregating_sites(pattern_rows, weights, uncertain, ignore_uncertain=True):
     """
     Returns the raw number of segregating sites (polymorphic sites).
     """
     s = 0
-    for i, c1 in enumerate(char_vectors[0]):
-        for v in char_vectors[1:]:
+    for i, c1 in enumerate(pattern_rows[0]):
+        for v in pattern_rows[1:]:
             c2 = v[i]
             if c1 != c2 \
                 and ((not ignore_uncertain) \
-                    or (c1.value is not state_alphabet.gap \
-                        and c2.value is not state_alphabet.gap \
-                        and len(c1.value.fundamental_ids) == 1 \
-                        and len(c2.value.fundamental_ids) == 1)):
-                s += 1
+                    or (not uncertain[c1] and not uncertain[c2])):
+                s += weights[i]
                 break
     return s
 
@@ -136,41 +152,51 @@ def _tajimas_d(num_sequences, avg_num_pairwise_differences, num_segregating_site
 ## friendlier-functions, generally taking a CharacterMatrix
 ###############################################################################
 
+def _char_matrix_site_pattern_data(char_matrix):
+    if isinstance(char_matrix, dendropy.SitePatterns):
+        return _site_pattern_data(char_matrix)
+    return _site_pattern_data(dendropy.SitePatterns(char_matrix))
+
 def num_segregating_sites(char_matrix, ignore_uncertain=True):
     """
     Returns the raw number of segregating sites (polymorphic sites).
+    `char_matrix` may also be a `SitePatterns` object (as may that of the
+    functions below).
     """
-    return _num_segregating_sites(char_matrix.vectors(), char_matrix.default_state_alphabet, ignore_uncertain)
+    pattern_rows, weights, uncertain = _char_matrix_site_pattern_data(char_matrix)
+    return _num_segregating_sites(pattern_rows, weights, uncertain, ignore_uncertain)
 
 def average_number_of_pairwise_differences(char_matrix, ignore_uncertain=True):
     """
     Returns $k$, calculated for a character block.
     """
-    return _average_number_of_pairwise_differences(char_matrix.vectors(), char_matrix.default_state_alphabet, ignore_uncertain)
+    pattern_rows, weights, uncertain = _char_matrix_site_pattern_data(char_matrix)
+    return _average_number_of_pairwise_differences(pattern_rows, weights, uncertain, ignore_uncertain)
 
 def nucleotide_diversity(char_matrix, ignore_uncertain=True):
     """
     Returns $\pi$, calculated for a character block.
     """
-    return _nucleotide_diversity(char_matrix.vectors(), char_matrix.default_state_alphabet, ignore_uncertain)
+    pattern_rows, weights, uncertain = _char_matrix_site_pattern_data(char_matrix)
+    return _nucleotide_diversity(pattern_rows, weights, uncertain, ignore_uncertain)
 
 def tajimas_d(char_matrix, ignore_uncertain=True):
     """
     Returns Tajima's D.
     """
-    vectors = char_matrix.vectors()
-    num_sequences = len(vectors)
-    avg_num_pairwise_differences = _average_number_of_pairwise_differences(vectors, char_matrix.default_state_alphabet, ignore_uncertain=ignore_uncertain)
-    num_segregating_sites = _num_segregating_sites(vectors, char_matrix.default_state_alphabet, ignore_uncertain=ignore_uncertain)
+    pattern_rows, weights, uncertain = _char_matrix_site_pattern_data(char_matrix)
+    num_sequences = len(pattern_rows)
+    avg_num_pairwise_differences = _average_number_of_pairwise_differences(pattern_rows, weights, uncertain, ignore_uncertain=ignore_uncertain)
+    num_segregating_sites = _num_segregating_sites(pattern_rows, weights, uncertain, ignore_uncertain=ignore_uncertain)
     return _tajimas_d(num_sequences, avg_num_pairwise_differences, num_segregating_sites)
 
 def wattersons_theta(char_matrix, ignore_uncertain=True):
     """
     Returns Watterson's Theta (per sequence)
     """
-    vectors = char_matrix.vectors()
-    num_segregating_sites = _num_segregating_sites(vectors, char_matrix.default_state_alphabet, ignore_uncertain=ignore_uncertain)
-    a1 = sum([1.0/i for i in range(1, len(vectors))])
+    pattern_rows, weights, uncertain = _char_matrix_site_pattern_data(char_matrix)
+    num_segregating_sites = _num_segregating_sites(pattern_rows, weights, uncertain, ignore_uncertain=ignore_uncertain)
+    a1 = sum([1.0/i for i in range(1, len(pattern_rows))])
     return float(num_segregating_sites) / a1
 
 ###############################################################################
@@ -201,8 +227,11 @@ class PopulationPairSummaryStatistics(object):
         Returns a summary of a set of sequences that can be partitioned into
         the list of lists of taxa given by `taxon_groups`.
         """
-        diffs_x, mean_diffs_x, sq_diff_x = _count_differences(self.pop1_seqs, self.state_alphabet, self.ignore_uncertain)
-        diffs_y, mean_diffs_y, sq_diff_y = _count_differences(self.pop2_seqs, self.state_alphabet, self.ignore_uncertain)
+        pattern_rows, self._weights, self._uncertain = _site_pattern_data(_vector_site_patterns(self.combined_seqs, self.state_alphabet))
+        self._pop1_pattern_rows = pattern_rows[:len(self.pop1_seqs)]
+        self._pop2_pattern_rows = pattern_rows[len(self.pop1_seqs):]
+        diffs_x, mean_diffs_x, sq_diff_x = _count_differences(self._pop1_pattern_rows, self._weights, self._uncertain, self.ignore_uncertain)
+        diffs_y, mean_diffs_y, sq_diff_y = _count_differences(self._pop2_pattern_rows, self._weights, self._uncertain, self.ignore_uncertain)
         d_x = diffs_x / probability.binomial_coefficient(len(self.pop1_seqs), 2)
         d_y = diffs_y / probability.binomial_coefficient(len(self.pop2_seqs), 2)
         d_xy = self._average_number_of_pairwise_differences_between_populations()
@@ -215,7 +244,7 @@ class PopulationPairSummaryStatistics(object):
         a = float(n * (n-1))
         ax = float(n_x * (n_x - 1))
         ay = float(n_y * (n_y - 1))
-        k = _average_number_of_pairwise_differences(self.combined_seqs, self.state_alphabet, self.ignore_uncertain)
+        k = _average_number_of_pairwise_differences(pattern_rows, self._weights, self._uncertain, self.ignore_uncertain)
         n = len(self.combined_seqs)
 
         # Hickerson 2006: pi #
@@ -231,7 +260,7 @@ class PopulationPairSummaryStatistics(object):
         self.average_number_of_pairwise_differences_net = d_xy - (d_x + d_y)
 
         # Hickerson 2006: S #
-        self.num_segregating_sites = _num_segregating_sites(self.combined_seqs, self.state_alphabet, self.ignore_uncertain)
+        self.num_segregating_sites = _num_segregating_sites(pattern_rows, self._weights, self._uncertain, self.ignore_uncertain)
 
         # Hickerson 2006: theta #
         a1 = sum([1.0/i for i in range(1, n)])
@@ -252,18 +281,14 @@ class PopulationPairSummaryStatistics(object):
         369-386.
         """
         diffs = 0
-        for sx in self.pop1_seqs:
-            for sy in self.pop2_seqs:
-                for cidx, c in enumerate(sx):
-                    c1 = c
-                    c2 = sy[cidx]
+        uncertain = self._uncertain
+        for sx in self._pop1_pattern_rows:
+            for sy in self._pop2_pattern_rows:
+                for c1, c2, wt in izip(sx, sy, self._weights):
                     if (not self.ignore_uncertain) \
-                        or (c1.value is not self.state_alphabet.gap \
-                            and c2.value is not self.state_alphabet.gap \
-                            and len(c1.value.fundamental_ids) == 1 \
-                            and len(c2.value.fundamental_ids) == 1):
-                        if c1.value is not c2.value:
-                            diffs += 1
+                        or (not uncertain[c1] and not uncertain[c2]):
+                        if c1 != c2:
+                            diffs += wt
         dxy = float(1)/(len(self.pop1_seqs) * len(self.pop2_seqs)) * float(diffs)
         return dxy
 
@@ -276,19 +301,15 @@ class PopulationPairSummaryStatistics(object):
         369-386.
         """
         ss_diffs = 0
-        for sx in self.pop1_seqs:
-            for sy in self.pop2_seqs:
+        uncertain = self._uncertain
+        for sx in self._pop1_pattern_rows:
+            for sy in self._pop2_pattern_rows:
                 diffs = 0
-                for cidx, c in enumerate(sx):
-                    c1 = c
-                    c2 = sy[cidx]
+                for c1, c2, wt in izip(sx, sy, self._weights):
                     if (not self.ignore_uncertain) \
-                        or (c1.value is not self.state_alphabet.gap \
-                            and c2.value is not self.state_alphabet.gap \
-                            and len(c1.value.fundamental_ids) == 1 \
-                            and len(c2.value.fundamental_ids) == 1):
-                        if c1.value is not c2.value:
-                            diffs += 1
+                        or (not uncertain[c1] and not uncertain[c2]):
+                        if c1 != c2:
+                            diffs += wt
                 ss_diffs += (float(diffs - mean_diff) ** 2)
         return float(ss_diffs)/(len(self.pop1_seqs)*len(self.pop2_seqs))
 
@@ -627,24 +627,22 @@ def reconciliation_discordance(gene_tree, species_tree):
             encode_splits was called, is_rooted must have been set to True)
 
     """
-    taxa_mask = species_tree.taxon_set.all_taxa_bitmask()
-
     species_node_gene_nodes = {}
     gene_node_species_nodes = {}
 
+    # the species tree LCA index is kept on the tree, so it is only built
+    # once when reconciling many gene trees against the same species tree
+    lca_index = species_tree.build_lca_index()
     for gnd in gene_tree.postorder_node_iter():
         gn_children = gnd.child_nodes()
         if len(gn_children) > 0:
-            ssplit = 0
-            for gn_child in gn_children:
-                ssplit = ssplit | gene_node_species_nodes[gn_child].edge.split_bitmask
-            sanc = species_tree.mrca(start_node=species_tree.seed_node, split_bitmask=ssplit)
+            sanc = lca_index.nodes_mrca([gene_node_species_nodes[gn_child] for gn_child in gn_children])
             gene_node_species_nodes[gnd] = sanc
             if sanc not in species_node_gene_nodes:
                 species_node_gene_nodes[sanc] = []
             species_node_gene_nodes[sanc].append(gnd)
         else:
-            gene_node_species_nodes[gnd] = species_tree.find_node(lambda x : x.taxon == gnd.taxon)
+            gene_node_species_nodes[gnd] = lca_index.leaf_node(gnd.taxon)
 
     contained_gene_lineages = {}
     for snd in species_tree.postorder_node_iter():
@@ -43,6 +43,26 @@ class TestFasta(datatest.DataObjectVerificationTestCase):
         expected = ['a Bad name', 'another', 'a Badn,ame', 'a  nothe++-_=+r', 'an!@#$o^&*()}{_ther']
         self.assertEquals(label, expected)
 
+    def testCompactReading(self):
+        src = ">a\nACGT-N\nacgt\n\n>b\nRYACG TAC\nAC\n"
+        dna1 = dendropy.DnaCharacterMatrix.get_from_string(src, 'fasta')
+        dna2 = dendropy.DnaCharacterMatrix.get_from_string(src, 'fasta', row_type='compact')
+        for taxon in dna2:
+            vec = dna2[taxon]
+            self.assertTrue(isinstance(vec, dendropy.CompactCharacterDataVector))
+            self.assertTrue(vec.is_compact())
+            self.assertEqual(len(vec), 10)
+            self.assertEqual(vec.symbols_as_string(), dna1[taxon.label].symbols_as_string())
+            self.assertEqual(vec.values(), dna1[taxon.label].values())
+        self.assertTrue(dna2.clone_from(dna2)[0].is_compact())
+        self.assertDistinctButEqual(dna1, dna2)
+        self.assertFalse(dna2[0].is_compact())
+        self.assertRaises(dendropy.utility.error.DataParseError,
+                dendropy.DnaCharacterMatrix.get_from_string,
+                ">a\nACGT\nAC*T\n",
+                'fasta',
+                row_type='compact')
+
     def testReadingAndWritingDataSet(self):
         ds1 = dendropy.DataSet(datagen.reference_dna_matrix())
         dataset = self.roundTripDataSetTest(ds1, "fasta", reader_kwargs={'data_type': 'dna'})
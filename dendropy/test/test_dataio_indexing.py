@@ -20,8 +20,19 @@
 Tests of data indexing.
 """
 
+import os
+import random
+import shutil
+import threading
+import time
 import unittest
+from cStringIO import StringIO
 import dendropy
+from dendropy.dataio import ioclient
+from dendropy.dataio import treeindex
+from dendropy.test.support import pathmap
+from dendropy.utility import fileutils
+from dendropy.utility.error import DataParseError
 
 class IndexingTestCase(unittest.TestCase):
 
@@ -109,5 +120,269 @@ class TestTreeListIndexing(IndexingTestCase):
     def testCollectionTreeOutOfRange(self):
         self.assertRaises(IndexError, dendropy.TreeList.get_from_string, self.trees1, "nexus", collection_offset=2, tree_offset=4)
 
+class TestTreeIndex(IndexingTestCase):
+
+    def testNexusIndex(self):
+        index = treeindex.build_tree_index(StringIO(self.trees1))
+        self.assertEqual(index.schema, "nexus")
+        self.assertEqual(len(index), 12)
+        self.assertEqual(index.tree_labels[7], "2 1")
+        self.assertEqual(index.tree_blocks, [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3])
+
+    def testShardsDoNotSpanBlocks(self):
+        index = treeindex.build_tree_index(StringIO(self.trees1))
+        shards = index.shards(2, start=1)
+        self.assertEqual(shards[0][0], 1)
+        self.assertEqual(shards[-1][1], 12)
+        for start, stop in shards:
+            self.assertEqual(len(set(index.tree_blocks[start:stop])), 1)
+        for (start1, stop1), (start2, stop2) in zip(shards[:-1], shards[1:]):
+            self.assertEqual(stop1, start2)
+
+    def testNexusShardedRead(self):
+        src = StringIO(self.trees1)
+        index = treeindex.build_tree_index(src)
+        expected = [t.label for t in dendropy.TreeList.get_from_string(self.trees1, "nexus")]
+        observed = []
+        for start, stop in index.shards(5):
+            for tree in index.tree_source_iter(src, start, stop):
+                observed.append(tree.label)
+        self.assertEqual(observed, expected)
+
+    def check_file(self, filename, schema, num_shards=3):
+        path = pathmap.tree_source_path(filename)
+        src = open(path, "rb")
+        index = treeindex.build_tree_index(src, schema=schema)
+        taxa1 = dendropy.TaxonSet()
+        expected = dendropy.TreeList.get_from_path(path, schema, taxon_set=taxa1)
+        self.assertEqual(len(index), len(expected))
+        taxa2 = dendropy.TaxonSet()
+        observed = []
+        for start, stop in index.shards(num_shards):
+            observed.extend(index.tree_source_iter(src, start, stop, taxon_set=taxa2))
+        src.close()
+        self.assertEqual([t.label for t in taxa1], [t.label for t in taxa2])
+        self.assertEqual(len(observed), len(expected))
+        for t1, t2 in zip(expected, observed):
+            self.assertEqual(t1.label, t2.label)
+            self.assertEqual(t1.as_newick_string(), t2.as_newick_string())
+
+    def testNexusFile(self):
+        self.check_file("pythonidae.reference-trees.nexus", "nexus")
+
+    def testNewickFile(self):
+        self.check_file("pythonidae.reference-trees.newick", "newick")
+
+class TestTreeSlicing(IndexingTestCase):
+
+    def testSliceFromString(self):
+        t = dendropy.TreeList.get_from_string(self.trees1, "nexus", tree_slice=slice(2, 9, 3))
+        self.assertEqual([tree.label for tree in t], ['0 2', '1 2', '2 2'])
+
+    def testNegativeIndexFromString(self):
+        t = dendropy.TreeList.get_from_string(self.trees1, "nexus", tree_slice=-1)
+        self.assertEqual([tree.label for tree in t], ['3 2'])
+
+    def testCollectionSlice(self):
+        t = dendropy.TreeList.get_from_string(self.trees1, "nexus", collection_offset=2, tree_slice=slice(1, None))
+        self.assertEqual([tree.label for tree in t], ['2 1', '2 2'])
+
+    def testSliceOutOfRange(self):
+        self.assertRaises(IndexError, dendropy.TreeList.get_from_string, self.trees1, "nexus", tree_slice=12)
+        self.assertRaises(IndexError, dendropy.TreeList.get_from_string, self.trees1, "nexus", collection_offset=4, tree_slice=0)
+
+    def testTreeSourceIterSlice(self):
+        src = open(pathmap.tree_source_path("pythonidae.mb.run1.t"), "rU")
+        expected = [t.label for t in dendropy.tree_source_iter(src, "nexus")][50::10]
+        src = open(pathmap.tree_source_path("pythonidae.mb.run1.t"), "rU")
+        observed = [t.label for t in dendropy.tree_source_iter(src, "nexus", tree_slice=slice(50, None, 10), use_index_file=False)]
+        self.assertEqual(observed, expected)
+
+    def testSidecarIndexFile(self):
+        path = pathmap.named_output_path("indexing.trees.nex")
+        shutil.copy(pathmap.tree_source_path("pythonidae.reference-trees.nexus"), path)
+        idx_path = treeindex.index_filepath(path)
+        if os.path.exists(idx_path):
+            os.remove(idx_path)
+        index1 = treeindex.get_tree_index(path)
+        self.assertTrue(os.path.exists(idx_path))
+        index2 = treeindex.get_tree_index(path)
+        self.assertEqual(index2.tree_offsets, index1.tree_offsets)
+        self.assertEqual(index2.tree_labels, index1.tree_labels)
+        self.assertEqual(index2.source_signature, treeindex.source_signature(path))
+        # stale index is rebuilt
+        open(path, "a").write("\n")
+        index3 = treeindex.get_tree_index(path)
+        self.assertEqual(index3.source_signature, treeindex.source_signature(path))
+        t = dendropy.TreeList.get_from_path(path, "nexus", tree_slice=slice(-2, None))
+        self.assertEqual([tree.label for tree in t], index1.tree_labels[-2:])
+        os.remove(idx_path)
+        os.remove(path)
+
+    def testInvalidSidecarIndexFile(self):
+        path = pathmap.named_output_path("indexing.invalid.trees.nex")
+        shutil.copy(pathmap.tree_source_path("pythonidae.reference-trees.nexus"), path)
+        idx_path = treeindex.index_filepath(path)
+        expected = treeindex.get_tree_index(path)
+        valid_index = open(idx_path, "rb").read()
+        for contents in ["cos\nsystem\n(S'exit 1'\ntR.",
+                "{}",
+                valid_index.replace('"tree_offsets": [', '"tree_offsets": ["x", '),
+                valid_index.replace('"version": 2', '"version": 1'),
+                valid_index[:len(valid_index)//2]]:
+            f = open(idx_path, "wb")
+            f.write(contents)
+            f.close()
+            self.assertRaises(ValueError, treeindex.TreeIndex.load, StringIO(contents))
+            index = treeindex.get_tree_index(path)
+            self.assertEqual(index.tree_offsets, expected.tree_offsets)
+            self.assertEqual(index.tree_labels, expected.tree_labels)
+        self.assertEqual(open(idx_path, "rb").read(), valid_index)
+        os.remove(idx_path)
+        os.remove(path)
+
+    def testIndexSaveAndLoad(self):
+        src = StringIO(self.trees1.replace("TREES1;", "TREES1;\n    TRANSLATE A 'a\xe9', B b;"))
+        index1 = treeindex.build_tree_index(src)
+        dest = StringIO()
+        index1.save(dest)
+        index2 = treeindex.TreeIndex.load(StringIO(dest.getvalue()))
+        for attr in ["schema", "tree_offsets", "tree_labels", "tree_blocks",
+                "translate_tables", "taxon_labels", "preserve_underscores", "source_signature"]:
+            self.assertEqual(getattr(index2, attr), getattr(index1, attr))
+        self.assertEqual(index2.translate_tables[0][0], ("A", "a\xe9"))
+        self.assertTrue(isinstance(index2.tree_labels[0], str))
+
+class TestTreeThinningAndSampling(unittest.TestCase):
+
+    def setUp(self):
+        self.sources = [("pythonidae.mb.run1.t", "nexus"),
+                ("pythonidae.reference-trees.newick", "newick"),
+                ("pythonidae.reference-trees.nexus", "nexus/newick")]
+
+    def get_trees(self, filename, schema, **kwargs):
+        src = open(pathmap.tree_source_path(filename), "rU")
+        return [t.as_newick_string() for t in dendropy.tree_source_iter(src, schema, use_index_file=False, **kwargs)]
+
+    def testThin(self):
+        for filename, schema in self.sources:
+            expected = self.get_trees(filename, schema)
+            self.assertEqual(self.get_trees(filename, schema, thin=3), expected[::3])
+            self.assertEqual(self.get_trees(filename, schema, tree_offset=2, thin=4), expected[2::4])
+
+    def testSample(self):
+        for filename, schema in self.sources:
+            expected = self.get_trees(filename, schema)
+            sample = self.get_trees(filename, schema, tree_offset=1, sample_size=5, rng=random.Random(1))
+            self.assertEqual(len(sample), 5)
+            # sampled trees are returned in the order found in the source
+            pos = 1
+            for t in sample:
+                pos = expected.index(t, pos) + 1
+            self.assertEqual(self.get_trees(filename, schema, sample_size=len(expected)+1), expected)
+
+    def testSampleIsReproducible(self):
+        s1 = self.get_trees("pythonidae.mb.run1.t", "nexus", thin=2, sample_size=10, rng=random.Random(7))
+        s2 = self.get_trees("pythonidae.mb.run1.t", "nexus", thin=2, sample_size=10, rng=random.Random(7))
+        self.assertEqual(s1, s2)
+
+    def testSampleUniformity(self):
+        rng = random.Random(0)
+        counts = [0] * 10
+        for rep in range(3000):
+            selector = dendropy.dataio.ioclient.TreeSelector(sample_size=3, rng=rng)
+            for idx in range(10):
+                slot = selector.select(idx)
+                if slot is not None:
+                    selector.store(slot, idx, idx)
+            sampled = selector.sampled_trees()
+            self.assertEqual(sampled, sorted(sampled))
+            for idx in sampled:
+                counts[idx] += 1
+        for count in counts:
+            self.assertTrue(800 < count < 1000)
+
+    def testMultiSourceSample(self):
+        paths = [pathmap.tree_source_path("pythonidae.reference-trees.newick")] * 2
+        trees = list(dendropy.multi_tree_source_iter(paths, "newick",
+                taxon_set=dendropy.TaxonSet(),
+                sample_size=15,
+                rng=random.Random(3)))
+        self.assertEqual(len(trees), 15)
+
+    def testOffsetOutOfRange(self):
+        self.assertRaises(KeyError, self.get_trees, "pythonidae.reference-trees.newick", "newick", tree_offset=20, thin=2)
+
+    def testSampleWithSidecarIndexFile(self):
+        path = pathmap.named_output_path("sampling.trees.nex")
+        shutil.copy(pathmap.tree_source_path("pythonidae.mb.run1.t"), path)
+        expected = [t.label for t in dendropy.tree_source_iter(open(path, "rU"), "nexus",
+                tree_offset=3, thin=2, sample_size=5, rng=random.Random(1), use_index_file=False)]
+        treeindex.get_tree_index(path)
+        observed = [t.label for t in dendropy.tree_source_iter(open(path, "rU"), "nexus",
+                tree_offset=3, thin=2, sample_size=5, rng=random.Random(1))]
+        self.assertEqual(observed, expected)
+        os.remove(treeindex.index_filepath(path))
+        os.remove(path)
+
+class TestTreeFollowing(unittest.TestCase):
+
+    def setUp(self):
+        self.data = open(pathmap.tree_source_path("pythonidae.mb.run1.t"), "rU").read()
+        self.expected = [t.as_newick_string() for t in dendropy.tree_source_iter(StringIO(self.data),
+                "nexus",
+                use_index_file=False)]
+        self.path = pathmap.named_output_path("following.trees.nex")
+        self.dest = open(self.path, "w")
+
+    def tearDown(self):
+        self.dest.close()
+        os.remove(self.path)
+
+    def write_data(self, chunk_size=3000, close=True):
+        for i in range(0, len(self.data), chunk_size):
+            self.dest.write(self.data[i:i+chunk_size])
+            self.dest.flush()
+            time.sleep(0.01)
+        if close:
+            self.dest.close()
+
+    def testFollowGrowingFile(self):
+        writer = threading.Thread(target=self.write_data)
+        writer.start()
+        trees = [t.as_newick_string() for t in dendropy.tree_source_iter(open(self.path, "rU"),
+                "nexus",
+                follow=True,
+                follow_timeout=2)]
+        writer.join()
+        self.assertEqual(trees, self.expected)
+
+    def testFollowStopsWhenIdle(self):
+        # reading stops at the end of the data already written, without
+        # waiting for the file to be completed
+        self.dest.write(self.data[:len(self.data) // 2])
+        self.dest.flush()
+        src = open(self.path, "rU")
+        trees = list(dendropy.tree_source_iter(src,
+                "nexus",
+                as_split_records=True,
+                follow=True,
+                follow_idle_func=lambda: False))
+        self.assertTrue(0 < len(trees) < len(self.expected))
+        self.assertRaises(TypeError, list, dendropy.tree_source_iter(src, "nexus", follow=True, sample_size=5))
+        src.close()
+
+    def testOnlyParseErrorsEndFollowing(self):
+        def trees(error):
+            yield 0
+            raise error
+        stream = fileutils.FollowingStream(StringIO(""), timeout=0)
+        self.assertRaises(DataParseError, list,
+                ioclient._followed_tree_iter(trees(DataParseError(message="partial tree")), stream))
+        self.assertEqual(stream.read(), "")
+        self.assertTrue(stream.ended)
+        self.assertEqual(list(ioclient._followed_tree_iter(trees(DataParseError(message="partial tree")), stream)), [0])
+        self.assertRaises(ValueError, list, ioclient._followed_tree_iter(trees(ValueError()), stream))
+
 if __name__ == "__main__":
     unittest.main()
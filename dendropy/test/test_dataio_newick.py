@@ -183,6 +183,69 @@ T4:4.4e+8)'this is an internal node called "i2"':4.0e+1)i3:4.0E-4,
                 label = nd.label
             self.assertAlmostEquals(nd.edge.length, expected[label])
 
+class NewickFastPathParsing(datatest.DataObjectVerificationTestCase):
+
+    def compare_parse(self, s, **kwargs):
+        results = []
+        for buffered_tokenizer in (False, True):
+            finished = []
+            kwargs["finish_node_func"] = lambda nd, tree: finished.append(nd.taxon or nd.label)
+            taxon_set = dendropy.TaxonSet(["A", "B", "C", "D", "E"])
+            trees = dendropy.TreeList.get_from_string(s,
+                    "newick",
+                    taxon_set=taxon_set,
+                    buffered_tokenizer=buffered_tokenizer,
+                    **kwargs)
+            results.append((trees, finished))
+        (t1, f1), (t2, f2) = results
+        self.assertEqual(len(t1), len(t2))
+        self.assertEqual([t.label for t in t1.taxon_set], [t.label for t in t2.taxon_set])
+        self.assertEqual([str(t) for t in f1], [str(t) for t in f2])
+        for a, b in zip(t1, t2):
+            self.assertEqual(a.as_newick_string(), b.as_newick_string())
+            self.assertEqual(a.is_rooted, b.is_rooted)
+            nodes1 = [nd for nd in a.postorder_node_iter()]
+            nodes2 = [nd for nd in b.postorder_node_iter()]
+            self.assertEqual(len(nodes1), len(nodes2))
+            for nd1, nd2 in zip(nodes1, nodes2):
+                self.assertEqual(nd1.edge.length, nd2.edge.length)
+                self.assertEqual(nd1.label, nd2.label)
+                self.assertEqual(str(nd1.taxon), str(nd2.taxon))
+                self.assertTrue(nd2.parent_node is None or nd2 in nd2.parent_node.child_nodes())
+                self.assertTrue(nd2.edge.head_node is nd2)
+                self.assertTrue(nd2.edge.tail_node is nd2.parent_node)
+                if kwargs.get("encode_splits", False):
+                    self.assertEqual(nd1.edge.split_bitmask, nd2.edge.split_bitmask)
+            if kwargs.get("encode_splits", False):
+                self.assertEqual(sorted(a.split_edges.keys()), sorted(b.split_edges.keys()))
+                for split, edge in b.split_edges.items():
+                    self.assertTrue(edge.head_node in nodes2)
+
+    def testPlainTrees(self):
+        s = """[&R] ((A:1.1,B:2.2e-1)i1:0.5,(C:1,D_x:-1)0.95:1e-3,E)root:7.0;
+            [&U] (A,(B,(C,(D,E))));
+            (A:1,B:2,(C:3,(D:4,E:5)):6):0;"""
+        self.compare_parse(s)
+        self.compare_parse(s, encode_splits=True)
+        self.compare_parse(s, suppress_internal_node_taxa=True)
+        self.compare_parse(s, edge_len_type=str)
+        self.compare_parse(s, preserve_underscores=True)
+
+    def testFallbackTrees(self):
+        s = """((A[&x=1]:1,B:2)[AB]:3,'C D':4,E);
+            (A,(B,(C,(D,E)i1)i2)i3);"""
+        self.compare_parse(s)
+        self.compare_parse(s, extract_comment_metadata=True)
+
+    def testErrorsWithFastPath(self):
+        for s in ["(A,(B,C));", "(A,(B,C)),;", "(A,(B,C)));", "(A,(B,C)):;", "(A,(B,A));", "(A,,B);", "(A B,C);", "(A,B+C,(D,E));", "(A,(B:1:2,C),(D,E));"]:
+            try:
+                dendropy.TreeList.get_from_string(s, "newick", buffered_tokenizer=False)
+            except DataParseError:
+                self.assertRaises(DataParseError, dendropy.TreeList.get_from_string, s, "newick")
+            else:
+                dendropy.TreeList.get_from_string(s, "newick")
+
 class NewickTreeListWriterTest(datatest.DataObjectVerificationTestCase):
 
     def setUp(self):
@@ -99,6 +99,70 @@ END;
             token = tokenizer.read_next_token()
             self.assertEqual(e, token)
 
+class BufferedNexusTokenizerTest(unittest.TestCase):
+
+    def read_all_tokens(self, tokenizer):
+        tokens = []
+        try:
+            while True:
+                token = tokenizer.read_next_token()
+                tokens.append((token,
+                    list(tokenizer.comments),
+                    tokenizer.tree_rooting_comment,
+                    tokenizer.tree_weight_comment,
+                    tokenizer.eof))
+                if token is None:
+                    break
+        except Exception, e:
+            tokens.append(str(e))
+        return tokens
+
+    def testMatchesUnbufferedTokenizer(self):
+        srcs = ["'a''b' 'it''s'x a'b'c ''''",
+                "x [a [b] c] y [&R] (a_b,'c_d')e[&W 1/2]f;   ",
+                "(a:1[&x=1],b:1e-3[c])[&U]:2-3",
+                "'unterminated",
+                "x [unterminated",
+                "#NEXUS\nbegin trees;\n\ttree 1 = (a,(b,c));\nend;\n"]
+        for src in srcs:
+            expected = self.read_all_tokens(nexustokenizer.NexusTokenizer(StringIO(src)))
+            for block_size in (1, 2, 3, 5, 1024):
+                tokenizer = nexustokenizer.BufferedNexusTokenizer(StringIO(src), block_size=block_size)
+                self.assertEqual(self.read_all_tokens(tokenizer), expected)
+
+    def testErrorPosition(self):
+        src = "(a,b);\n(c,\n  'd"
+        tokenizer = nexustokenizer.BufferedNexusTokenizer(StringIO(src), block_size=4)
+        for i in range(9):
+            tokenizer.read_next_token()
+        try:
+            tokenizer.read_next_token()
+        except nexustokenizer.DataParseError, e:
+            self.assertEqual(e.row, 3)
+        else:
+            self.fail("Expecting DataParseError")
+
+    def testTreesMatchUnbufferedTokenizer(self):
+        s = "[&R] ((A[&x=1]:1,B:2)[AB]0.9:3,'C D':4)[root];\n[&U][&W 1/2]((A,B),'C D');"
+        for extract_comment_metadata in (True, False):
+            t1 = dendropy.TreeList.get_from_string(s, 'newick',
+                    buffered_tokenizer=False,
+                    store_tree_weights=True,
+                    extract_comment_metadata=extract_comment_metadata)
+            t2 = dendropy.TreeList.get_from_string(s, 'newick',
+                    buffered_tokenizer=True,
+                    store_tree_weights=True,
+                    extract_comment_metadata=extract_comment_metadata)
+            self.assertEqual(len(t1), len(t2))
+            for a, b in zip(t1, t2):
+                self.assertEqual(a.as_newick_string(), b.as_newick_string())
+                self.assertEqual(a.is_rooted, b.is_rooted)
+                self.assertEqual(a.weight, b.weight)
+                for nd1, nd2 in zip(a.postorder_node_iter(), b.postorder_node_iter()):
+                    self.assertEqual(nd1.comments, nd2.comments)
+                    if extract_comment_metadata:
+                        self.assertEqual(nd1.comment_metadata, nd2.comment_metadata)
+
 class CommentReadingTests(unittest.TestCase):
 
     def testSimplePostNodeComments(self):
@@ -21,6 +21,7 @@ Tests creation, reading, update, deletion of CharMatrix objects.
 """
 
 import unittest
+import pickle
 from cStringIO import StringIO
 from dendropy.utility import error
 from dendropy.test.support.extendedtest import ExtendedTestCase
@@ -120,6 +121,128 @@ class StandardMatrixTest(datatest.DataObjectVerificationTestCase):
             distinct_state_alphabets=True,
             distinct_taxa=False)
 
+class CompactMatrixTest(datatest.DataObjectVerificationTestCase):
+
+    def setUp(self):
+        self.char_matrix1 = datagen.reference_dna_matrix()
+        self.char_matrix2 = datagen.reference_dna_matrix()
+        self.char_matrix2.compact_sequences()
+
+    def testCompactSequences(self):
+        self.assertFalse(self.char_matrix1.is_compact())
+        self.assertTrue(self.char_matrix2.is_compact())
+        for t1, t2 in zip(self.char_matrix1, self.char_matrix2):
+            self.assertTrue(isinstance(self.char_matrix2[t2], dendropy.CompactCharacterDataVector))
+            self.assertEqual(self.char_matrix1[t1].values(), self.char_matrix2[t2].values())
+            self.assertEqual(self.char_matrix1[t1].symbols_as_string(), self.char_matrix2[t2].symbols_as_string())
+        ca2 = dendropy.DnaCharacterMatrix(self.char_matrix2)
+        self.assertTrue(ca2.is_compact())
+        self.assertDistinctButEqual(
+            self.char_matrix2,
+            ca2,
+            char_type=dendropy.DnaCharacterMatrix,
+            distinct_state_alphabets=False,
+            distinct_taxa=False)
+        self.assertFalse(self.char_matrix2.is_compact())
+
+    def testAppendTaxonSequence(self):
+        t = self.char_matrix2.taxon_set[0]
+        expected = self.char_matrix2[t].symbols_as_string() + "ACGT-"
+        self.char_matrix2.append_taxon_sequence(t, "acgt-")
+        self.assertTrue(self.char_matrix2.is_compact())
+        self.assertEqual(self.char_matrix2[t].symbols_as_string(), expected)
+
+    def testExportCharacterIndices(self):
+        indices = [0, 4, 5, 9, 1000000]
+        ca1 = self.char_matrix1.export_character_indices(indices)
+        ca2 = self.char_matrix2.export_character_indices(indices)
+        self.assertTrue(ca2.is_compact())
+        self.assertTrue(ca2.taxon_set is self.char_matrix2.taxon_set)
+        for t in ca2:
+            vec = ca2[t]
+            self.assertTrue(vec._state_indices is self.char_matrix2[t]._state_indices)
+            self.assertEqual(len(vec), 4)
+            self.assertEqual(vec.symbols_as_string(), ca1[t.label].symbols_as_string())
+            self.assertFalse(vec._state_indices is self.char_matrix2[t]._state_indices)
+        ca3 = ca2.export_character_indices([3, 1])
+        self.assertTrue(ca3.is_compact())
+        for t in ca3:
+            self.assertEqual(ca3[t].symbols_as_string(), ca1[t.label].symbols_as_string()[1::2])
+        self.char_matrix2.new_character_subset("x", [2, 3])
+        ca4 = self.char_matrix2.export_character_subset("x")
+        for t in ca4:
+            self.assertEqual(ca4[t].symbols_as_string(), self.char_matrix1[t.label].symbols_as_string()[2:4])
+
+    def testWriteNexus(self):
+        self.assertEqual(self.char_matrix2.as_string("nexus"), self.char_matrix1.as_string("nexus"))
+        self.assertTrue(self.char_matrix2.is_compact())
+
+    def testPickling(self):
+        ca2 = self.char_matrix2.export_character_indices([3, 1, 4])
+        for protocol in [0, 1, 2]:
+            for char_matrix in [self.char_matrix2, ca2]:
+                for t in char_matrix:
+                    vec = char_matrix[t]
+                    vec2 = pickle.loads(pickle.dumps(vec, protocol))
+                    self.assertTrue(vec2.is_compact())
+                    self.assertEqual(vec2.symbols_as_string(), vec.symbols_as_string())
+                    self.assertTrue(vec.is_compact())
+            t = self.char_matrix2.taxon_set[0]
+            vec = self.char_matrix2.export_character_indices([0, 2])[t]
+            vec[0]
+            self.assertFalse(vec.is_compact())
+            vec2 = pickle.loads(pickle.dumps(vec, protocol))
+            self.assertFalse(vec2.is_compact())
+            self.assertEqual(vec2.symbols_as_string(), vec.symbols_as_string())
+
+class SitePatternsTest(ExtendedTestCase):
+
+    def setUp(self):
+        src = ">a\nAACGA-T\n>b\nAACGA-T\n>c\nACCGANT\n>d\nACCTACT\n"
+        self.char_matrix = dendropy.DnaCharacterMatrix.get_from_string(src, "fasta")
+
+    def testPatterns(self):
+        sp = dendropy.SitePatterns(self.char_matrix)
+        self.assertEqual(sp.taxa, list(self.char_matrix.taxon_set))
+        self.assertEqual(sp.num_sites, 7)
+        self.assertEqual(len(sp), 6)
+        self.assertEqual(sp.weights, [2, 1, 1, 1, 1, 1])
+        self.assertEqual(sp.pattern_sites, [[0, 4], [1], [2], [3], [5], [6]])
+        self.assertEqual(list(sp.site_pattern_indices), [0, 1, 2, 3, 0, 4, 5])
+        alphabet = self.char_matrix.default_state_alphabet
+        self.assertEqual([alphabet[i].symbol for i in sp.patterns[1]], ["A", "A", "C", "C"])
+        self.assertEqual(sp.site_values(sp.weights), [2, 1, 1, 1, 2, 1, 1])
+        state_sets = sp.taxon_state_sets()
+        self.assertEqual(state_sets[self.char_matrix.taxon_set[2]][4], set([0, 1, 2, 3]))
+
+    def testGapsAndAmbiguity(self):
+        sp = dendropy.SitePatterns(self.char_matrix, exclude_gaps=True)
+        self.assertEqual(sum(sp.weights), 6)
+        self.assertEqual(list(sp.site_pattern_indices), [0, 1, 2, 3, 0, -1, 4])
+        self.assertEqual(sp.site_values(sp.weights, 0), [2, 1, 1, 1, 2, 0, 1])
+        sp = dendropy.SitePatterns(self.char_matrix, exclude_uncertain=True)
+        self.assertEqual(sum(sp.weights), 6)
+        sp = dendropy.SitePatterns(self.char_matrix, gaps_as_missing=True)
+        missing = self.char_matrix.default_state_alphabet.missing
+        self.assertEqual(sp.state_alphabet[sp.patterns[4][0]], missing)
+
+    def testIncrementalBuilding(self):
+        taxa = list(self.char_matrix.taxon_set)
+        sp1 = dendropy.SitePatterns(self.char_matrix)
+        sp2 = dendropy.SitePatterns(self.char_matrix, taxa=taxa[:2])
+        self.assertEqual(len(sp2), 5)
+        for t in taxa[2:]:
+            sp2.add_sequence(t, self.char_matrix[t])
+        self.assertEqual(sp2.taxa, sp1.taxa)
+        self.assertEqual(sp2.patterns, sp1.patterns)
+        self.assertEqual(sp2.weights, sp1.weights)
+        self.assertEqual(sp2.pattern_sites, sp1.pattern_sites)
+        sp1.add_matrix(self.char_matrix)
+        self.assertEqual(sp1.num_sites, 14)
+        self.assertEqual(sp1.weights, [4, 2, 2, 2, 2, 2])
+        self.assertEqual(sp1.pattern_sites[0], [0, 4, 7, 11])
+        self.assertRaises(ValueError, sp1.add_sequence, taxa[0], self.char_matrix[taxa[0]])
+
 class CharMatrixReadTest(datatest.DataObjectVerificationTestCase):
 
     def setUp(self):
@@ -102,6 +102,79 @@ class TaxaTest(datatest.DataObjectVerificationTestCase):
         self.assertIs(ts.get_taxon(label="Q"), None)
         self.assertIs(ts.get_taxon(label="T1"), ts[0])
 
+class TaxonLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.labels = ["T%d" % (idx+1) for idx in xrange(10)]
+        self.taxon_set = dendropy.TaxonSet(self.labels)
+
+    def testIndex(self):
+        for idx, t in enumerate(self.taxon_set):
+            self.assertEqual(self.taxon_set.index(t), idx)
+            self.assertTrue(t in self.taxon_set)
+        t = dendropy.Taxon(label="T1")
+        self.assertFalse(t in self.taxon_set)
+        self.assertRaises(ValueError, self.taxon_set.index, t)
+
+    def testCaseInsensitive(self):
+        self.assertIs(self.taxon_set.get_taxon(label="t3"), None)
+        self.assertIs(self.taxon_set.get_taxon(label="t3", case_insensitive=True), self.taxon_set[2])
+
+    def testFirstMatchReturned(self):
+        t = self.taxon_set.new_taxon(label="T2")
+        self.assertIs(self.taxon_set.get_taxon(label="T2"), self.taxon_set[1])
+        self.assertIs(self.taxon_set.get_taxon(label="T9", oid=t.oid), self.taxon_set[8])
+        self.taxon_set.remove(self.taxon_set[1])
+        self.assertIs(self.taxon_set.get_taxon(label="T2"), t)
+        self.assertEqual(self.taxon_set.index(t), 9)
+
+    def testModification(self):
+        ts = self.taxon_set
+        t1, t2 = ts[0], ts[1]
+        ts.reverse()
+        self.assertEqual(ts.index(t1), 9)
+        ts.sort(key=lambda x: int(x.label[1:]))
+        self.assertEqual(ts.index(t2), 1)
+        x = dendropy.Taxon(label="X")
+        ts.insert(0, x)
+        self.assertEqual(ts.index(t1), 1)
+        self.assertIs(ts.get_taxon(label="X"), x)
+        ts.pop(0)
+        self.assertFalse(ts.has_taxon(label="X"))
+        self.assertEqual(ts.index(t1), 0)
+        del ts[0]
+        self.assertFalse(t1 in ts)
+        self.assertEqual(ts.index(t2), 0)
+        ts.clear()
+        self.assertEqual(len(ts), 0)
+        self.assertIs(ts.get_taxon(label="T2"), None)
+        self.assertFalse(ts.has_taxon(taxon=t2))
+
+    def testRelabeling(self):
+        t = self.taxon_set[4]
+        t.label = "Z"
+        self.assertIs(self.taxon_set.get_taxon(label="Z"), t)
+        self.assertIs(self.taxon_set.get_taxon(label="T5"), None)
+        self.assertTrue(self.taxon_set.has_taxa(labels=["Z"]))
+        t.oid = "zz"
+        self.assertIs(self.taxon_set.get_taxon(oid="zz"), t)
+
+    def testCopiesAreIndependent(self):
+        import copy
+        ts = copy.copy(self.taxon_set)
+        x = ts.new_taxon(label="X")
+        self.assertIs(ts.get_taxon(label="X"), x)
+        self.assertIs(self.taxon_set.get_taxon(label="X"), None)
+
+    def testPickling(self):
+        import pickle
+        self.taxon_set.get_taxon(label="T3")
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            ts = pickle.loads(pickle.dumps(self.taxon_set, protocol))
+            self.assertEqual([t.label for t in ts], self.labels)
+            self.assertIs(ts.get_taxon(label="T3"), ts[2])
+            self.assertEqual(ts.index(ts[5]), 5)
+
 class TaxonSetPartitionTest(datatest.DataObjectVerificationTestCase):
 
     def setUp(self):
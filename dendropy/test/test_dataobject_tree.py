@@ -144,6 +144,190 @@ class TreeCreateTest(datatest.DataObjectVerificationTestCase):
         tree = dendropy.Tree.get_from_string(tree_list.as_string('nexus'), "nexus", tree_offset=2, taxon_set=tree_list.taxon_set)
         self.assertDistinctButEqual(tree_list[2], tree, distinct_taxa=False)
 
+class CompactNodeTreeTest(datatest.DataObjectVerificationTestCase):
+
+    def setUp(self):
+        self.tree_list = datagen.reference_tree_list()
+
+    def testNewTree(self):
+        tree = dendropy.Tree(node_factory=dendropy.CompactNode)
+        self.assertTrue(isinstance(tree.seed_node, dendropy.CompactNode))
+        self.assertTrue(isinstance(tree.seed_node.edge, dendropy.CompactEdge))
+        c = tree.seed_node.new_child(label="c")
+        self.assertTrue(isinstance(c, dendropy.CompactNode))
+        self.assertIs(c.parent_node, tree.seed_node)
+        self.assertIs(c.edge.tail_node, tree.seed_node)
+
+    def testLazyContainers(self):
+        nd = dendropy.CompactNode(label="x")
+        self.assertIs(nd._oid, None)
+        self.assertIs(nd._comments, None)
+        self.assertFalse(nd.has_annotations())
+        self.assertEqual(len(nd.annotations()), 0)
+        self.assertIs(nd._annotations_dict, None)
+        oid = nd.oid
+        self.assertEqual(nd.oid, oid)
+        nd.oid = "n1"
+        self.assertEqual(nd.oid, "n1")
+        nd.comments.append("comment")
+        self.assertEqual(nd.comments, ["comment"])
+        nd.annotate("label")
+        self.assertTrue(nd.has_annotations())
+        self.assertEqual(nd.annotations()["label"][0], "x")
+
+    def testReadSameTaxa(self):
+        for schema in ("nexus", "newick", "nexml"):
+            s = self.tree_list.as_string(schema)
+            expected = dendropy.TreeList.get_from_string(s,
+                    schema,
+                    taxon_set=self.tree_list.taxon_set)
+            tree_list = dendropy.TreeList.get_from_string(s,
+                    schema,
+                    taxon_set=self.tree_list.taxon_set,
+                    node_factory=dendropy.CompactNode)
+            self.assertEqual(len(tree_list), len(expected))
+            for t1, t2 in zip(expected, tree_list):
+                self.assertTrue(isinstance(t2.seed_node, dendropy.CompactNode))
+                for nd in t2.postorder_node_iter():
+                    self.assertTrue(isinstance(nd, dendropy.CompactNode))
+                    self.assertTrue(isinstance(nd.edge, dendropy.CompactEdge))
+                self.assertEqual(t1.symmetric_difference(t2), 0)
+                self.assertEqual(t1.as_string("newick"), t2.as_string("newick"))
+
+    def testDeepCopy(self):
+        s = self.tree_list.as_string("newick")
+        tree = dendropy.Tree.get_from_string(s,
+                "newick",
+                taxon_set=self.tree_list.taxon_set,
+                node_factory=dendropy.CompactNode)
+        tree.seed_node.comments.append("root")
+        tree2 = dendropy.Tree(tree)
+        self.assertTrue(isinstance(tree2.seed_node, dendropy.CompactNode))
+        self.assertIs(tree2.node_factory, dendropy.CompactNode)
+        self.assertDistinctButEqual(tree, tree2, distinct_taxa=False, equal_oids=False)
+        self.assertEqual(tree2.seed_node.comments, ["root"])
+        self.assertIsNot(tree2.seed_node.comments, tree.seed_node.comments)
+        self.assertEqual(tree.as_string("newick"), tree2.as_string("newick"))
+
+    def testPickling(self):
+        import pickle
+        tree = dendropy.Tree.get_from_string("((A:1,B:2)x:3,(C:1,D:1):2);",
+                "newick",
+                node_factory=dendropy.CompactNode)
+        tree.seed_node.comments.append("root")
+        tree.seed_node.foo = 1
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            tree2 = pickle.loads(pickle.dumps(tree, protocol))
+            self.assertEqual(tree2.as_string("newick"), tree.as_string("newick"))
+            for nd in tree2.postorder_node_iter():
+                self.assertTrue(isinstance(nd, dendropy.CompactNode))
+                self.assertTrue(isinstance(nd.edge, dendropy.CompactEdge))
+                self.assertIs(nd.edge.head_node, nd)
+            self.assertEqual(tree2.seed_node.comments, ["root"])
+            self.assertEqual(tree2.seed_node.foo, 1)
+
+    def testConsensus(self):
+        tree_list = dendropy.TreeList.get_from_string("((A,B),(C,D));((A,B),(C,D));((A,C),(B,D));",
+                "newick",
+                node_factory=dendropy.CompactNode)
+        con_tree = tree_list.consensus()
+        self.assertIs(con_tree.node_factory, dendropy.CompactNode)
+        for nd in con_tree.postorder_node_iter():
+            self.assertTrue(isinstance(nd, dendropy.CompactNode))
+
+class LcaIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = dendropy.Tree.get_from_string("((((a,b),c),(d,(e,f))),(g,(h,i,j)));",
+                "newick",
+                as_rooted=True)
+
+    def _naive_mrca(self, nd1, nd2):
+        ancestors = set()
+        while nd1 is not None:
+            ancestors.add(nd1)
+            nd1 = nd1.parent_node
+        while nd2 not in ancestors:
+            nd2 = nd2.parent_node
+        return nd2
+
+    def testNodeMrca(self):
+        lca_index = self.tree.build_lca_index()
+        nodes = self.tree.nodes()
+        for nd1 in nodes:
+            for nd2 in nodes:
+                self.assertIs(lca_index.mrca(nd1, nd2), self._naive_mrca(nd1, nd2))
+
+    def testTaxaMrca(self):
+        expected = {}
+        taxon_sets = [("a", "b"), ("a", "c"), ("b", "e"), ("h", "j"), ("g", "i", "j"), ("e",), ("a", "j")]
+        for labels in taxon_sets:
+            expected[labels] = self.tree.mrca(taxon_labels=labels)
+        lca_index = self.tree.build_lca_index()
+        self.assertIs(self.tree.build_lca_index(), lca_index)
+        for labels in taxon_sets:
+            taxa = self.tree.taxon_set.get_taxa(labels=labels)
+            self.assertIs(lca_index.taxa_mrca(taxa), expected[labels])
+            self.assertIs(self.tree.mrca(taxa=taxa), expected[labels])
+        for taxon in self.tree.taxon_set:
+            self.assertIs(lca_index.leaf_node(taxon), self.tree.find_node_for_taxon(taxon))
+
+    def testInvalidation(self):
+        lca_index = self.tree.build_lca_index()
+        self.assertTrue(lca_index.is_current())
+        nd = self.tree.find_node_with_taxon_label("d")
+        nd.new_child(label="x")
+        self.assertFalse(lca_index.is_current())
+        self.assertIsNot(self.tree.build_lca_index(), lca_index)
+        self.assertTrue(self.tree.build_lca_index().is_current())
+
+    def testSetChildNodes(self):
+        tree = dendropy.Tree.get_from_string("((a,b),(c,d),e);", "newick")
+        self.assertEqual(len(tree.nodes()), 8)
+        self.assertEqual(len(tree.leaf_nodes()), 5)
+        self.assertEqual(tree.mrca(taxon_labels=["a", "c"]), tree.seed_node)
+        lca_index = tree.build_lca_index()
+        nd = tree.seed_node.child_nodes()[0]
+        children = nd.child_nodes()
+        nd.set_child_nodes([])
+        self.assertFalse(lca_index.is_current())
+        for child in children:
+            self.assertIs(child.parent_node, None)
+            self.assertIs(child.edge.tail_node, None)
+        self.assertEqual(tree.nodes(), [n for n in tree.preorder_node_iter()])
+        self.assertEqual(len(tree.nodes()), 6)
+        self.assertEqual(tree.leaf_nodes(), [n for n in tree.leaf_iter()])
+        self.assertEqual(len(tree.leaf_nodes()), 4)
+        self.assertEqual(tree.mrca(taxon_labels=["c", "d"]), tree.seed_node.child_nodes()[1])
+        self.assertEqual(tree.mrca(taxon_labels=["c", "e"]), tree.seed_node)
+        nd.set_child_nodes(children)
+        self.assertEqual(len(tree.nodes()), 8)
+        self.assertEqual(tree.mrca(taxon_labels=["a", "b"]), nd)
+
+    def testEditsToOtherTrees(self):
+        lca_index = self.tree.build_lca_index()
+        preorder = self.tree._get_node_lists()[0]
+        other = dendropy.Tree.get_from_string("((a,b),c);", "newick")
+        other.build_lca_index()
+        other.seed_node.new_child()
+        ladderized = dendropy.Tree(self.tree)
+        ladderized.ladderize()
+        self.assertTrue(lca_index.is_current())
+        self.assertIs(self.tree.build_lca_index(), lca_index)
+        self.assertIs(self.tree._get_node_lists()[0], preorder)
+        self.tree.seed_node.child_nodes()[0].new_child()
+        self.assertFalse(lca_index.is_current())
+        self.assertIsNot(self.tree._get_node_lists()[0], preorder)
+
+    def testSharedNodes(self):
+        lca_index = self.tree.build_lca_index()
+        num_nodes = len(self.tree.nodes())
+        subtree = dendropy.Tree(seed_node=self.tree.seed_node.child_nodes()[0])
+        sub_lca_index = subtree.build_lca_index()
+        subtree.seed_node.child_nodes()[0].new_child()
+        self.assertFalse(sub_lca_index.is_current())
+        self.assertFalse(lca_index.is_current())
+        self.assertEqual(len(self.tree.nodes()), num_nodes + 1)
 
 if __name__ == "__main__":
     unittest.main()
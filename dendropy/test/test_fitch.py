@@ -50,6 +50,94 @@ class FitchTest(unittest.TestCase):
             pscore = fitch_down_pass(node_list, taxa_to_state_set_map=taxa_to_state_set_map)
             self.assertEqual(expected_scores[n], pscore)
 
+    def testPScoreWithSitePatterns(self):
+        expected_scores = [370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 671, 670, 678, 687, 633, 675, 689, 668, 652, 644]
+        dataset = dendropy.DataSet(stream=open(pathmap.char_source_path("apternodus.chars.nexus"), "rU"),
+                                   schema='NEXUS')
+        dataset.read(stream=open(pathmap.tree_source_path("apternodus.tre"), "rU"),
+                     schema='NEXUS',
+                     taxon_set=dataset.taxon_sets[0])
+        site_patterns = dendropy.SitePatterns(dataset.char_matrices[0])
+        for n, tree in enumerate(dataset.tree_lists[0]):
+            pscore = fitch_down_pass(tree.postorder_node_iter(), site_patterns=site_patterns)
+            self.assertEqual(expected_scores[n], pscore)
+
+class FitchScorerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dataset = dendropy.DataSet(stream=open(pathmap.char_source_path("apternodus.chars.nexus"), "rU"),
+                                   schema='NEXUS')
+        self.dataset.read(stream=open(pathmap.tree_source_path("apternodus.tre"), "rU"),
+                     schema='NEXUS',
+                     taxon_set=self.dataset.taxon_sets[0])
+        self.char_mat = self.dataset.char_matrices[0]
+        self.tree_list = self.dataset.tree_lists[0]
+
+    def testScoreTrees(self):
+        expected_scores = [370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 370, 671, 670, 678, 687, 633, 675, 689, 668, 652, 644]
+        scorer = treecalc.FitchScorer(self.char_mat)
+        self.assertEqual(expected_scores, scorer.score_trees(self.tree_list))
+
+    def testSiteScores(self):
+        scorer = treecalc.FitchScorer(self.char_mat)
+        site_patterns = scorer.site_patterns
+        tree = self.tree_list[-1]
+        pattern_scores = scorer.pattern_scores(tree)
+        for idx in range(len(site_patterns)):
+            weight_list = [0] * len(site_patterns)
+            weight_list[idx] = 1
+            pscore = fitch_down_pass(tree.postorder_node_iter(),
+                    weight_list=weight_list,
+                    site_patterns=site_patterns)
+            self.assertEqual(pscore, pattern_scores[idx])
+        site_scores = scorer.site_scores(tree)
+        self.assertEqual(len(self.char_mat[0]), len(site_scores))
+        self.assertEqual(scorer.score(tree), sum(site_scores))
+
+    def testStateSets(self):
+        scorer = treecalc.FitchScorer(self.char_mat)
+        taxa_to_state_set_map = scorer.site_patterns.taxon_state_sets()
+        for tree in self.tree_list[-3:]:
+            tree2 = dendropy.Tree(tree)
+            fitch_down_pass(tree2.postorder_node_iter(), taxa_to_state_set_map=taxa_to_state_set_map)
+            self.assertEqual(scorer.score(tree), scorer.assign_state_sets(tree, final=False))
+            for nd1, nd2 in zip(tree.postorder_node_iter(), tree2.postorder_node_iter()):
+                if not nd1.is_leaf():
+                    self.assertEqual(nd2.state_sets, nd1.state_sets)
+            treecalc.fitch_up_pass(tree2.preorder_node_iter())
+            scorer.assign_state_sets(tree)
+            for nd1, nd2 in zip(tree.postorder_node_iter(), tree2.postorder_node_iter()):
+                if not nd1.is_leaf():
+                    self.assertEqual(nd2.state_sets, nd1.state_sets)
+
+    def testPolytomies(self):
+        char_mat = dendropy.DnaCharacterMatrix.get_from_string("""\
+#NEXUS
+begin data;
+    dimensions ntax=5 nchar=5;
+    format datatype=dna gap=- missing=?;
+    matrix
+        a AAAAC
+        b AACCC
+        c ACGCR
+        d ACTG?
+        e ACTGT
+    ;
+end;
+""", "nexus")
+        scorer = treecalc.FitchScorer(char_mat)
+        tree = dendropy.Tree.get_from_string("(a,b,c,d,e);", "newick", taxon_set=char_mat.taxon_set)
+        self.assertEqual([0, 2, 3, 3, 2], scorer.site_scores(tree))
+        self.assertEqual(10, scorer.score(tree))
+        scorer.assign_state_sets(tree)
+        state_alphabet = char_mat.default_state_alphabet
+        self.assertEqual([set(["A"]), set(["C"]), set(["T"]), set(["C", "G"]), set(["C"])],
+                [set([state_alphabet[i].symbol for i in ss]) for ss in tree.seed_node.state_sets])
+        tree = dendropy.Tree.get_from_string("((a,b),(c,d,e));", "newick", taxon_set=char_mat.taxon_set)
+        self.assertEqual([0, 1, 3, 3, 2], scorer.site_scores(tree))
+        resolved = dendropy.Tree.get_from_string("((a,b),((c,d),e));", "newick", taxon_set=char_mat.taxon_set)
+        self.assertEqual(scorer.score(tree), scorer.score(resolved))
+
 if __name__ == "__main__":
     unittest.main()
 
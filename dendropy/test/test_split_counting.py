@@ -21,6 +21,7 @@ Tests of split distribution counting.
 """
 
 import unittest
+import json
 from cStringIO import StringIO
 
 from dendropy.test.support import pathmap
@@ -35,6 +36,206 @@ import dendropy
 
 _LOG = messaging.get_logger(__name__)
 
+class SplitRecordCountTest(ExtendedTestCase):
+
+    def count_splits(self, stream, schema, is_rooted, as_split_records, calc_node_ages=False, **kwargs):
+        taxon_set = dendropy.TaxonSet()
+        split_distribution = treesplit.SplitDistribution(taxon_set=taxon_set)
+        split_distribution.is_rooted = is_rooted
+        split_distribution.ignore_node_ages = not calc_node_ages
+        topology_counter = treesum.TopologyCounter()
+        for tree in dataio.tree_source_iter(stream,
+                schema=schema,
+                taxon_set=taxon_set,
+                as_rooted=is_rooted,
+                store_tree_weights=True,
+                as_split_records=as_split_records,
+                calc_node_ages=calc_node_ages,
+                **kwargs):
+            if as_split_records:
+                self.assertTrue(isinstance(tree, treesplit.SplitRecord))
+                self.assertIs(tree.taxon_set, taxon_set)
+            else:
+                treesplit.encode_splits(tree)
+            split_distribution.count_splits_on_tree(tree)
+            topology_counter.count(tree, tree_splits_encoded=True)
+        return split_distribution, topology_counter
+
+    def compare_counts(self, src, schema, is_rooted, calc_node_ages=False, **kwargs):
+        if isinstance(src, str):
+            src1 = open(src, "rU")
+            src2 = open(src, "rU")
+        else:
+            src1 = StringIO(src.getvalue())
+            src2 = StringIO(src.getvalue())
+        sd1, tc1 = self.count_splits(src1, schema, is_rooted, False, calc_node_ages, **kwargs)
+        sd2, tc2 = self.count_splits(src2, schema, is_rooted, True, calc_node_ages, **kwargs)
+        self.assertEqual([t.label for t in sd1.taxon_set], [t.label for t in sd2.taxon_set])
+        self.assertEqual(sd1.total_trees_counted, sd2.total_trees_counted)
+        self.assertEqual(sd1.splits, sd2.splits)
+        self.assertEqual(sd1.split_counts, sd2.split_counts)
+        self.assertEqual(sd1.weighted_split_counts, sd2.weighted_split_counts)
+        self.assertEqual(sd1.sum_of_weights, sd2.sum_of_weights)
+        self.assertEqual(sd1.split_edge_lengths, sd2.split_edge_lengths)
+        self.assertEqual(sd1.split_node_ages, sd2.split_node_ages)
+        self.assertEqual(tc1.topology_hash_map, tc2.topology_hash_map)
+
+    def testTreeFiles(self):
+        for filename, schema in [('pythonidae.reference-trees.nexus', 'nexus'),
+                ('pythonidae.reference-trees.newick', 'newick'),
+                ('pythonidae.mb.run1.t', 'nexus')]:
+            for is_rooted in [True, False]:
+                self.compare_counts(pathmap.tree_source_path(filename), schema, is_rooted)
+
+    def testNodeAges(self):
+        self.compare_counts(pathmap.tree_source_path('pythonidae.beast.mcmc.trees'),
+                'nexus',
+                is_rooted=True,
+                calc_node_ages=True,
+                tree_offset=80)
+
+    def testSpecialCases(self):
+        trees = StringIO("""\
+            [&W 1/2] ((A:1,B:2):3,(C:4,(D:5,E:6):7):8);
+            [&R] ((A:1,B:2):3,(C:4,(D:5,E:6):7):8):9;
+            (A:1,(B:2,C:3):4,(D:5,E:6):7);
+            (A:1,((B:2,C:3)x:4,(D:5,E:6)y:7):8);
+            ((A:1,B:2),((C:3,(D:4,E:5)))):1;
+            ('A':1,[comment]B:2,(C:3,(D:4,E:5):6):7);
+            (A:1,B:2,(C:3,(D:4,E:5))[&rate=2]:6);
+            (A,B,(C,D,E));
+            ((A,B),(C,(D,E)));
+            """)
+        for is_rooted in [True, False]:
+            self.compare_counts(trees, "newick", is_rooted)
+
+class SplitCountSavingTest(ExtendedTestCase):
+
+    def count_splits(self, filenames, taxon_set, is_rooted=False, store_value_lists=True, calc_node_ages=False):
+        counting_state = treesum.SplitCountingState(
+                split_distribution=treesplit.SplitDistribution(taxon_set=taxon_set,
+                        store_value_lists=store_value_lists),
+                tree_offset=5,
+                thin=2)
+        counting_state.split_distribution.is_rooted = is_rooted
+        counting_state.split_distribution.ignore_node_ages = not calc_node_ages
+        for filename in filenames:
+            src = pathmap.tree_source_path(filename)
+            for idx, tree in enumerate(dataio.tree_source_iter(open(src, "rU"),
+                    schema="nexus",
+                    taxon_set=taxon_set,
+                    as_rooted=is_rooted,
+                    as_split_records=True,
+                    calc_node_ages=calc_node_ages,
+                    tree_offset=5,
+                    thin=2)):
+                counting_state.split_distribution.count_splits_on_tree(tree)
+                counting_state.topology_counter.count(tree, tree_splits_encoded=True)
+                counting_state.set_next_tree_index(src, 5 + ((idx + 1) * 2))
+        return counting_state
+
+    def assertSameSplitDistributions(self, sd1, sd2):
+        self.assertEqual([t.label for t in sd1.taxon_set], [t.label for t in sd2.taxon_set])
+        self.assertEqual(sd1.is_rooted, sd2.is_rooted)
+        self.assertEqual(sd1.total_trees_counted, sd2.total_trees_counted)
+        self.assertAlmostEqual(sd1.sum_of_weights, sd2.sum_of_weights)
+        self.assertEqual(set(sd1.splits), set(sd2.splits))
+        self.assertEqual(sd1.split_counts, sd2.split_counts)
+        self.assertEqual(sd1.weighted_split_counts, sd2.weighted_split_counts)
+        self.assertEqual(sd1.split_edge_lengths, sd2.split_edge_lengths)
+        self.assertEqual(sd1.split_node_ages, sd2.split_node_ages)
+        for stats1, stats2 in [(sd1.split_edge_length_stats, sd2.split_edge_length_stats),
+                (sd1.split_node_age_stats, sd2.split_node_age_stats)]:
+            self.assertEqual(set(stats1.keys()), set(stats2.keys()))
+            for split in stats1:
+                self.assertEqual(stats1[split].get_state(), stats2[split].get_state())
+
+    def saved_and_loaded(self, obj, taxon_set=None):
+        dest = StringIO()
+        obj.save(dest)
+        return obj.__class__.load(StringIO(dest.getvalue()), taxon_set=taxon_set)
+
+    def testSaveAndLoad(self):
+        for filename, is_rooted, store_value_lists, calc_node_ages in [
+                ('pythonidae.mb.run1.t', False, True, False),
+                ('pythonidae.mb.run1.t', True, False, False),
+                ('pythonidae.beast.mcmc.trees', True, True, True),
+                ('pythonidae.beast.mcmc.trees', True, False, True)]:
+            sd = self.count_splits([filename],
+                    dendropy.TaxonSet(),
+                    is_rooted=is_rooted,
+                    store_value_lists=store_value_lists,
+                    calc_node_ages=calc_node_ages).split_distribution
+            sd2 = self.saved_and_loaded(sd)
+            self.assertSameSplitDistributions(sd, sd2)
+            self.assertEqual(sd.splits, sd2.splits)
+            self.assertEqual(sd.split_edge_length_summaries, sd2.split_edge_length_summaries)
+            self.assertEqual(sd.split_node_age_summaries, sd2.split_node_age_summaries)
+
+    def testLoadWithReorderedTaxa(self):
+        for is_rooted in [False, True]:
+            sd1 = self.count_splits(['pythonidae.mb.run1.t'],
+                    dendropy.TaxonSet(),
+                    is_rooted=is_rooted).split_distribution
+            taxon_set = dendropy.TaxonSet([t.label for t in reversed(sd1.taxon_set)])
+            sd2 = self.count_splits(['pythonidae.mb.run1.t'],
+                    taxon_set,
+                    is_rooted=is_rooted).split_distribution
+            self.assertNotEqual(sd1.splits, sd2.splits)
+            sd3 = self.saved_and_loaded(sd1, taxon_set=taxon_set)
+            self.assertIs(sd3.taxon_set, taxon_set)
+            self.assertSameSplitDistributions(sd2, sd3)
+
+    def testBadSource(self):
+        self.assertRaises(ValueError, treesplit.SplitDistribution.load, StringIO("not a split distribution"))
+        sd = self.count_splits(['pythonidae.mb.run1.t'], dendropy.TaxonSet()).split_distribution
+        dest = StringIO()
+        sd.save(dest)
+        self.assertRaises(ValueError, treesum.SplitCountingState.load, StringIO(dest.getvalue()))
+
+    def testMalformedState(self):
+        counting_state = self.count_splits(['pythonidae.mb.run1.t'], dendropy.TaxonSet(), store_value_lists=False)
+        dest = StringIO()
+        counting_state.save(dest)
+        data = json.loads(dest.getvalue())
+        for version in [1, 3, None]:
+            data["version"] = version
+            self.assertRaises(ValueError, treesum.SplitCountingState.load, StringIO(json.dumps(data)))
+        data["version"] = treesum.SPLIT_COUNTING_STATE_FORMAT_VERSION
+        sd_state = data["state"]["split_distribution"]
+        for state, key, value in [
+                (data["state"], "thin", "2"),
+                (data["state"], "topologies", [[[-1], 1]]),
+                (data["state"], "next_tree_indices", {"a": 1}),
+                (sd_state, "total_trees_counted", None),
+                (sd_state, "splits", sd_state["splits"][1:]),
+                (sd_state, "splits", [1 << len(sd_state["taxon_labels"])] + sd_state["splits"][1:]),
+                (sd_state, "split_edge_length_stats", [[1, 2]] * len(sd_state["splits"])),
+                (sd_state, "is_rooted", 0)]:
+            saved_value = state[key]
+            state[key] = value
+            self.assertRaises(ValueError, treesum.SplitCountingState.load, StringIO(json.dumps(data)))
+            state[key] = saved_value
+        counting_state2 = treesum.SplitCountingState.load(StringIO(json.dumps(data)))
+        self.assertSameSplitDistributions(counting_state.split_distribution, counting_state2.split_distribution)
+
+    def testMergeCountingStates(self):
+        filenames = ['pythonidae.mb.run1.t', 'pythonidae.mb.run2.t', 'pythonidae.mb.run3.t']
+        full = self.count_splits(filenames, dendropy.TaxonSet())
+        merged = None
+        for filename in filenames:
+            # each part has its own taxa, in a different order
+            part = self.count_splits([filename], dendropy.TaxonSet())
+            if merged is None:
+                merged = self.saved_and_loaded(part)
+            else:
+                merged.update(self.saved_and_loaded(part, taxon_set=merged.split_distribution.taxon_set))
+        self.assertSameSplitDistributions(full.split_distribution, merged.split_distribution)
+        self.assertEqual(full.topology_counter.topology_hash_map, merged.topology_counter.topology_hash_map)
+        self.assertEqual(full.topology_counter.total_trees_counted, merged.topology_counter.total_trees_counted)
+        self.assertEqual(full.next_tree_indices, merged.next_tree_indices)
+        self.assertRaises(ValueError, merged.update, self.count_splits(filenames[:1], merged.split_distribution.taxon_set))
+
 if not paup.DENDROPY_PAUP_INTEROPERABILITY:
     _LOG.warn("PAUP interoperability not available: skipping split counting tests")
 else:
@@ -109,5 +310,5 @@ else:
             for tc in self.test_cases:
                 self.countSplits(tc, is_rooted=True)
 
-    if __name__ == "__main__":
-        unittest.main()
+if __name__ == "__main__":
+    unittest.main()
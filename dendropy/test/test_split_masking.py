@@ -23,6 +23,7 @@ Splits encoding tests.
 import sys
 import os
 import unittest
+import random
 import tempfile
 from cStringIO import StringIO
 
@@ -72,6 +73,38 @@ class LowestBitTest(unittest.TestCase):
         for n, expected in enumerate([0, 1, 2, 1, 4, 1, 2, 1, 8, 1, 2, 1, 4, 1, 2, 1, 16]):
             self.assertEqual(treesplit.lowest_bit_only(n), expected)
 
+class SetBitsTest(unittest.TestCase):
+
+    def runTest(self):
+        self.assertEqual(list(treesplit.iter_set_bits(0)), [])
+        self.assertEqual(list(treesplit.iter_set_bits(0x15)), [0, 2, 4])
+        self.assertEqual(list(treesplit.iter_set_bits(1L << 200 | 2)), [1, 200])
+        self.assertRaises(ValueError, list, treesplit.iter_set_bits(-1))
+        self.assertRaises(ValueError, treesplit.split_to_list, -2)
+        self.assertEqual(treesplit.lowest_bit_index(0), -1)
+        self.assertEqual(treesplit.lowest_bit_index(40), 3)
+        self.assertEqual(treesplit.count_bits((1L << 200) - 1), 200)
+        self.assertEqual(treesplit.count_bits(0), 0)
+        self.assertRaises(ValueError, treesplit.count_bits, -1)
+        self.assertRaises(ValueError, treesplit.count_bits, 2.5)
+
+class SplitCompatibilityIndexTest(unittest.TestCase):
+
+    def runTest(self):
+        rng = random.Random(1)
+        mask = (1L << 70) - 1
+        splits = [rng.getrandbits(70) for i in range(200)]
+        sci = treesplit.SplitCompatibilityIndex(mask, splits)
+        self.assertEqual(len(sci), len(splits))
+        for i in range(50):
+            split = rng.getrandbits(70)
+            expected = [s for s in splits if not treesplit.is_compatible(split, s, mask)]
+            self.assertEqual(sci.incompatible_splits(split), expected)
+            self.assertEqual(sci.is_compatible(split), len(expected) == 0)
+        sci = treesplit.SplitCompatibilityIndex(0x3F, [0x03, 0x07])
+        self.assertTrue(sci.is_compatible(0x0F))
+        self.assertEqual(sci.incompatible_splits(0x06), [0x03])
+
 class IsTrivialTest(unittest.TestCase):
 
     def runTest(self):
@@ -85,5 +118,74 @@ class IsTrivialTest(unittest.TestCase):
         for i, r in enumerate([y, y, y, n, y, n, n, y, y, y, y, n, y, n, n, y, y, n, n, y, n, y, y, y, y, n, n, y, n, y, y, y, ]):
             self.assertEqual(r, treesplit.is_trivial_split(i, 0x17))
 
+class ParseTimeSplitEncodingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.taxon_set = dendropy.TaxonSet(["A", "B", "C", "D", "E", "F"])
+
+    def read_tree(self, newick, **kwargs):
+        return dendropy.Tree.get_from_string(newick, "newick", taxon_set=self.taxon_set, **kwargs)
+
+    def post_pass_splits(self, newick, **kwargs):
+        tree = self.read_tree(newick, split_encoding="none", **kwargs)
+        self.assertFalse(hasattr(tree, "split_edges"))
+        treesplit.encode_splits(tree)
+        return dict([(split, edge.length) for split, edge in tree.split_edges.items()])
+
+    def testMarkedOnPrepopulatedTaxonSet(self):
+        for newick in ["(A:1,B:2,((C:3,D:4):5,(E:6,F:7):8):9);",
+                "[&U] (A:1,B:2,((C:3,D:4)[x]:5,(E:6,F:7):8):9);",
+                "[&R] ((A:1,B:2):3,((C:3,D:4):5,(E:6,F:7):8):9);"]:
+            tree = self.read_tree(newick)
+            self.assertTrue(treesplit.splits_encoded(tree))
+            split_edges = tree.split_edges
+            treesplit.encode_splits(tree)
+            self.assertTrue(tree.split_edges is split_edges)
+            self.assertEqual(dict([(split, edge.length) for split, edge in split_edges.items()]),
+                    self.post_pass_splits(newick))
+
+    def testNotMarkedIfRestructuringRequired(self):
+        for newick in ["((A,B),((C,D),(E,F)));", "(A,B,((C,D)),(E,F));"]:
+            tree = self.read_tree(newick)
+            self.assertFalse(hasattr(tree, "split_edges"))
+            self.assertFalse(treesplit.splits_encoded(tree))
+            tree = self.read_tree(newick, split_encoding="unrooted")
+            self.assertTrue(hasattr(tree, "split_edges"))
+            self.assertFalse(treesplit.splits_encoded(tree))
+            treesplit.encode_splits(tree)
+            self.assertTrue(treesplit.splits_encoded(tree))
+
+    def testNotMarkedIfTaxaAdded(self):
+        tree = self.read_tree("(A,B,(C,G));")
+        self.assertFalse(hasattr(tree, "split_edges"))
+
+    def testNotEncodedWithoutTaxonSet(self):
+        tree = dendropy.Tree.get_from_string("(A,B,(C,D));", "newick")
+        self.assertFalse(hasattr(tree.seed_node.edge, "split_bitmask"))
+
+    def testRooting(self):
+        tree = self.read_tree("[&U] ((A,B),(C,D),(E,F));", split_encoding="rooted")
+        self.assertTrue(tree.is_rooted)
+        self.assertTrue(treesplit.splits_encoded(tree))
+        self.assertFalse(isinstance(tree.split_edges, treesplit.containers.NormalizedBitmaskDict))
+        self.assertRaises(ValueError, self.read_tree, "(A,B,C);", split_encoding="foo")
+
+    def testInternalNodeTaxaIgnored(self):
+        tree = self.read_tree("(A,B,(C,D)E);")
+        self.assertTrue(treesplit.splits_encoded(tree))
+        self.assertEqual(tree.seed_node.child_nodes()[2].edge.split_bitmask, 12)
+
+    def testTopologyChangeDetected(self):
+        tree = self.read_tree("(A,B,((C,D),(E,F)));")
+        self.assertTrue(treesplit.splits_encoded(tree))
+        tree.prune_taxa_with_labels(["F"])
+        self.assertFalse(treesplit.splits_encoded(tree))
+        treesplit.encode_splits(tree)
+        self.assertTrue(treesplit.splits_encoded(tree))
+        tree.seed_node.new_child(taxon=self.taxon_set[5])
+        self.assertFalse(treesplit.splits_encoded(tree))
+        tree.update_splits()
+        self.assertTrue(self.taxon_set.all_taxa_bitmask() in tree.split_edges)
+
 if __name__ == "__main__":
     unittest.main()
@@ -21,6 +21,7 @@ Tests statistical routines.
 """
 
 import unittest
+import random
 from dendropy.test.support import extendedtest
 from dendropy.utility import statistics
 from dendropy.utility import messaging
@@ -173,6 +174,41 @@ class TestMedian(unittest.TestCase):
     def testMedian(self):
         self.assertEqual(statistics.median([2, 9, 9, 7, 9, 2, 4, 5, 8]), 7)
 
+class TestOnlineSummary(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.values = [rng.gauss(100, 5) for i in range(2000)]
+
+    def testExact(self):
+        values = self.values[:200]
+        summary = statistics.OnlineSummary(values, sketch_size=256)
+        self.assertTrue(summary.is_exact())
+        expected = statistics.summarize(values)
+        observed = summary.summary()
+        self.assertEqual(sorted(expected.keys()), sorted(observed.keys()))
+        for key in ('range', 'median', 'hpd95', 'quant_5_95'):
+            self.assertEqual(observed[key], expected[key])
+        for key in ('mean', 'var', 'sd'):
+            self.assertAlmostEqual(observed[key], expected[key])
+
+    def testSketch(self):
+        summary = statistics.OnlineSummary(self.values[:1000], sketch_size=64)
+        summary.merge(statistics.OnlineSummary(self.values[1000:], sketch_size=64))
+        self.assertFalse(summary.is_exact())
+        self.assertEqual(len(summary), len(self.values))
+        expected = statistics.summarize(self.values)
+        observed = summary.summary()
+        self.assertEqual(observed['range'], expected['range'])
+        self.assertAlmostEqual(observed['mean'], expected['mean'])
+        self.assertAlmostEqual(observed['var'], expected['var'])
+        # rank error is bounded, so estimates are within a fraction of an sd
+        sd = expected['sd']
+        self.assertTrue(abs(observed['median'] - expected['median']) < 0.2 * sd)
+        for i in range(2):
+            self.assertTrue(abs(observed['quant_5_95'][i] - expected['quant_5_95'][i]) < 0.2 * sd)
+            self.assertTrue(abs(observed['hpd95'][i] - expected['hpd95'][i]) < 0.2 * sd)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -48,6 +48,64 @@ class TreeEuclideanDistTest(unittest.TestCase):
          self.assertAlmostEqual(treecalc.euclidean_distance(tree_list[1], tree_list[3]), 2.2232636377544162)
          self.assertAlmostEqual(treecalc.euclidean_distance(tree_list[2], tree_list[3]), 1.000419513484718)
 
+class SplitLengthMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree_list = dendropy.TreeList(
+            stream=StringIO("""((t5:0.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:2.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:0.161175,t6:0.161175):0.392293,((t2:0.075411,(t4:0.104381,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:0.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):0.028969):0.065840,t3:0.170221):0.383247);
+                        ((t5:0.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        """),
+            schema="newick")
+        self.dist_fns = {
+            "robinson_foulds": treecalc.robinson_foulds_distance,
+            "euclidean": treecalc.euclidean_distance,
+            "branch_score": lambda t1, t2: treecalc.splits_distance(t1, t2,
+                    dist_func=treecalc.brlen_scores_calc),
+        }
+
+    def testDistanceMatrix(self):
+        slm = treecalc.SplitLengthMatrix(self.tree_list)
+        self.assertEqual(len(slm), len(self.tree_list))
+        for metric in treecalc.SplitLengthMatrix.METRICS:
+            dists = slm.distance_matrix(metric)
+            k = 0
+            for i, t1 in enumerate(self.tree_list):
+                for t2 in self.tree_list[i+1:]:
+                    self.assertAlmostEqual(dists[k], self.dist_fns[metric](t1, t2))
+                    k += 1
+            self.assertEqual(k, len(dists))
+        self.assertEqual(slm.distance_matrix("euclidean")[3], 0.0)
+
+    def testReferenceDistances(self):
+        slm = treecalc.SplitLengthMatrix(self.tree_list[1:])
+        ref = self.tree_list[0]
+        for metric in treecalc.SplitLengthMatrix.METRICS:
+            dists = slm.reference_distances(ref, metric)
+            self.assertEqual(len(dists), len(self.tree_list) - 1)
+            for d, t in zip(dists, self.tree_list[1:]):
+                self.assertAlmostEqual(d, self.dist_fns[metric](ref, t))
+
+    def testLongSharedEdges(self):
+        tree_list = dendropy.TreeList(
+            stream=StringIO("""(A:1e8,B:1e8,(C:1e8,D:1e8):1e-4);
+                        (A:1e8,C:1e8,(B:1e8,D:1e8):1e-4);
+                        """),
+            schema="newick")
+        slm = treecalc.SplitLengthMatrix(tree_list)
+        for metric in treecalc.SplitLengthMatrix.METRICS:
+            expected = self.dist_fns[metric](tree_list[0], tree_list[1])
+            self.assertTrue(expected > 0.0)
+            for d in [slm.distance_matrix(metric)[0], slm.reference_distances(tree_list[0], metric)[1]]:
+                self.assertTrue(abs(d - expected) <= 1e-9 * expected, "%s: %r != %r" % (metric, d, expected))
+        self.assertAlmostEqual(slm.distance_matrix("euclidean")[0], math.sqrt(2.0) * 1e-4, 15)
+
+    def testBadMetric(self):
+        slm = treecalc.SplitLengthMatrix(self.tree_list)
+        self.assertRaises(ValueError, slm.distance_matrix, "foo")
+
 class TreeSymmetricDistTest(unittest.TestCase):
 
     def runTest(self):
@@ -58,6 +116,46 @@ class TreeSymmetricDistTest(unittest.TestCase):
          encode_splits(o_tree)
          self.assertEqual(treecalc.symmetric_difference(o_tree, ref), 2)
 
+class TreeRfDistanceMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree_list = dendropy.TreeList(
+            stream=StringIO("""((t5,t6),((t4,(t2,t1)),t3));
+                        ((t1,t2),((t4,(t5,t6)),t3));
+                        ((t5,t6),((t4,(t2,t1)),t3));
+                        ((t5,t1),((t4,(t2,t6)),t3));
+                        (((t5,t6),t4),((t2,t1),t3));
+                        """),
+            schema="newick")
+
+    def _chk_matrix(self, dists):
+        n = len(self.tree_list)
+        self.assertEqual(len(dists), n * (n-1) / 2)
+        k = 0
+        for i in range(n):
+            for j in range(i+1, n):
+                self.assertEqual(dists[k],
+                        treecalc.symmetric_difference(self.tree_list[i], self.tree_list[j]))
+                k += 1
+
+    def testMatrix(self):
+        self._chk_matrix(treecalc.rf_distance_matrix(self.tree_list))
+
+    def testChunkedRows(self):
+        dists = []
+        for idx, row in enumerate(treecalc.iter_rf_distance_rows(self.tree_list, chunk_size=2)):
+            self.assertEqual(len(row), len(self.tree_list) - idx - 1)
+            dists.extend(row)
+        self._chk_matrix(dists)
+
+    def testMultiprocessing(self):
+        self._chk_matrix(treecalc.rf_distance_matrix(self.tree_list, chunk_size=1, num_processes=2))
+
+    def testDifferentTaxonSets(self):
+        t1 = dendropy.Tree.get_from_string("((a,b),(c,d));", "newick")
+        t2 = dendropy.Tree.get_from_string("((a,b),(c,d));", "newick")
+        self.assertRaises(TypeError, treecalc.rf_distance_matrix, [t1, t2])
+
 class TreePatristicDistTest(unittest.TestCase):
 
     def setUp(self):
@@ -91,5 +189,97 @@ class TreePatristicDistTest(unittest.TestCase):
         _chk_distance("f", "d", 4)
         _chk_distance("c", "d", 6)
 
+    def testPatDistMatrixMrca(self):
+        encode_splits(self.tree)
+        pdm = treecalc.PatristicDistanceMatrix(self.tree)
+        for t1 in self.tree.taxon_set:
+            for t2 in self.tree.taxon_set:
+                if t1 is not t2:
+                    self.assertTrue(pdm.mrca(t1, t2) is self.tree.mrca(taxa=[t1, t2]))
+        self.assertEqual(pdm.max_dist, 6)
+        self.assertEqual(pdm(*pdm.max_dist_taxa), 6)
+
+    def testPatDistMatrixCondensed(self):
+        pdm = treecalc.PatristicDistanceMatrix(self.tree, single_precision=True)
+        cd = pdm.condensed_distances()
+        n = len(pdm.taxa)
+        self.assertEqual(n, 6)
+        self.assertEqual(len(cd), n * (n-1) / 2)
+        self.assertEqual(cd.typecode, 'f')
+        k = 0
+        for i in range(n):
+            for j in range(i+1, n):
+                self.assertEqual(cd[k], pdm(pdm.taxa[i], pdm.taxa[j]))
+                self.assertEqual(cd[k], pdm.index_distance(j, i))
+                k += 1
+        for i, t in enumerate(pdm.taxa):
+            self.assertEqual(pdm.taxon_index(t), i)
+        self.assertEqual(pdm.sum_of_distances(), sum(cd))
+
+class FlatTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tree_list = dendropy.TreeList(
+            stream=StringIO("""((t5:0.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:2.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:0.161175,t6:0.161175):0.392293,((t2:0.075411,(t4:0.104381,t1:0.075411):1):0.065840,t3:0.170221):0.383247);
+                        ((t5:0.161175,t6:0.161175):0.392293,((t4:0.104381,(t2:0.075411,t1:0.075411):0.028969):0.065840,t3:0.170221):0.383247);
+                        """),
+            schema="newick")
+
+    def testRoundTrip(self):
+        for tree in self.tree_list:
+            flat = tree.to_flat()
+            self.assertEqual(len(flat), len(tree.nodes()))
+            t2 = flat.to_tree()
+            self.assertEqual(t2.as_newick_string(), tree.as_newick_string())
+            self.assertTrue(t2.taxon_set is tree.taxon_set)
+
+    def testNodeAges(self):
+        tree = dendropy.Tree.get_from_string("(((a:1, b:1):1, c:2):1, (d:2, (e:1,f:1):1):1):0;", schema="newick")
+        flat = tree.to_flat()
+        ages = flat.calc_node_ages()
+        tree.calc_node_ages()
+        for idx, nd in enumerate(tree.preorder_node_list()):
+            self.assertAlmostEqual(ages[idx], nd.age)
+
+    def testSplitDistances(self):
+        flats = [t.to_flat() for t in self.tree_list]
+        for t in self.tree_list:
+            encode_splits(t)
+        for f in flats:
+            encode_splits(f)
+        for i in range(len(flats)):
+            for j in range(i+1, len(flats)):
+                t1, t2 = self.tree_list[i], self.tree_list[j]
+                f1, f2 = flats[i], flats[j]
+                self.assertEqual(treecalc.symmetric_difference(f1, f2),
+                        treecalc.symmetric_difference(t1, t2))
+                self.assertAlmostEqual(treecalc.euclidean_distance(f1, f2),
+                        treecalc.euclidean_distance(t1, t2))
+                self.assertAlmostEqual(treecalc.euclidean_distance(f1, t2),
+                        treecalc.euclidean_distance(t1, t2))
+
+    def testPatDistMatrix(self):
+        tree = self.tree_list[2]
+        pdm1 = treecalc.PatristicDistanceMatrix(tree)
+        pdm2 = treecalc.PatristicDistanceMatrix(tree.to_flat())
+        for t1 in tree.taxon_set:
+            for t2 in tree.taxon_set:
+                self.assertAlmostEqual(pdm1(t1, t2), pdm2(t1, t2))
+
+    def testReadAsFlatTrees(self):
+        taxon_set = dendropy.TaxonSet()
+        src = StringIO(self.tree_list.as_string("nexus"))
+        flats = list(dendropy.tree_source_iter(src,
+                schema="nexus",
+                taxon_set=taxon_set,
+                as_flat_trees=True))
+        self.assertEqual(len(flats), len(self.tree_list))
+        for flat, tree in zip(flats, self.tree_list):
+            self.assertTrue(isinstance(flat, dendropy.FlatTree))
+            self.assertEqual(flat.to_tree().as_newick_string(),
+                    tree.as_newick_string())
+
 if __name__ == "__main__":
     unittest.main()
@@ -26,6 +26,7 @@ from dendropy.test.support import datagen
 from dendropy.test.support import datatest
 from dendropy.utility.messaging import get_logger
 from dendropy import treesplit
+from dendropy import treesum
 import dendropy
 
 _LOG = get_logger(__name__)
@@ -61,5 +62,55 @@ class NexusTreeListReaderTest(datatest.DataObjectVerificationTestCase):
             treesplit.encode_splits(t_tree)
             self.assertEqual(ref_tree.symmetric_difference(t_tree), 0)
 
+class SplitHierarchyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.taxon_set = dendropy.TaxonSet(["A", "B", "C", "D", "E", "F"])
+        self.mask = self.taxon_set.all_taxa_bitmask()
+
+    def testIncompatibleSplitsSkipped(self):
+        # splits are given as the taxa on one side
+        h = treesplit.SplitHierarchy(self.mask)
+        self.assertTrue(h.add(0x03)) # AB|CDEF
+        self.assertTrue(h.add(0x30)) # ABCD|EF
+        self.assertFalse(h.add(0x06)) # BC|ADEF
+        self.assertTrue(h.add(0x01)) # trivial
+        self.assertTrue(h.add(0x3C)) # same as AB|CDEF
+        self.assertTrue(h.add(0x38)) # ABC|DEF
+        self.assertEqual(len(h), 3)
+        self.assertTrue(0x06 not in h)
+        tree = h.as_tree(self.taxon_set)
+        self.assertEqual(tree.as_newick_string(), "(A,B,(C,(D,(E,F))))")
+
+    def testIncompatibleSplitsGivenAsCompatible(self):
+        # falls back to adding the splits one at a time, in the order given
+        h = treesplit.SplitHierarchy(self.mask, False, [0x06, 0x38, 0x03])
+        self.assertEqual(h.clusters, [0x06, 0x38])
+        self.assertTrue(0x03 not in h)
+        self.assertEqual(h.as_tree(self.taxon_set).as_newick_string(), "(A,(B,C),(D,E,F))")
+
+    def testCompatibleSplitsPlacedBySize(self):
+        splits = [0x0C, 0x3C, 0x3E, 0x30]
+        h1 = treesplit.SplitHierarchy(self.mask, is_rooted=True)
+        for split in splits:
+            self.assertTrue(h1.add(split))
+        h2 = treesplit.SplitHierarchy(self.mask, is_rooted=True, compatible_splits=splits)
+        self.assertEqual(h2.clusters, h1.clusters)
+        t1 = h1.as_tree(self.taxon_set)
+        t2 = h2.as_tree(self.taxon_set)
+        self.assertEqual(t2.as_newick_string(), t1.as_newick_string())
+        self.assertEqual(t2.as_newick_string(), "(A,(B,((C,D),(E,F))))")
+
+    def testConsensusOfSplitCountsWithoutTrees(self):
+        # splits counted without trees all have a frequency of 1.0, and so
+        # are treated as majority splits, even if they are not compatible
+        taxon_set = dendropy.TaxonSet(["A", "B", "C", "D", "E"])
+        sd = treesplit.SplitDistribution(taxon_set=taxon_set)
+        sd.add_split_count(0x03) # AB|CDE
+        sd.add_split_count(0x05) # AC|BDE
+        self.assertEqual(sd.total_trees_counted, 0)
+        tree = treesum.TreeSummarizer().tree_from_splits(sd, include_edge_lengths=False)
+        self.assertEqual(tree.as_newick_string(), "(A,C,(B,D,E))")
+
 if __name__ == "__main__":
     unittest.main()
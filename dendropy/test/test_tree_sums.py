@@ -57,6 +57,23 @@ class TestConsensusTree(unittest.TestCase):
                 s2 = round(float(edge2.head_node.label), 2)
                 self.assertAlmostEqual(s1, s2, 2)
 
+    def testConsensusVariants(self):
+        con_tree = self.tree_list.consensus(min_freq=0.50)
+        tsum = treesum.TreeSummarizer()
+        sd = self.tree_list.split_distribution
+        strict_tree = tsum.strict_consensus_tree(sd)
+        majority_tree = tsum.majority_rule_consensus_tree(sd)
+        greedy_tree = tsum.greedy_consensus_tree(sd)
+        self.assertEqual(treecalc.symmetric_difference(majority_tree, con_tree), 0)
+        strict_splits = set(strict_tree.split_edges.keys())
+        majority_splits = set(majority_tree.split_edges.keys())
+        greedy_splits = set(greedy_tree.split_edges.keys())
+        self.assertTrue(strict_splits < majority_splits < greedy_splits)
+        for split in strict_splits:
+            self.assertAlmostEqual(sd.split_frequencies[split], 1.0)
+        # fully resolved
+        self.assertEqual(len(greedy_tree.internal_nodes()), len(sd.taxon_set) - 2)
+
 class TestTreeEdgeSummarization(unittest.TestCase):
 
     def setUp(self):
@@ -96,6 +113,64 @@ class TestTreeEdgeSummarization(unittest.TestCase):
             obs_edge = obs_tree.split_edges[split]
             self.assertAlmostEqual(obs_edge.head_node.age, exp_edge.head_node.age)
 
+class TestStreamingSplitSummaries(unittest.TestCase):
+
+    def setUp(self):
+        self.taxon_set = dendropy.TaxonSet()
+        self.support_trees = dendropy.TreeList.get_from_path(pathmap.tree_source_path("pythonidae.beast.mcmc.trees"),
+                "nexus",
+                taxon_set=self.taxon_set,
+                tree_offset=900)
+        self.split_dists = []
+        for store_value_lists in (True, False):
+            sd = treesplit.SplitDistribution(taxon_set=self.taxon_set,
+                    store_value_lists=store_value_lists)
+            sd.is_rooted = True
+            sd.ignore_node_ages = False
+            self.split_dists.append(sd)
+        for tree in self.support_trees:
+            tree.update_splits()
+            for sd in self.split_dists:
+                sd.count_splits_on_tree(tree)
+
+    def testSummaries(self):
+        sd1, sd2 = self.split_dists
+        self.assertEqual(sd2.split_edge_lengths, {})
+        self.assertEqual(sd2.split_node_ages, {})
+        for attr in ("split_edge_length_summaries", "split_node_age_summaries"):
+            s1 = getattr(sd1, attr)
+            s2 = getattr(sd2, attr)
+            self.assertEqual(sorted(s1.keys()), sorted(s2.keys()))
+            for split in s1:
+                for field in ('range', 'median', 'hpd95', 'quant_5_95'):
+                    self.assertEqual(s1[split][field], s2[split][field])
+                for field in ('mean', 'var'):
+                    if s1[split][field] != float('inf'):
+                        self.assertAlmostEqual(s1[split][field], s2[split][field])
+        m1 = sd1.mean_edge_lengths()
+        m2 = sd2.mean_edge_lengths()
+        self.assertEqual(sorted(m1.keys()), sorted(m2.keys()))
+        for split in m1:
+            self.assertAlmostEqual(m1[split], m2[split])
+
+    def testMergeAndSummarizeOnTree(self):
+        sd = treesplit.SplitDistribution(taxon_set=self.taxon_set, store_value_lists=False)
+        sd.is_rooted = True
+        sd.update(self.split_dists[1])
+        sd.update(self.split_dists[1])
+        self.assertEqual(sd.total_trees_counted, 2 * len(self.support_trees))
+        for split, stats in self.split_dists[1].split_node_age_stats.items():
+            self.assertEqual(sd.split_node_age_stats[split].count, 2 * stats.count)
+            self.assertAlmostEqual(sd.split_node_age_stats[split].mean, stats.mean)
+        ts = treesum.TreeSummarizer()
+        trees = []
+        for sd in self.split_dists:
+            tree = dendropy.Tree(self.support_trees[0])
+            ts.summarize_node_ages_on_tree(tree=tree, split_distribution=sd)
+            trees.append(tree)
+        for nd1, nd2 in zip(trees[0].preorder_node_iter(), trees[1].preorder_node_iter()):
+            self.assertAlmostEqual(nd1.age, nd2.age)
+
 class TestTopologyCounter(extendedtest.ExtendedTestCase):
 
     def testSimple(self):
@@ -131,5 +206,33 @@ class TestTopologyCounter(extendedtest.ExtendedTestCase):
             self.assertAlmostEqual(result_freq[0], expected_count)
             self.assertAlmostEqual(result_freq[1], expected_freq)
 
+    def testMergeAndDigestCollision(self):
+        taxa = dendropy.TaxonSet()
+        trees = dendropy.TreeList.get_from_string("""
+            [&U] (A,(B,(C,(D,E))));
+            [&U] (B,(C,(D,(A,E))));
+            [&U] (A,(B,(C,(D,E))));
+            [&U] (D,(A,(B,(C,E))));
+            """, "newick", taxon_set=taxa)
+        tc1 = treesum.TopologyCounter()
+        tc2 = treesum.TopologyCounter()
+        for tree in trees[:2]:
+            tc1.count(tree)
+        for tree in trees[2:]:
+            tc2.count(tree)
+        tc1.update_topology_hash_map(tc2.topology_hash_map, tc2.topology_exemplars)
+        self.assertEqual(tc1.total_trees_counted, 4)
+        self.assertEqual(sorted(tc1.topology_hash_map.values()), [1, 1, 2])
+        self.assertEqual(tc1.topology_hash_map[tc1.hash_topology(trees[0])], 2)
+        # every topology given the same digest
+        tc3 = treesum.TopologyCounter()
+        tc3.topology_digest = lambda splits: "0" * 16
+        for tree in trees:
+            tc3.count(tree)
+        self.assertEqual(sorted(tc3.topology_hash_map.values()), [1, 1, 2])
+        self.assertEqual(tc3.topology_hash_map["0" * 16], 2)
+        for topology_hash in tc3.topology_hash_map:
+            self.assertEqual(len(tc3.get_topology_splits(topology_hash)), 8)
+
 if __name__ == "__main__":
     unittest.main()
@@ -89,6 +89,45 @@ class TestLevelorderIter(TreeTraversalChecker):
         expected = ["i0", "i1", "T14", "i10", "i2", "i7", "T11", "T12", "i3", "i6", "i8", "T10", "T1", "i4", "T5", "T6", "T13", "T7", "i9", "i5", "T4", "T8", "T9", "T2", "T3"]
         self.assertEqual(result, expected)
 
+class TestCachedNodeLists(TreeTraversalChecker):
+
+    def testListsMatchIterators(self):
+        self.assertEqual(self.tree.preorder_node_list(),
+                [nd for nd in self.tree.preorder_node_iter()])
+        self.assertEqual(self.tree.postorder_node_list(),
+                [nd for nd in self.tree.postorder_node_iter()])
+        self.assertEqual(self.tree.leaf_nodes(),
+                [nd for nd in self.tree.leaf_iter()])
+
+    def testListsAreCopies(self):
+        nodes = self.tree.preorder_node_list()
+        del nodes[:]
+        self.assertEqual(len(self.tree.preorder_node_list()), 25)
+
+    def testListsUpdatedOnTopologyChange(self):
+        self.assertEqual(len(self.tree.postorder_node_list()), 25)
+        i10 = [nd for nd in self.tree.preorder_node_iter() if nd.oid == "i10"][0]
+        i10.new_child(oid="T15")
+        result = [nd.oid for nd in self.tree.postorder_node_list()]
+        self.assertEqual(result[-5:], ["T11", "T12", "T15", "i10", "i0"])
+        self.tree.seed_node.remove_child(i10)
+        result = [nd.oid for nd in self.tree.preorder_node_list()]
+        self.assertEqual(len(result), 22)
+        self.assertFalse("i10" in result)
+
+    def testListsUpdatedOnLadderize(self):
+        self.tree.preorder_node_list()
+        self.tree.ladderize(ascending=True)
+        self.assertEqual(self.tree.preorder_node_list(),
+                [nd for nd in self.tree.preorder_node_iter()])
+
+    def testListsUpdatedOnNewSeedNode(self):
+        self.tree.preorder_node_list()
+        i1 = self.tree.seed_node.child_nodes()[0]
+        self.tree.seed_node = i1
+        self.assertEqual(self.tree.preorder_node_list(),
+                [nd for nd in i1.preorder_iter()])
+
 class TestAgeOrderNodeIterator(unittest.TestCase):
 
     def setUp(self):
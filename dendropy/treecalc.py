@@ -20,8 +20,12 @@
 Tree metrics/statistics calculations.
 """
 from itertools import izip
-from math import sqrt
+from array import array
+from math import sqrt, fsum, isinf, isnan
 from dendropy import treesplit
+from dendropy.dataobject.flattree import FlatTree
+from dendropy.dataobject.char import SitePatterns
+from dendropy.utility.textutils import int_to_bitstring
 from dendropy.utility.messaging import get_logger
 _LOG = get_logger(__name__)
 
@@ -32,16 +36,29 @@ class PatristicDistanceMatrix(object):
     and corresponding nodes, respectively, that span the greatest path distance
     in the tree. The mid-point between the two is *guaranteed* to be on the
     closer to the first item of each pair.
+
+    The distances and MRCAs of all pairs of leaves are stored in condensed
+    form, i.e., as flat arrays holding the upper triangle of the
+    leaf-by-leaf matrix row by row, with the leaves (rows) in the order of
+    `taxa`. If `single_precision` is True, distances are stored as
+    single-precision (32-bit) floats, halving the storage required.
+
+    If the tree is a `FlatTree`, then node indices are used in place of
+    nodes, i.e., by `mrca()` and `max_dist_nodes`.
     """
 
-    def __init__(self, tree=None):
+    def __init__(self, tree=None, single_precision=False):
         self.tree = None
         self.taxon_set = None
-        self._pat_dists = {}
+        self.taxa = []
+        self.single_precision = single_precision
         self.max_dist = None
         self.max_dist_taxa = None
         self.max_dist_nodes = None
-        self._mrca = {}
+        self._taxon_index = {}
+        self._nodes = None
+        self._pat_dists = array(self._dist_typecode())
+        self._mrca = array('l')
         if tree is not None:
             self.calc(tree)
 
@@ -51,10 +68,8 @@ class PatristicDistanceMatrix(object):
         """
         if taxon1 is taxon2:
             return 0.0
-        try:
-            return self._pat_dists[taxon1][taxon2]
-        except KeyError:
-            return self._pat_dists[taxon2][taxon1]
+        return self._pat_dists[self._condensed_index(self._taxon_index[taxon1],
+                self._taxon_index[taxon2])]
 
     def mrca(self, taxon1, taxon2):
         """
@@ -62,69 +77,159 @@ class PatristicDistanceMatrix(object):
         """
         if taxon1 is taxon2:
             return taxon1
-        try:
-            return self._mrca[taxon1][taxon2]
-        except KeyError:
-            return self._mrca[taxon2][taxon1]
+        idx = self._mrca[self._condensed_index(self._taxon_index[taxon1],
+                self._taxon_index[taxon2])]
+        if self._nodes is None:
+            return idx
+        return self._nodes[idx]
+
+    def taxon_index(self, taxon):
+        """
+        Returns the index of `taxon` in `taxa`, i.e., the row of the
+        distance matrix corresponding to `taxon`.
+        """
+        return self._taxon_index[taxon]
+
+    def index_distance(self, idx1, idx2):
+        """
+        Returns the patristic distance between the taxa at indices `idx1` and
+        `idx2` of `taxa`.
+        """
+        if idx1 == idx2:
+            return 0.0
+        return self._pat_dists[self._condensed_index(idx1, idx2)]
+
+    def _condensed_index(self, idx1, idx2):
+        if idx1 > idx2:
+            idx1, idx2 = idx2, idx1
+        return len(self.taxa) * idx1 - (idx1 * (idx1 + 1)) // 2 + idx2 - idx1 - 1
+
+    def _dist_typecode(self):
+        if self.single_precision:
+            return 'f'
+        return 'd'
 
     def calc(self, tree=None, create_midpoints=None):
         """
         Calculates the distances.
+
+        The leaves are numbered in preorder, so that the leaves descending
+        from any node form a contiguous range of rows. The distances to the
+        leaves of all later siblings of a child of a node can then be filled
+        in as one contiguous slice of each row of the leaves of that child, in
+        a single postorder sweep with no copying of per-node collections.
         """
         if tree is not None:
             self.tree = tree
-        assert tree is not None
-        if not hasattr(self.tree, "split_edges"):
-            treesplit.encode_splits(self.tree)
-        self.taxon_set = tree.taxon_set
-        self._pat_dists = {}
-        for i1, t1 in enumerate(self.taxon_set):
-            self._pat_dists[t1] = {}
-            self._mrca[t1] = {}
-            self.max_dist = None
-            self.max_dist_taxa = None
-            self.max_dist_nodes = None
-
-        for node in tree.postorder_node_iter():
-            children = node.child_nodes()
-            if len(children) == 0:
-                node.desc_paths = {node : 0}
+        assert self.tree is not None
+        tree = self.tree
+        if isinstance(tree, FlatTree):
+            flat = tree
+            self._nodes = None
+        else:
+            if not hasattr(tree, "split_edges"):
+                treesplit.encode_splits(tree)
+            flat = FlatTree.from_tree(tree)
+            self._nodes = tree.preorder_node_list()
+        self.taxon_set = flat.taxon_set
+        self.max_dist = None
+        self.max_dist_taxa = None
+        self.max_dist_nodes = None
+
+        child_offsets = flat.child_offsets
+        child_counts = flat.child_counts
+        child_indices = flat.child_indices
+        taxon_indices = flat.taxon_indices
+        root_dists = flat.calc_root_distances()
+        num_nodes = len(flat)
+
+        leaves = []
+        leaf_start = array('l', [0]) * num_nodes
+        leaf_stop = array('l', [0]) * num_nodes
+        for idx in flat.preorder_indices:
+            if not child_counts[idx]:
+                leaf_start[idx] = len(leaves)
+                leaf_stop[idx] = len(leaves) + 1
+                leaves.append(idx)
+        self.taxa = []
+        self._taxon_index = {}
+        for rank, idx in enumerate(leaves):
+            if taxon_indices[idx] >= 0:
+                taxon = self.taxon_set[taxon_indices[idx]]
+                self._taxon_index[taxon] = rank
             else:
-                node.desc_paths = {}
-                for cidx1, c1 in enumerate(children):
-                    for desc1, desc1_plen in c1.desc_paths.items():
-                        node.desc_paths[desc1] = desc1_plen + c1.edge.length
-                        for c2 in children[cidx1+1:]:
-                            for desc2, desc2_plen in c2.desc_paths.items():
-                                pat_dist = node.desc_paths[desc1] + desc2_plen + c2.edge.length
-                                self._pat_dists[desc1.taxon][desc2.taxon] = pat_dist
-                                self._mrca[desc1.taxon][desc2.taxon] = c1.parent_node
-                                if pat_dist > self.max_dist:
-                                    self.max_dist = pat_dist
-                                    midpoint = float(pat_dist) / 2
-                                    if midpoint - node.desc_paths[desc1] <= 0:
-                                        self.max_dist_nodes = (desc1, desc2)
-                                        self.max_dist_taxa = (desc1.taxon, desc2.taxon)
-                                    else:
-                                        self.max_dist_nodes = (desc2, desc1)
-                                        self.max_dist_taxa = (desc2.taxon, desc1.taxon)
-                    del(c1.desc_paths)
+                taxon = None
+            self.taxa.append(taxon)
+        num_leaves = len(leaves)
+        leaf_dists = array('d', [root_dists[idx] for idx in leaves])
+
+        num_pairs = (num_leaves * (num_leaves - 1)) // 2
+        typecode = self._dist_typecode()
+        pat_dists = array(typecode, [0.0]) * num_pairs
+        mrcas = array('l', [0]) * num_pairs
+        max_dist = None
+        max_pair = None
+        for idx in flat.postorder_indices:
+            count = child_counts[idx]
+            if not count:
+                continue
+            start = child_offsets[idx]
+            leaf_start[idx] = leaf_start[child_indices[start]]
+            stop = leaf_stop[child_indices[start + count - 1]]
+            leaf_stop[idx] = stop
+            node_dist = 2 * root_dists[idx]
+            for cidx in xrange(start, start + count - 1):
+                child = child_indices[cidx]
+                lo = leaf_stop[child]
+                row_mrcas = array('l', [idx]) * (stop - lo)
+                for i in xrange(leaf_start[child], lo):
+                    offset = num_leaves * i - (i * (i + 1)) // 2 - i - 1
+                    d1 = leaf_dists[i] - node_dist
+                    row = array(typecode, [d1 + d2 for d2 in leaf_dists[lo:stop]])
+                    pat_dists[offset + lo:offset + stop] = row
+                    mrcas[offset + lo:offset + stop] = row_mrcas
+                    row_max = max(row)
+                    if max_dist is None or row_max > max_dist:
+                        max_dist = row_max
+                        max_pair = (i, lo + list(row).index(row_max), idx)
+        self._pat_dists = pat_dists
+        self._mrca = mrcas
+
+        if max_pair is not None:
+            i, j, idx = max_pair
+            self.max_dist = max_dist
+            leaf1, leaf2 = leaves[i], leaves[j]
+            midpoint = float(max_dist) / 2
+            if midpoint - (root_dists[leaf1] - root_dists[idx]) > 0:
+                i, j = j, i
+                leaf1, leaf2 = leaf2, leaf1
+            self.max_dist_taxa = (self.taxa[i], self.taxa[j])
+            if self._nodes is None:
+                self.max_dist_nodes = (leaf1, leaf2)
+            else:
+                self.max_dist_nodes = (self._nodes[leaf1], self._nodes[leaf2])
 
     def distances(self):
         """
         Returns list of patristic distances.
         """
-        dists = []
-        for dt in self._pat_dists.values():
-            for d in dt.values():
-                dists.append(d)
-        return dists
+        return list(self._pat_dists)
+
+    def condensed_distances(self):
+        """
+        Returns the distances between all pairs of taxa as a condensed
+        distance vector (an `array`), i.e., the upper triangle of the
+        distance matrix, row by row, with rows in the order of `taxa`. This
+        is the form expected by most hierarchical clustering routines (e.g.,
+        `scipy.cluster.hierarchy.linkage`).
+        """
+        return array(self._pat_dists.typecode, self._pat_dists)
 
     def sum_of_distances(self):
         """
         Returns sum of patristic distances on tree.
         """
-        return sum(self.distances())
+        return sum(self._pat_dists)
 
 def patristic_distance(tree, taxon1, taxon2):
     """
@@ -192,6 +297,22 @@ def get_length_diffs(tree1,
     if tree1.taxon_set is not tree2.taxon_set:
         raise TypeError("Trees have different TaxonSet objects: %s vs. %s" \
                 % (hex(id(tree1.taxon_set)), hex(id(tree2.taxon_set))))
+    if isinstance(tree1, FlatTree) or isinstance(tree2, FlatTree):
+        if edge_length_attr != "length":
+            raise ValueError("Only edge lengths are available on FlatTree objects")
+        split_lengths1 = _get_split_lengths(tree1)
+        split_lengths2 = _get_split_lengths(tree2)
+        for split, elen1 in split_lengths1.iteritems():
+            length_diffs.append((value_type(elen1), value_type(split_lengths2.get(split, 0.0))))
+            split_length_diffs[split] = length_diffs[-1]
+        for split, elen2 in split_lengths2.iteritems():
+            if split not in split_lengths1:
+                length_diffs.append((value_type(0.0), value_type(elen2)))
+                split_length_diffs[split] = length_diffs[-1]
+        if split_length_diff_map:
+            return length_diffs, split_length_diffs
+        else:
+            return length_diffs
     if not hasattr(tree1, "split_edges"):
         treesplit.encode_splits(tree1)
     if not hasattr(tree2, "split_edges"):
@@ -258,6 +379,27 @@ def get_length_diffs(tree1,
     else:
         return length_diffs
 
+def _get_split_lengths(tree, edge_length_attr="length"):
+    """
+    Returns a dictionary mapping the splits of `tree` (a `Tree` or a
+    `FlatTree`) to the `edge_length_attr` values of the edges subtending them
+    (0.0 if not defined).
+    """
+    if isinstance(tree, FlatTree):
+        if edge_length_attr != "length":
+            raise ValueError("Only edge lengths are available on FlatTree objects")
+        return tree.split_edge_lengths()
+    if not hasattr(tree, "split_edges"):
+        treesplit.encode_splits(tree)
+    split_lengths = {}
+    for split, edge in tree.split_edges.iteritems():
+        elen = getattr(edge, edge_length_attr)
+        if elen is None:
+            split_lengths[split] = 0.0
+        else:
+            split_lengths[split] = float(elen)
+    return split_lengths
+
 def splits_distance(tree1,
                     tree2,
                     dist_func=robinson_foulds_calc,
@@ -336,7 +478,360 @@ def false_positives_and_negatives(reference_tree, test_tree):
     return false_positives, false_negatives
 
 
-def fitch_down_pass(postorder_node_list, attr_name="state_sets", weight_list=None, taxa_to_state_set_map=None):
+def _get_tree_split_sets(trees):
+    """
+    Returns a tuple, (`split_sets`, `split_counts`, `num_common`), where
+    `split_sets` is a list with, for each tree in `trees`, an integer with
+    bits set for the IDs of those of its splits that are found in some but
+    not all of the other trees, `split_counts` is the total number of splits
+    on each tree, and `num_common` is the number of splits found on all the
+    trees. Splits found on only one or on all trees are left out of the
+    split sets as they do not affect the number of splits shared between
+    two trees beyond a constant.
+    """
+    taxon_set = None
+    split_ids = {}
+    split_freqs = []
+    tree_split_ids = []
+    split_counts = []
+    for tree in trees:
+        if taxon_set is None:
+            taxon_set = tree.taxon_set
+        elif tree.taxon_set is not taxon_set:
+            raise TypeError("Trees have different TaxonSet objects: %s vs. %s" \
+                    % (hex(id(taxon_set)), hex(id(tree.taxon_set))))
+        if not hasattr(tree, "split_edges"):
+            treesplit.encode_splits(tree)
+        ids = []
+        for split in tree.split_edges:
+            try:
+                split_id = split_ids[split]
+                split_freqs[split_id] += 1
+            except KeyError:
+                split_id = len(split_freqs)
+                split_ids[split] = split_id
+                split_freqs.append(1)
+            ids.append(split_id)
+        tree_split_ids.append(ids)
+        split_counts.append(len(ids))
+    num_trees = len(tree_split_ids)
+    num_common = 0
+    for freq in split_freqs:
+        if freq == num_trees:
+            num_common += 1
+    # renumber the informative splits so that the split sets are as short as
+    # possible
+    bit_ids = [None] * len(split_freqs)
+    next_bit = 0
+    for split_id, freq in enumerate(split_freqs):
+        if 1 < freq < num_trees:
+            bit_ids[split_id] = next_bit
+            next_bit += 1
+    split_sets = []
+    for ids in tree_split_ids:
+        split_set = 0
+        for split_id in ids:
+            bit = bit_ids[split_id]
+            if bit is not None:
+                split_set |= 1 << bit
+        split_sets.append(split_set)
+    return split_sets, split_counts, num_common
+
+def _calc_rf_rows(split_sets, split_counts, num_common, start, stop):
+    """
+    Returns a list of the rows `start` to `stop` of the upper triangle of the
+    symmetric difference matrix of the trees described by `split_sets`,
+    `split_counts` and `num_common` (see `_get_tree_split_sets()`).
+    """
+    rows = []
+    num_trees = len(split_sets)
+    count_bits = treesplit.count_bits
+    for i in xrange(start, stop):
+        set1 = split_sets[i]
+        base = split_counts[i] - 2 * num_common
+        row = array('l', [0]) * (num_trees - i - 1)
+        for j in xrange(i + 1, num_trees):
+            row[j - i - 1] = base + split_counts[j] - 2 * count_bits(set1 & split_sets[j])
+        rows.append(row)
+    return rows
+
+_RF_WORKER_DATA = None
+
+def _init_rf_worker(split_sets, split_counts, num_common):
+    global _RF_WORKER_DATA
+    _RF_WORKER_DATA = (split_sets, split_counts, num_common)
+
+def _rf_worker(row_range):
+    split_sets, split_counts, num_common = _RF_WORKER_DATA
+    return _calc_rf_rows(split_sets, split_counts, num_common, row_range[0], row_range[1])
+
+def iter_rf_distance_rows(trees, chunk_size=100, num_processes=1):
+    """
+    Iterates over the rows of the upper triangle of the matrix of symmetric
+    differences (unweighted Robinson-Foulds distances) between all pairs of
+    trees in `trees` (which must all share the same `TaxonSet`), yielding
+    for each tree, in order, an `array` of the distances between it and all
+    the trees that follow it. Splits are encoded on trees that do not
+    already have `split_edges`.
+
+    Each distinct split is hashed once to an integer ID, and each tree is
+    represented by an integer with the bits of the IDs of its splits set, so
+    that the number of splits shared by two trees is the number of bits set
+    in the intersection of their split sets.
+
+    Rows are calculated `chunk_size` rows at a time, so only a chunk of rows
+    needs to be held in memory at once. If `num_processes` is greater than
+    1, chunks are calculated in parallel by a pool of that many processes.
+    """
+    split_sets, split_counts, num_common = _get_tree_split_sets(trees)
+    num_trees = len(split_sets)
+    chunk_size = max(1, chunk_size)
+    row_ranges = [(start, min(start + chunk_size, num_trees)) \
+            for start in xrange(0, num_trees, chunk_size)]
+    if num_processes > 1 and len(row_ranges) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(num_processes,
+                _init_rf_worker,
+                (split_sets, split_counts, num_common))
+        try:
+            for rows in pool.imap(_rf_worker, row_ranges):
+                for row in rows:
+                    yield row
+        finally:
+            pool.terminate()
+    else:
+        for start, stop in row_ranges:
+            for row in _calc_rf_rows(split_sets, split_counts, num_common, start, stop):
+                yield row
+
+def rf_distance_matrix(trees, chunk_size=100, num_processes=1):
+    """
+    Returns the symmetric differences (unweighted Robinson-Foulds distances)
+    between all pairs of trees in `trees` as a condensed distance vector,
+    i.e., an `array` holding the upper triangle of the distance matrix,
+    row by row, in the order of the trees. `chunk_size` and `num_processes`
+    are as for `iter_rf_distance_rows()`.
+    """
+    dists = array('l')
+    for row in iter_rf_distance_rows(trees,
+            chunk_size=chunk_size,
+            num_processes=num_processes):
+        dists.extend(row)
+    return dists
+
+def _square(x):
+    return x * x
+
+def _partials(values):
+    """
+    Returns a short list of non-overlapping floats that sum exactly to the
+    sum of `values` (the partial sums kept by `math.fsum()`, following
+    Shewchuk's algorithm), so that the exact sum of `values` and other
+    numbers can later be obtained by `fsum()` without visiting `values`
+    again. Values with an infinite or undefined sum are returned as they are.
+    """
+    total = fsum(values)
+    if isinf(total) or isnan(total):
+        return list(values)
+    partials = []
+    for x in values:
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+    return partials
+
+class SplitLengthMatrix(object):
+    """
+    Edge lengths (or other `edge_length_attr` values) of a collection of
+    trees sharing the same `TaxonSet`, stored as a sparse trees-by-splits
+    matrix over a split index space shared by all the trees, for calculating
+    branch-length-aware distances between all pairs of trees, or between a
+    reference tree and all the trees, in bulk.
+
+    Distances are calculated by `metric`, one of:
+
+        - "robinson_foulds" : the weighted Robinson-Foulds distance (sum of
+          absolute differences of lengths; `robinson_foulds_distance()`)
+        - "euclidean" : the Euclidean branch length distance (square root
+          of the sum of squared differences; `euclidean_distance()`)
+        - "branch_score" : the Kuhner-Felsenstein branch score (sum of
+          squared differences; `brlen_scores_calc()`)
+
+    A split found on only one of two trees contributes its full length. For
+    each pair of trees, only the splits they share are visited: the
+    contribution of the splits found on just one of the two trees is
+    obtained by removing that of their shared splits from that of all the
+    splits of both trees, using exact (`math.fsum`) summation, so that small
+    differences between trees with long shared edges are not lost. The
+    exact sum for each tree is calculated once, and kept as a short list of
+    partial sums, so the time taken for each pair is proportional to the
+    number of splits they share (plus the length of these lists, which is
+    usually very small).
+    """
+
+    METRICS = ("robinson_foulds", "euclidean", "branch_score")
+
+    def __init__(self, trees=None, edge_length_attr="length"):
+        self.taxon_set = None
+        self.edge_length_attr = edge_length_attr
+        self.splits = []
+        self._split_ids = {}
+        self._postings = []
+        self._rows = []
+        self._partials_cache = None
+        if trees is not None:
+            for tree in trees:
+                self.add_tree(tree)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _get_row(self, tree, add_splits):
+        if self.taxon_set is None:
+            self.taxon_set = tree.taxon_set
+        elif tree.taxon_set is not self.taxon_set:
+            raise TypeError("Trees have different TaxonSet objects: %s vs. %s" \
+                    % (hex(id(self.taxon_set)), hex(id(tree.taxon_set))))
+        row = {}
+        unindexed = []
+        for split, length in _get_split_lengths(tree, self.edge_length_attr).iteritems():
+            split_id = self._split_ids.get(split)
+            if split_id is None:
+                if not add_splits:
+                    unindexed.append(length)
+                    continue
+                split_id = len(self.splits)
+                self._split_ids[split] = split_id
+                self.splits.append(split)
+                self._postings.append([])
+            row[split_id] = length
+        return row, unindexed
+
+    def add_tree(self, tree):
+        """
+        Adds the splits and edge lengths of `tree` (a `Tree` or `FlatTree`)
+        as a new row of the matrix. Splits are encoded on trees that do not
+        already have `split_edges`.
+        """
+        row, unindexed = self._get_row(tree, add_splits=True)
+        tree_idx = len(self._rows)
+        for split_id, length in row.iteritems():
+            self._postings[split_id].append((tree_idx, length))
+        self._rows.append(row)
+
+    def _get_value_fn(self, metric):
+        if metric == "robinson_foulds":
+            return abs
+        elif metric in ("euclidean", "branch_score"):
+            return _square
+        else:
+            raise ValueError("Unrecognized metric: '%s' (must be one of: %s)" \
+                    % (metric, ", ".join(self.METRICS)))
+
+    def _calc_distances(self, row, num_splits, partials, first_idx, value_fn, metric):
+        # distances between the tree given by `row` (with `num_splits` splits
+        # in all, the values of which sum exactly to the sum of `partials`)
+        # and the trees with indices from `first_idx` onwards
+        num_trees = len(self._rows)
+        shared_counts = array('l', [0]) * num_trees
+        shared_diffs = array('d', [0.0]) * num_trees
+        # negated values of the splits shared with each tree, to be removed
+        # (exactly) from the sum of the values of all the splits of both trees
+        shared_values = [None] * num_trees
+        postings = self._postings
+        for split_id, length1 in row.iteritems():
+            value1 = -value_fn(length1)
+            for tree_idx, length2 in postings[split_id]:
+                if tree_idx >= first_idx:
+                    shared_counts[tree_idx] += 1
+                    shared_diffs[tree_idx] += value_fn(length1 - length2)
+                    values = shared_values[tree_idx]
+                    if values is None:
+                        values = shared_values[tree_idx] = []
+                    values.append(value1)
+                    values.append(-value_fn(length2))
+        tree_partials = self._partials(value_fn)
+        rows = self._rows
+        dists = array('d', [0.0]) * (num_trees - first_idx)
+        for tree_idx in xrange(first_idx, num_trees):
+            d = shared_diffs[tree_idx]
+            # splits on only one of the trees; checking the shared counts
+            # keeps identical trees at a distance of exactly 0
+            count = shared_counts[tree_idx]
+            if count != num_splits or count != len(rows[tree_idx]):
+                values = shared_values[tree_idx]
+                if values is None:
+                    values = []
+                d += fsum(partials + tree_partials[tree_idx] + values)
+            if metric == "euclidean":
+                d = sqrt(d)
+            dists[tree_idx - first_idx] = d
+        return dists
+
+    def _partials(self, value_fn):
+        # partial sums (see `_partials()`) of the values of the splits of
+        # each tree
+        cache = self._partials_cache
+        if cache is None or cache[0] is not value_fn or len(cache[1]) != len(self._rows):
+            partials = [_partials([value_fn(v) for v in row.itervalues()]) for row in self._rows]
+            self._partials_cache = (value_fn, partials)
+        return self._partials_cache[1]
+
+    def iter_distance_rows(self, metric="robinson_foulds"):
+        """
+        Iterates over the rows of the upper triangle of the matrix of
+        `metric` distances between all pairs of trees, yielding for each
+        tree, in order, an `array` of the distances between it and all the
+        trees that follow it.
+        """
+        value_fn = self._get_value_fn(metric)
+        tree_partials = self._partials(value_fn)
+        for tree_idx, row in enumerate(self._rows):
+            yield self._calc_distances(row,
+                    len(row),
+                    tree_partials[tree_idx],
+                    tree_idx + 1,
+                    value_fn,
+                    metric)
+
+    def distance_matrix(self, metric="robinson_foulds"):
+        """
+        Returns the `metric` distances between all pairs of trees as a
+        condensed distance vector, i.e., an `array` holding the upper
+        triangle of the distance matrix, row by row, in the order in which
+        the trees were added.
+        """
+        dists = array('d')
+        for row in self.iter_distance_rows(metric=metric):
+            dists.extend(row)
+        return dists
+
+    def reference_distances(self, tree, metric="robinson_foulds"):
+        """
+        Returns an `array` of the `metric` distances between `tree` (which
+        need not have been added) and each of the trees, in the order in which
+        they were added.
+        """
+        value_fn = self._get_value_fn(metric)
+        row, unindexed = self._get_row(tree, add_splits=False)
+        values = [value_fn(v) for v in row.itervalues()] \
+                + [value_fn(v) for v in unindexed]
+        return self._calc_distances(row,
+                len(values),
+                _partials(values),
+                0,
+                value_fn,
+                metric)
+
+def fitch_down_pass(postorder_node_list, attr_name="state_sets", weight_list=None, taxa_to_state_set_map=None, site_patterns=None):
     """
     Reads `attr_name` attribute of leaves as an iterable of state sets, and
     sets that attribute for internal nodes using the "preliminary phase" of
@@ -351,9 +846,18 @@ def fitch_down_pass(postorder_node_list, attr_name="state_sets", weight_list=Non
             then the nodes.taxon will be used as a key in taxa_to_state_set_map
             to find the state set. This allows for the scoring of
             previously undecorated trees.
+        `site_patterns`
+            a `SitePatterns` object: if given, and `taxa_to_state_set_map`
+            and `weight_list` are not, the state sets of the taxa in each
+            of its patterns, and the weights of its patterns, are used.
 
     Currently this requires a bifurcating tree (even at the root).
     """
+    if site_patterns is not None:
+        if taxa_to_state_set_map is None:
+            taxa_to_state_set_map = site_patterns.taxon_state_sets()
+        if weight_list is None:
+            weight_list = site_patterns.weights
     score = 0
     for nd in postorder_node_list:
         c = nd.child_nodes()
@@ -461,3 +965,310 @@ def fitch_up_pass(preorder_node_list, attr_name="state_sets", taxa_to_state_set_
             #                    (str(curr_ss), str(par_ss), str(left_ss), str(right_ss), str(final_ss)))
             result.append(final_ss)
         setattr(nd, attr_name, result)
+
+###############################################################################
+## Bit-Parallel Fitch Parsimony
+
+def _bitsliced_increment(planes, mask, start=0):
+    """
+    Adds 1 (at the positions set in `mask`) to a "bit-sliced" vector of
+    numbers, i.e., a list of integers, `planes`, of which the `b`-th gives
+    bit `b` of the number at each (bit) position, starting from plane
+    `start`.
+    """
+    carry = mask
+    idx = start
+    while carry:
+        if idx == len(planes):
+            planes.append(carry)
+            return
+        plane = planes[idx]
+        planes[idx] = plane ^ carry
+        carry = plane & carry
+        idx += 1
+
+def _bitsliced_add(planes, addend):
+    "Adds the bit-sliced vector of numbers `addend` to `planes`."
+    carry = 0
+    for idx, bits in enumerate(addend):
+        if idx == len(planes):
+            planes.append(0)
+        plane = planes[idx]
+        planes[idx] = plane ^ bits ^ carry
+        carry = (plane & bits) | (carry & (plane ^ bits))
+    _bitsliced_increment(planes, carry, len(addend))
+
+def _bitsliced_decrement(planes, mask):
+    """
+    Returns the bit-sliced vector of numbers `planes`, less 1 at the
+    positions set in `mask` (which must all be at least 1).
+    """
+    result = []
+    borrow = mask
+    for plane in planes:
+        result.append(plane ^ borrow)
+        borrow = borrow & ~plane
+    while result and not result[-1]:
+        result.pop()
+    return result
+
+def _bit_indices(mask):
+    "Returns list of the indices of the bits set in `mask`."
+    return [idx for idx, bit in enumerate(int_to_bitstring(mask)[::-1]) if bit == "1"]
+
+class FitchScorer(object):
+    """
+    Calculates parsimony scores of trees for a character matrix, using
+    Fitch's (1971) unordered parsimony algorithm, as generalized by Hartigan
+    (1973) to trees with polytomies, on all sites at once.
+
+    The matrix is compressed into its distinct site patterns (see
+    `SitePatterns`), and the state sets of a node at all the patterns are
+    encoded as a list of bit vectors (Python integers), one for each
+    fundamental state of the state alphabet, in which bit `i` is set if the
+    state is in the state set at pattern `i`. Each step of the algorithm is
+    thus carried out for all patterns by a few bitwise operations. As the bit
+    vectors of the taxa are only built once, many trees (e.g., a posterior
+    sample, or bootstrap trees) can be scored efficiently against the same
+    matrix (see `score_trees()`).
+
+    Unlike `fitch_down_pass()` and `fitch_up_pass()`, trees may have nodes of
+    any degree: a basal trifurcation, for example, gives the score of the
+    unrooted tree.
+    """
+
+    def __init__(self, char_matrix=None, site_patterns=None, **kwargs):
+        """
+        Requires either `char_matrix`, a `DiscreteCharacterMatrix`, or
+        `site_patterns`, a `SitePatterns` object. Other keyword arguments
+        (e.g., `gaps_as_missing`) are passed to `SitePatterns` when
+        compressing `char_matrix`.
+        """
+        if site_patterns is None:
+            if char_matrix is None:
+                raise TypeError("Must specify either 'char_matrix' or 'site_patterns'")
+            site_patterns = SitePatterns(char_matrix, **kwargs)
+        self.site_patterns = site_patterns
+        state_alphabet = site_patterns.state_alphabet
+        fundamental_states = set()
+        for state in state_alphabet:
+            fundamental_states.update(state.fundamental_states)
+        self.fundamental_state_indices = [idx for idx, state in enumerate(state_alphabet) if state in fundamental_states]
+        self.num_patterns = len(site_patterns)
+        self.total_weight = sum(site_patterns.weights)
+        self._all_patterns = (1L << self.num_patterns) - 1
+        self._weight_planes = self._build_weight_planes(site_patterns.weights)
+        self.taxon_state_masks = self._build_taxon_state_masks()
+
+    def _build_weight_planes(self, weights):
+        weight_planes = []
+        bit = 0
+        while [w for w in weights if w >> bit]:
+            bits = ["0"]
+            bits.extend([str((w >> bit) & 1) for w in reversed(weights)])
+            weight_planes.append(long("".join(bits), 2))
+            bit += 1
+        return weight_planes
+
+    def _build_taxon_state_masks(self):
+        """
+        Returns a dictionary mapping each taxon of the patterns to its list
+        of state bit vectors (one for each fundamental state).
+        """
+        site_patterns = self.site_patterns
+        state_alphabet = site_patterns.state_alphabet
+        state_indices = state_alphabet.state_index_map()
+        tables = []
+        for state_index in self.fundamental_state_indices:
+            table = []
+            for state in state_alphabet:
+                if state_alphabet[state_index] in state.fundamental_states:
+                    table.append("1")
+                else:
+                    table.append("0")
+            tables.append(table)
+        if len(state_alphabet) <= 256:
+            tables = [("".join(table) + ("0" * (256 - len(table)))) for table in tables]
+        taxon_state_masks = {}
+        for taxon_index, taxon in enumerate(site_patterns.taxa):
+            row = [pattern[taxon_index] for pattern in site_patterns.patterns]
+            row.reverse()
+            masks = []
+            if len(state_alphabet) <= 256:
+                row = array('B', row).tostring()
+                for table in tables:
+                    masks.append(long("0" + row.translate(table), 2))
+            else:
+                for table in tables:
+                    masks.append(long("0" + "".join([table[i] for i in row]), 2))
+            taxon_state_masks[taxon] = masks
+        return taxon_state_masks
+
+    def _weighted_count(self, mask):
+        "Returns the sum of the weights of the patterns set in `mask`."
+        total = 0
+        for bit, plane in enumerate(self._weight_planes):
+            total += treesplit.count_bits(mask & plane) << bit
+        return total
+
+    def _hartigan_sets(self, child_sets, upper_sets):
+        """
+        Returns a tuple of three values for a node with children with state
+        sets `child_sets`: the states found in the most children, the states
+        found in one less than the most children (if `upper_sets` is True,
+        else None), and the most children sharing a state less one (as a
+        bit-sliced vector).
+        """
+        all_patterns = self._all_patterns
+        counts = [[] for i in self.fundamental_state_indices]
+        for child in child_sets:
+            for count, mask in izip(counts, child):
+                _bitsliced_increment(count, mask)
+        num_planes = max([len(count) for count in counts])
+        for count in counts:
+            count.extend([0] * (num_planes - len(count)))
+        states = [all_patterns] * len(counts)
+        max_planes = [0] * num_planes
+        for bit in range(num_planes-1, -1, -1):
+            has_bit = [count[bit] & alive for count, alive in izip(counts, states)]
+            any_bit = 0
+            for mask in has_bit:
+                any_bit |= mask
+            max_planes[bit] = any_bit
+            not_any_bit = all_patterns ^ any_bit
+            states = [mask | (alive & not_any_bit) for mask, alive in izip(has_bit, states)]
+        max_less_one = _bitsliced_decrement(max_planes, all_patterns)
+        if not upper_sets:
+            return states, None, max_less_one
+        max_less_one_planes = max_less_one + [0] * (num_planes - len(max_less_one))
+        upper = []
+        for count in counts:
+            equal = all_patterns
+            for plane, target in izip(count, max_less_one_planes):
+                equal &= ~(plane ^ target)
+            upper.append(equal)
+        return states, upper, max_less_one
+
+    def _down_pass(self, tree, upper_sets=False):
+        """
+        Returns a tuple of four values: a dictionary mapping the nodes of
+        `tree` to their (preliminary) state sets, a dictionary mapping the
+        internal nodes to their "upper" state sets (if `upper_sets` is True),
+        and the minimum number of changes at each pattern, as a number of
+        changes and a bit-sliced vector of numbers to be subtracted from it.
+        """
+        all_patterns = self._all_patterns
+        taxon_state_masks = self.taxon_state_masks
+        node_sets = {}
+        node_upper_sets = {}
+        savings = []
+        num_changes = 0
+        for nd in tree.postorder_node_iter():
+            children = nd.child_nodes()
+            if not children:
+                node_sets[nd] = taxon_state_masks[nd.taxon]
+                continue
+            if len(children) == 2:
+                left = node_sets[children[0]]
+                right = node_sets[children[1]]
+                inter = [l & r for l, r in izip(left, right)]
+                nonempty = 0
+                for mask in inter:
+                    nonempty |= mask
+                empty = all_patterns ^ nonempty
+                if empty:
+                    node_sets[nd] = [i | ((l | r) & empty) for i, l, r in izip(inter, left, right)]
+                else:
+                    node_sets[nd] = inter
+                if upper_sets:
+                    node_upper_sets[nd] = [(((l | r) ^ i) & nonempty) | (empty & ~(l | r)) \
+                            for i, l, r in izip(inter, left, right)]
+                _bitsliced_increment(savings, nonempty)
+            else:
+                states, upper, max_less_one = self._hartigan_sets([node_sets[c] for c in children], upper_sets)
+                node_sets[nd] = states
+                if upper_sets:
+                    node_upper_sets[nd] = upper
+                _bitsliced_add(savings, max_less_one)
+            num_changes += len(children) - 1
+        return node_sets, node_upper_sets, num_changes, savings
+
+    def _up_pass(self, tree, node_sets, node_upper_sets):
+        """
+        Returns a dictionary mapping the nodes of `tree` to their final state
+        sets, given their preliminary and upper state sets. As with
+        `fitch_up_pass()`, the state sets of the leaves are not changed.
+        """
+        final_sets = {}
+        for nd in tree.preorder_node_iter():
+            if nd.parent_node is None or nd.is_leaf():
+                final_sets[nd] = node_sets[nd]
+                continue
+            parent_sets = final_sets[nd.parent_node]
+            lower = node_sets[nd]
+            upper = node_upper_sets[nd]
+            not_subset = 0
+            for f, l in izip(parent_sets, lower):
+                not_subset |= f & ~l
+            final_sets[nd] = [(f & (l | u)) | (l & not_subset) for f, l, u in izip(parent_sets, lower, upper)]
+        return final_sets
+
+    def _pattern_scores(self, num_changes, savings):
+        pattern_scores = [num_changes] * self.num_patterns
+        for bit, plane in enumerate(savings):
+            for idx in _bit_indices(plane):
+                pattern_scores[idx] -= 1 << bit
+        return pattern_scores
+
+    def _state_sets(self, masks):
+        """
+        Returns a list of the sets of the indices (in the state alphabet) of
+        the states set in `masks` at each pattern.
+        """
+        state_sets = [set() for i in range(self.num_patterns)]
+        for state_index, mask in izip(self.fundamental_state_indices, masks):
+            for idx in _bit_indices(mask):
+                state_sets[idx].add(state_index)
+        return state_sets
+
+    def score(self, tree):
+        "Returns the (weighted) parsimony score of `tree`."
+        node_sets, node_upper_sets, num_changes, savings = self._down_pass(tree)
+        score = num_changes * self.total_weight
+        for bit, plane in enumerate(savings):
+            score -= self._weighted_count(plane) << bit
+        return score
+
+    def score_trees(self, trees):
+        "Returns list of the (weighted) parsimony scores of `trees`."
+        return [self.score(tree) for tree in trees]
+
+    def pattern_scores(self, tree):
+        "Returns list of the (unweighted) parsimony scores of each pattern."
+        node_sets, node_upper_sets, num_changes, savings = self._down_pass(tree)
+        return self._pattern_scores(num_changes, savings)
+
+    def site_scores(self, tree, excluded_value=None):
+        """
+        Returns list of the parsimony scores of each site, with
+        `excluded_value` for sites excluded from the patterns.
+        """
+        return self.site_patterns.site_values(self.pattern_scores(tree), excluded_value)
+
+    def assign_state_sets(self, tree, attr_name="state_sets", final=True):
+        """
+        Sets the attribute `attr_name` of each node of `tree` to a list of
+        the sets of the indices of its states (as `fitch_down_pass()` and
+        `fitch_up_pass()` do) at each pattern: the preliminary sets of the
+        "down" pass, or, if `final` is True, the final sets of the "up"
+        pass. Returns the (weighted) parsimony score of the tree.
+        """
+        node_sets, node_upper_sets, num_changes, savings = self._down_pass(tree, upper_sets=final)
+        if final:
+            node_sets = self._up_pass(tree, node_sets, node_upper_sets)
+        for nd, masks in node_sets.iteritems():
+            setattr(nd, attr_name, self._state_sets(masks))
+        score = num_changes * self.total_weight
+        for bit, plane in enumerate(savings):
+            score -= self._weighted_count(plane) << bit
+        return score
@@ -20,6 +20,10 @@
 Split calculation and management.
 """
 
+import sys
+import json
+import base64
+from array import array
 from copy import deepcopy
 from dendropy.utility import messaging
 _LOG = messaging.get_logger(__name__)
@@ -35,91 +39,177 @@ import dendropy
 
 def tree_from_splits(splits,
         taxon_set,
-        is_rooted=False):
+        is_rooted=False,
+        node_factory=None):
     """
     Builds a tree from a set of splits, `splits`, using taxon references from
     `taxon_set`.
     If `is_rooted` is True, then tree will be rooted.
-    If `split_edge_lengths` is not None, it should be a dictionary mapping
-    splits to edge lengths.
-    """
-    leaf_to_root_search = True
-    con_tree = dendropy.Tree(taxon_set=taxon_set)
-    con_tree.is_rooted = is_rooted
-    for taxon in taxon_set:
-        con_tree.seed_node.new_child(taxon=taxon)
-    taxa_mask = taxon_set.all_taxa_bitmask()
-    encode_splits(con_tree)
-    leaves = con_tree.leaf_nodes()
-
-    if leaf_to_root_search:
-        to_leaf_dict = {}
-        for leaf in leaves:
-            to_leaf_dict[leaf.edge.split_bitmask] = leaf
-
-    root = con_tree.seed_node
-    root_edge = root.edge
-
-    splits_to_add = []
-    #new_old_split_map = {}
-    for s in splits:
-        m = s & taxa_mask
-        if (m != taxa_mask) and ((m-1) & m): # if not root (i.e., all "1's") and not singleton (i.e., one "1")
-            if not is_rooted:
-                c = (~m) & taxa_mask
-                if (c-1) & c: # not singleton (i.e., one "0")
-                    if 1 & m:
-                        k = c
-                    else:
-                        k = m
-                    splits_to_add.append(k)
-                    #new_old_split_map[k] = m
-            else:
-                splits_to_add.append(m)
-                #new_old_split_map[m] = m
-
-    # Now when we add splits in order, we will do a greedy, extended majority-rule consensus tree
-    #for freq, split_to_add, split_in_dict in to_try_to_add:
-    for split_to_add in splits_to_add:
-        if (split_to_add & root_edge.split_bitmask) != split_to_add:
-            continue
-        elif leaf_to_root_search:
-            lb = lowest_bit_only(split_to_add)
-            one_leaf = to_leaf_dict[lb]
-            parent_node = one_leaf
-            while (split_to_add & parent_node.edge.split_bitmask) != split_to_add:
-                parent_node = parent_node.parent_node
-        else:
-            parent_node = con_tree.mrca(split_bitmask=split_to_add)
-        if parent_node is None or parent_node.edge.split_bitmask == split_to_add:
-            continue # split is not in tree, or already in tree.
-        new_node = dendropy.Node()
-        #self.map_split_support_to_node(node=new_node, split_support=freq)
-        new_node_children = []
-        new_edge = new_node.edge
-        new_edge.split_bitmask = 0
-        for child in parent_node.child_nodes():
-            # might need to modify the following if rooted splits
-            # are used
-            cecm = child.edge.split_bitmask
-            if (cecm & split_to_add ):
-                assert cecm != split_to_add
-                new_edge.split_bitmask |= cecm
-                new_node_children.append(child)
-
-        # Check to see if we have accumulated all of the bits that we
-        #   needed, but none that we don't need.
-        if new_edge.split_bitmask == split_to_add:
-            #if split_edge_lengths:
-                #old_split = new_old_split_map[split_to_add]
-                #new_edge.length = split_edge_lengths[old_split]
-                #new_edge.length = split_edge_lengths[split_to_add]
-            for child in new_node_children:
-                parent_node.remove_child(child)
-                new_node.add_child(child)
-            parent_node.add_child(new_node)
-            con_tree.split_edges[split_to_add] = new_edge
-    return con_tree
+    `node_factory` is the class of the nodes of the tree (e.g.,
+    `dendropy.CompactNode`).
+    Splits are added in the order given, skipping any that are not
+    compatible with those already added: if `splits` are in order of
+    decreasing frequency, the result is thus a greedy, extended
+    majority-rule consensus tree.
+    """
+    hierarchy = SplitHierarchy(taxon_set.all_taxa_bitmask(), is_rooted=is_rooted)
+    for split in splits:
+        hierarchy.add(split)
+    return hierarchy.as_tree(taxon_set, node_factory=node_factory)
+
+class SplitHierarchy(object):
+    """
+    A set of mutually compatible splits on the taxa given by `mask`, from
+    which the tree displaying them can be assembled (using `as_tree()`).
+
+    Each split is stored as a cluster: the split bitmask itself if
+    `is_rooted` is True, or, otherwise, the side of the split that does not
+    include the first taxon of `mask`. The clusters form a hierarchy, kept as
+    a map of each cluster (and of the bitmask of each taxon) to the smallest
+    cluster containing it (`mask` itself at the top), so that a split can be
+    tested for compatibility with all the splits of the set at once by
+    climbing the hierarchy with bitwise operations, rather than comparing it
+    with each of them in turn.
+
+    `compatible_splits`, if given, are splits that are expected to be
+    mutually compatible (e.g., the splits found in more than half of a sample
+    of trees), which are placed in a single pass, in order of increasing
+    size. If they turn out not to be, they are instead added one at a time
+    using `add()`, in the order given, skipping any that are not compatible
+    with those before them.
+    """
+
+    def __init__(self, mask, is_rooted=False, compatible_splits=None):
+        self.mask = mask
+        self.is_rooted = is_rooted
+        self.clusters = []
+        self._first_taxon_bit = lowest_bit_only(mask)
+        self._parent = {}
+        for idx in iter_set_bits(mask):
+            self._parent[1L << idx] = mask
+        if compatible_splits is not None:
+            self._add_compatible(compatible_splits)
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def __contains__(self, split):
+        cluster = self.cluster(split)
+        return cluster is not None and cluster in self._parent
+
+    def cluster(self, split):
+        """
+        Returns the cluster representing `split`, or None if `split` is
+        trivial (i.e., it separates no more than a single taxon from the
+        rest).
+        """
+        mask = self.mask
+        m = split & mask
+        if not self.is_rooted and (m & self._first_taxon_bit):
+            m = mask ^ m
+        if m == mask or not (m & (m - 1)):
+            return None
+        if not self.is_rooted:
+            c = mask ^ m
+            if not (c & (c - 1)):
+                return None
+        return m
+
+    def add(self, split):
+        """
+        Adds `split` if it is compatible with all the splits of the set,
+        returning False if it is not, or True otherwise (including if it is
+        trivial or already in the set).
+
+        A cluster is compatible with the hierarchy if it is the union of some
+        of the children of a single cluster: this is checked by climbing from
+        each of its taxa in turn to the largest cluster within it, and
+        checking that the parents of these are the same.
+        """
+        cluster = self.cluster(split)
+        if cluster is None or cluster in self._parent:
+            return True
+        parent = self._parent
+        pieces = []
+        top = None
+        remaining = cluster
+        while remaining:
+            x = remaining & -remaining
+            p = parent[x]
+            while (p & cluster) == p:
+                x = p
+                p = parent[x]
+            if top is None:
+                top = p
+            elif p != top:
+                return False
+            pieces.append(x)
+            remaining ^= x
+        for x in pieces:
+            parent[x] = cluster
+        parent[cluster] = top
+        self.clusters.append(cluster)
+        return True
+
+    def _add_compatible(self, splits):
+        # Places clusters in order of increasing size, attaching each above
+        # the largest clusters already placed that contain its taxa, which
+        # are tracked by a union-find structure. If a cluster is found to
+        # conflict with one already placed, the hierarchy is restored, and
+        # the splits are added one at a time instead.
+        saved_parent = dict(self._parent)
+        clusters = []
+        for split in splits:
+            cluster = self.cluster(split)
+            if cluster is not None and cluster not in self._parent:
+                self._parent[cluster] = self.mask
+                clusters.append(cluster)
+        parent = self._parent
+        placed = {}
+        for cluster in sorted(clusters, key=count_bits):
+            remaining = cluster
+            pieces = []
+            while remaining:
+                x = remaining & -remaining
+                path = []
+                while x in placed:
+                    path.append(x)
+                    x = placed[x]
+                for y in path:
+                    placed[y] = x
+                if (x & cluster) != x:
+                    self._parent = saved_parent
+                    for split in splits:
+                        self.add(split)
+                    return
+                pieces.append(x)
+                remaining ^= x
+            for x in pieces:
+                parent[x] = cluster
+                placed[x] = cluster
+        self.clusters.extend(clusters)
+
+    def as_tree(self, taxon_set, node_factory=None):
+        """
+        Returns a tree (with its splits encoded) displaying the splits of the
+        set, assembled in a single pass by attaching the node of each taxon
+        and cluster to the node of its parent cluster. The children of each
+        node are ordered with taxa first, in the order of `taxon_set`, and
+        then clusters, in the order in which they were added. The nodes are
+        of class `node_factory`, if given.
+        """
+        tree = dendropy.Tree(taxon_set=taxon_set, node_factory=node_factory)
+        tree.is_rooted = self.is_rooted
+        parent = self._parent
+        nodes = {self.mask: tree.seed_node}
+        for cluster in self.clusters:
+            nodes[cluster] = tree.node_factory()
+        for idx, taxon in enumerate(taxon_set):
+            nodes[parent[1L << idx]].add_child(tree.node_factory(taxon=taxon))
+        for cluster in self.clusters:
+            nodes[parent[cluster]].add_child(nodes[cluster])
+        encode_splits(tree)
+        return tree
 
 ###############################################################################
 ## TOOLS/UTILITIES FOR MANAGING SPLITS
@@ -137,16 +227,13 @@ def iter_split_indices(s, mask=-1, one_based=False, ordination_in_mask=False):
             index will be the index in a taxon block that is the subset of the
             full set of taxa).
     '''
-    currBitIndex = one_based and 1 or 0
-    test_bit = 1L
-    maskedSplitRep = s & mask
-    standard_ordination = not ordination_in_mask
-    while test_bit <= maskedSplitRep:
-        if maskedSplitRep & test_bit:
-            yield currBitIndex
-        if standard_ordination or (mask & test_bit):
-            currBitIndex += 1
-        test_bit <<=1
+    offset = one_based and 1 or 0
+    if ordination_in_mask:
+        for idx in iter_set_bits(s & mask):
+            yield count_bits(mask & ((1L << idx) - 1)) + offset
+    else:
+        for idx in iter_set_bits(s & mask):
+            yield idx + offset
 
 def is_trivial_split(split, mask):
     """Returns True if the split occurs in any tree of the taxa `mask` -- if
@@ -209,6 +296,119 @@ def find_edge_from_split(root, split_to_find, mask=-1):
             return r
     return None
 
+##############################################################################
+## Split encoding policy and status
+
+class SplitEncodingPolicy(object):
+    """
+    Determines whether or not, and how, tree readers calculate split bitmasks
+    as trees are being built. `split_encoding` can be:
+
+        - "rooted" or "unrooted": splits are encoded, and trees are treated
+          as rooted or unrooted respectively (overriding any rooting given
+          in the source or by other keywords).
+        - "none": splits are not encoded.
+        - None [default]: splits are encoded if `encode_splits` is True, or
+          if the taxon set of the tree is pre-populated (i.e., is not empty
+          when the tree starts being read).
+
+    Trees whose splits are encoded as they are built, and which do not need
+    to be restructured by `encode_splits()` (i.e., without nodes of
+    out-degree one or, if unrooted, a basal bifurcation), are marked (see
+    `mark_splits_encoded()`) so that calling `encode_splits()` on them
+    does nothing. When splits are encoded only because the taxon set is
+    pre-populated, no `split_edges` dictionary is left on trees that cannot
+    be marked (or to whose taxon set new taxa were added while being read).
+    """
+
+    SPLIT_ENCODINGS = ("rooted", "unrooted", "none")
+
+    def get(split_encoding=None, encode_splits=False):
+        """
+        Returns `split_encoding` if it is a `SplitEncodingPolicy` object, or
+        a new `SplitEncodingPolicy` object based on the arguments otherwise.
+        """
+        if isinstance(split_encoding, SplitEncodingPolicy):
+            return split_encoding
+        return SplitEncodingPolicy(split_encoding=split_encoding, encode_splits=encode_splits)
+    get = staticmethod(get)
+
+    def __init__(self, split_encoding=None, encode_splits=False):
+        if split_encoding is not None and split_encoding not in SplitEncodingPolicy.SPLIT_ENCODINGS:
+            raise ValueError("Invalid split encoding: '%s' (must be one of: %s)" \
+                    % (split_encoding, ", ".join(["'%s'" % i for i in SplitEncodingPolicy.SPLIT_ENCODINGS])))
+        self.split_encoding = split_encoding
+        self.encode_splits = encode_splits
+
+    def _get_is_required(self):
+        if self.split_encoding is None:
+            return bool(self.encode_splits)
+        return self.split_encoding != "none"
+    is_required = property(_get_is_required, doc="True if splits must be encoded on all trees.")
+
+    def encodes_splits(self, taxon_set):
+        """
+        Returns True if splits are to be encoded on a tree with taxon set
+        `taxon_set` (as it is before the tree is read).
+        """
+        if self.split_encoding is None and not self.encode_splits:
+            return taxon_set is not None and len(taxon_set) > 0
+        return self.is_required
+
+    def resolve_rooting(self, is_rooted):
+        """
+        Returns the rooting state that a tree whose rooting is otherwise
+        given by `is_rooted` should have.
+        """
+        if self.split_encoding == "rooted":
+            return True
+        elif self.split_encoding == "unrooted":
+            return False
+        return is_rooted
+
+def _split_encoding_stamp(tree):
+    return (dendropy.Node.topology_edit_count,
+            tree.seed_node,
+            bool(tree.is_rooted),
+            tree.taxon_set,
+            len(tree.taxon_set))
+
+def mark_splits_encoded(tree):
+    """
+    Records that the splits of `tree` have been encoded (and that `tree`
+    has been restructured) exactly as `encode_splits()` would do, so that
+    subsequent calls to `encode_splits()` return without doing anything,
+    unless the tree has since been restructured through the `Node` API,
+    re-seeded or re-rooted, or its taxon set has been replaced or has gained
+    taxa. Note that changing the taxa of nodes directly is not detected:
+    use `Tree.update_splits()` to force re-encoding in that case.
+    """
+    tree._split_encoding_stamp = _split_encoding_stamp(tree)
+
+def clear_splits_encoded_mark(tree):
+    """
+    Removes the mark set by `mark_splits_encoded()`, if any.
+    """
+    tree._split_encoding_stamp = None
+
+def splits_encoded(tree):
+    """
+    Returns True if `tree` has been marked by `mark_splits_encoded()` and
+    its structure has not changed since.
+    """
+    stamp = getattr(tree, "_split_encoding_stamp", None)
+    if stamp is None or tree.taxon_set is None or not hasattr(tree, "split_edges"):
+        return False
+    current = _split_encoding_stamp(tree)
+    return stamp[0] == current[0] \
+            and stamp[1] is current[1] \
+            and stamp[2] == current[2] \
+            and stamp[3] is current[3] \
+            and stamp[4] == current[4]
+
+##############################################################################
+## Split encoding
+
 def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
     """
     Processes splits on a tree, encoding them as bitmask on each edge.
@@ -230,7 +430,16 @@ def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
         if the split_edges dictionary is to refer to all edges in the tree).
         Note this will mean that an unrooted tree like '(A,(B,C))' will
         be changed to '(A,B,C)' after this operation!
+    If the splits of `tree` are already encoded (e.g., as it was read: see
+    `SplitEncodingPolicy`), and it has not been changed since, this does
+    nothing. If `tree` is a `FlatTree`, its own (non-restructuring)
+    `encode_splits()` is called instead.
     """
+    if isinstance(tree, dendropy.FlatTree):
+        tree.encode_splits(create_dict=create_dict)
+        return
+    if splits_encoded(tree):
+        return
     taxon_set = tree.taxon_set
     if taxon_set is None:
         taxon_set = tree.infer_taxa()
@@ -245,8 +454,10 @@ def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
     if not tree.seed_node:
         return
 
+    # True if `tree` does not need restructuring
+    normalized = True
+    sn = tree.seed_node
     if delete_outdegree_one:
-        sn = tree.seed_node
         if not tree.is_rooted:
             if len(sn.child_nodes()) == 2:
                 tree.deroot()
@@ -261,6 +472,11 @@ def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
             sn.remove_child(c)
             for gc in c.child_nodes():
                 sn.add_child(gc)
+    else:
+        nc = len(sn._child_nodes)
+        if (nc == 2 and not tree.is_rooted) \
+                or (nc == 1 and sn._child_nodes[0]._child_nodes):
+            normalized = False
 
     for edge in tree.postorder_edge_iter():
         cm = 0
@@ -280,6 +496,8 @@ def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
                 p.add_child(c, pos=pos)
                 p.remove_child(h)
             else:
+                if nc == 1 and edge.tail_node:
+                    normalized = False
                 for child in child_nodes:
                     cm |= child.edge.split_bitmask
         else:
@@ -289,24 +507,8 @@ def encode_splits(tree, create_dict=True, delete_outdegree_one=True):
         edge.split_bitmask = cm
         if create_dict:
             split_map[cm] = edge
-
-def is_compatible(split1, split2, mask):
-    """
-    Mask should have 1 for every leaf in the leaf_set
-    """
-    m1 = mask & split1
-    m2 = mask & split2
-    if 0 == (m1 & m2):
-        return True
-    c2 = mask ^ split2
-    if 0 == (m1 & c2):
-        return True
-    c1 = mask ^ split1
-    if 0 == (c1 & m2):
-        return True
-    if 0 == (c1 & c2):
-        return True
-    return False
+    if create_dict and normalized and tree.taxon_set is not None:
+        mark_splits_encoded(tree)
 
 def delete_outdegree_one(tree):
     """This function mimics the tree changing operations `encode_splits` but
@@ -349,35 +551,343 @@ def delete_outdegree_one(tree):
                 p.add_child(c, pos=pos)
                 p.remove_child(h)
 
+##############################################################################
+## Bitset kernel
+##
+## Splits are arbitrary-precision integers, so these operate on whole splits
+## at a time, leaving the per-bit work to the integer implementation rather
+## than looping over bits (or groups of bits) in Python.
+
 def lowest_bit_only(s):
-    m = s & (s - 1)
-    return m ^ s
+    "Returns `s` with all but its lowest set bit cleared."
+    return s & -s
+
+def lowest_bit_index(s):
+    "Returns the index of the lowest set bit of `s`, or -1 if `s` is 0."
+    return (s & -s).bit_length() - 1
+
+def iter_set_bits(s):
+    """
+    Iterates over the indices of the bits set in (non-negative) `s`, from
+    lowest to highest, in time proportional to the number of bits set.
+    Raises ValueError if `s` is negative (and so has infinitely many bits
+    set).
+    """
+    if s < 0:
+        raise ValueError("negative argument")
+    while s:
+        low = s & -s
+        yield low.bit_length() - 1
+        s ^= low
 
-__n_bits_set = (0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4)
 def count_bits(a):
     '''Returns the number of bits set to one.'''
-    global __n_bits_set
-    c = long(a)
-    if c != a:
-        raise ValueError('non-integer argument')
-    if c < 1L:
-        if c < 0L:
-            raise ValueError('negative argument')
-        return 0
-    n_bits = 0
-    while c > 0:
-        i = c & 0x0FL
-        n_bits += __n_bits_set[i]
-        c >>= 4
-    return n_bits
+    if a < 0:
+        raise ValueError('negative argument')
+    try:
+        return bin(a).count("1")
+    except TypeError:
+        c = long(a)
+        if c != a:
+            raise ValueError('non-integer argument')
+        return bin(c).count("1")
+
+def is_compatible(split1, split2, mask):
+    """
+    Mask should have 1 for every leaf in the leaf_set
+    """
+    m1 = mask & split1
+    m2 = mask & split2
+    if 0 == (m1 & m2):
+        return True
+    c2 = mask ^ split2
+    if 0 == (m1 & c2):
+        return True
+    c1 = mask ^ split1
+    if 0 == (c1 & m2):
+        return True
+    if 0 == (c1 & c2):
+        return True
+    return False
+
+class SplitCompatibilityIndex(object):
+    """
+    A collection of splits on the taxa given by `mask`, stored transposed (as
+    a "bit-sliced" set) to test a split for compatibility against all the
+    splits of the collection at once.
+
+    For each taxon in `mask`, the index keeps an integer with bit `k` set if
+    the `k`-th split of the collection includes that taxon. A split `s` is
+    incompatible with the `k`-th split `t` if all four of `s & t`,
+    `s & ~t`, `~s & t` and `~s & ~t` are non-empty, which can be determined
+    for all `k` by combining the columns of the taxa in and out of `s` with
+    bitwise OR and AND, in time proportional to the number of taxa rather than
+    the number of splits.
+    """
+
+    def __init__(self, mask, splits=None):
+        self.mask = mask
+        self.splits = []
+        self._columns = {}
+        for idx in iter_set_bits(mask):
+            self._columns[idx] = 0
+        if splits is not None:
+            for split in splits:
+                self.add(split)
+
+    def __len__(self):
+        return len(self.splits)
+
+    def add(self, split):
+        "Adds `split` to the collection."
+        bit = 1L << len(self.splits)
+        columns = self._columns
+        for idx in iter_set_bits(split & self.mask):
+            columns[idx] |= bit
+        self.splits.append(split)
+
+    def incompatible_bitmask(self, split):
+        """
+        Returns an integer with bit `k` set if `split` is incompatible with
+        the `k`-th split of the collection.
+        """
+        all_splits = (1L << len(self.splits)) - 1
+        split = split & self.mask
+        in_any = 0
+        in_all = all_splits
+        out_any = 0
+        out_all = all_splits
+        for idx, column in self._columns.iteritems():
+            if (split >> idx) & 1:
+                in_any |= column
+                in_all &= column
+            else:
+                out_any |= column
+                out_all &= column
+        return in_any & out_any & ~in_all & ~out_all & all_splits
+
+    def is_compatible(self, split):
+        "Returns True if `split` is compatible with all splits in the collection."
+        return self.incompatible_bitmask(split) == 0
+
+    def incompatible_splits(self, split):
+        "Returns the list of splits in the collection incompatible with `split`."
+        splits = self.splits
+        return [splits[idx] for idx in iter_set_bits(self.incompatible_bitmask(split))]
+
+###############################################################################
+## SplitRecord
+
+class SplitRecord(object):
+    """
+    Lightweight representation of the splits of a single tree, as yielded by
+    `tree_source_iter()` when called with `as_split_records=True`. Holds the
+    same information that `SplitDistribution.count_splits_on_tree()` and
+    `TopologyCounter.count()` would otherwise extract from a `Tree` after
+    `encode_splits()` has been called on it, in the form of parallel tuples:
+
+        - `splits` : the keys of `tree.split_edges` (i.e., normalized split
+          bitmasks if the tree is unrooted, rooted split bitmasks otherwise)
+        - `split_bitmasks` : the (rooted) `split_bitmask` of the corresponding
+          edges
+        - `edge_lengths` : the lengths of the corresponding edges
+        - `node_ages` : the ages of the corresponding head nodes, or None if
+          node ages were not calculated
+    """
+
+    def from_tree(tree, calc_node_ages=False):
+        """
+        Returns a SplitRecord summarizing the splits on `tree`. As with
+        `encode_splits()`, the structure of `tree` may be modified.
+        """
+        encode_splits(tree)
+        if calc_node_ages:
+            tree.calc_node_ages()
+        splits = []
+        split_bitmasks = []
+        edge_lengths = []
+        if calc_node_ages:
+            node_ages = []
+        else:
+            node_ages = None
+        for split, edge in tree.split_edges.iteritems():
+            splits.append(split)
+            split_bitmasks.append(edge.split_bitmask)
+            edge_lengths.append(edge.length)
+            if calc_node_ages:
+                node_ages.append(edge.head_node.age)
+        if node_ages is not None:
+            node_ages = tuple(node_ages)
+        return SplitRecord(taxon_set=tree.taxon_set,
+                splits=tuple(splits),
+                split_bitmasks=tuple(split_bitmasks),
+                edge_lengths=tuple(edge_lengths),
+                node_ages=node_ages,
+                is_rooted=tree.is_rooted,
+                weight=tree.weight,
+                label=tree.label)
+    from_tree = staticmethod(from_tree)
+
+    def __init__(self,
+            taxon_set,
+            splits,
+            split_bitmasks,
+            edge_lengths,
+            node_ages=None,
+            is_rooted=False,
+            weight=None,
+            label=None):
+        self.taxon_set = taxon_set
+        self.splits = splits
+        self.split_bitmasks = split_bitmasks
+        self.edge_lengths = edge_lengths
+        self.node_ages = node_ages
+        self.is_rooted = is_rooted
+        self.weight = weight
+        self.label = label
+
+    def __len__(self):
+        return len(self.splits)
 
 ###############################################################################
 ## SplitDistribution
 
+SPLIT_DISTRIBUTION_FORMAT = "dendropy.SplitDistribution"
+SPLIT_DISTRIBUTION_FORMAT_VERSION = 2
+
+# encoding used to map the (byte) strings of saved states to and from JSON:
+# every byte string is valid latin-1, and decodes back to the same bytes
+_STATE_STRING_ENCODING = "latin-1"
+
+_STATE_INT = (int, long)
+_STATE_NUMBER = (int, long, float)
+
+def _decode_state_strings(value):
+    # returns `value` (read from JSON) with its strings encoded as byte strings
+    if isinstance(value, unicode):
+        return value.encode(_STATE_STRING_ENCODING)
+    if isinstance(value, list):
+        return [_decode_state_strings(item) for item in value]
+    if isinstance(value, dict):
+        return dict([(_decode_state_strings(k), _decode_state_strings(v)) for k, v in value.iteritems()])
+    return value
+
+def save_state(state, format, version, dest):
+    """
+    Writes `state`, a dictionary of plain values (numbers, strings, and
+    lists, tuples and dictionaries of these), as JSON to the file-like object
+    `dest`, under a header identifying its `format` and `version`.
+    """
+    json.dump({"format": format, "version": version, "state": state},
+            dest,
+            encoding=_STATE_STRING_ENCODING)
+
+def load_state(src, format, version, description):
+    """
+    Returns the state read from the file-like object `src`, as written by
+    `save_state()` (with tuples read as lists), checking that it is of
+    `format` and `version` before it is used. Raises ValueError (with a
+    message referring to the state as `description`) if it is not.
+    """
+    try:
+        data = json.load(src)
+    except ValueError, e:
+        raise ValueError("Invalid %s: %s" % (description, e))
+    if not isinstance(data, dict) or data.get("format") != format:
+        raise ValueError("Invalid %s: unrecognized format" % description)
+    if data.get("version") != version:
+        raise ValueError("Unsupported %s format version: %s" % (description, data.get("version")))
+    if not isinstance(data.get("state"), dict):
+        raise ValueError("Invalid %s: no state found" % description)
+    return _decode_state_strings(data["state"])
+
+def _state_value(value, types):
+    # returns `value`, read from a saved state, if it is of one of `types`
+    if not isinstance(value, types) \
+            or (isinstance(value, bool) and bool not in types):
+        raise ValueError("Expecting %s, but found %r" \
+                % (" or ".join([t.__name__ for t in types]), value))
+    return value
+
+def _state_list(value, types, length=None):
+    # returns `value`, read from a saved state, if it is a list of values of
+    # one of `types` (of `length` values, if given)
+    _state_value(value, (list,))
+    if length is not None and len(value) != length:
+        raise ValueError("Expecting %d values, but found %d" % (length, len(value)))
+    for item in value:
+        _state_value(item, types)
+    return value
+
+def taxon_index_map(taxon_labels, taxon_set):
+    """
+    Returns a list of the indices in `taxon_set` of the taxa with the labels
+    `taxon_labels` (adding any that are not found to `taxon_set`), for
+    remapping split bitmasks defined on taxa in the order of `taxon_labels`
+    to `taxon_set` using `remap_split()`, or None if no remapping is needed
+    (as each taxon has the same index in both).
+    """
+    index_map = []
+    for label in taxon_labels:
+        taxon = taxon_set.get_taxon(label=label)
+        if taxon is None:
+            taxon = taxon_set.new_taxon(label=label)
+        index_map.append(taxon_set.index(taxon))
+    if index_map == range(len(index_map)):
+        return None
+    return index_map
+
+def remap_split(split, index_map, mask=None):
+    """
+    Returns `split` with the bit of each taxon index `i` moved to index
+    `index_map[i]` (see `taxon_index_map()`). If `mask` is given, the
+    result is normalized (as an unrooted split) with respect to it.
+    """
+    remapped = 0
+    for idx in iter_set_bits(split):
+        remapped |= 1 << index_map[idx]
+    if mask is not None:
+        remapped = containers.NormalizedBitmaskDict.normalize(remapped, mask)
+    return remapped
+
+def _pack_values(values):
+    # packs a list of numbers into a (base64-encoded) string of little-endian
+    # doubles
+    if values is None:
+        return None
+    a = array("d", values)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return base64.b64encode(a.tostring())
+
+def _unpack_values(packed):
+    try:
+        packed = base64.b64decode(packed)
+    except TypeError, e:
+        raise ValueError("Invalid packed values: %s" % e)
+    if len(packed) % 8 != 0:
+        raise ValueError("Invalid packed values: incomplete value")
+    a = array("d")
+    a.fromstring(packed)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a.tolist()
+
 class SplitDistribution(object):
-    "Collects information regarding splits over multiple trees."
+    """
+    Collects information regarding splits over multiple trees.
+
+    By default, the edge lengths and node ages of each split on every tree
+    counted are stored in lists (`split_edge_lengths` and `split_node_ages`).
+    If `store_value_lists` is False, they are instead summarized as they
+    are counted, by `statistics.OnlineSummary` objects (in
+    `split_edge_length_stats` and `split_node_age_stats`), which take a
+    fixed amount of memory per split whatever the number of trees, at the
+    cost of the medians, quantiles and HPD intervals in the summaries being
+    estimates once the number of values of a split exceeds `sketch_size`.
+    """
 
-    def __init__(self, taxon_set=None, split_set=None):
+    def __init__(self, taxon_set=None, split_set=None, store_value_lists=True, sketch_size=256):
         self.total_trees_counted = 0
         self.sum_of_weights = 0.0
         self.taxon_set = taxon_set
@@ -386,6 +896,10 @@ class SplitDistribution(object):
         self.weighted_split_counts = {}
         self.split_edge_lengths = {}
         self.split_node_ages = {}
+        self.store_value_lists = store_value_lists
+        self.sketch_size = sketch_size
+        self.split_edge_length_stats = {}
+        self.split_node_age_stats = {}
         self.ignore_edge_lengths = False
         self.ignore_node_ages = True
         self._is_rooted = False
@@ -417,7 +931,7 @@ class SplitDistribution(object):
     is_unrooted = property(_get_is_unrooted, _set_is_unrooted)
 
     def add_split_count(self, split, count=1, weight=None):
-        if split not in self.splits:
+        if split not in self.split_counts:
             self.splits.append(split)
             self.split_counts[split] = 0
         self.split_counts[split] += count
@@ -446,13 +960,164 @@ class SplitDistribution(object):
                 else:
                     self.weighted_split_counts[split] += split_dist.weighted_split_counts[split]
             if split in self.split_edge_lengths:
-                self.split_edge_lengths[split].extend(split_dist.split_edge_lengths[split])
+                self.split_edge_lengths[split].extend(split_dist.split_edge_lengths.get(split, []))
             elif split in split_dist.split_edge_lengths:
-                self.split_edge_lengths[split] = split_dist.split_edge_lengths[split]
+                self.split_edge_lengths[split] = list(split_dist.split_edge_lengths[split])
             if split in self.split_node_ages:
-                self.split_node_ages[split].extend(split_dist.split_node_ages[split])
+                self.split_node_ages[split].extend(split_dist.split_node_ages.get(split, []))
             elif split in split_dist.split_node_ages:
-                self.split_node_ages[split] = split_dist.split_node_ages[split]
+                self.split_node_ages[split] = list(split_dist.split_node_ages[split])
+            for stats, other_stats in ((self.split_edge_length_stats, split_dist.split_edge_length_stats),
+                    (self.split_node_age_stats, split_dist.split_node_age_stats)):
+                if split in other_stats:
+                    if split not in stats:
+                        stats[split] = statistics.OnlineSummary(sketch_size=self.sketch_size)
+                    stats[split].merge(other_stats[split])
+
+    def save(self, dest):
+        """
+        Writes the splits counted, with their counts, weights and edge length
+        and node age lists or summaries, to the file-like object `dest`, as
+        JSON (see `save_state()`). The distribution can then be recreated
+        using `load()`, e.g., to be merged with others using `update()`.
+        """
+        save_state(self.get_state(),
+                SPLIT_DISTRIBUTION_FORMAT,
+                SPLIT_DISTRIBUTION_FORMAT_VERSION,
+                dest)
+
+    def load(cls, src, taxon_set=None):
+        """
+        Returns a `SplitDistribution` read from the file-like object `src`,
+        as written by `save()`. See `from_state()` for `taxon_set`. Raises
+        ValueError if `src` does not contain a (well-formed) split
+        distribution of the current format. Only plain values are read, so a
+        distribution from an untrusted source can be loaded safely.
+        """
+        state = load_state(src,
+                SPLIT_DISTRIBUTION_FORMAT,
+                SPLIT_DISTRIBUTION_FORMAT_VERSION,
+                "split distribution")
+        return cls.from_state(state, taxon_set=taxon_set)
+    load = classmethod(load)
+
+    def get_state(self):
+        """
+        Returns the state of the distribution as a dictionary of plain
+        values (numbers, strings and lists and tuples of these), from which
+        an equivalent distribution can be recreated using `from_state()`.
+        The values associated with each split are given in lists parallel to
+        `splits`, with None for splits that have no value; edge lengths and
+        node ages are packed into (base64-encoded) strings of little-endian
+        doubles.
+        """
+        if self.taxon_set is None:
+            taxon_labels = []
+        else:
+            taxon_labels = [t.label for t in self.taxon_set]
+        state = {
+            'taxon_labels': taxon_labels,
+            'is_rooted': bool(self.is_rooted),
+            'ignore_edge_lengths': bool(self.ignore_edge_lengths),
+            'ignore_node_ages': bool(self.ignore_node_ages),
+            'store_value_lists': bool(self.store_value_lists),
+            'sketch_size': self.sketch_size,
+            'total_trees_counted': self.total_trees_counted,
+            'sum_of_weights': self.sum_of_weights,
+            'splits': list(self.splits),
+            'split_counts': [self.split_counts[split] for split in self.splits],
+            'weighted_split_counts': [self.weighted_split_counts.get(split) for split in self.splits],
+        }
+        for name in ('split_edge_lengths', 'split_node_ages'):
+            value_lists = getattr(self, name)
+            state[name] = [_pack_values(value_lists.get(split)) for split in self.splits]
+        for name in ('split_edge_length_stats', 'split_node_age_stats'):
+            value_stats = getattr(self, name)
+            stats_states = []
+            for split in self.splits:
+                if split in value_stats:
+                    stats_states.append(value_stats[split].get_state())
+                else:
+                    stats_states.append(None)
+            state[name] = stats_states
+        return state
+
+    def from_state(cls, state, taxon_set=None):
+        """
+        Returns a distribution recreated from `state` (see `get_state()`).
+        If `taxon_set` is given, the distribution will refer to it instead of
+        a new `TaxonSet`, with any taxa of the distribution not in it added
+        to it, and the splits remapped to the order of its taxa if this is
+        different (so that, e.g., the distribution can be merged with others
+        referring to `taxon_set` using `update()`). The splits of
+        distributions that are not rooted are taken to be normalized, and
+        are normalized again after being remapped. Raises ValueError if
+        `state` is not well-formed.
+        """
+        cls._check_state(state)
+        taxon_labels = state['taxon_labels']
+        if taxon_set is None:
+            taxon_set = dendropy.TaxonSet()
+        index_map = taxon_index_map(taxon_labels, taxon_set)
+        if index_map is not None and not state['is_rooted']:
+            mask = taxon_set.all_taxa_bitmask()
+        else:
+            mask = None
+        sd = cls(taxon_set=taxon_set,
+                store_value_lists=state['store_value_lists'],
+                sketch_size=state['sketch_size'])
+        sd.is_rooted = state['is_rooted']
+        sd.ignore_edge_lengths = state['ignore_edge_lengths']
+        sd.ignore_node_ages = state['ignore_node_ages']
+        sd.total_trees_counted = state['total_trees_counted']
+        sd.sum_of_weights = state['sum_of_weights']
+        if index_map is None:
+            sd.splits = list(state['splits'])
+        else:
+            sd.splits = [remap_split(split, index_map, mask) for split in state['splits']]
+        for idx, split in enumerate(sd.splits):
+            sd.split_counts[split] = state['split_counts'][idx]
+            weight = state['weighted_split_counts'][idx]
+            if weight is not None:
+                sd.weighted_split_counts[split] = weight
+            for name in ('split_edge_lengths', 'split_node_ages'):
+                packed = state[name][idx]
+                if packed is not None:
+                    getattr(sd, name)[split] = _unpack_values(packed)
+            for name in ('split_edge_length_stats', 'split_node_age_stats'):
+                stats_state = state[name][idx]
+                if stats_state is not None:
+                    getattr(sd, name)[split] = statistics.OnlineSummary.from_state(stats_state)
+        return sd
+    from_state = classmethod(from_state)
+
+    def _check_state(state):
+        # raises ValueError if `state` (see `get_state()`) is not well-formed
+        try:
+            taxon_labels = _state_list(state['taxon_labels'], (str, type(None)))
+            for key in ('is_rooted', 'ignore_edge_lengths', 'ignore_node_ages', 'store_value_lists'):
+                _state_value(state[key], (bool,))
+            _state_value(state['sketch_size'], _STATE_INT)
+            _state_value(state['total_trees_counted'], _STATE_INT)
+            _state_value(state['sum_of_weights'], _STATE_NUMBER)
+            splits = _state_list(state['splits'], _STATE_INT)
+            num_splits = len(splits)
+            _state_list(state['split_counts'], _STATE_NUMBER, num_splits)
+            _state_list(state['weighted_split_counts'], _STATE_NUMBER + (type(None),), num_splits)
+            for key in ('split_edge_lengths', 'split_node_ages'):
+                _state_list(state[key], (str, type(None)), num_splits)
+            for key in ('split_edge_length_stats', 'split_node_age_stats'):
+                _state_list(state[key], (list, type(None)), num_splits)
+        except KeyError, e:
+            raise ValueError("Invalid split distribution: missing %s" % e)
+        except ValueError, e:
+            raise ValueError("Invalid split distribution: %s" % e)
+        taxa_limit = 1 << len(taxon_labels)
+        for split in splits:
+            if not (0 <= split < taxa_limit):
+                raise ValueError("Invalid split distribution: split %s not defined on its %d taxa" \
+                        % (split, len(taxon_labels)))
+    _check_state = staticmethod(_check_state)
 
     def splits_considered(self):
         """
@@ -529,6 +1194,9 @@ class SplitDistribution(object):
                 self._split_edge_length_summaries[split] = statistics.summarize(elens)
             except ValueError:
                 pass
+        for split, stats in self.split_edge_length_stats.items():
+            if stats.count and split not in self._split_edge_length_summaries:
+                self._split_edge_length_summaries[split] = stats.summary()
         return self._split_edge_length_summaries
 
     def summarize_node_ages(self):
@@ -540,8 +1208,65 @@ class SplitDistribution(object):
                 self._split_node_age_summaries[split] = statistics.summarize(ages)
             except ValueError:
                 pass
+        for split, stats in self.split_node_age_stats.items():
+            if stats.count and split not in self._split_node_age_summaries:
+                self._split_node_age_summaries[split] = stats.summary()
         return self._split_node_age_summaries
 
+    def mean_edge_lengths(self):
+        """
+        Returns a dictionary mapping splits to the mean length of the edges
+        subtending them (None for splits without edge lengths), from the
+        edge length lists or the online summaries, whichever are in use.
+        """
+        return self._calc_means(self.split_edge_lengths, self.split_edge_length_stats)
+
+    def mean_node_ages(self):
+        """
+        Returns a dictionary mapping splits to the mean age of the nodes
+        subtended by them, as for `mean_edge_lengths()`.
+        """
+        return self._calc_means(self.split_node_ages, self.split_node_age_stats)
+
+    def _calc_means(self, value_lists, value_stats):
+        means = {}
+        for split, values in value_lists.iteritems():
+            if values:
+                means[split] = statistics.mean_and_sample_variance(values)[0]
+            else:
+                means[split] = None
+        for split, stats in value_stats.iteritems():
+            if stats.count:
+                means[split] = stats.mean
+            elif split not in means:
+                means[split] = None
+        return means
+
+    def _add_edge_length(self, split, edge_length):
+        if self.store_value_lists:
+            sel = self.split_edge_lengths.setdefault(split, [])
+            if edge_length is not None:
+                sel.append(edge_length)
+        else:
+            try:
+                stats = self.split_edge_length_stats[split]
+            except KeyError:
+                stats = statistics.OnlineSummary(sketch_size=self.sketch_size)
+                self.split_edge_length_stats[split] = stats
+            if edge_length is not None:
+                stats.add(edge_length)
+
+    def _add_node_age(self, split, node_age):
+        if self.store_value_lists:
+            self.split_node_ages.setdefault(split, []).append(node_age)
+        else:
+            try:
+                stats = self.split_node_age_stats[split]
+            except KeyError:
+                stats = statistics.OnlineSummary(sketch_size=self.sketch_size)
+                self.split_node_age_stats[split] = stats
+            stats.add(node_age)
+
     def _get_split_edge_length_summaries(self):
         if self._split_edge_length_summaries is None \
                 or self._trees_counted_for_summaries != self.total_trees_counted:
@@ -559,12 +1284,15 @@ class SplitDistribution(object):
     def count_splits_on_tree(self, tree):
         """
         Counts splits in this tree and add to totals. `tree` must be decorated
-        with splits, and no attempt is made to normalize taxa.
+        with splits, and no attempt is made to normalize taxa. `tree` may also
+        be a `SplitRecord`.
         """
         if self.taxon_set is None:
             self.taxon_set = tree.taxon_set
         else:
             assert tree.taxon_set is self.taxon_set
+        if isinstance(tree, SplitRecord):
+            return self._count_splits_on_record(tree)
         self.total_trees_counted += 1
         if not self.ignore_node_ages:
             tree.calc_node_ages()
@@ -586,14 +1314,48 @@ class SplitDistribution(object):
                 self.weighted_split_counts[split] = weight_to_use
             self.sum_of_weights += weight_to_use
             if not self.ignore_edge_lengths:
-                sel = self.split_edge_lengths.setdefault(split,[])
-                if edge.length is not None:
-                    sel.append(tree.split_edges[split].length)
+                self._add_edge_length(split, edge.length)
                 # for correct behavior when some or all trees have no edge lengths
 #                 else:
 #                     self.split_edge_lengths[split].append(0.0)
             if not self.ignore_node_ages:
-                sna = self.split_node_ages.setdefault(split, [])
                 if edge.head_node is not None:
-                    sna.append(edge.head_node.age)
+                    self._add_node_age(split, edge.head_node.age)
+                elif self.store_value_lists:
+                    self.split_node_ages.setdefault(split, [])
 
+
+    def _count_splits_on_record(self, split_record):
+        """
+        Counts splits in `split_record` (a `SplitRecord`) and add to totals.
+        """
+        self.total_trees_counted += 1
+        if split_record.weight is None:
+            weight_to_use = 1.0
+        else:
+            weight_to_use = float(split_record.weight)
+        if self.is_rooted:
+            splits = split_record.split_bitmasks
+        else:
+            splits = split_record.splits
+        if not self.ignore_node_ages:
+            node_ages = split_record.node_ages
+            if node_ages is None:
+                raise ValueError("Node ages were not calculated for split record: use 'calc_node_ages=True' when reading trees as split records")
+        split_counts = self.split_counts
+        weighted_split_counts = self.weighted_split_counts
+        for idx, split in enumerate(splits):
+            try:
+                split_counts[split] += 1
+            except KeyError:
+                self.splits.append(split)
+                split_counts[split] = 1
+            try:
+                weighted_split_counts[split] += weight_to_use
+            except KeyError:
+                weighted_split_counts[split] = weight_to_use
+            self.sum_of_weights += weight_to_use
+            if not self.ignore_edge_lengths:
+                self._add_edge_length(split, split_record.edge_lengths[idx])
+            if not self.ignore_node_ages:
+                self._add_node_age(split, node_ages[idx])
@@ -20,6 +20,13 @@
 Tree summarization and consensus tree building.
 """
 
+import os
+import marshal
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
 import dendropy
 from dendropy import treesplit
 from dendropy import dataobject
@@ -55,12 +62,23 @@ class TreeSummarizer(object):
     def tree_from_splits(self,
             split_distribution,
             min_freq=0.5,
-            include_edge_lengths=True):
+            include_edge_lengths=True,
+            node_factory=None):
         """Returns a consensus tree from splits in `split_distribution`.
 
+        Splits with a frequency greater than `min_freq` (or all splits, if
+        `min_freq` is None) are added to the tree in order of decreasing
+        frequency, skipping any that are not compatible with those already
+        added. With `min_freq` of 1.0, this gives the strict consensus
+        tree, with 0.5 the majority-rule consensus tree, and with None or
+        0.0 the greedy (extended majority-rule) consensus tree.
+
         If include_edge_length_var is True, then the sample variance of the
             edge length will also be calculated and will be stored as
             a length_var attribute.
+
+        `node_factory` is the class of the nodes of the tree (e.g.,
+        `dendropy.CompactNode`).
         """
         taxon_set = split_distribution.taxon_set
         taxa_mask = taxon_set.all_taxa_bitmask()
@@ -81,20 +99,21 @@ class TreeSummarizer(object):
         to_try_to_add.sort(reverse=True)
         splits_for_tree = [i[1] for i in to_try_to_add]
 
-        con_tree = treesplit.tree_from_splits(splits=splits_for_tree,
-                taxon_set=taxon_set,
-                is_rooted=is_rooted)
-        treesplit.encode_splits(con_tree)
+        # splits found in more than half of the trees are all compatible
+        # with each other, and so can be placed without being checked
+        num_majority_splits = 0
+        while num_majority_splits < len(to_try_to_add) \
+                and to_try_to_add[num_majority_splits][0] > 0.5:
+            num_majority_splits += 1
+        hierarchy = treesplit.SplitHierarchy(taxa_mask,
+                is_rooted=is_rooted,
+                compatible_splits=splits_for_tree[:num_majority_splits])
+        for split in splits_for_tree[num_majority_splits:]:
+            hierarchy.add(split)
+        con_tree = hierarchy.as_tree(taxon_set, node_factory=node_factory)
 
         if include_edge_lengths:
-            split_edge_lengths = {}
-            for split, edges in split_distribution.split_edge_lengths.items():
-                if len(edges) > 0:
-                    mean, var = mean_and_sample_variance(edges)
-                    elen = mean
-                else:
-                    elen = None
-                split_edge_lengths[split] = elen
+            split_edge_lengths = split_distribution.mean_edge_lengths()
         else:
             split_edge_lengths = None
 
@@ -102,17 +121,32 @@ class TreeSummarizer(object):
             split = node.edge.split_bitmask
             if split in split_freqs:
                 self.map_split_support_to_node(node=node, split_support=split_freqs[split])
-            if include_edge_lengths and split in split_distribution.split_edge_lengths:
-                edges = split_distribution.split_edge_lengths[split]
-                if len(edges) > 0:
-                    mean, var = mean_and_sample_variance(edges)
-                    elen = mean
-                else:
-                    elen = None
-                node.edge.length = elen
+            if include_edge_lengths and split in split_edge_lengths:
+                node.edge.length = split_edge_lengths[split]
 
         return con_tree
 
+    def strict_consensus_tree(self, split_distribution, include_edge_lengths=True):
+        "Returns the strict consensus tree of the splits in `split_distribution`."
+        return self.tree_from_splits(split_distribution,
+                min_freq=1.0,
+                include_edge_lengths=include_edge_lengths)
+
+    def majority_rule_consensus_tree(self, split_distribution, include_edge_lengths=True):
+        "Returns the majority-rule consensus tree of the splits in `split_distribution`."
+        return self.tree_from_splits(split_distribution,
+                min_freq=0.5,
+                include_edge_lengths=include_edge_lengths)
+
+    def greedy_consensus_tree(self, split_distribution, include_edge_lengths=True):
+        """
+        Returns the greedy (extended majority-rule) consensus tree of the
+        splits in `split_distribution`.
+        """
+        return self.tree_from_splits(split_distribution,
+                min_freq=None,
+                include_edge_lengths=include_edge_lengths)
+
     def compose_support_label(self, split_support_freq):
         "Returns an appropriately composed and formatted support label."
         if self.support_as_percentages:
@@ -224,13 +258,22 @@ class TreeSummarizer(object):
         `SplitDistribution` object) being summarized.
         `summarization_func` should take an iterable of floats, and return a float. If `None`, it
         defaults to calculating the mean (`lambda x: float(sum(x))/len(x)`).
+        If `split_distribution` does not store value lists, `summarization_func`
+        is given the `statistics.OnlineSummary` of the ages instead, and
+        defaults to taking its mean (`lambda x: x.mean`).
         If `set_edge_lengths` is `True`, then edge lengths will be set to so that the actual node ages
         correspond to the `age` attribute value.
         If `collapse_negative_edges` is True, then edge lengths with negative values will be set to 0.
         If `allow_negative_edges` is True, then no error will be raised if edges have negative lengths.
         """
-        if summarization_func is None:
-            summarization_func = lambda x: float(sum(x))/len(x)
+        if split_distribution.store_value_lists:
+            split_node_ages = split_distribution.split_node_ages
+            if summarization_func is None:
+                summarization_func = lambda x: float(sum(x))/len(x)
+        else:
+            split_node_ages = split_distribution.split_node_age_stats
+            if summarization_func is None:
+                summarization_func = lambda x: x.mean
         if not hasattr(tree, "split_edges"):
             tree.update_splits()
         #'height',
@@ -245,8 +288,8 @@ class TreeSummarizer(object):
         for edge in tree.preorder_edge_iter():
             split = edge.split_bitmask
             nd = edge.head_node
-            if split in split_distribution.split_node_ages:
-                ages = split_distribution.split_node_ages[split]
+            if split in split_node_ages:
+                ages = split_node_ages[split]
                 nd.age = summarization_func(ages)
             else:
                 # default to age of parent if split not found
@@ -271,21 +314,30 @@ class TreeSummarizer(object):
         summarized.
         `summarization_func` should take an iterable of floats, and return a float. If `None`, it
         defaults to calculating the mean (`lambda x: float(sum(x))/len(x)`).
+        If `split_distribution` does not store value lists, `summarization_func`
+        is given the `statistics.OnlineSummary` of the lengths instead, and
+        defaults to taking its mean (`lambda x: x.mean`).
         """
-        if summarization_func is None:
-            summarization_func = lambda x: float(sum(x))/len(x)
+        if split_distribution.store_value_lists:
+            split_edge_lengths = split_distribution.split_edge_lengths
+            if summarization_func is None:
+                summarization_func = lambda x: float(sum(x))/len(x)
+        else:
+            split_edge_lengths = split_distribution.split_edge_length_stats
+            if summarization_func is None:
+                summarization_func = lambda x: x.mean
         if not hasattr(tree, "split_edges"):
             tree.update_splits()
         for split, edge in tree.split_edges.items():
-            if (split in split_distribution.split_edge_lengths
-                    and split_distribution.split_edge_lengths[split]):
-                lengths = split_distribution.split_edge_lengths[split]
+            if (split in split_edge_lengths
+                    and split_edge_lengths[split]):
+                lengths = split_edge_lengths[split]
                 #if len(lengths) != split_distribution.total_trees_counted:
                 #    # not all input trees had edge lengths (at least, for this split)
                 #    pass
                 edge.length = summarization_func(lengths)
-            elif (split in split_distribution.split_edge_lengths
-                    and not split_distribution.split_edge_lengths[split]):
+            elif (split in split_edge_lengths
+                    and not split_edge_lengths[split]):
                 # no input trees had any edge lengths for this split
                 edge.length = None
             else:
@@ -323,6 +375,8 @@ class TreeSummarizer(object):
         """
         Given a list of trees file, a SplitsDistribution object (a new one, or,
         if passed as an argument) is returned collating the split data in the files.
+        `tree_iterator` may also yield `SplitRecord` objects (e.g., as given
+        by `tree_source_iter()` called with `as_split_records=True`).
         """
         if split_distribution is None:
             split_distribution = treesplit.SplitDistribution()
@@ -335,7 +389,7 @@ class TreeSummarizer(object):
                 taxon_set = tree.taxon_set
             else:
                 assert(taxon_set is tree.taxon_set)
-            if not trees_splits_encoded:
+            if not trees_splits_encoded and not isinstance(tree, treesplit.SplitRecord):
                 treesplit.encode_splits(tree)
             split_distribution.count_splits_on_tree(tree)
         return split_distribution
@@ -349,46 +403,103 @@ class TreeSummarizer(object):
 class TopologyCounter(object):
     """
     Tracks frequency of occurrences of topologies.
+
+    Each topology is identified by a fixed-width (128-bit) digest of its
+    (sorted) splits, which is used as its key in `topology_hash_map` (mapping
+    topologies to counts), while its splits are stored once, as a tuple, in
+    `topology_exemplars` (mapping digests to splits). The split values
+    themselves are shared by all the topologies in which they are found. In
+    the (unlikely) event of two topologies having the same digest, the
+    second one is keyed by its tuple of splits instead.
     """
 
+    def topology_splits(tree):
+        """
+        Returns the (sorted) tuple of all the splits on `tree`, which may also
+        be a `SplitRecord`.
+        """
+        if isinstance(tree, treesplit.SplitRecord):
+            splits = list(tree.splits)
+        else:
+            splits = tree.split_edges.keys()
+        splits.sort()
+        return tuple(splits)
+    topology_splits = staticmethod(topology_splits)
+
+    def topology_digest(splits):
+        "Returns the digest of the (sorted) tuple of splits, `splits`."
+        # (as longs, as ints and longs of the same value are marshalled
+        # differently)
+        return md5(marshal.dumps(map(long, splits))).digest()
+    topology_digest = staticmethod(topology_digest)
+
     def hash_topology(tree):
         """
-        Set of all splits on tree: default topology hash.
+        Digest of the set of all splits on tree: default topology hash.
         """
-        return frozenset(tree.split_edges.keys())
+        return TopologyCounter.topology_digest(TopologyCounter.topology_splits(tree))
     hash_topology = staticmethod(hash_topology)
 
     def __init__(self):
         self.topology_hash_map = {}
+        self.topology_exemplars = {}
         self.total_trees_counted = 0
+        self._split_pool = {}
+
+    def get_topology_splits(self, topology_hash):
+        "Returns the (sorted) tuple of splits of the topology `topology_hash`."
+        return self.topology_exemplars.get(topology_hash, topology_hash)
+
+    def add_topology_count(self, splits, count=1, digest=None):
+        """
+        Adds `count` occurrences of the topology with the (sorted) tuple of
+        splits `splits`, and returns its key in `topology_hash_map`. `digest`,
+        if given, is the digest of `splits` (see `topology_digest()`).
+        """
+        if digest is None:
+            digest = self.topology_digest(splits)
+        exemplar = self.topology_exemplars.get(digest)
+        if exemplar is None:
+            pool = self._split_pool
+            exemplar = tuple([pool.setdefault(split, split) for split in splits])
+            self.topology_exemplars[digest] = exemplar
+            topology_hash = digest
+        elif exemplar == splits:
+            topology_hash = digest
+        else:
+            # digest collision
+            topology_hash = tuple(splits)
+        self.topology_hash_map[topology_hash] = self.topology_hash_map.get(topology_hash, 0) + count
+        self.total_trees_counted += count
+        return topology_hash
 
     def update_topology_hash_map(self,
-            src_map):
+            src_map,
+            src_exemplars=None):
         """
-        Imports data from another counter.
+        Imports data from another counter: `src_map` and `src_exemplars` are
+        its `topology_hash_map` and `topology_exemplars`. Topologies are
+        merged by digest. Keys of `src_map` not found in `src_exemplars`
+        are taken to be the splits of the topology (as a tuple or set).
         """
-        trees_counted = 0
-        for topology_hash in src_map:
-            if topology_hash not in self.topology_hash_map:
-                self.topology_hash_map[topology_hash] = src_map[topology_hash]
+        if src_exemplars is None:
+            src_exemplars = {}
+        for topology_hash, count in src_map.iteritems():
+            splits = src_exemplars.get(topology_hash)
+            if splits is not None:
+                self.add_topology_count(splits, count, digest=topology_hash)
             else:
-                self.topology_hash_map[topology_hash] = self.topology_hash_map[topology_hash] + src_map[topology_hash]
-            self.total_trees_counted += src_map[topology_hash]
+                self.add_topology_count(tuple(sorted(topology_hash)), count)
 
     def count(self,
             tree,
             tree_splits_encoded=False):
         """
-        Logs/registers a tree.
+        Logs/registers a tree. `tree` may also be a `SplitRecord`.
         """
-        if not tree_splits_encoded:
+        if not tree_splits_encoded and not isinstance(tree, treesplit.SplitRecord):
             treesplit.encode_splits(tree)
-        topology = self.hash_topology(tree)
-        if topology not in self.topology_hash_map:
-            self.topology_hash_map[topology] = 1
-        else:
-            self.topology_hash_map[topology] = self.topology_hash_map[topology] + 1
-        self.total_trees_counted += 1
+        self.add_topology_count(self.topology_splits(tree))
 
     def calc_hash_freqs(self):
         """
@@ -413,7 +524,7 @@ class TopologyCounter(object):
         hash_freqs = self.calc_hash_freqs()
         tree_freqs = OrderedDict()
         for topology_hash, (count, freq) in hash_freqs.items():
-            tree = treesplit.tree_from_splits(splits=topology_hash,
+            tree = treesplit.tree_from_splits(splits=self.get_topology_splits(topology_hash),
                 taxon_set=taxon_set,
                 is_rooted=is_rooted)
             tree_freqs[tree] = (count, freq)
@@ -422,3 +533,182 @@ class TopologyCounter(object):
 ## TreeCounter
 ##############################################################################
 
+##############################################################################
+## SplitCountingState
+
+SPLIT_COUNTING_STATE_FORMAT = "dendropy.SplitCountingState"
+SPLIT_COUNTING_STATE_FORMAT_VERSION = 2
+
+class SplitCountingState(object):
+    """
+    The (possibly partial) results of counting the splits and topologies of
+    the trees of one or more sources: a `SplitDistribution`, a
+    `TopologyCounter` and, for each source, the 0-based index of the next
+    tree to be counted, given the `tree_offset` (burn-in) and `thin`
+    (thinning interval) used to select the trees.
+
+    States can be saved to and loaded from files, so that counting can be
+    resumed from where it was interrupted (by reading each source again with
+    the offset returned by `next_tree_index()`), and the states of runs over
+    different sources (e.g., on different machines) can be combined using
+    `update()`, with exactly the same results as if all the trees had been
+    counted in a single run.
+    """
+
+    def source_key(source):
+        """
+        Returns the key under which the progress through `source` (a
+        filepath or a file-like object with a `name`) is recorded: its
+        absolute path.
+        """
+        if not isinstance(source, str):
+            source = source.name
+        return os.path.abspath(source)
+    source_key = staticmethod(source_key)
+
+    def __init__(self,
+            split_distribution=None,
+            topology_counter=None,
+            tree_offset=0,
+            thin=1):
+        if split_distribution is None:
+            split_distribution = treesplit.SplitDistribution(taxon_set=dendropy.TaxonSet())
+        if topology_counter is None:
+            topology_counter = TopologyCounter()
+        self.split_distribution = split_distribution
+        self.topology_counter = topology_counter
+        self.tree_offset = tree_offset
+        self.thin = thin
+        self.next_tree_indices = OrderedDict()
+
+    def next_tree_index(self, source):
+        """
+        Returns the 0-based index of the next tree of `source` to be counted
+        (`tree_offset` if no trees of `source` have been counted).
+        """
+        return self.next_tree_indices.get(self.source_key(source), self.tree_offset)
+
+    def set_next_tree_index(self, source, tree_idx):
+        "Records `tree_idx` as the index of the next tree of `source` to be counted."
+        self.next_tree_indices[self.source_key(source)] = tree_idx
+
+    def update(self, other):
+        """
+        Adds the counts of `other`, which must have been made from trees
+        selected in the same way and from different sources (otherwise
+        ValueError is raised), to this state.
+        """
+        if (other.tree_offset, other.thin) != (self.tree_offset, self.thin):
+            raise ValueError("Cannot combine counts of trees selected with different burn-in/thinning: %d/%d and %d/%d" \
+                    % (self.tree_offset, self.thin, other.tree_offset, other.thin))
+        sd = self.split_distribution
+        other_sd = other.split_distribution
+        for attr in ("is_rooted", "ignore_edge_lengths", "ignore_node_ages"):
+            if bool(getattr(sd, attr)) != bool(getattr(other_sd, attr)):
+                raise ValueError("Cannot combine split counts with different settings of '%s'" % attr)
+        for key in other.next_tree_indices:
+            if key in self.next_tree_indices:
+                raise ValueError("Trees of '%s' have been counted in both sets of counts" % key)
+        if other_sd.total_trees_counted:
+            taxon_labels = [t.label for t in other_sd.taxon_set]
+            if sd.taxon_set is None:
+                sd.taxon_set = dendropy.TaxonSet()
+            if len(sd.taxon_set) == 0:
+                for label in taxon_labels:
+                    sd.taxon_set.new_taxon(label=label)
+            elif [t.label for t in sd.taxon_set] != taxon_labels:
+                raise ValueError("Cannot combine split counts over different taxa (or taxa in a different order): "
+                        + "counts to be combined should be loaded using the same taxon set")
+        sd.update(other_sd)
+        self.topology_counter.update_topology_hash_map(other.topology_counter.topology_hash_map,
+                other.topology_counter.topology_exemplars)
+        self.next_tree_indices.update(other.next_tree_indices)
+
+    def save(self, dest):
+        """
+        Writes the state to the file-like object `dest`, as JSON (see
+        `treesplit.save_state()`).
+        """
+        state = {
+            'split_distribution': self.split_distribution.get_state(),
+            'topologies': [(self.topology_counter.get_topology_splits(h), c) \
+                    for h, c in self.topology_counter.topology_hash_map.iteritems()],
+            'tree_offset': self.tree_offset,
+            'thin': self.thin,
+            'next_tree_indices': self.next_tree_indices.items(),
+        }
+        treesplit.save_state(state,
+                SPLIT_COUNTING_STATE_FORMAT,
+                SPLIT_COUNTING_STATE_FORMAT_VERSION,
+                dest)
+
+    def load(cls, src, taxon_set=None):
+        """
+        Returns a `SplitCountingState` read from the file-like object `src`,
+        as written by `save()`. If given, `taxon_set` is used as the taxon
+        set of the split distribution (see
+        `treesplit.SplitDistribution.from_state()`). Raises ValueError if
+        `src` does not contain a (well-formed) state of the current format.
+        States to be combined using `update()` should be loaded using the
+        same taxon set.
+        """
+        state = treesplit.load_state(src,
+                SPLIT_COUNTING_STATE_FORMAT,
+                SPLIT_COUNTING_STATE_FORMAT_VERSION,
+                "split counting state")
+        cls._check_state(state)
+        sd_state = state['split_distribution']
+        if taxon_set is None:
+            taxon_set = dendropy.TaxonSet()
+        split_distribution = treesplit.SplitDistribution.from_state(sd_state, taxon_set=taxon_set)
+        index_map = treesplit.taxon_index_map(sd_state['taxon_labels'], taxon_set)
+        topology_counter = TopologyCounter()
+        for splits, count in state['topologies']:
+            if index_map is not None:
+                if split_distribution.is_rooted:
+                    mask = None
+                else:
+                    mask = taxon_set.all_taxa_bitmask()
+                splits = [treesplit.remap_split(split, index_map, mask) for split in splits]
+            topology_counter.add_topology_count(tuple(sorted(splits)), count)
+        counting_state = cls(split_distribution=split_distribution,
+                topology_counter=topology_counter,
+                tree_offset=state['tree_offset'],
+                thin=state['thin'])
+        counting_state.next_tree_indices.update(state['next_tree_indices'])
+        return counting_state
+    load = classmethod(load)
+
+    def _check_state(state):
+        # raises ValueError if `state` (as written by `save()`) is not
+        # well-formed; the split distribution is checked when it is recreated
+        def check(is_valid, desc):
+            if not is_valid:
+                raise ValueError("Invalid split counting state: invalid %s" % desc)
+        is_int = lambda x: isinstance(x, (int, long)) and not isinstance(x, bool)
+        for key in ('split_distribution', 'topologies', 'tree_offset', 'thin', 'next_tree_indices'):
+            if key not in state:
+                raise ValueError("Invalid split counting state: missing '%s'" % key)
+        check(isinstance(state['split_distribution'], dict)
+                and isinstance(state['split_distribution'].get('taxon_labels'), list),
+                "split distribution")
+        check(is_int(state['tree_offset']) and state['tree_offset'] >= 0, "burn-in")
+        check(is_int(state['thin']) and state['thin'] >= 1, "thinning interval")
+        num_taxa = len(state['split_distribution']['taxon_labels'])
+        check(isinstance(state['topologies'], list), "topologies")
+        for item in state['topologies']:
+            check(isinstance(item, list) and len(item) == 2
+                    and isinstance(item[0], list)
+                    and isinstance(item[1], (int, long, float)), "topology count")
+            for split in item[0]:
+                check(is_int(split) and 0 <= split < (1 << num_taxa), "topology split")
+        check(isinstance(state['next_tree_indices'], list), "tree indices")
+        for item in state['next_tree_indices']:
+            check(isinstance(item, list) and len(item) == 2
+                    and isinstance(item[0], str)
+                    and is_int(item[1]), "tree index")
+    _check_state = staticmethod(_check_state)
+
+## SplitCountingState
+##############################################################################
+
@@ -190,6 +190,98 @@ class LineReadingThread(Thread):
                     break
         _LOG.debug("LineReadingThread exiting")
 
+###############################################################################
+## FollowingStream
+
+class FollowingStream(object):
+    """
+    Wraps a file-like object that is being written to (e.g., the tree file
+    of a running MCMC analysis), so that, as with `LineReadingThread` (or
+    'tail -f'), reaching the end of the data does not end the stream: reads
+    instead wait, polling every `sleep_interval` seconds, until more data
+    is appended. Readers (e.g., the NEXUS/NEWICK tokenizers) can thus parse
+    the data incrementally as it is written, with statements that are only
+    partly written when they are reached being completed when the rest is
+    written.
+
+    The stream ends (i.e., reads return an empty string) when:
+
+        - `stop_event` (an Event) is set
+        - no new data has appeared for `timeout` seconds (if not None)
+        - `idle_func`, if given, returns False: this is called (without
+          arguments) each time the reader catches up with the writer, i.e.,
+          when a read first finds no more data after some has been read.
+    """
+
+    def __init__(self,
+            stream,
+            sleep_interval=DEFAULT_SLEEP_INTERVAL,
+            stop_event=None,
+            timeout=None,
+            idle_func=None):
+        self.stream = stream
+        self.sleep_interval = sleep_interval
+        self.stop_event = stop_event
+        self.timeout = timeout
+        self.idle_func = idle_func
+        self.is_idle = False
+        self.ended = False
+
+    def _get_name(self):
+        return getattr(self.stream, "name", "<stream>")
+    name = property(_get_name)
+
+    def close(self):
+        self.stream.close()
+
+    def seek(self, offset, whence=0):
+        "Repositions the underlying stream (e.g., to re-read data already read)."
+        self.stream.seek(offset, whence)
+
+    def tell(self):
+        return self.stream.tell()
+
+    def read(self, size=-1):
+        "Returns up to `size` bytes, waiting for data if none are available."
+        return self._wait_for(lambda: self.stream.read(size))
+
+    def readline(self):
+        "Returns the next line, waiting for data if the line is not complete."
+        line = self._wait_for(self.stream.readline)
+        while line and not line.endswith("\n"):
+            more = self._wait_for(self.stream.readline)
+            if not more:
+                break
+            line = line + more
+        return line
+
+    def _wait_for(self, read_func):
+        if self.ended:
+            return ""
+        last_data_time = time.time()
+        while True:
+            data = read_func()
+            if data:
+                self.is_idle = False
+                return data
+            if (self.stop_event is not None) and self.stop_event.isSet():
+                break
+            if not self.is_idle:
+                self.is_idle = True
+                if self.idle_func is not None and self.idle_func() is False:
+                    break
+            if self.timeout is not None and time.time() - last_data_time >= self.timeout:
+                break
+            time.sleep(self.sleep_interval)
+            try:
+                # clears the end-of-file condition of the underlying file,
+                # which would otherwise hide data appended after it was set
+                self.stream.seek(0, os.SEEK_CUR)
+            except (AttributeError, IOError, ValueError):
+                pass
+        self.ended = True
+        return ""
+
 ###############################################################################
 ## File Finding
 
@@ -102,10 +102,17 @@ class DataReader(IOService):
         __init__ creates a `DataReader` object. See `IOClient` for details on
         keyword arguments recognized. In addition, the keyword `encode_splits`
         specifies whether or not splits will be automatically-encoded upon
-        a tree being read.
+        a tree being read, while `split_encoding` ("rooted", "unrooted" or
+        "none") overrides this and the default policy of encoding splits
+        on trees read with a pre-populated taxon set (see
+        `dendropy.treesplit.SplitEncodingPolicy`). The keyword
+        `node_factory` specifies the class of the nodes of the trees
+        read (e.g., `dendropy.CompactNode`).
         """
         IOService.__init__(self, **kwargs)
         self.encode_splits = kwargs.get("encode_splits", False)
+        self.split_encoding = kwargs.get("split_encoding", None)
+        self.node_factory = kwargs.get("node_factory", None)
 
     def read(self, stream):
         """
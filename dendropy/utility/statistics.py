@@ -17,10 +17,11 @@
 ##############################################################################
 
 """
-Functions to calculate some general statistics.
+Functions and classes to calculate some general statistics.
 """
 
 import math
+import bisect
 from operator import itemgetter
 
 def _mean_and_variance_pop_n(values):
@@ -165,3 +166,266 @@ def summarize(values):
     except (ValueError, OverflowError):
         summary['quant_5_95'] = None
     return summary
+
+class OnlineSummary(object):
+    """
+    Summarizes a stream of values without storing them, so that memory
+    use does not grow with the number of values:
+
+        - the count, mean and (sample) variance are updated exactly, using
+          Welford's algorithm
+        - the minimum and maximum are tracked exactly
+        - quantiles (median, 5% and 95% quantiles and 95% HPD) are estimated
+          from a fixed-size sketch of the values
+
+    The sketch keeps up to `sketch_size` values at each of a number of
+    levels, with each value at level `h` standing in for 2**h of the original
+    values. When a level fills up, its values are sorted and every other one
+    is promoted to the next level. Until the first level first fills up, the
+    sketch holds all values, and quantiles are exact; after that, the error in
+    the rank of any quantile estimate is at most about `L/sketch_size` of the
+    number of values, where `L` is the number of levels (which grows with
+    the logarithm of the number of values).
+
+    Summaries (including their sketches) of separate streams can be combined
+    with `merge()`.
+    """
+
+    def __init__(self, values=None, sketch_size=256):
+        self.sketch_size = max(2, sketch_size)
+        self.count = 0
+        self.mean = 0.0
+        self._sum_sq_devs = 0.0
+        self.min = None
+        self.max = None
+        self._levels = [[]]
+        self._compactions = [0]
+        if values is not None:
+            for value in values:
+                self.add(value)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        "Adds `value` to the summary."
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._sum_sq_devs += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        level = self._levels[0]
+        level.append(value)
+        if len(level) >= self.sketch_size:
+            self._compact(0)
+
+    def merge(self, other):
+        "Adds the values summarized by `other` to this summary."
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.mean = other.mean
+            self._sum_sq_devs = other._sum_sq_devs
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self._sum_sq_devs += other._sum_sq_devs \
+                    + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+        self.count += other.count
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        for h, values in enumerate(other._levels):
+            while h >= len(self._levels):
+                self._levels.append([])
+                self._compactions.append(0)
+            self._levels[h].extend(values)
+        for h in xrange(len(self._levels)):
+            if h < len(self._levels) and len(self._levels[h]) >= self.sketch_size:
+                self._compact(h)
+
+    def get_state(self):
+        """
+        Returns the state of the summary as a tuple of numbers and lists of
+        numbers, from which an equivalent summary can be recreated using
+        `from_state()` (e.g., after being saved to a file).
+        """
+        return (self.sketch_size,
+                self.count,
+                self.mean,
+                self._sum_sq_devs,
+                self.min,
+                self.max,
+                [list(values) for values in self._levels],
+                list(self._compactions))
+
+    def from_state(cls, state):
+        """
+        Returns a summary recreated from `state` (see `get_state()`), which
+        may also be given as a list. Raises ValueError if `state` is not
+        well-formed.
+        """
+        if not isinstance(state, (tuple, list)) or len(state) != 8:
+            raise ValueError("Invalid summary state")
+        sketch_size, count, mean, sum_sq_devs, min_value, max_value, levels, compactions = state
+        numbers = (int, long, float)
+        if not isinstance(sketch_size, (int, long)) \
+                or not isinstance(count, (int, long)) \
+                or not isinstance(mean, numbers) \
+                or not isinstance(sum_sq_devs, numbers) \
+                or not isinstance(min_value, numbers + (type(None),)) \
+                or not isinstance(max_value, numbers + (type(None),)) \
+                or not isinstance(levels, (tuple, list)) \
+                or not isinstance(compactions, (tuple, list)) \
+                or len(levels) != len(compactions) \
+                or len(levels) == 0:
+            raise ValueError("Invalid summary state")
+        for values in levels:
+            if not isinstance(values, (tuple, list)):
+                raise ValueError("Invalid summary state")
+            for value in values:
+                if not isinstance(value, numbers):
+                    raise ValueError("Invalid summary state")
+        for num_compactions in compactions:
+            if not isinstance(num_compactions, (int, long)):
+                raise ValueError("Invalid summary state")
+        summary = cls(sketch_size=sketch_size)
+        summary.count = count
+        summary.mean = mean
+        summary._sum_sq_devs = sum_sq_devs
+        summary.min = min_value
+        summary.max = max_value
+        summary._levels = [list(values) for values in levels]
+        summary._compactions = list(compactions)
+        return summary
+    from_state = classmethod(from_state)
+
+    def _compact(self, h):
+        level = self._levels[h]
+        level.sort()
+        if len(level) % 2:
+            # keep one value back, so the total weight is conserved
+            leftover = [level.pop()]
+        else:
+            leftover = []
+        # alternate between keeping the odd and the even values, so that
+        # values are not consistently biased up or down
+        start = self._compactions[h] % 2
+        self._compactions[h] += 1
+        promoted = level[start::2]
+        self._levels[h] = leftover
+        if h + 1 == len(self._levels):
+            self._levels.append([])
+            self._compactions.append(0)
+        self._levels[h + 1].extend(promoted)
+        if len(self._levels[h + 1]) >= self.sketch_size:
+            self._compact(h + 1)
+
+    def is_exact(self):
+        "Returns True if the sketch still holds all values."
+        return len(self._levels) == 1
+
+    def _get_sketch(self):
+        # returns the sorted values in the sketch and the cumulative weights
+        # (ranks) they reach
+        weighted = []
+        for h, values in enumerate(self._levels):
+            weight = 1 << h
+            for v in values:
+                weighted.append((v, weight))
+        weighted.sort()
+        values = []
+        cum_weights = []
+        total = 0
+        for v, weight in weighted:
+            total += weight
+            values.append(v)
+            cum_weights.append(total)
+        return values, cum_weights
+
+    def _ranked_value(self, sketch, rank):
+        # value at 0-based `rank` of the (estimated) sorted sample, with
+        # negative ranks counting from the end, as with list indices
+        values, cum_weights = sketch
+        if rank < 0:
+            rank += self.count
+        return values[bisect.bisect_right(cum_weights, rank)]
+
+    def median(self):
+        "Returns the (estimated) median."
+        if self.count == 0:
+            raise ValueError("No values in data")
+        sketch = self._get_sketch()
+        size = self.count
+        if size % 2 == 1:
+            return self._ranked_value(sketch, (size - 1) / 2)
+        else:
+            return (self._ranked_value(sketch, size/2 - 1) + self._ranked_value(sketch, size/2)) / 2
+
+    def quantile_5_95(self):
+        "Returns (estimated) 5% and 95% quantiles (see `quantile_5_95()`)."
+        size = self.count
+        idx5 = int(round(size * 0.05)) - 1
+        idx95 = int(round(size * 0.95)) - 1
+        if idx5 == 0:
+            raise ValueError("Sample size too small: %s" % size)
+        sketch = self._get_sketch()
+        return self._ranked_value(sketch, idx5), self._ranked_value(sketch, idx95)
+
+    def empirical_hpd(self, conf=0.05):
+        "Returns the (estimated) HPD interval (see `empirical_hpd()`)."
+        conf = min([conf, 1.0 - conf])
+        n = self.count
+        nn = int(round(n * conf))
+        if nn == 0:
+            raise ValueError("Sample size too small: %s" % n)
+        sketch = self._get_sketch()
+        best = None
+        for i in range(nn):
+            lower = self._ranked_value(sketch, i)
+            upper = self._ranked_value(sketch, n-nn+i)
+            if best is None or upper - lower < best[1] - best[0]:
+                best = (lower, upper)
+        return best
+
+    def sample_variance(self):
+        "Returns the sample variance (`inf` if there is only one value)."
+        if self.count == 0:
+            raise IndexError("values in mean_and_variance cannot be empty")
+        if self.count == 1:
+            return float('inf')
+        return self._sum_sq_devs / (self.count - 1)
+
+    def summary(self):
+        """
+        Returns a dictionary of summary statistics with the same keys as
+        those returned by `summarize()`.
+        """
+        summary = {}
+        if self.count == 0:
+            raise ValueError("No values in data")
+        summary['range'] = (self.min, self.max)
+        summary['mean'] = self.mean
+        summary['var'] = self.sample_variance()
+        try:
+            summary['sd'] = summary['var'] ** 0.5
+        except OverflowError:
+            summary['sd'] = float('inf')
+        try:
+            summary['median'] = self.median()
+        except (ValueError, OverflowError):
+            summary['median'] = None
+        try:
+            summary['hpd95'] = self.empirical_hpd(conf=0.95)
+        except (ValueError, OverflowError):
+            summary['hpd95'] = None
+        try:
+            summary['quant_5_95'] = self.quantile_5_95()
+        except (ValueError, OverflowError):
+            summary['quant_5_95'] = None
+        return summary
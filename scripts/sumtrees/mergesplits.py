@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+
+##############################################################################
+##  DendroPy Phylogenetic Computing Library.
+##
+##  Copyright 2010 Jeet Sukumaran and Mark T. Holder.
+##  All rights reserved.
+##
+##  See "LICENSE.txt" for terms and conditions of usage.
+##
+##  If you use this work or any portion thereof in published work,
+##  please cite it as:
+##
+##     Sukumaran, J. and M. T. Holder. 2010. DendroPy: a Python library
+##     for phylogenetic computing. Bioinformatics 26: 1569-1571.
+##
+##############################################################################
+
+"""
+Merge split counts saved by SumTrees checkpoints.
+"""
+
+import os
+import sys
+from optparse import OptionParser
+from optparse import OptionGroup
+
+from dendropy import treesum
+from dendropy.utility.cli import confirm_overwrite, show_splash
+from dendropy.utility.messaging import ConsoleMessenger
+
+_program_name = 'MergeSplits'
+_program_subtitle = 'SumTrees Split Count Merging'
+_program_date = 'May 05 2011'
+_program_version = 'Version 1.0.0 (%s)' % _program_date
+_program_author = 'Jeet Sukumaran and Mark T. Holder'
+_program_contact = 'jeetsukumaran@gmail.com'
+_program_copyright = "Copyright (C) 2008 Jeet Sukumaran.\n" \
+                 "License GPLv3+: GNU GPL version 3 or later.\n" \
+                 "This is free software: you are free to change\nand redistribute it. " \
+                 "There is NO WARRANTY,\nto the extent permitted by law."
+
+def main_cli():
+
+    description =  '%s %s %s' % (_program_name, _program_version, _program_subtitle)
+    usage = "%prog [options] -o <OUTPUT FILE> <CHECKPOINT FILE> [<CHECKPOINT FILE> [...]]"
+
+    parser = OptionParser(usage=usage, add_help_option=True, version = _program_version, description=description)
+
+    output_filepath_optgroup = OptionGroup(parser, 'Output File Options')
+    parser.add_option_group(output_filepath_optgroup)
+    output_filepath_optgroup.add_option('-o','--output',
+                  dest='output_filepath',
+                  default=None,
+                  help="path to output file, to which the merged counts will be saved in the same form as the checkpoint files, to be summarized using the '--resume' option of SumTrees")
+    output_filepath_optgroup.add_option('-r', '--replace',
+                      action='store_true',
+                      dest='replace',
+                      default=False,
+                      help="replace/overwrite output file without asking if it already exists ")
+
+    run_optgroup = OptionGroup(parser, 'Program Run Options')
+    parser.add_option_group(run_optgroup)
+    run_optgroup.add_option('-q', '--quiet',
+                      action='store_true',
+                      dest='quiet',
+                      default=False,
+                      help="suppress progress messages")
+
+    (opts, args) = parser.parse_args()
+    if opts.quiet:
+        messaging_level = ConsoleMessenger.ERROR_MESSAGING_LEVEL
+    else:
+        messaging_level = ConsoleMessenger.INFO_MESSAGING_LEVEL
+    messenger = ConsoleMessenger(name='mergesplits.py', messaging_level=messaging_level)
+
+    # splash
+    if not opts.quiet:
+        show_splash(prog_name=_program_name,
+        prog_subtitle=_program_subtitle,
+        prog_version=_program_version,
+        prog_author=_program_author,
+        prog_copyright=_program_copyright,
+        dest=sys.stderr,
+        extended=False)
+
+    ###################################################
+    # Checkpoint file idiot checking
+
+    checkpoint_filepaths = []
+    for fpath in args:
+        fpath = os.path.expanduser(os.path.expandvars(fpath))
+        if not os.path.exists(fpath):
+            messenger.send_error('Checkpoint file not found: "%s"' % fpath)
+            sys.exit(1)
+        checkpoint_filepaths.append(fpath)
+    if len(checkpoint_filepaths) == 0:
+        messenger.send_error("No checkpoint files specified.")
+        sys.exit(1)
+    if opts.output_filepath is None:
+        messenger.send_error("Output file must be specified (using '-o' or '--output').")
+        sys.exit(1)
+    output_fpath = os.path.expanduser(os.path.expandvars(opts.output_filepath))
+    if not confirm_overwrite(filepath=output_fpath, replace_without_asking=opts.replace):
+        sys.exit(1)
+
+    ###################################################
+    # Main work begins here
+
+    merged_state = None
+    for fpath in checkpoint_filepaths:
+        if merged_state is None:
+            taxon_set = None
+        else:
+            taxon_set = merged_state.split_distribution.taxon_set
+        src = open(fpath, "rb")
+        try:
+            try:
+                counting_state = treesum.SplitCountingState.load(src, taxon_set=taxon_set)
+                if merged_state is None:
+                    merged_state = counting_state
+                else:
+                    merged_state.update(counting_state)
+            except ValueError, e:
+                messenger.send_error('Cannot merge "%s": %s' % (fpath, e))
+                sys.exit(1)
+        finally:
+            src.close()
+        messenger.send_info('"%s": %d trees counted from %d source(s).' \
+                % (fpath, counting_state.split_distribution.total_trees_counted, len(counting_state.next_tree_indices)))
+
+    dest = open(output_fpath, "wb")
+    merged_state.save(dest)
+    dest.close()
+    messenger.send_info('Merged counts of %d trees from %d source(s) written to: "%s".' \
+            % (merged_state.split_distribution.total_trees_counted, len(merged_state.next_tree_indices), output_fpath))
+
+if __name__ == '__main__':
+    main_cli()
@@ -29,13 +29,15 @@ from optparse import OptionGroup
 import datetime
 import time
 import socket
+import threading
+from itertools import izip
 try:
     import getpass
 except:
     pass
 import platform
+import Queue
 try:
-    import Queue
     import multiprocessing
     _MP = True
 except ImportError:
@@ -47,6 +49,7 @@ from dendropy import treesum
 from dendropy.dataio import tree_source_iter
 from dendropy.dataio import multi_tree_source_iter
 from dendropy.dataio import newick
+from dendropy.dataio import treeindex
 from dendropy.utility.messaging import ConsoleMessenger
 from dendropy.utility.cli import confirm_overwrite, show_splash
 from dendropy.utility import statistics
@@ -74,11 +77,11 @@ if _MP:
                 ignore_node_ages,
                 calc_tree_probs,
                 weighted_trees,
-                tree_offset,
                 process_idx,
                 messenger,
                 messenger_lock,
-                log_frequency=1000):
+                log_frequency=1000,
+                sketch_size=None):
             multiprocessing.Process.__init__(self)
             self.work_queue = work_queue
             self.result_split_dist_queue = result_split_dist_queue
@@ -86,18 +89,15 @@ if _MP:
             self.schema = schema
             self.taxon_labels = list(taxon_labels)
             self.taxon_set = dendropy.TaxonSet(self.taxon_labels)
-            self.split_distribution = treesplit.SplitDistribution(taxon_set=self.taxon_set)
-            self.split_distribution.is_rooted = is_rooted
-            self.split_distribution.ignore_node_ages = ignore_node_ages
             self.is_rooted = is_rooted
+            self.ignore_node_ages = ignore_node_ages
             self.calc_tree_probs = calc_tree_probs
-            self.topology_counter = treesum.TopologyCounter()
             self.weighted_trees = weighted_trees
-            self.tree_offset = tree_offset
             self.process_idx = process_idx
             self.messenger = messenger
             self.messenger_lock = messenger_lock
             self.log_frequency = log_frequency
+            self.sketch_size = sketch_size
             self.kill_received = False
 
         def send_message(self, msg, level, wrap=True):
@@ -122,39 +122,71 @@ if _MP:
             self.send_message(msg, ConsoleMessenger.ERROR_MESSAGING_LEVEL, wrap=wrap)
 
         def run(self):
+            """
+            Processes tasks until the work queue is empty. A result is put
+            on the result queues for every task received: if the task could
+            not be completed (because of an error, or a kill request), then
+            the result is None, and no more tasks are processed.
+            """
             while not self.kill_received:
                 try:
-                    source = self.work_queue.get_nowait()
+                    task_idx, source, tree_index, first_tree_idx, tree_indices = self.work_queue.get_nowait()
                 except Queue.Empty:
                     break
-                self.send_info("Received task: '%s'." % source, wrap=False)
-                fsrc = open(source, "rU")
-                for tidx, tree in enumerate(tree_source_iter(fsrc,
-                        schema=self.schema,
-                        taxon_set=self.taxon_set,
-                        as_rooted=self.is_rooted,
-                        store_tree_weights=self.weighted_trees)):
-                    if tidx >= self.tree_offset:
-                        if (self.log_frequency == 1) or (tidx > 0 and self.log_frequency > 0 and tidx % self.log_frequency == 0):
-                            self.send_info("(processing) '%s': tree at offset %d" % (source, tidx), wrap=False)
-                        treesplit.encode_splits(tree)
-                        self.split_distribution.count_splits_on_tree(tree)
-                        if self.calc_tree_probs:
-                            self.topology_counter.count(tree,
-                                    tree_splits_encoded=True)
-                    else:
-                        if (self.log_frequency == 1) or (tidx > 0 and self.log_frequency > 0 and tidx % self.log_frequency == 0):
-                            self.send_info("(processing) '%s': tree at offset %d (skipping)" % (source, tidx), wrap=False)
-                    if self.kill_received:
-                        break
-                if self.kill_received:
+                try:
+                    split_distribution, topology_counter = self.count_trees(source,
+                            tree_index,
+                            first_tree_idx,
+                            tree_indices)
+                except Exception, e:
+                    self.send_error("Failed to process '%s': %s" % (source, e), wrap=False)
+                    split_distribution, topology_counter = None, None
+                if split_distribution is None:
+                    self.result_split_dist_queue.put((task_idx, None))
+                    self.result_topology_hash_map_queue.put((task_idx, None, None))
                     break
-                self.send_info("Completed task: '%s'." % (source), wrap=False)
+                self.result_split_dist_queue.put((task_idx, split_distribution))
+                self.result_topology_hash_map_queue.put((task_idx, topology_counter.topology_hash_map, topology_counter.topology_exemplars))
             if self.kill_received:
                 self.send_warning("Terminating in response to kill request.")
-            else:
-                self.result_split_dist_queue.put(self.split_distribution)
-                self.result_topology_hash_map_queue.put(self.topology_counter.topology_hash_map)
+
+        def count_trees(self, source, tree_index, first_tree_idx, tree_indices):
+            """
+            Counts the splits on the trees of `source` at `tree_indices`
+            (relative to `first_tree_idx`, the first tree of `tree_index`).
+            Returns a tuple of the split distribution and topology counter,
+            or (None, None) if interrupted by a kill request.
+            """
+            split_distribution = new_split_distribution(self.taxon_set, self.sketch_size)
+            split_distribution.is_rooted = self.is_rooted
+            split_distribution.ignore_node_ages = self.ignore_node_ages
+            topology_counter = treesum.TopologyCounter()
+            last_tree_idx = first_tree_idx + len(tree_index) - 1
+            self.send_info("Received task: '%s' (trees %d to %d)." % (source, first_tree_idx, last_tree_idx), wrap=False)
+            fsrc = open(source, "rb")
+            try:
+                # izip, so that each tree is counted (and a kill request
+                # noticed) as soon as it is read
+                for local_idx, tree in izip(tree_indices, tree_index.indexed_tree_iter(fsrc,
+                        tree_indices,
+                        taxon_set=self.taxon_set,
+                        as_rooted=self.is_rooted,
+                        store_tree_weights=self.weighted_trees,
+                        as_split_records=True,
+                        calc_node_ages=not self.ignore_node_ages)):
+                    tidx = first_tree_idx + local_idx
+                    if (self.log_frequency == 1) or (tidx > 0 and self.log_frequency > 0 and tidx % self.log_frequency == 0):
+                        self.send_info("(processing) '%s': tree at offset %d" % (source, tidx), wrap=False)
+                    split_distribution.count_splits_on_tree(tree)
+                    if self.calc_tree_probs:
+                        topology_counter.count(tree,
+                                tree_splits_encoded=True)
+                    if self.kill_received:
+                        return None, None
+            finally:
+                fsrc.close()
+            self.send_info("Completed task: '%s' (trees %d to %d)." % (source, first_tree_idx, last_tree_idx), wrap=False)
+            return split_distribution, topology_counter
 
 def discover_taxa(treefile, schema):
     """
@@ -166,12 +198,68 @@ def discover_taxa(treefile, schema):
     else:
         tdf = treefile
     tt = None
-    for tree in tree_source_iter(tdf, schema=schema):
-        tt = tree
-        break
+    try:
+        for tree in tree_source_iter(tdf, schema=schema):
+            tt = tree
+            break
+    finally:
+        if tdf is not treefile:
+            tdf.close()
     taxon_set = tt.taxon_set
     return taxon_set
 
+def new_split_distribution(taxon_set, sketch_size=None):
+    """
+    Returns a new SplitDistribution for `taxon_set`, which stores the edge
+    lengths and node ages of each split in lists if `sketch_size` is None,
+    or otherwise summarizes them in a fixed amount of memory per split (see
+    `treesplit.SplitDistribution`), keeping a sketch of up to about
+    `sketch_size` values for estimating medians, quantiles and HPD
+    intervals.
+    """
+    if sketch_size is None:
+        return treesplit.SplitDistribution(taxon_set=taxon_set)
+    return treesplit.SplitDistribution(taxon_set=taxon_set,
+            store_value_lists=False,
+            sketch_size=sketch_size)
+
+def new_counting_state(tree_offset, thin, is_rooted, ignore_node_ages, sketch_size=None):
+    "Returns a new SplitCountingState, with a split distribution as given."
+    counting_state = treesum.SplitCountingState(
+            split_distribution=new_split_distribution(dendropy.TaxonSet(), sketch_size),
+            tree_offset=tree_offset,
+            thin=thin)
+    counting_state.split_distribution.is_rooted = is_rooted
+    counting_state.split_distribution.ignore_node_ages = ignore_node_ages
+    return counting_state
+
+def write_file_atomically(filepath, write_func, mode="w"):
+    """
+    Calls `write_func` with a (temporary) file opened for writing with
+    `mode`, which then replaces `filepath` once it has been completely
+    written, so that `filepath` is never left incomplete. Returns the value
+    returned by `write_func`.
+    """
+    tmp_filepath = filepath + ".tmp"
+    dest = open(tmp_filepath, mode)
+    try:
+        result = write_func(dest)
+    finally:
+        dest.close()
+    if os.path.exists(filepath) and sys.platform.startswith("win"):
+        os.remove(filepath)
+    os.rename(tmp_filepath, filepath)
+    return result
+
+def save_checkpoint(counting_state, checkpoint_filepath, messenger):
+    """
+    Saves `counting_state` to `checkpoint_filepath`, replacing any previous
+    checkpoint only once the new one has been completely written.
+    """
+    write_file_atomically(checkpoint_filepath, counting_state.save, mode="wb")
+    messenger.send_info("Checkpoint saved to '%s' (%d trees counted)." \
+            % (checkpoint_filepath, counting_state.split_distribution.total_trees_counted), wrap=False)
+
 def process_sources_parallel(
         num_processes,
         support_filepaths,
@@ -181,35 +269,75 @@ def process_sources_parallel(
         calc_tree_probs,
         weighted_trees,
         tree_offset,
+        thin,
         log_frequency,
-        messenger):
+        messenger,
+        counting_state=None,
+        checkpoint_filepath=None,
+        sketch_size=None):
     """
     Returns a SplitDistribution object summarizing all trees found in
-    `support_filepaths`.
+    `support_filepaths`. If `counting_state` (a `treesum.SplitCountingState`)
+    is given, the trees are counted in addition to those already counted in
+    it, skipping any trees of the sources that have already been counted.
+    The counts are saved to `checkpoint_filepath`, if given, once all the
+    sources have been processed. If `sketch_size` is not None, edge lengths
+    and node ages are summarized in bounded memory (see
+    `new_split_distribution()`).
     """
 
     # describe
     messenger.send_info("Running in multiprocessing mode (up to %d processes)." % num_processes)
     messenger.send_info("%d sources to be processed." % (len(support_filepaths)))
 
-    # pre-discover taxa
-    tdfpath = support_filepaths[0]
-    messenger.send_info("Pre-loading taxa based on '%s' ..." % tdfpath)
-    taxon_set = discover_taxa(tdfpath, schema)
+    if counting_state is None:
+        counting_state = new_counting_state(tree_offset, thin, is_rooted, ignore_node_ages, sketch_size)
+    if counting_state.split_distribution.store_value_lists:
+        sketch_size = None
+    else:
+        sketch_size = counting_state.split_distribution.sketch_size
+
+    # pre-discover taxa (unless resuming counts, which fix the taxa)
+    taxon_set = counting_state.split_distribution.taxon_set
+    if len(taxon_set) == 0:
+        tdfpath = support_filepaths[0]
+        messenger.send_info("Pre-loading taxa based on '%s' ..." % tdfpath)
+        for taxon in discover_taxa(tdfpath, schema):
+            taxon_set.new_taxon(label=taxon.label)
     taxon_labels = [str(t) for t in taxon_set]
     messenger.send_info("Found %d taxa: [%s]" % (len(taxon_labels), (', '.join(["'%s'" % t for t in taxon_labels]))))
 
-    # load up queue
+    # load up queue: each source is indexed and split into (up to)
+    # `num_processes` ranges of trees, to be processed independently
     messenger.send_info("Creating work queue ...")
     work_queue = multiprocessing.Queue()
+    num_tasks = 0
+    next_tree_indices = []
     for f in support_filepaths:
-        work_queue.put(f)
+        messenger.send_info("Indexing trees in '%s' ..." % f, wrap=False)
+        tree_index = treeindex.get_tree_index(f, schema=schema)
+        start = counting_state.next_tree_index(f)
+        if start > tree_offset:
+            messenger.send_info("Resuming '%s' from tree at offset %d." % (f, start), wrap=False)
+        shards = tree_index.shards(num_processes, start=start)
+        num_selected = len(range(start, len(tree_index), thin))
+        next_tree_indices.append((f, start + (num_selected * thin)))
+        messenger.send_info("Found %d trees in '%s': %d trees to be processed in %d task(s)." \
+                % (len(tree_index), f, num_selected, len(shards)), wrap=False)
+        for start, stop in shards:
+            # 0-based indices, relative to `start`, of the trees selected by thinning
+            tree_indices = [idx - start for idx in xrange(start, stop) if (idx - tree_offset) % thin == 0]
+            if tree_indices:
+                work_queue.put((num_tasks, f, tree_index.sub_index(start, stop), start, tree_indices))
+                num_tasks += 1
+    num_processes = max(1, min(num_processes, num_tasks))
 
     # launch processes
     messenger.send_info("Launching worker processes ...")
     result_split_dist_queue = multiprocessing.Queue()
     result_topology_hash_map_queue = multiprocessing.Queue()
     messenger_lock = multiprocessing.Lock()
+    workers = []
     for idx in range(num_processes):
         sct = SplitCountingWorker(work_queue,
                 result_split_dist_queue=result_split_dist_queue,
@@ -220,26 +348,40 @@ def process_sources_parallel(
                 ignore_node_ages=ignore_node_ages,
                 calc_tree_probs=calc_tree_probs,
                 weighted_trees=weighted_trees,
-                tree_offset=tree_offset,
                 process_idx=idx,
                 messenger=messenger,
                 messenger_lock=messenger_lock,
-                log_frequency=log_frequency)
+                log_frequency=log_frequency,
+                sketch_size=sketch_size)
         sct.start()
-
-    # collate results
-    result_count = 0
-    split_distribution = treesplit.SplitDistribution(taxon_set=taxon_set)
-    split_distribution.is_rooted = is_rooted
-    split_distribution.ignore_node_ages = ignore_node_ages
-    topology_counter = treesum.TopologyCounter()
-    while result_count < num_processes:
-        result_split_dist = result_split_dist_queue.get()
-        split_distribution.update(result_split_dist)
-        result_topology_hash_map = result_topology_hash_map_queue.get()
-        topology_counter.update_topology_hash_map(result_topology_hash_map)
-        result_count += 1
+        workers.append(sct)
+
+    # collate results (in task order, so that the results are the same as
+    # if the trees had been processed serially)
+    result_split_dists = {}
+    result_topology_hash_maps = {}
+    while len(result_split_dists) < num_tasks:
+        task_idx, result_split_dist = result_split_dist_queue.get()
+        result_split_dists[task_idx] = result_split_dist
+        task_idx, result_topology_hash_map, result_topology_exemplars = result_topology_hash_map_queue.get()
+        result_topology_hash_maps[task_idx] = (result_topology_hash_map, result_topology_exemplars)
+        if result_split_dist is None:
+            # a worker failed (or was killed): the remaining tasks may never
+            # be completed, so the other workers are stopped
+            for worker in workers:
+                worker.terminate()
+            messenger.send_error("Worker process failed to complete its task: aborting.")
+            sys.exit(1)
+    split_distribution = counting_state.split_distribution
+    topology_counter = counting_state.topology_counter
+    for task_idx in range(num_tasks):
+        split_distribution.update(result_split_dists[task_idx])
+        topology_counter.update_topology_hash_map(*result_topology_hash_maps[task_idx])
+    for f, next_tree_idx in next_tree_indices:
+        counting_state.set_next_tree_index(f, next_tree_idx)
     messenger.send_info("Recovered results from all worker processes.")
+    if checkpoint_filepath is not None:
+        save_checkpoint(counting_state, checkpoint_filepath, messenger)
     return split_distribution, topology_counter
 
 def process_sources_serial(
@@ -250,18 +392,29 @@ def process_sources_serial(
         calc_tree_probs,
         weighted_trees,
         tree_offset,
+        thin,
         log_frequency,
-        messenger):
+        messenger,
+        counting_state=None,
+        checkpoint_filepath=None,
+        checkpoint_frequency=0,
+        sketch_size=None):
     """
     Returns a SplitDistribution object summarizing all trees found in
-    `support_filepaths`.
+    `support_filepaths`. If `counting_state` (a `treesum.SplitCountingState`)
+    is given, the trees are counted in addition to those already counted in
+    it, skipping any trees of the sources that have already been counted.
+    The counts are saved to `checkpoint_filepath`, if given, after every
+    `checkpoint_frequency` trees (if greater than 0) and after each source.
+    `sketch_size` is as for `process_sources_parallel()`.
     """
     messenger.send_info("Running in serial mode.")
-    taxon_set = dendropy.TaxonSet()
-    split_distribution = treesplit.SplitDistribution(taxon_set=taxon_set)
-    split_distribution.ignore_node_ages = ignore_node_ages
-    split_distribution.is_rooted = is_rooted
-    topology_counter = treesum.TopologyCounter()
+    if counting_state is None:
+        counting_state = new_counting_state(tree_offset, thin, is_rooted, ignore_node_ages, sketch_size)
+    split_distribution = counting_state.split_distribution
+    taxon_set = split_distribution.taxon_set
+    topology_counter = counting_state.topology_counter
+    trees_since_checkpoint = 0
 
     if support_filepaths is None or len(support_filepaths) == 0:
         messenger.send_info("Reading trees from standard input.")
@@ -285,595 +438,421 @@ def process_sources_serial(
 
         name = getattr(src, "name", "<stdin>")
         messenger.send_info("Processing %d of %d: '%s'" % (sidx+1, len(srcs), name), wrap=False)
-        for tidx, tree in enumerate(tree_source_iter(src,
+        if src is sys.stdin:
+            start = tree_offset
+        else:
+            start = counting_state.next_tree_index(src)
+            if start > tree_offset:
+                messenger.send_info("Resuming '%s' from tree at offset %d." % (name, start), wrap=False)
+        # trees in the burn-in, or not selected by thinning (or already
+        # counted), are skipped without being parsed
+        tree_iter = tree_source_iter(src,
                 schema=schema,
                 taxon_set=taxon_set,
                 store_tree_weights=weighted_trees,
-                as_rooted=is_rooted)):
-            if tidx >= tree_offset:
-                if (log_frequency == 1) or (tidx > 0 and log_frequency > 0 and tidx % log_frequency == 0):
-                    messenger.send_info("(processing) '%s': tree at offset %d" % (name, tidx), wrap=False)
-                treesplit.encode_splits(tree)
-                split_distribution.count_splits_on_tree(tree)
-                topology_counter.count(tree, tree_splits_encoded=True)
-            else:
-                if (log_frequency == 1) or (tidx > 0 and log_frequency > 0 and tidx % log_frequency == 0):
-                    messenger.send_info("(processing) '%s': tree at offset %d (skipping)" % (name, tidx), wrap=False)
+                as_rooted=is_rooted,
+                as_split_records=True,
+                calc_node_ages=not ignore_node_ages,
+                tree_offset=start,
+                thin=thin)
+        count = 0
+        while True:
+            try:
+                tree = tree_iter.next()
+            except StopIteration:
+                break
+            except KeyError:
+                # raised by the tree source if there are no trees at or
+                # beyond `start`
+                if start > tree_offset:
+                    messenger.send_info("'%s': no trees beyond those already counted" % name, wrap=False)
+                else:
+                    messenger.send_warning("'%s': burn-in of %d trees exceeds number of trees in source" % (name, tree_offset), wrap=False)
+                break
+            tidx = start + (count * thin)
+            count += 1
+            if (log_frequency == 1) or (tidx > 0 and log_frequency > 0 and tidx % log_frequency == 0):
+                messenger.send_info("(processing) '%s': tree at offset %d" % (name, tidx), wrap=False)
+            split_distribution.count_splits_on_tree(tree)
+            topology_counter.count(tree, tree_splits_encoded=True)
+            if src is not sys.stdin:
+                counting_state.set_next_tree_index(src, tidx + thin)
+            if checkpoint_filepath is not None:
+                trees_since_checkpoint += 1
+                if checkpoint_frequency > 0 and trees_since_checkpoint >= checkpoint_frequency:
+                    save_checkpoint(counting_state, checkpoint_filepath, messenger)
+                    trees_since_checkpoint = 0
         try:
             src.close()
         except ValueError:
             # "I/O operation on closed file" if we try to close sys.stdin
             pass
+        if checkpoint_filepath is not None:
+            save_checkpoint(counting_state, checkpoint_filepath, messenger)
+            trees_since_checkpoint = 0
 
     messenger.send_info("Serial processing of %d source(s) completed." % len(srcs))
     return split_distribution, topology_counter
 
-def main_cli():
+class TreeSourceFollowingThread(threading.Thread):
+    """
+    Reads trees (as split records) from a tree file that is still being
+    written, waiting for trees to be appended to it (see the `follow`
+    argument of `tree_source_iter()`), and puts them on `tree_queue` as
+    (`source_idx`, tree index, split record) tuples. When done, puts
+    (`source_idx`, None, None) on the queue, preceded by (`source_idx`,
+    None, exception) if reading failed.
+    """
 
-    description =  "%s %s %s" % (_program_name, _program_version, _program_subtitle)
-    usage = "%prog [options] TREES-FILE [TREES-FILE [TREES-FILE [...]]"
+    def __init__(self, source_idx, filepath, tree_queue, stop_event, start, thin, follow_timeout, tree_source_kwargs):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.source_idx = source_idx
+        self.filepath = filepath
+        self.tree_queue = tree_queue
+        self.stop_event = stop_event
+        self.start_idx = start
+        self.thin = thin
+        self.follow_timeout = follow_timeout
+        self.tree_source_kwargs = tree_source_kwargs
+
+    def run(self):
+        try:
+            try:
+                src = open(self.filepath, "rU")
+                try:
+                    for count, tree in enumerate(tree_source_iter(src,
+                            tree_offset=self.start_idx,
+                            thin=self.thin,
+                            follow=True,
+                            follow_timeout=self.follow_timeout,
+                            follow_stop_event=self.stop_event,
+                            **self.tree_source_kwargs)):
+                        self.tree_queue.put((self.source_idx, self.start_idx + (count * self.thin), tree))
+                finally:
+                    src.close()
+            except Exception, e:
+                self.tree_queue.put((self.source_idx, None, e))
+        finally:
+            self.tree_queue.put((self.source_idx, None, None))
+
+def process_sources_following(
+        support_filepaths,
+        schema,
+        is_rooted,
+        ignore_node_ages,
+        weighted_trees,
+        tree_offset,
+        thin,
+        log_frequency,
+        messenger,
+        counting_state=None,
+        checkpoint_filepath=None,
+        checkpoint_frequency=0,
+        follow_timeout=None,
+        refresh_interval=60,
+        refresh_func=None,
+        sketch_size=None):
+    """
+    Returns a SplitDistribution object summarizing all trees found in
+    `support_filepaths`, which are read as they are being written, until no
+    trees have been added to any of them for `follow_timeout` seconds (if
+    not None), or until interrupted (by the user pressing CTRL-C). Each
+    time all the trees written so far have been counted, if trees have been
+    counted since it was last called and at least `refresh_interval`
+    seconds ago, `refresh_func` (if given) is called with the split
+    distribution and topology counter. `counting_state`, `checkpoint_filepath`,
+    `checkpoint_frequency` and `sketch_size` are as for
+    `process_sources_serial()`.
+    """
+    messenger.send_info("Running in follow mode: %d source(s) to be followed." % len(support_filepaths))
+    if counting_state is None:
+        counting_state = new_counting_state(tree_offset, thin, is_rooted, ignore_node_ages, sketch_size)
+    split_distribution = counting_state.split_distribution
+    topology_counter = counting_state.topology_counter
+    taxon_set = split_distribution.taxon_set
+
+    # the sources are read concurrently, so the taxa are fixed beforehand
+    if len(taxon_set) == 0:
+        messenger.send_info("Waiting for the first tree of '%s' to discover taxa ..." % support_filepaths[0])
+        src = open(support_filepaths[0], "rU")
+        try:
+            try:
+                for tree in tree_source_iter(src,
+                        schema=schema,
+                        taxon_set=taxon_set,
+                        tree_offset=tree_offset,
+                        follow=True,
+                        follow_timeout=follow_timeout):
+                    break
+            except KeyError:
+                messenger.send_warning("'%s': burn-in of %d trees exceeds number of trees in source" % (support_filepaths[0], tree_offset), wrap=False)
+                return split_distribution, topology_counter
+        finally:
+            src.close()
+    messenger.send_info("Following trees of %d taxa." % len(taxon_set))
+    taxon_set.lock()
+
+    tree_queue = Queue.Queue()
+    stop_event = threading.Event()
+    tree_source_kwargs = {
+        "schema": schema,
+        "taxon_set": taxon_set,
+        "store_tree_weights": weighted_trees,
+        "as_rooted": is_rooted,
+        "as_split_records": True,
+        "calc_node_ages": not ignore_node_ages,
+    }
+    for sidx, filepath in enumerate(support_filepaths):
+        start = counting_state.next_tree_index(filepath)
+        if start > tree_offset:
+            messenger.send_info("Resuming '%s' from tree at offset %d." % (filepath, start), wrap=False)
+        TreeSourceFollowingThread(sidx,
+                filepath,
+                tree_queue,
+                stop_event,
+                start,
+                thin,
+                follow_timeout,
+                tree_source_kwargs).start()
+
+    num_active = len(support_filepaths)
+    failed = False
+    trees_since_checkpoint = 0
+    trees_since_refresh = 0
+    last_refresh_time = time.time()
+    try:
+        while num_active > 0:
+            try:
+                sidx, tidx, tree = tree_queue.get(True, 0.5)
+            except Queue.Empty:
+                # all trees written so far have been counted
+                if trees_since_refresh > 0 and time.time() - last_refresh_time >= refresh_interval:
+                    if refresh_func is not None:
+                        refresh_func(split_distribution, topology_counter)
+                    if checkpoint_filepath is not None:
+                        save_checkpoint(counting_state, checkpoint_filepath, messenger)
+                        trees_since_checkpoint = 0
+                    trees_since_refresh = 0
+                    last_refresh_time = time.time()
+                continue
+            name = support_filepaths[sidx]
+            if tidx is None:
+                if tree is None:
+                    num_active -= 1
+                    messenger.send_info("Stopped following '%s'." % name, wrap=False)
+                elif isinstance(tree, KeyError) and str(tree).find("0-based index out of bounds") >= 0:
+                    messenger.send_warning("'%s': burn-in of %d trees exceeds number of trees in source" % (name, tree_offset), wrap=False)
+                else:
+                    messenger.send_error("Error reading '%s': %s" % (name, tree), wrap=False)
+                    failed = True
+                    stop_event.set()
+                continue
+            if (log_frequency == 1) or (tidx > 0 and log_frequency > 0 and tidx % log_frequency == 0):
+                messenger.send_info("(processing) '%s': tree at offset %d" % (name, tidx), wrap=False)
+            split_distribution.count_splits_on_tree(tree)
+            topology_counter.count(tree, tree_splits_encoded=True)
+            counting_state.set_next_tree_index(name, tidx + thin)
+            trees_since_refresh += 1
+            if checkpoint_filepath is not None:
+                trees_since_checkpoint += 1
+                if checkpoint_frequency > 0 and trees_since_checkpoint >= checkpoint_frequency:
+                    save_checkpoint(counting_state, checkpoint_filepath, messenger)
+                    trees_since_checkpoint = 0
+    except KeyboardInterrupt:
+        # trees read but not yet counted are dropped, and will be read
+        # again if counting is resumed from the checkpoint
+        messenger.send_info("Interrupted: no longer following sources.")
+        stop_event.set()
+    taxon_set.unlock()
+    if failed:
+        sys.exit(1)
+    if checkpoint_filepath is not None:
+        save_checkpoint(counting_state, checkpoint_filepath, messenger)
+    messenger.send_info("Following of %d source(s) completed." % len(support_filepaths))
+    return split_distribution, topology_counter
 
-    parser = OptionParser(usage=usage, add_help_option=True, version = _program_version, description=description)
+def write_summary(master_split_distribution,
+        master_topology_counter,
+        opts,
+        messenger,
+        start_time,
+        target_tree_filepath,
+        support_filepaths,
+        resume_filepath,
+        output_dest,
+        trprobs_dest=None,
+        split_edges_dest=None):
+    """
+    Maps the support for the splits counted in `master_split_distribution`
+    onto the target trees (or a consensus tree), summarizes edge lengths and
+    node ages as specified by `opts`, and writes the resulting trees to
+    `output_dest`, as well as the tree (topology) probabilities and the
+    split edge lengths to `trprobs_dest` and `split_edges_dest`, if given.
+    Returns the run report.
+    """
 
-    sum_tree_optgroup = OptionGroup(parser, "Source Treatment Options")
-    parser.add_option_group(sum_tree_optgroup)
-    sum_tree_optgroup.add_option("-b", "--burnin",
-            action="store",
-            dest="burnin",
-            type="int",
-            default=0,
-            help='number of trees to skip from the beginning of *each tree file* when counting support [default=%default]')
+    ###################################################
+    # Compose post-counting report
 
-    source_tree_optgroup = OptionGroup(parser, "Source Tree Options")
-    parser.add_option_group(source_tree_optgroup)
-    source_tree_optgroup.add_option("--rooted",
-            action="store_true",
-            dest="rooted_trees",
-            default=None,
-            help="treat trees as rooted")
-    source_tree_optgroup.add_option("--unrooted",
-            action="store_false",
-            dest="rooted_trees",
-            default=None,
-            help="treat trees as unrooted")
-    source_tree_optgroup.add_option("--ultrametric",
-            action="store_true",
-            dest="ultrametric_trees",
-            default=False,
-            help="assume trees are ultrametric (implies '--rooted' ; will result in node ages being summarized; will result in error if trees are not ultrametric)")
-    source_tree_optgroup.add_option("--weighted-trees",
-            action="store_true",
-            dest="weighted_trees",
-            default=False,
-            help="use weights of trees as indicated by '[&W m/n]' comment to weight contribution of splits found on each tree to overall split frequencies")
-    source_tree_optgroup.add_option("--from-newick-stream",
-            action="store_true",
-            dest="from_newick_stream",
-            default=False,
-            help="support trees will be streamed in newick format")
-    source_tree_optgroup.add_option("--from-nexus-stream",
-            action="store_true",
-            dest="from_nexus_stream",
-            default=False,
-            help="support trees will be streamed in NEXUS format")
+    # if not splits counted or the taxon set was not populated for any reason,
+    # we just produce an empty block so we don't crash as we report nothing of interest
+    if master_split_distribution.taxon_set is None:
+        assert(master_split_distribution.total_trees_counted == 0)
+        master_split_distribution.taxon_set = dendropy.TaxonSet()
 
-    target_tree_optgroup = OptionGroup(parser, 'Target Tree Options')
-    parser.add_option_group(target_tree_optgroup)
-    target_tree_optgroup.add_option("-t","--target",
-            dest="target_tree_filepath",
-            default=None,
-            help="path to optional target, model or best topology tree file (Newick or NEXUS format) "
-            + "to which support will be mapped; "
-            + "if not given, then a majority-rule clade consensus tree will be constructed based on the "
-            + "all the trees given in the support tree files (except for those discarded as burn-ins), "
-            + "and this will be used as the target tree")
-    target_tree_optgroup.add_option("-f", "--min-clade-freq",
-            dest="min_clade_freq",
-            type="float",
-            default=0.50,
-            metavar="#.##",
-            help="minimum frequency or probability for a clade or a split to be "\
-                    + "included in the consensus tree, if used [default=%default]")
+    # taxon set to handle target trees
+    master_taxon_set = master_split_distribution.taxon_set
 
-    support_summarization_optgroup = OptionGroup(parser, "Support Summarization Options")
-    parser.add_option_group(support_summarization_optgroup)
-    support_summarization_optgroup.add_option("-l","--support-as-labels",
-            action="store_const",
-            dest="support_annotation_target",
-            default=1,
-            const=1,
-            help="in addition to node metadata, indicate branch support as internal node labels [default]")
-    support_summarization_optgroup.add_option("-v","--support-as-lengths",
-            action="store_const",
-            dest="support_annotation_target",
-            default=1,
-            const=2,
-            help="in addition to node metadata, indicate branch support as branch lengths")
-    support_summarization_optgroup.add_option("-x","--no-support",
-            action="store_const",
-            dest="support_annotation_target",
-            default=1,
-            const=0,
-            help="""\
-do not indicate support with internal node labels or edge lengths
-(support will still be indicated as node metadata unless
-'--no-summary-metadata' is specified)""")
-    support_summarization_optgroup.add_option("-p", "--percentages",
-            action="store_true",
-            dest="support_as_percentages",
-            default=False,
-            help="indicate branch support as percentages (otherwise, will report as proportions by default)")
-    support_summarization_optgroup.add_option("-d", "--decimals",
-            dest="support_label_decimals",
-            type="int",
-            metavar="#",
-            default=2,
-            help="number of decimal places in indication of support values [default=%default]")
+    report = []
+    report.append("%d trees considered in total for split support assessment." % (master_split_distribution.total_trees_counted))
+    if opts.rooted_trees is None:
+        report.append("Tree rooting as given by tree statement (defaults to unrooted).")
+    elif opts.rooted_trees:
+        report.append("Trees treated as rooted.")
+    else:
+        report.append("Trees treated as unrooted.")
+    if opts.ultrametric_trees:
+        report.append("Trees are expected to be ultrametric.")
+    if opts.weighted_trees:
+        report.append("Trees treated as weighted (default weight = 1.0).")
+    else:
+        report.append("Trees treated as unweighted.")
+    n_taxa = len(master_taxon_set)
+    report.append("%d unique taxa across all trees." % n_taxa)
+    num_splits, num_unique_splits, num_nt_splits, num_nt_unique_splits = master_split_distribution.splits_considered()
+    report.append("%d unique splits out of %d total splits counted." % (num_unique_splits, num_splits))
+    report.append("%d unique non-trivial splits out of %d total non-trivial splits counted." % (num_nt_unique_splits, num_nt_splits))
 
-    edge_summarization_optgroup = OptionGroup(parser, "Edge Length Summarization Options")
-    parser.add_option_group(edge_summarization_optgroup)
-    edge_summarization_choices = ["mean-length", "median-length", "mean-age", "median-age", "keep", "unweighted"]
-    edge_summarization_optgroup.add_option("-e", "--edges",
-            type="choice",
-            dest="edge_summarization",
-            metavar="<%s>" % ("|".join(edge_summarization_choices)),
-            choices=edge_summarization_choices,
-            default=None,
-            help="""\
-set edge lengths of target tree(s) to mean/median lengths/ages of
-corresponding splits or edges of input trees (note that using 'mean-age' or
-'median-age' require rooted ultrametric input trees, and will behave as
-if '--ultrametric' and '--with-node-ages' are specified");
-default is to 'keep' if target trees are specified
-(i.e., target trees will have their branch lengths preserved by default),
-'median-age' if no target trees are specified but the '--ultrametric' directive is given
-(a consensus tree should be constructed to summarize support and input trees are ultrametric),
-and 'mean-length' if no target trees are specified and the '--ultrametric' directive is *not* given
-(a consensus tree should be constructed to summarize support and input trees are *not* assumed to be ultrametric),
-""")
-    edge_summarization_optgroup.add_option("--collapse-negative-edges",
-            action="store_true",
-            dest="collapse_negative_edges",
-            default=False,
-            help="(if setting edge lengths) force parent node ages to be at least as old as its oldest child when summarizing node ages")
+    comments = []
+    comments.extend(report)
+    messenger.send_info("Split counting completed:")
+    messenger.send_info_lines(report, prefix=" - ")
 
-    other_summarization_optgroup = OptionGroup(parser, "Other Summarization Options")
-    parser.add_option_group(other_summarization_optgroup)
-    #other_summarization_optgroup.add_option("--with-node-ages",
-    #        action="store_true",
-    #        dest="calc_node_ages",
-    #        default=None,
-    #        help="summarize node ages as well as edge lengths (implies '--rooted' and '--ultrametric'; automatically enabled if '--ultrametric' is specified; will result in error if trees are not ultrametric)")
-    other_summarization_optgroup.add_option("--trprobs", "--calc-tree-probabilities",
-            dest="trprobs_filepath",
-            default=None,
-            metavar="FILEPATH",
-            help="if specified, a file listing tree (topologies) and the " \
-                    + "frequencies of their occurrences will be saved to FILEPATH")
-    other_summarization_optgroup.add_option("--extract-edges",
-            dest="split_edges_filepath",
-            default=None,
-            metavar="FILEPATH",
-            help="if specified, a tab-delimited file of splits and their edge " \
-                    + "lengths across input trees will be saved to FILEPATH")
-    other_summarization_optgroup.add_option("--no-node-ages",
-            action="store_false",
-            dest="calc_node_ages",
-            default=None,
-            help="do not calculate/summarize node ages, even if '--ultrametric' is specified")
-    other_summarization_optgroup.add_option("--no-summary-metadata",
-            action="store_true",
-            dest="suppress_summary_metadata",
-            default=False,
-            help="do not annotate nodes with ranges, 5%/95 quartiles, 95% HPD's etc. of edge lengths and node ages")
+    ###################################################
+    #  Target tree and mapping
 
-    output_filepath_optgroup = OptionGroup(parser, "Output File Options")
-    parser.add_option_group(output_filepath_optgroup)
-    output_filepath_optgroup.add_option("-o","--output",
-            dest="output_filepath",
-            default=None,
-            help="path to output file (if not given, will print to standard output)")
-    output_filepath_optgroup.add_option("--no-taxa-block",
-            action="store_false",
-            dest="include_taxa_block",
-            default=True,
-            help="do not include a taxa block in the output treefile (otherwise will create taxa block by default)")
-    output_filepath_optgroup.add_option("--no-meta-comments",
-            action="store_false",
-            dest="include_meta_comments",
-            default=True,
-            help="do not include initial file comment annotating details of scoring operation")
-    output_filepath_optgroup.add_option("-c", "--additional-comments",
-            action="store",
-            dest="additional_comments",
-            default=None,
-            help="additional comments to be added to the summary file")
-    output_filepath_optgroup.add_option("--to-newick",
-            action="store_true",
-            dest="to_newick_format",
-            default=False,
-            help="save results in NEWICK (PHYLIP) format (default is to save in NEXUS format)")
-    output_filepath_optgroup.add_option("--to-phylip",
-            action="store_true",
-            dest="to_newick_format",
-            default=False,
-            help="same as --newick")
-    output_filepath_optgroup.add_option("-r", "--replace",
-            action="store_true",
-            dest="replace",
-            default=False,
-            help="replace/overwrite output file without asking if it already exists ")
-
-    run_optgroup = OptionGroup(parser, "Program Run Options")
-    parser.add_option_group(run_optgroup)
-    if _MP:
-        run_optgroup.add_option("-m", "--multiprocessing",
-                action="store",
-                dest="multiprocess",
-                metavar="NUM-PROCESSES",
-                default=None,
-                help="run in parallel mode with up to a maximum of NUM-PROCESSES processes " \
-                        + "(specify '*' to run in as many processes as there are cores on the "\
-                        + "local machine)")
-
-    run_optgroup.add_option("-g", "--log-frequency",
-            type="int",
-            metavar="LOG-FREQUENCY",
-            dest="log_frequency",
-            default=500,
-            help="tree processing progress logging frequency (default=%default; set to 0 to suppress)")
-    run_optgroup.add_option("-q", "--quiet",
-            action="store_true",
-            dest="quiet",
-            default=False,
-            help="suppress ALL logging, progress and feedback messages")
-    run_optgroup.add_option("--ignore-missing-support",
-            action="store_true",
-            dest="ignore_missing_support",
-            default=False,
-            help="ignore missing support tree files (at least one must exist!)")
-    run_optgroup.add_option("--ignore-missing-target",
-            action="store_true",
-            dest="ignore_missing_target",
-            default=False,
-            help="ignore missing target tree file (will construct majority rule consensus tree if missing)")
+    if not opts.support_as_percentages and opts.support_label_decimals < 2:
+        messenger.send_warning("Reporting support by proportions require that support will be reported to at least 2 decimal places")
+        opts.support_label_decimals = 2
 
-    (opts, args) = parser.parse_args()
-    if opts.quiet:
-        messaging_level = ConsoleMessenger.ERROR_MESSAGING_LEVEL
+    tsum = treesum.TreeSummarizer()
+    tsum.add_node_metadata = not opts.suppress_summary_metadata
+    if opts.support_annotation_target == 1:
+        tsum.support_as_labels = True
+        tsum.support_as_edge_lengths = False
+        support_show = "indicated by node labels"
+        if tsum.add_node_metadata:
+            support_show += " and node metadata"
+    elif opts.support_annotation_target == 2:
+        tsum.support_as_labels = False
+        tsum.support_as_edge_lengths = True
+        support_show = "indicated by branch lengths"
+        if tsum.add_node_metadata:
+            support_show += " and node metadata"
+    elif opts.support_annotation_target == 0:
+        tsum.support_as_labels = False
+        tsum.support_as_edge_lengths = False
+        if tsum.add_node_metadata:
+            support_show = "indicated by node metadata (only)"
+        else:
+            support_show = "not indicated"
     else:
-        messaging_level = ConsoleMessenger.INFO_MESSAGING_LEVEL
-    messenger = ConsoleMessenger(name="SumTrees", messaging_level=messaging_level)
-
-    # splash
-    if not opts.quiet:
-        show_splash(prog_name=_program_name,
-                prog_subtitle=_program_subtitle,
-                prog_version=_program_version,
-                prog_author=_program_author,
-                prog_copyright=_program_copyright,
-                dest=sys.stderr,
-                extended=False)
-
-    ###################################################
-    # Support file idiot checking
+        raise Exception("Unexpected value for support annotation target: %s" % opts.support_annotation_target)
+    tsum.support_as_percentages = opts.support_as_percentages
+    tsum.support_label_decimals = opts.support_label_decimals
+    tsum.weighted_splits = opts.weighted_trees
 
-    support_filepaths = []
-    if len(args) > 0:
-        for fpath in args:
-            fpath = os.path.expanduser(os.path.expandvars(fpath))
-            if not os.path.exists(fpath):
-                if opts.ignore_missing_support:
-                    messenger.send_warning("Support file not found: '%s'" % fpath)
-                else:
-                    messenger.send_error("Terminating due to missing support files. "
-                           + "Use the '--ignore-missing-support' option to continue even "
-                           + "if some files are missing.")
-                    sys.exit(1)
-            else:
-                support_filepaths.append(fpath)
-        if len(support_filepaths) == 0:
-            messenger.send_error("No valid sources of input trees specified. "
-                    + "Please provide the path to at least one (valid and existing) file "
-                    + "containing tree samples to summarize.")
-            sys.exit(1)
+    if opts.support_as_percentages:
+        support_units = "Percentage"
     else:
-        if not opts.from_newick_stream and not opts.from_nexus_stream:
-            messenger.send_info("No sources of input trees specified. "
-                    + "Please provide the path to at least one (valid and existing) file "
-                    + "containing tree samples to summarize. See '--help' for other options.")
-            sys.exit(1)
-
-    ###################################################
-    # Lots of other idiot-checking ...
+        support_units = "Proportion (frequency or probability)"
+    support_summarization = "%s of support for each split %s" % (support_units, support_show)
 
-    # target tree
-    if opts.target_tree_filepath is not None:
-        target_tree_filepath = os.path.expanduser(os.path.expandvars(opts.target_tree_filepath))
-        if not os.path.exists(target_tree_filepath):
-            if opts.ignore_missing_target:
-                if not opts.quiet:
-                    messenger.send_warning("Target tree file not found: '%s': using majority-rule consensus tree instead." % target_tree_filepath)
-                target_tree_filepath = None
-            else:
-                messenger.send_error("Target tree file not found: '%s'" % target_tree_filepath)
+    tt_trees = []
+    if target_tree_filepath is not None:
+        messenger.send_info("Mapping support to target tree ...")
+        for tree in tree_source_iter(stream=open(target_tree_filepath, 'r'),
+                schema="nexus/newick",
+                taxon_set=master_taxon_set,
+                as_rooted=opts.rooted_trees):
+            if opts.root_target:
+                if opts.outgroup:
+                    pass
+                else:
+                    tree.root_at_midpoint(splits=True)
+            if opts.rooted_trees and not tree.is_rooted:
+                messenger.send_error("Support trees are treated as rooted, but target tree is unrooted. Root target tree(s) and re-run, or run using the '--root-target' flag.")
                 sys.exit(1)
+            stree = tsum.map_split_support_to_tree(tree,
+                    master_split_distribution)
+            tt_trees.append(stree)
+        messenger.send_info("Parsed '%s': %d tree(s) in file" % (target_tree_filepath, len(tt_trees)))
+        comments.append("Split support mapped to trees in:")
+        comments.append("  - '%s' (%d trees)" % (os.path.abspath(target_tree_filepath), len(tt_trees)))
+        if opts.root_target:
+            if opts.outgroup:
+                comments.append("Target tree(s) rooted using outgroup: %s." % opts.outgroup)
+            else:
+                comments.append("Target tree(s) rooted at midpoint.")
+        comments.append(support_summarization + '.')
     else:
-        target_tree_filepath = None
-
-    ### TODO: these will be command-line options in the future
-    ### here we just set it
-    assert not hasattr(opts, 'outgroup')
-    opts.outgroup = None
-    assert not hasattr(opts, 'root_target')
-    opts.root_target = None
-
-    ### TODO: idiot-check edge length summarization
-    # edge lengths
-    if opts.edge_summarization:
-        opts.edge_summarization = opts.edge_summarization.lower()
-        if opts.edge_summarization not in edge_summarization_choices:
-            messenger.send_error("'%s' is not a valid edge summarization choice; must be one of: %s" % (opts.edge_summarization, edge_summarization_choices))
-            sys.exit(1)
-    if opts.edge_summarization == "mean-age" or opts.edge_summarization == "median-age":
-        opts.ultrametric_trees = True
-        opts.rooted_trees = True
-        if opts.calc_node_ages is None:
-            opts.calc_node_ages = True
-    else:
-        if opts.ultrametric_trees:
-            opts.rooted_trees = True
-            if opts.calc_node_ages is None:
-                opts.calc_node_ages = True
+        messenger.send_info("Constructing clade consensus tree ...")
+        if opts.min_clade_freq > 1.0:
+            messenger.send_warning("Maximum frequency threshold for clade inclusion is 1.0: reset to 1.0.")
+            min_freq = 1.0
         else:
-            if opts.calc_node_ages is True:
-                opts.ultrametric_trees = True
-                opts.rooted_trees = True
+            min_freq = opts.min_clade_freq
+        stree = tsum.tree_from_splits(master_split_distribution,
+                min_freq=min_freq,
+                include_edge_lengths=False)
+                #include_edge_lengths=not opts.no_branch_lengths)
+        if opts.root_target:
+            stree.reroot_at_midpoint(update_splits=True)
+        report = []
+        report.append("Consensus tree (%f clade frequency threshold) constructed from splits." % min_freq)
+        tt_trees.append(stree)
+        if opts.root_target:
+            if opts.outgroup:
+                report.append("Consensus tree rooted using outgroup: %s." % opts.outgroup)
             else:
-                opts.calc_node_ages = False
+                report.append("Consensus tree rooted at midpoint.")
+        report.append(support_summarization + ".")
+        messenger.send_info_lines(report)
+        comments.extend(report)
 
-    # output
-    if opts.output_filepath is None:
-        output_dest = sys.stdout
-    else:
-        output_fpath = os.path.expanduser(os.path.expandvars(opts.output_filepath))
-        if confirm_overwrite(filepath=output_fpath, replace_without_asking=opts.replace):
-            output_dest = open(output_fpath, "w")
-        else:
-            sys.exit(1)
+    if not opts.suppress_summary_metadata:
+        messenger.send_info("Summarizing node ages and lengths ...")
+        for stree in tt_trees:
+            tsum.annotate_nodes_and_edges(tree=stree, split_distribution=master_split_distribution)
 
-    if opts.trprobs_filepath:
-        trprobs_filepath = os.path.expanduser(os.path.expandvars(opts.trprobs_filepath))
-        if confirm_overwrite(filepath=trprobs_filepath, replace_without_asking=opts.replace):
-            trprobs_dest = open(trprobs_filepath, "w")
+    if opts.edge_summarization is None:
+        if target_tree_filepath is not None:
+            opts.edge_summarization = 'keep'
         else:
-            sys.exit(1)
-        opts.calc_tree_probs = True
-    else:
-        trprobs_dest = None
-        opts.calc_tree_probs = False
-
-    if opts.split_edges_filepath:
-        split_edges_filepath = os.path.expanduser(os.path.expandvars(opts.split_edges_filepath))
-        if confirm_overwrite(filepath=split_edges_filepath, replace_without_asking=opts.replace):
-            split_edges_dest = open(split_edges_filepath, "w")
-        else:
-            sys.exit(1)
-    else:
-        split_edges_dest = None
-
-    if opts.from_newick_stream:
-        schema = "newick"
-    elif opts.from_nexus_stream:
-        schema = "nexus"
-    else:
-        schema = 'nexus/newick'
-
-    ###################################################
-    # Main work begins here: Count the splits
-
-    start_time = datetime.datetime.now()
-    master_split_distribution = None
-    if (support_filepaths is not None and len(support_filepaths) > 1) \
-            and _MP \
-            and opts.multiprocess:
-        if opts.multiprocess is not None:
-            if opts.multiprocess == "*":
-                num_processes = multiprocessing.cpu_count()
-            elif  opts.multiprocess == "@":
-                num_processes = len(support_filepaths)
-            else:
-                try:
-                    num_processes = int(opts.multiprocess)
-                except ValueError:
-                    messenger.send_error("'%s' is not a valid number of processes (must be a positive integer)." % opts.multiprocess)
-                    sys.exit(1)
-            if num_processes <= 0:
-                messenger.send_error("Maximum number of processes set to %d: cannot run SumTrees with less than 1 process" % num_processes)
-                sys.exit(1)
-            if num_processes == 1:
-                messenger.send_warning("Running in parallel processing mode but limited to only 1 process: probably more efficient to run in serial mode!")
-
-        master_split_distribution, master_topology_counter = process_sources_parallel(
-                num_processes=num_processes,
-                support_filepaths=support_filepaths,
-                schema=schema,
-                is_rooted=opts.rooted_trees,
-                ignore_node_ages=not opts.calc_node_ages,
-                calc_tree_probs=opts.calc_tree_probs,
-                weighted_trees=opts.weighted_trees,
-                tree_offset=opts.burnin,
-                log_frequency=opts.log_frequency,
-                messenger=messenger)
-    else:
-        if (_MP and opts.multiprocess is not None and len(support_filepaths) == 1):
-            messenger.send_warning("Parallel processing mode requested but only one source specified: defaulting to serial mode.")
-        if opts.from_newick_stream or opts.from_nexus_stream:
-            support_filepaths = None
-        master_split_distribution, master_topology_counter = process_sources_serial(
-                support_filepaths=support_filepaths,
-                schema=schema,
-                is_rooted=opts.rooted_trees,
-                ignore_node_ages=not opts.calc_node_ages,
-                calc_tree_probs=opts.calc_tree_probs,
-                weighted_trees=opts.weighted_trees,
-                tree_offset=opts.burnin,
-                log_frequency=opts.log_frequency,
-                messenger=messenger)
-
-    ###################################################
-    # Compose post-counting report
-
-    # if not splits counted or the taxon set was not populated for any reason,
-    # we just produce an empty block so we don't crash as we report nothing of interest
-    if master_split_distribution.taxon_set is None:
-        assert(master_split_distribution.total_trees_counted == 0)
-        master_split_distribution.taxon_set = dendropy.TaxonSet()
-
-    # taxon set to handle target trees
-    master_taxon_set = master_split_distribution.taxon_set
-
-    report = []
-    report.append("%d trees considered in total for split support assessment." % (master_split_distribution.total_trees_counted))
-    if opts.rooted_trees is None:
-        report.append("Tree rooting as given by tree statement (defaults to unrooted).")
-    elif opts.rooted_trees:
-        report.append("Trees treated as rooted.")
-    else:
-        report.append("Trees treated as unrooted.")
-    if opts.ultrametric_trees:
-        report.append("Trees are expected to be ultrametric.")
-    if opts.weighted_trees:
-        report.append("Trees treated as weighted (default weight = 1.0).")
-    else:
-        report.append("Trees treated as unweighted.")
-    n_taxa = len(master_taxon_set)
-    report.append("%d unique taxa across all trees." % n_taxa)
-    num_splits, num_unique_splits, num_nt_splits, num_nt_unique_splits = master_split_distribution.splits_considered()
-    report.append("%d unique splits out of %d total splits counted." % (num_unique_splits, num_splits))
-    report.append("%d unique non-trivial splits out of %d total non-trivial splits counted." % (num_nt_unique_splits, num_nt_splits))
-
-    comments = []
-    comments.extend(report)
-    messenger.send_info("Split counting completed:")
-    messenger.send_info_lines(report, prefix=" - ")
-
-    ###################################################
-    #  Target tree and mapping
-
-    if not opts.support_as_percentages and opts.support_label_decimals < 2:
-        messenger.send_warning("Reporting support by proportions require that support will be reported to at least 2 decimal places")
-        opts.support_label_decimals = 2
-
-    tsum = treesum.TreeSummarizer()
-    tsum.add_node_metadata = not opts.suppress_summary_metadata
-    if opts.support_annotation_target == 1:
-        tsum.support_as_labels = True
-        tsum.support_as_edge_lengths = False
-        support_show = "indicated by node labels"
-        if tsum.add_node_metadata:
-            support_show += " and node metadata"
-    elif opts.support_annotation_target == 2:
-        tsum.support_as_labels = False
-        tsum.support_as_edge_lengths = True
-        support_show = "indicated by branch lengths"
-        if tsum.add_node_metadata:
-            support_show += " and node metadata"
-    elif opts.support_annotation_target == 0:
-        tsum.support_as_labels = False
-        tsum.support_as_edge_lengths = False
-        if tsum.add_node_metadata:
-            support_show = "indicated by node metadata (only)"
-        else:
-            support_show = "not indicated"
-    else:
-        raise Exception("Unexpected value for support annotation target: %s" % opts.support_annotation_target)
-    tsum.support_as_percentages = opts.support_as_percentages
-    tsum.support_label_decimals = opts.support_label_decimals
-    tsum.weighted_splits = opts.weighted_trees
-
-    if opts.support_as_percentages:
-        support_units = "Percentage"
-    else:
-        support_units = "Proportion (frequency or probability)"
-    support_summarization = "%s of support for each split %s" % (support_units, support_show)
-
-    tt_trees = []
-    if target_tree_filepath is not None:
-        messenger.send_info("Mapping support to target tree ...")
-        for tree in tree_source_iter(stream=open(target_tree_filepath, 'r'),
-                schema="nexus/newick",
-                taxon_set=master_taxon_set,
-                as_rooted=opts.rooted_trees):
-            if opts.root_target:
-                if opts.outgroup:
-                    pass
-                else:
-                    tree.root_at_midpoint(splits=True)
-            if opts.rooted_trees and not tree.is_rooted:
-                messenger.send_error("Support trees are treated as rooted, but target tree is unrooted. Root target tree(s) and re-run, or run using the '--root-target' flag.")
-                sys.exit(1)
-            stree = tsum.map_split_support_to_tree(tree,
-                    master_split_distribution)
-            tt_trees.append(stree)
-        messenger.send_info("Parsed '%s': %d tree(s) in file" % (target_tree_filepath, len(tt_trees)))
-        comments.append("Split support mapped to trees in:")
-        comments.append("  - '%s' (%d trees)" % (os.path.abspath(target_tree_filepath), len(tt_trees)))
-        if opts.root_target:
-            if opts.outgroup:
-                comments.append("Target tree(s) rooted using outgroup: %s." % opts.outgroup)
-            else:
-                comments.append("Target tree(s) rooted at midpoint.")
-        comments.append(support_summarization + '.')
-    else:
-        messenger.send_info("Constructing clade consensus tree ...")
-        if opts.min_clade_freq > 1.0:
-            messenger.send_warning("Maximum frequency threshold for clade inclusion is 1.0: reset to 1.0.")
-            min_freq = 1.0
-        else:
-            min_freq = opts.min_clade_freq
-        stree = tsum.tree_from_splits(master_split_distribution,
-                min_freq=min_freq,
-                include_edge_lengths=False)
-                #include_edge_lengths=not opts.no_branch_lengths)
-        if opts.root_target:
-            stree.reroot_at_midpoint(update_splits=True)
-        report = []
-        report.append("Consensus tree (%f clade frequency threshold) constructed from splits." % min_freq)
-        tt_trees.append(stree)
-        if opts.root_target:
-            if opts.outgroup:
-                report.append("Consensus tree rooted using outgroup: %s." % opts.outgroup)
-            else:
-                report.append("Consensus tree rooted at midpoint.")
-        report.append(support_summarization + ".")
-        messenger.send_info_lines(report)
-        comments.extend(report)
-
-    if not opts.suppress_summary_metadata:
-        messenger.send_info("Summarizing node ages and lengths ...")
-        for stree in tt_trees:
-            tsum.annotate_nodes_and_edges(tree=stree, split_distribution=master_split_distribution)
-
-    if opts.edge_summarization is None:
-        if target_tree_filepath is not None:
-            opts.edge_summarization = 'keep'
-        else:
-            if opts.ultrametric_trees:
-                opts.edge_summarization = 'median-age'
-            else:
-                opts.edge_summarization = 'mean-length'
-    if opts.edge_summarization is not None and opts.edge_summarization == 'unweighted':
-        for stree in tt_trees:
-            for edge in stree.postorder_edge_iter():
-                edge.length = None
-    elif opts.edge_summarization is not None and opts.edge_summarization != 'keep':
-        if opts.edge_summarization.startswith('mean'):
-            summary_func_desc = "mean"
-            summarization_func = lambda x: statistics.mean_and_sample_variance(x)[0]
+            if opts.ultrametric_trees:
+                opts.edge_summarization = 'median-age'
+            else:
+                opts.edge_summarization = 'mean-length'
+    if opts.edge_summarization is not None and opts.edge_summarization == 'unweighted':
+        for stree in tt_trees:
+            for edge in stree.postorder_edge_iter():
+                edge.length = None
+    elif opts.edge_summarization is not None and opts.edge_summarization != 'keep':
+        # without value lists, the summarization functions are given the
+        # `statistics.OnlineSummary` of the values of each split
+        if opts.edge_summarization.startswith('mean'):
+            summary_func_desc = "mean"
+            if master_split_distribution.store_value_lists:
+                summarization_func = lambda x: statistics.mean_and_sample_variance(x)[0]
+            else:
+                summarization_func = lambda x: x.mean
         else:
             summary_func_desc = "median"
-            summarization_func = statistics.median
+            if master_split_distribution.store_value_lists:
+                summarization_func = statistics.median
+            else:
+                summarization_func = lambda x: x.median()
         if opts.edge_summarization.endswith("age"):
             messenger.send_info("Mapping node ages ...")
             comments.append("Setting node ages of output tree(s) to %s ages of corresponding nodes of input trees." % summary_func_desc)
@@ -939,8 +918,8 @@ and 'mean-length' if no target trees are specified and the '--ultrametric' direc
             simple = False
         else:
             simple = True
+        comment = []
         if opts.include_meta_comments:
-            comment = []
             try:
                 username = getpass.getuser()
             except:
@@ -951,7 +930,12 @@ and 'mean-length' if no target trees are specified and the '--ultrametric' direc
             python_version = sys.version.replace("\n", "").replace("[", "(").replace("]",")")
             comment.append("Running under Python %s on %s." % (python_version, sys.platform))
             comment.append("Executed on %s by %s@%s." % (platform.node(),  username, socket.gethostname()))
-            if support_filepaths is not None and len(support_filepaths) > 0:
+            if resume_filepath:
+                comment.append("Basis of split support:")
+                comment.append("  - counts resumed from '%s'" % os.path.abspath(resume_filepath))
+                for support_file in support_filepaths:
+                    comment.append("  - '%s'" % os.path.abspath(support_file))
+            elif support_filepaths is not None and len(support_filepaths) > 0:
                 comment.append("Basis of split support:")
                 for support_file in support_filepaths:
                     comment.append("  - '%s'" % os.path.abspath(support_file))
@@ -1024,6 +1008,633 @@ and 'mean-length' if no target trees are specified and the '--ultrametric' direc
                 row.append("%s" % edge_length)
             split_edges_dest.write("%s\n" % ("\t".join(row)))
 
+    return final_run_report
+
+def main_cli():
+
+    description =  "%s %s %s" % (_program_name, _program_version, _program_subtitle)
+    usage = "%prog [options] TREES-FILE [TREES-FILE [TREES-FILE [...]]"
+
+    parser = OptionParser(usage=usage, add_help_option=True, version = _program_version, description=description)
+
+    sum_tree_optgroup = OptionGroup(parser, "Source Treatment Options")
+    parser.add_option_group(sum_tree_optgroup)
+    sum_tree_optgroup.add_option("-b", "--burnin",
+            action="store",
+            dest="burnin",
+            type="int",
+            default=0,
+            help='number of trees to skip from the beginning of *each tree file* when counting support [default=%default]')
+    sum_tree_optgroup.add_option("--thin",
+            action="store",
+            dest="thin",
+            type="int",
+            default=1,
+            metavar="K",
+            help='only count every K-th tree (after the burn-in) of each tree file; trees not counted are skipped without being parsed [default=%default]')
+
+    source_tree_optgroup = OptionGroup(parser, "Source Tree Options")
+    parser.add_option_group(source_tree_optgroup)
+    source_tree_optgroup.add_option("--rooted",
+            action="store_true",
+            dest="rooted_trees",
+            default=None,
+            help="treat trees as rooted")
+    source_tree_optgroup.add_option("--unrooted",
+            action="store_false",
+            dest="rooted_trees",
+            default=None,
+            help="treat trees as unrooted")
+    source_tree_optgroup.add_option("--ultrametric",
+            action="store_true",
+            dest="ultrametric_trees",
+            default=False,
+            help="assume trees are ultrametric (implies '--rooted' ; will result in node ages being summarized; will result in error if trees are not ultrametric)")
+    source_tree_optgroup.add_option("--weighted-trees",
+            action="store_true",
+            dest="weighted_trees",
+            default=False,
+            help="use weights of trees as indicated by '[&W m/n]' comment to weight contribution of splits found on each tree to overall split frequencies")
+    source_tree_optgroup.add_option("--from-newick-stream",
+            action="store_true",
+            dest="from_newick_stream",
+            default=False,
+            help="support trees will be streamed in newick format")
+    source_tree_optgroup.add_option("--from-nexus-stream",
+            action="store_true",
+            dest="from_nexus_stream",
+            default=False,
+            help="support trees will be streamed in NEXUS format")
+
+    target_tree_optgroup = OptionGroup(parser, 'Target Tree Options')
+    parser.add_option_group(target_tree_optgroup)
+    target_tree_optgroup.add_option("-t","--target",
+            dest="target_tree_filepath",
+            default=None,
+            help="path to optional target, model or best topology tree file (Newick or NEXUS format) "
+            + "to which support will be mapped; "
+            + "if not given, then a majority-rule clade consensus tree will be constructed based on the "
+            + "all the trees given in the support tree files (except for those discarded as burn-ins), "
+            + "and this will be used as the target tree")
+    target_tree_optgroup.add_option("-f", "--min-clade-freq",
+            dest="min_clade_freq",
+            type="float",
+            default=0.50,
+            metavar="#.##",
+            help="minimum frequency or probability for a clade or a split to be "\
+                    + "included in the consensus tree, if used [default=%default]")
+
+    support_summarization_optgroup = OptionGroup(parser, "Support Summarization Options")
+    parser.add_option_group(support_summarization_optgroup)
+    support_summarization_optgroup.add_option("-l","--support-as-labels",
+            action="store_const",
+            dest="support_annotation_target",
+            default=1,
+            const=1,
+            help="in addition to node metadata, indicate branch support as internal node labels [default]")
+    support_summarization_optgroup.add_option("-v","--support-as-lengths",
+            action="store_const",
+            dest="support_annotation_target",
+            default=1,
+            const=2,
+            help="in addition to node metadata, indicate branch support as branch lengths")
+    support_summarization_optgroup.add_option("-x","--no-support",
+            action="store_const",
+            dest="support_annotation_target",
+            default=1,
+            const=0,
+            help="""\
+do not indicate support with internal node labels or edge lengths
+(support will still be indicated as node metadata unless
+'--no-summary-metadata' is specified)""")
+    support_summarization_optgroup.add_option("-p", "--percentages",
+            action="store_true",
+            dest="support_as_percentages",
+            default=False,
+            help="indicate branch support as percentages (otherwise, will report as proportions by default)")
+    support_summarization_optgroup.add_option("-d", "--decimals",
+            dest="support_label_decimals",
+            type="int",
+            metavar="#",
+            default=2,
+            help="number of decimal places in indication of support values [default=%default]")
+
+    edge_summarization_optgroup = OptionGroup(parser, "Edge Length Summarization Options")
+    parser.add_option_group(edge_summarization_optgroup)
+    edge_summarization_choices = ["mean-length", "median-length", "mean-age", "median-age", "keep", "unweighted"]
+    edge_summarization_optgroup.add_option("-e", "--edges",
+            type="choice",
+            dest="edge_summarization",
+            metavar="<%s>" % ("|".join(edge_summarization_choices)),
+            choices=edge_summarization_choices,
+            default=None,
+            help="""\
+set edge lengths of target tree(s) to mean/median lengths/ages of
+corresponding splits or edges of input trees (note that using 'mean-age' or
+'median-age' require rooted ultrametric input trees, and will behave as
+if '--ultrametric' and '--with-node-ages' are specified");
+default is to 'keep' if target trees are specified
+(i.e., target trees will have their branch lengths preserved by default),
+'median-age' if no target trees are specified but the '--ultrametric' directive is given
+(a consensus tree should be constructed to summarize support and input trees are ultrametric),
+and 'mean-length' if no target trees are specified and the '--ultrametric' directive is *not* given
+(a consensus tree should be constructed to summarize support and input trees are *not* assumed to be ultrametric),
+""")
+    edge_summarization_optgroup.add_option("--collapse-negative-edges",
+            action="store_true",
+            dest="collapse_negative_edges",
+            default=False,
+            help="(if setting edge lengths) force parent node ages to be at least as old as its oldest child when summarizing node ages")
+    edge_summarization_optgroup.add_option("--sketch-size",
+            dest="sketch_size",
+            type="int",
+            metavar="N",
+            default=None,
+            help="summarize the edge lengths and node ages of each split as "\
+                    + "the trees are counted, in a fixed amount of memory, "\
+                    + "instead of storing every value (recommended for very "\
+                    + "large numbers of trees): means, variances and ranges "\
+                    + "are exact, while medians, quantiles and HPD intervals "\
+                    + "are estimated from a sketch of about N values once a "\
+                    + "split has more than N values (e.g., 256)")
+
+    other_summarization_optgroup = OptionGroup(parser, "Other Summarization Options")
+    parser.add_option_group(other_summarization_optgroup)
+    #other_summarization_optgroup.add_option("--with-node-ages",
+    #        action="store_true",
+    #        dest="calc_node_ages",
+    #        default=None,
+    #        help="summarize node ages as well as edge lengths (implies '--rooted' and '--ultrametric'; automatically enabled if '--ultrametric' is specified; will result in error if trees are not ultrametric)")
+    other_summarization_optgroup.add_option("--trprobs", "--calc-tree-probabilities",
+            dest="trprobs_filepath",
+            default=None,
+            metavar="FILEPATH",
+            help="if specified, a file listing tree (topologies) and the " \
+                    + "frequencies of their occurrences will be saved to FILEPATH")
+    other_summarization_optgroup.add_option("--extract-edges",
+            dest="split_edges_filepath",
+            default=None,
+            metavar="FILEPATH",
+            help="if specified, a tab-delimited file of splits and their edge " \
+                    + "lengths across input trees will be saved to FILEPATH")
+    other_summarization_optgroup.add_option("--no-node-ages",
+            action="store_false",
+            dest="calc_node_ages",
+            default=None,
+            help="do not calculate/summarize node ages, even if '--ultrametric' is specified")
+    other_summarization_optgroup.add_option("--no-summary-metadata",
+            action="store_true",
+            dest="suppress_summary_metadata",
+            default=False,
+            help="do not annotate nodes with ranges, 5%/95 quartiles, 95% HPD's etc. of edge lengths and node ages")
+
+    output_filepath_optgroup = OptionGroup(parser, "Output File Options")
+    parser.add_option_group(output_filepath_optgroup)
+    output_filepath_optgroup.add_option("-o","--output",
+            dest="output_filepath",
+            default=None,
+            help="path to output file (if not given, will print to standard output)")
+    output_filepath_optgroup.add_option("--no-taxa-block",
+            action="store_false",
+            dest="include_taxa_block",
+            default=True,
+            help="do not include a taxa block in the output treefile (otherwise will create taxa block by default)")
+    output_filepath_optgroup.add_option("--no-meta-comments",
+            action="store_false",
+            dest="include_meta_comments",
+            default=True,
+            help="do not include initial file comment annotating details of scoring operation")
+    output_filepath_optgroup.add_option("-c", "--additional-comments",
+            action="store",
+            dest="additional_comments",
+            default=None,
+            help="additional comments to be added to the summary file")
+    output_filepath_optgroup.add_option("--to-newick",
+            action="store_true",
+            dest="to_newick_format",
+            default=False,
+            help="save results in NEWICK (PHYLIP) format (default is to save in NEXUS format)")
+    output_filepath_optgroup.add_option("--to-phylip",
+            action="store_true",
+            dest="to_newick_format",
+            default=False,
+            help="same as --newick")
+    output_filepath_optgroup.add_option("-r", "--replace",
+            action="store_true",
+            dest="replace",
+            default=False,
+            help="replace/overwrite output file without asking if it already exists ")
+
+    run_optgroup = OptionGroup(parser, "Program Run Options")
+    parser.add_option_group(run_optgroup)
+    if _MP:
+        run_optgroup.add_option("-m", "--multiprocessing",
+                action="store",
+                dest="multiprocess",
+                metavar="NUM-PROCESSES",
+                default=None,
+                help="run in parallel mode with up to a maximum of NUM-PROCESSES processes " \
+                        + "(specify '*' to run in as many processes as there are cores on the "\
+                        + "local machine)")
+
+    run_optgroup.add_option("-g", "--log-frequency",
+            type="int",
+            metavar="LOG-FREQUENCY",
+            dest="log_frequency",
+            default=500,
+            help="tree processing progress logging frequency (default=%default; set to 0 to suppress)")
+    run_optgroup.add_option("-q", "--quiet",
+            action="store_true",
+            dest="quiet",
+            default=False,
+            help="suppress ALL logging, progress and feedback messages")
+    run_optgroup.add_option("--ignore-missing-support",
+            action="store_true",
+            dest="ignore_missing_support",
+            default=False,
+            help="ignore missing support tree files (at least one must exist!)")
+    run_optgroup.add_option("--ignore-missing-target",
+            action="store_true",
+            dest="ignore_missing_target",
+            default=False,
+            help="ignore missing target tree file (will construct majority rule consensus tree if missing)")
+    run_optgroup.add_option("--checkpoint",
+            dest="checkpoint_filepath",
+            default=None,
+            metavar="FILEPATH",
+            help="save the split and topology counts, and the number of trees " \
+                    + "counted from each tree file, to FILEPATH (after every " \
+                    + "CHECKPOINT-FREQUENCY trees and after each tree file in " \
+                    + "serial mode, or once all trees have been counted in " \
+                    + "parallel mode), so that the run can be resumed using " \
+                    + "'--resume' if interrupted, or combined with other runs " \
+                    + "using 'mergesplits.py'")
+    run_optgroup.add_option("--checkpoint-frequency",
+            type="int",
+            metavar="CHECKPOINT-FREQUENCY",
+            dest="checkpoint_frequency",
+            default=10000,
+            help="number of trees counted between checkpoints in serial mode (default=%default; set to 0 to only save checkpoints after each tree file)")
+    run_optgroup.add_option("--resume",
+            dest="resume_filepath",
+            default=None,
+            metavar="FILEPATH",
+            help="add to the split and topology counts saved in FILEPATH " \
+                    + "(by '--checkpoint' or 'mergesplits.py'), skipping the " \
+                    + "trees of each tree file that have already been counted; " \
+                    + "if no tree files are given, the saved counts are " \
+                    + "summarized as they are")
+    run_optgroup.add_option("--follow",
+            action="store_true",
+            dest="follow",
+            default=False,
+            help="keep reading the tree files as they are being written " \
+                    + "(e.g., by a running MCMC analysis), counting trees as " \
+                    + "they are added and periodically rewriting the output " \
+                    + "file with a summary of all the trees counted so far, " \
+                    + "until interrupted (CTRL-C) or until no trees have been " \
+                    + "added for FOLLOW-TIMEOUT seconds; requires an output " \
+                    + "file to be specified")
+    run_optgroup.add_option("--follow-timeout",
+            type="float",
+            metavar="FOLLOW-TIMEOUT",
+            dest="follow_timeout",
+            default=None,
+            help="in follow mode, stop once no trees have been added to the tree files for this number of seconds (default: follow until interrupted)")
+    run_optgroup.add_option("--refresh-interval",
+            type="float",
+            metavar="SECONDS",
+            dest="refresh_interval",
+            default=60,
+            help="in follow mode, minimum number of seconds between rewrites of the output file (default=%default)")
+
+    (opts, args) = parser.parse_args()
+    if opts.quiet:
+        messaging_level = ConsoleMessenger.ERROR_MESSAGING_LEVEL
+    else:
+        messaging_level = ConsoleMessenger.INFO_MESSAGING_LEVEL
+    messenger = ConsoleMessenger(name="SumTrees", messaging_level=messaging_level)
+
+    # splash
+    if not opts.quiet:
+        show_splash(prog_name=_program_name,
+                prog_subtitle=_program_subtitle,
+                prog_version=_program_version,
+                prog_author=_program_author,
+                prog_copyright=_program_copyright,
+                dest=sys.stderr,
+                extended=False)
+
+    ###################################################
+    # Support file idiot checking
+
+    support_filepaths = []
+    if len(args) > 0:
+        for fpath in args:
+            fpath = os.path.expanduser(os.path.expandvars(fpath))
+            if not os.path.exists(fpath):
+                if opts.ignore_missing_support:
+                    messenger.send_warning("Support file not found: '%s'" % fpath)
+                else:
+                    messenger.send_error("Terminating due to missing support files. "
+                           + "Use the '--ignore-missing-support' option to continue even "
+                           + "if some files are missing.")
+                    sys.exit(1)
+            else:
+                support_filepaths.append(fpath)
+        if len(support_filepaths) == 0:
+            messenger.send_error("No valid sources of input trees specified. "
+                    + "Please provide the path to at least one (valid and existing) file "
+                    + "containing tree samples to summarize.")
+            sys.exit(1)
+    elif opts.resume_filepath is None:
+        if not opts.from_newick_stream and not opts.from_nexus_stream:
+            messenger.send_info("No sources of input trees specified. "
+                    + "Please provide the path to at least one (valid and existing) file "
+                    + "containing tree samples to summarize. See '--help' for other options.")
+            sys.exit(1)
+
+    ###################################################
+    # Lots of other idiot-checking ...
+
+    # target tree
+    if opts.target_tree_filepath is not None:
+        target_tree_filepath = os.path.expanduser(os.path.expandvars(opts.target_tree_filepath))
+        if not os.path.exists(target_tree_filepath):
+            if opts.ignore_missing_target:
+                if not opts.quiet:
+                    messenger.send_warning("Target tree file not found: '%s': using majority-rule consensus tree instead." % target_tree_filepath)
+                target_tree_filepath = None
+            else:
+                messenger.send_error("Target tree file not found: '%s'" % target_tree_filepath)
+                sys.exit(1)
+    else:
+        target_tree_filepath = None
+
+    ### TODO: these will be command-line options in the future
+    ### here we just set it
+    assert not hasattr(opts, 'outgroup')
+    opts.outgroup = None
+    assert not hasattr(opts, 'root_target')
+    opts.root_target = None
+
+    ### TODO: idiot-check edge length summarization
+    # edge lengths
+    if opts.edge_summarization:
+        opts.edge_summarization = opts.edge_summarization.lower()
+        if opts.edge_summarization not in edge_summarization_choices:
+            messenger.send_error("'%s' is not a valid edge summarization choice; must be one of: %s" % (opts.edge_summarization, edge_summarization_choices))
+            sys.exit(1)
+    if opts.edge_summarization == "mean-age" or opts.edge_summarization == "median-age":
+        opts.ultrametric_trees = True
+        opts.rooted_trees = True
+        if opts.calc_node_ages is None:
+            opts.calc_node_ages = True
+    else:
+        if opts.ultrametric_trees:
+            opts.rooted_trees = True
+            if opts.calc_node_ages is None:
+                opts.calc_node_ages = True
+        else:
+            if opts.calc_node_ages is True:
+                opts.ultrametric_trees = True
+                opts.rooted_trees = True
+            else:
+                opts.calc_node_ages = False
+
+    # follow mode
+    if opts.follow:
+        if opts.from_newick_stream or opts.from_nexus_stream or not support_filepaths:
+            messenger.send_error("Follow mode requires tree files to be specified (trees cannot be read from the standard input).")
+            sys.exit(1)
+        if opts.output_filepath is None:
+            messenger.send_error("Follow mode requires an output file to be specified (using '-o' or '--output').")
+            sys.exit(1)
+        if opts.multiprocess:
+            messenger.send_warning("Parallel processing mode is not supported in follow mode: following tree files in a single process.")
+            opts.multiprocess = None
+        if opts.refresh_interval < 0:
+            messenger.send_error("Refresh interval set to %s: must not be negative" % opts.refresh_interval)
+            sys.exit(1)
+
+    # output
+    if opts.output_filepath is None:
+        output_dest = sys.stdout
+    else:
+        output_fpath = os.path.expanduser(os.path.expandvars(opts.output_filepath))
+        if not confirm_overwrite(filepath=output_fpath, replace_without_asking=opts.replace):
+            sys.exit(1)
+        elif opts.follow:
+            # (re)written as a whole at each refresh
+            output_dest = None
+        else:
+            output_dest = open(output_fpath, "w")
+
+    if opts.trprobs_filepath:
+        trprobs_filepath = os.path.expanduser(os.path.expandvars(opts.trprobs_filepath))
+        if confirm_overwrite(filepath=trprobs_filepath, replace_without_asking=opts.replace):
+            trprobs_dest = open(trprobs_filepath, "w")
+        else:
+            sys.exit(1)
+        opts.calc_tree_probs = True
+    else:
+        trprobs_dest = None
+        opts.calc_tree_probs = False
+
+    if opts.sketch_size is not None:
+        if opts.sketch_size < 1:
+            messenger.send_error("Sketch size set to %d: must be a positive integer" % opts.sketch_size)
+            sys.exit(1)
+        if opts.split_edges_filepath:
+            messenger.send_error("Split edge lengths cannot be extracted (using '--extract-edges') when summarizing them in bounded memory (using '--sketch-size')")
+            sys.exit(1)
+
+    if opts.split_edges_filepath:
+        split_edges_filepath = os.path.expanduser(os.path.expandvars(opts.split_edges_filepath))
+        if confirm_overwrite(filepath=split_edges_filepath, replace_without_asking=opts.replace):
+            split_edges_dest = open(split_edges_filepath, "w")
+        else:
+            sys.exit(1)
+    else:
+        split_edges_dest = None
+
+    if opts.thin < 1:
+        messenger.send_error("Thinning interval set to %d: must be a positive integer" % opts.thin)
+        sys.exit(1)
+
+    if opts.from_newick_stream:
+        schema = "newick"
+    elif opts.from_nexus_stream:
+        schema = "nexus"
+    else:
+        schema = 'nexus/newick'
+
+    if (opts.checkpoint_filepath or opts.resume_filepath) \
+            and (opts.from_newick_stream or opts.from_nexus_stream):
+        messenger.send_error("Checkpoints cannot be used when reading trees from standard input")
+        sys.exit(1)
+    if opts.resume_filepath:
+        resume_filepath = os.path.expanduser(os.path.expandvars(opts.resume_filepath))
+        if not os.path.exists(resume_filepath):
+            messenger.send_error("Checkpoint file not found: '%s'" % resume_filepath)
+            sys.exit(1)
+        src = open(resume_filepath, "rb")
+        try:
+            try:
+                counting_state = treesum.SplitCountingState.load(src)
+            except ValueError, e:
+                messenger.send_error("Cannot resume from '%s': %s" % (resume_filepath, e))
+                sys.exit(1)
+        finally:
+            src.close()
+        resumed_split_distribution = counting_state.split_distribution
+        if (counting_state.tree_offset, counting_state.thin) != (opts.burnin, opts.thin):
+            messenger.send_error("Cannot resume from '%s': trees were counted with a burn-in of %d and a thinning interval of %d" \
+                    % (resume_filepath, counting_state.tree_offset, counting_state.thin))
+            sys.exit(1)
+        if bool(resumed_split_distribution.is_rooted) != bool(opts.rooted_trees) \
+                or resumed_split_distribution.ignore_node_ages != (not opts.calc_node_ages):
+            messenger.send_error("Cannot resume from '%s': trees were counted with different rooting or node age options" \
+                    % resume_filepath)
+            sys.exit(1)
+        if resumed_split_distribution.store_value_lists != (opts.sketch_size is None):
+            messenger.send_error("Cannot resume from '%s': trees were counted with different '--sketch-size' options" \
+                    % resume_filepath)
+            sys.exit(1)
+        messenger.send_info("Resuming from '%s' (%d trees counted)." \
+                % (resume_filepath, resumed_split_distribution.total_trees_counted))
+    else:
+        resume_filepath = None
+        counting_state = None
+    if opts.checkpoint_filepath:
+        checkpoint_filepath = os.path.expanduser(os.path.expandvars(opts.checkpoint_filepath))
+        if not opts.resume_filepath \
+                or os.path.abspath(checkpoint_filepath) != os.path.abspath(resume_filepath):
+            if not confirm_overwrite(filepath=checkpoint_filepath, replace_without_asking=opts.replace):
+                sys.exit(1)
+    else:
+        checkpoint_filepath = None
+
+    ###################################################
+    # Main work begins here: Count the splits
+
+    start_time = datetime.datetime.now()
+    master_split_distribution = None
+    if counting_state is not None and not support_filepaths:
+        master_split_distribution = counting_state.split_distribution
+        master_topology_counter = counting_state.topology_counter
+    elif (support_filepaths is not None and len(support_filepaths) > 0) \
+            and not (opts.from_newick_stream or opts.from_nexus_stream) \
+            and _MP \
+            and opts.multiprocess:
+        if opts.multiprocess is not None:
+            if opts.multiprocess == "*":
+                num_processes = multiprocessing.cpu_count()
+            elif  opts.multiprocess == "@":
+                num_processes = len(support_filepaths)
+            else:
+                try:
+                    num_processes = int(opts.multiprocess)
+                except ValueError:
+                    messenger.send_error("'%s' is not a valid number of processes (must be a positive integer)." % opts.multiprocess)
+                    sys.exit(1)
+            if num_processes <= 0:
+                messenger.send_error("Maximum number of processes set to %d: cannot run SumTrees with less than 1 process" % num_processes)
+                sys.exit(1)
+            if num_processes == 1:
+                messenger.send_warning("Running in parallel processing mode but limited to only 1 process: probably more efficient to run in serial mode!")
+
+        master_split_distribution, master_topology_counter = process_sources_parallel(
+                num_processes=num_processes,
+                support_filepaths=support_filepaths,
+                schema=schema,
+                is_rooted=opts.rooted_trees,
+                ignore_node_ages=not opts.calc_node_ages,
+                calc_tree_probs=opts.calc_tree_probs,
+                weighted_trees=opts.weighted_trees,
+                tree_offset=opts.burnin,
+                thin=opts.thin,
+                log_frequency=opts.log_frequency,
+                messenger=messenger,
+                counting_state=counting_state,
+                checkpoint_filepath=checkpoint_filepath,
+                sketch_size=opts.sketch_size)
+    elif opts.follow:
+        refresh_messenger = ConsoleMessenger(name="SumTrees", messaging_level=ConsoleMessenger.ERROR_MESSAGING_LEVEL)
+        def refresh_summary(split_distribution, topology_counter):
+            write_file_atomically(output_fpath,
+                    lambda dest: write_summary(split_distribution,
+                            topology_counter,
+                            opts=opts,
+                            messenger=refresh_messenger,
+                            start_time=start_time,
+                            target_tree_filepath=target_tree_filepath,
+                            support_filepaths=support_filepaths,
+                            resume_filepath=resume_filepath,
+                            output_dest=dest))
+            messenger.send_info("Summary of %d trees written to: '%s'." \
+                    % (split_distribution.total_trees_counted, output_fpath), wrap=False)
+        master_split_distribution, master_topology_counter = process_sources_following(
+                support_filepaths=support_filepaths,
+                schema=schema,
+                is_rooted=opts.rooted_trees,
+                ignore_node_ages=not opts.calc_node_ages,
+                weighted_trees=opts.weighted_trees,
+                tree_offset=opts.burnin,
+                thin=opts.thin,
+                log_frequency=opts.log_frequency,
+                messenger=messenger,
+                counting_state=counting_state,
+                checkpoint_filepath=checkpoint_filepath,
+                checkpoint_frequency=opts.checkpoint_frequency,
+                follow_timeout=opts.follow_timeout,
+                refresh_interval=opts.refresh_interval,
+                refresh_func=refresh_summary,
+                sketch_size=opts.sketch_size)
+    else:
+        if opts.from_newick_stream or opts.from_nexus_stream:
+            support_filepaths = None
+        master_split_distribution, master_topology_counter = process_sources_serial(
+                support_filepaths=support_filepaths,
+                schema=schema,
+                is_rooted=opts.rooted_trees,
+                ignore_node_ages=not opts.calc_node_ages,
+                calc_tree_probs=opts.calc_tree_probs,
+                weighted_trees=opts.weighted_trees,
+                tree_offset=opts.burnin,
+                thin=opts.thin,
+                log_frequency=opts.log_frequency,
+                messenger=messenger,
+                counting_state=counting_state,
+                checkpoint_filepath=checkpoint_filepath,
+                checkpoint_frequency=opts.checkpoint_frequency,
+                sketch_size=opts.sketch_size)
+
+    if master_split_distribution.total_trees_counted == 0 and opts.follow:
+        messenger.send_error("No trees counted.")
+        sys.exit(1)
+    summary_kwargs = {
+        "opts": opts,
+        "messenger": messenger,
+        "start_time": start_time,
+        "target_tree_filepath": target_tree_filepath,
+        "support_filepaths": support_filepaths,
+        "resume_filepath": resume_filepath,
+        "trprobs_dest": trprobs_dest,
+        "split_edges_dest": split_edges_dest,
+    }
+    if output_dest is None:
+        final_run_report = write_file_atomically(output_fpath,
+                lambda dest: write_summary(master_split_distribution,
+                        master_topology_counter,
+                        output_dest=dest,
+                        **summary_kwargs))
+    else:
+        final_run_report = write_summary(master_split_distribution,
+                master_topology_counter,
+                output_dest=output_dest,
+                **summary_kwargs)
+
     if not opts.output_filepath:
         pass
     else: